@@ -10,6 +10,7 @@ from typing import Dict, List, Any, Optional
 import shutil
 
 from ..orchestrator import AgentOrchestrator, AgentType
+from ..tool_cache import invalidate_tool_caches
 from utils.logger import get_logger
 from pathlib import Path
 
@@ -120,6 +121,12 @@ class CleanupAgent:
                     results["failed_count"] += 1
                     results["failed_files"].append(error_info)
 
+        # 直接删除不经过工具，使各会话中涉及这些路径的缓存结果失效
+        if not is_dry_run and cleanup_items:
+            invalidate_tool_caches([
+                os.path.abspath(item.get("path", "")) for item in cleanup_items if item.get("path")
+            ])
+
         # 计算成功率
         if results["total_planned"] > 0:
             results["success_rate"] = results["deleted_count"] / results["total_planned"]
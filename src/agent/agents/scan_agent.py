@@ -10,6 +10,7 @@ from pathlib import Path
 
 from ..orchestrator import AgentOrchestrator, AgentType
 from ..models_agent import AgentSession
+from ..tools import file_tools, scan_tools  # noqa: F401  注册扫描所需工具
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -19,9 +20,9 @@ class ScanAgent:
     """扫描智能体
 
     工作流程：
-    1. 使用 Glob 工具搜索已知垃圾文件模式
-    2. 使用 Read/Ls 工具验证发现的文件
-    3. 使用 Grep 工具分析文件内容（如需要）
+    1. 使用 ScanJunk 工具一次扫描全部路径，获取按类别聚合的摘要
+    2. 使用 Glob 工具按已知垃圾文件模式核实具体类别
+    3. 使用 Read/Grep 工具验证文件（如需要）
     4. AI 分析并生成清理计划
     """
 
@@ -137,10 +138,11 @@ class ScanAgent:
         request_parts.extend([
             "",
             "## 任务要求",
-            "1. 使用 Glob 工具按模式搜索文件",
-            "2. 使用 Read/Ls 工具验证发现的文件",
-            "3. 对每个文件进行风险评估 (safe/suspicious/dangerous)",
-            "4. 生成清理计划（JSON 格式）",
+            "1. 先调用 scan_junk 工具一次扫描全部路径，基于聚合摘要（类别、大小、目录）判断",
+            "2. 仅对需要核实的类别使用 Glob 工具按上述模式搜索",
+            "3. 必要时使用 Read 工具验证文件",
+            "4. 对每个文件进行风险评估 (safe/suspicious/dangerous)",
+            "5. 生成清理计划（JSON 格式）",
         ])
 
         return "\n".join(request_parts)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+上下文窗口管理 - 控制每个会话发送给 AI 的 token 数
+
+每轮都会把完整历史发送给 API，工具输出（尤其是 grep/glob 的结果列表）
+会让 token 用量随轮次二次增长。本模块在每轮调用前整理会话:
+
+1. 截断: 单个工具结果超过 max_tool_result_chars 时保留首尾
+2. 压缩: 超出预算时，较早的工具结果替换为简短摘要（工具名、长度、预览）
+3. 折叠: 仍超出预算时，最早的若干轮折叠为一条结构化摘要消息
+
+整理直接作用于 AgentSession.messages，已压缩的历史在后续轮次保持不变。
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .models_agent import AgentSession, AgentMessage, AgentRole, ContentBlock
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+DIGEST_HEADER = "[早期对话摘要]"
+
+
+@dataclass
+class ContextConfig:
+    """上下文预算配置"""
+    max_context_tokens: int = 60000        # 每轮消息的 token 预算（不含系统提示词和工具定义）
+    keep_recent_messages: int = 6          # 最近的若干条消息不做压缩
+    max_tool_result_chars: int = 8000      # 单个工具结果的最大字符数
+    compacted_preview_chars: int = 200     # 压缩后保留的预览字符数
+    max_digest_chars: int = 4000           # 摘要消息的最大字符数
+    digest_line_chars: int = 160           # 摘要中每条记录的最大字符数
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数
+
+    ASCII 字符约 4 个字符 1 个 token，中文等非 ASCII 字符约 1 个字符 1 个 token。
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def _block_text(block: ContentBlock) -> str:
+    """内容块中计入上下文的文本"""
+    data = block.content
+    if block.type == "text":
+        return data.get("text", "")
+    if block.type == "tool_result":
+        return str(data.get("content", ""))
+    if block.type == "tool_use":
+        return str(data.get("input_json", ""))
+    return ""
+
+
+def _clip(text: str, limit: int) -> str:
+    """单行截断"""
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class ContextManager:
+    """会话上下文管理器"""
+
+    def __init__(self, config: Optional[ContextConfig] = None):
+        self.config = config or ContextConfig()
+
+    def prepare(self, session: AgentSession) -> List[Dict[str, Any]]:
+        """整理会话并返回本轮发送的 API 消息
+
+        Args:
+            session: 智能体会话
+
+        Returns:
+            API 格式消息列表
+        """
+        changed = self._truncate_tool_results(session.messages)
+
+        total = self.count_tokens(session.messages)
+        if total > self.config.max_context_tokens:
+            changed |= self._compact_old_results(session.messages)
+            total = self.count_tokens(session.messages)
+
+        if total > self.config.max_context_tokens:
+            changed |= self._fold_old_turns(session)
+            total = self.count_tokens(session.messages)
+
+        if changed:
+            session.invalidate_api_cache()
+            logger.debug(
+                f"[CONTEXT] 会话 {session.session_id} 已整理, "
+                f"消息 {len(session.messages)} 条, 约 {total} tokens"
+            )
+
+        return session.get_api_messages()
+
+    @staticmethod
+    def count_tokens(messages: List[AgentMessage]) -> int:
+        """估算消息列表的 token 数（不含系统消息）"""
+        return sum(
+            estimate_tokens(_block_text(block))
+            for message in messages if message.role != AgentRole.SYSTEM
+            for block in message.content
+        )
+
+    # ------------------------------------------------------------------
+    # 整理步骤
+    # ------------------------------------------------------------------
+
+    def _truncate_tool_results(self, messages: List[AgentMessage]) -> bool:
+        """截断过长的工具结果（保留首尾）"""
+        limit = self.config.max_tool_result_chars
+        changed = False
+
+        for message in messages:
+            for block in message.content:
+                if block.type != "tool_result" or block.content.get("truncated"):
+                    continue
+                content = str(block.content.get("content", ""))
+                if len(content) > limit:
+                    head = content[:limit * 3 // 4]
+                    tail = content[-(limit // 4):]
+                    omitted = len(content) - len(head) - len(tail)
+                    block.content["content"] = f"{head}\n...[省略 {omitted} 字符]...\n{tail}"
+                    block.content["truncated"] = True
+                    changed = True
+
+        return changed
+
+    def _compact_old_results(self, messages: List[AgentMessage]) -> bool:
+        """将较早的工具结果替换为摘要"""
+        preview_chars = self.config.compacted_preview_chars
+        cutoff = max(0, len(messages) - self.config.keep_recent_messages)
+        changed = False
+
+        for message in messages[:cutoff]:
+            for block in message.content:
+                if block.type != "tool_result" or block.content.get("compacted"):
+                    continue
+                content = str(block.content.get("content", ""))
+                if len(content) <= preview_chars:
+                    continue
+                tool_name = block.content.get("tool_name") or "tool"
+                block.content["content"] = (
+                    f"[已压缩] {tool_name} 输出 {len(content)} 字符: {_clip(content, preview_chars)}"
+                )
+                block.content["compacted"] = True
+                changed = True
+
+        return changed
+
+    def _fold_old_turns(self, session: AgentSession) -> bool:
+        """将最早的若干条消息折叠为一条摘要消息"""
+        messages = session.messages
+        start = 1 if messages and messages[0].role == AgentRole.SYSTEM else 0
+        end = len(messages) - self.config.keep_recent_messages
+        if end - start < 2:
+            return False
+
+        # 折叠到预算的一半，避免每轮都重新折叠
+        budget = self.config.max_context_tokens // 2
+        tokens = self.count_tokens(messages[start:])
+        fold_end = start
+        while fold_end < end and tokens > budget:
+            tokens -= self.count_tokens([messages[fold_end]])
+            fold_end += 1
+        if fold_end - start < 2:
+            fold_end = min(end, start + 2)
+
+        digest = self._build_digest(messages[start:fold_end])
+        session.messages = (
+            messages[:start]
+            + [AgentMessage(
+                role=AgentRole.USER,
+                content=[ContentBlock(type="text", content={"text": digest, "digest": True})]
+            )]
+            + messages[fold_end:]
+        )
+        logger.info(f"[CONTEXT] 会话 {session.session_id} 折叠 {fold_end - start} 条早期消息")
+        return True
+
+    def _build_digest(self, messages: List[AgentMessage]) -> str:
+        """生成结构化摘要: 每条消息一行（角色 / 工具名 / 内容预览）"""
+        line_chars = self.config.digest_line_chars
+        lines: List[str] = []
+
+        for message in messages:
+            for block in message.content:
+                data = block.content
+                if block.type == "text" and data.get("digest"):
+                    # 合并之前的摘要
+                    lines.extend(data.get("text", "").splitlines()[1:])
+                elif block.type == "text":
+                    role = "助手" if message.role == AgentRole.ASSISTANT else "用户"
+                    lines.append(f"- {role}: {_clip(data.get('text', ''), line_chars)}")
+                elif block.type == "tool_use":
+                    lines.append(
+                        f"- 调用 {data.get('tool_name')}: {_clip(str(data.get('input_json', '')), line_chars)}"
+                    )
+                elif block.type == "tool_result":
+                    status = "失败" if data.get("is_error") else "结果"
+                    lines.append(
+                        f"- {data.get('tool_name') or 'tool'} {status}: "
+                        f"{_clip(str(data.get('content', '')), line_chars)}"
+                    )
+
+        # 摘要最多占预算的约四分之一（按 ASCII 4 字符/token 计）
+        limit = min(self.config.max_digest_chars, self.config.max_context_tokens)
+        text = "\n".join(lines)
+        if len(text) > limit:
+            # 超长时保留最近的记录
+            text = "…\n" + text[-limit:].split("\n", 1)[-1]
+        return f"{DIGEST_HEADER}\n{text}"
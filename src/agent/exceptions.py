@@ -32,6 +32,7 @@ class ErrorCode(Enum):
     AI_INVALID_RESPONSE = "E2003"
     AI_CONNECTION_ERROR = "E2004"
     AI_QUOTA_EXCEEDED = "E2005"
+    AI_REPLAY_MISMATCH = "E2006"
 
     # 工具执行错误
     TOOL_NOT_FOUND = "E3000"
@@ -356,6 +357,24 @@ class AIQuotaExceededException(AgentException):
         self.update_context(**kwargs)
 
 
+class AIReplayMismatchException(AgentException):
+    """AI 回放异常（请求与录制不一致或录制已用尽）"""
+
+    def __init__(
+        self,
+        message: str = "回放记录与当前请求不一致",
+        **kwargs
+    ):
+        super().__init__(
+            code=ErrorCode.AI_REPLAY_MISMATCH,
+            message=message,
+            severity=ErrorSeverity.ERROR,
+            recoverable=False,
+            recovery_strategy=RecoveryStrategy.NONE
+        )
+        self.update_context(**kwargs)
+
+
 class MaxRetriesExceededError(AgentException):
     """最大重试次数超限异常"""
 
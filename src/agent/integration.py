@@ -4,9 +4,11 @@ Agent 集成辅助模块
 
 提供智能体与 PurifyAI 现有系统的集成接口
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 import json
 import os
+import queue
+import threading
 
 from . import (
     get_orchestrator, AgentType,
@@ -20,6 +22,92 @@ from utils.logger import get_logger
 logger = get_logger(__name__)
 
 
+PIPELINE_CHUNK_SIZE = 200    # 流水线每块的清理项目数
+PIPELINE_QUEUE_SIZE = 4      # 阶段间队列容量（块数），限制上游超前的程度
+_PIPELINE_DONE = object()    # 阶段结束标记
+
+
+def _extract_cleanup_items(files: List[Dict[str, Any]], seen: Set[str],
+                           dangerous: Set[str]) -> List[Dict[str, Any]]:
+    """从扫描结果提取清理项目（线性时间）
+
+    排除被任一扫描标记为 dangerous 的路径，并跳过 seen 中已出现过的路径
+    （扫描路径重叠时避免重复清理）。
+
+    Args:
+        files: 扫描结果中的文件列表
+        seen: 已提取过的路径集合，会被原地更新
+        dangerous: 整个流程中被标记为 dangerous 的路径，会被原地更新
+
+    Returns:
+        清理项目列表
+    """
+    dangerous.update(f.get("path") for f in files if f.get("risk") == "dangerous")
+    items = []
+    for f in files:
+        path = f.get("path")
+        if not f.get("is_garbage", False) or path in dangerous or path in seen:
+            continue
+        seen.add(path)
+        items.append({"path": path, "type": "file", "size": f.get("size", 0)})
+    return items
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """两个路径是否相同或互为祖先/后代"""
+    a = os.path.normcase(os.path.abspath(a))
+    b = os.path.normcase(os.path.abspath(b))
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    return longer == shorter or longer.startswith(shorter.rstrip(os.sep) + os.sep)
+
+
+def _merge_scan_results(scan_results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """合并各扫描路径的结果，单个结果原样返回"""
+    if not scan_results:
+        return None
+    if len(scan_results) == 1:
+        return scan_results[0]
+
+    merged = dict(scan_results[0])
+    merged["success"] = all(r.get("success", False) for r in scan_results)
+    merged["scan_ids"] = [r.get("scan_id") for r in scan_results]
+    merged["files"] = [f for r in scan_results for f in r.get("files", [])]
+    summary: Dict[str, Any] = {}
+    for r in scan_results:
+        for key, value in r.get("summary", {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                summary[key] = summary.get(key, 0) + value
+    merged["summary"] = summary
+    errors = [r["error"] for r in scan_results if r.get("error")]
+    if errors:
+        merged["error"] = "; ".join(errors)
+    return merged
+
+
+def _empty_cleanup_result(is_dry_run: bool) -> Dict[str, Any]:
+    """与 CleanupAgent.execute_cleanup 返回结构一致的空结果"""
+    return {
+        "total_planned": 0,
+        "deleted_count": 0,
+        "failed_count": 0,
+        "deleted_files": [],
+        "failed_files": [],
+        "total_freed_bytes": 0,
+        "is_dry_run": is_dry_run,
+        "success_rate": 0.0
+    }
+
+
+def _merge_cleanup_result(total: Dict[str, Any], part: Dict[str, Any]):
+    """将一个块的清理结果合并到汇总结果（原地更新）"""
+    for key in ("total_planned", "deleted_count", "failed_count", "total_freed_bytes"):
+        total[key] += part.get(key, 0)
+    total["deleted_files"].extend(part.get("deleted_files", []))
+    total["failed_files"].extend(part.get("failed_files", []))
+    if total["total_planned"] > 0:
+        total["success_rate"] = total["deleted_count"] / total["total_planned"]
+
+
 def _get_app_config() -> Dict[str, Any]:
     """获取应用配置
 
@@ -75,6 +163,9 @@ class AgentIntegration:
     2. Review Agent 审查清理计划安全性
     3. Cleanup Agent 执行清理
     4. Report Agent 生成报告
+
+    run_full_cleanup 以流水线方式运行前三个阶段，按块重叠执行；
+    各阶段在不同线程中驱动智能体，因此各自使用独立的编排器实例。
     """
 
     def __init__(self, api_key: Optional[str] = None):
@@ -94,28 +185,54 @@ class AgentIntegration:
             temperature=config.get("ai", {}).get("temperature", 0.7)
         )
 
-        self.orchestrator = get_orchestrator(self.ai_config)
-        self.scan_agent = create_scan_agent(self.orchestrator)
-        self.review_agent = create_review_agent(self.orchestrator)
-        self.cleanup_agent = create_cleanup_agent(self.orchestrator)
+        # 设置 AGENT_RECORD_PATH 时录制模型响应和工具输入输出，供离线回放基准使用
+        self.record_path = os.environ.get("AGENT_RECORD_PATH")
+        self._recording = None
+        if self.record_path:
+            from .replay import AgentRecording
+            self._recording = AgentRecording(model=self.ai_config.model)
+
+        # 编排器的会话、恢复和熔断状态不是线程安全的，流水线的每个阶段各用一个实例
+        self.orchestrator = self._create_orchestrator()
+        self.scan_agent = create_scan_agent(self._create_orchestrator())
+        self.review_agent = create_review_agent(self._create_orchestrator())
+        self.cleanup_agent = create_cleanup_agent(self._create_orchestrator())
         self.report_agent = create_report_agent(self.orchestrator)
 
         logger.info("[AGENT_INTEGRATION] 集成管理器初始化完成")
 
+    def _create_orchestrator(self):
+        """创建编排器（录制模式下所有实例写入同一份录制）"""
+        if self._recording is not None:
+            from .replay import RecordingOrchestrator
+            return RecordingOrchestrator(self.ai_config, record_path=self.record_path,
+                                         recording=self._recording)
+        return get_orchestrator(self.ai_config)
+
     def run_full_cleanup(
         self,
         scan_paths: List[str],
         scan_patterns: Optional[List[str]] = None,
         is_dry_run: bool = True,
-        skip_review: bool = False
+        skip_review: bool = False,
+        chunk_size: int = PIPELINE_CHUNK_SIZE
     ) -> Dict[str, Any]:
-        """运行完整清理流程
+        """运行完整清理流程（流水线）
+
+        各扫描路径依次扫描，结果按 chunk_size 分块流向审查，审查通过的块再流向清理，
+        清理结果增量合并后生成报告。扫描、审查、清理在不同线程中重叠执行，
+        无需等待全部扫描结束即可开始释放空间。任一阶段失败会停止后续的块，
+        已清理的块不会回滚。
+
+        任一扫描标记为 dangerous 的路径都不会被清理: 位于之后仍待扫描的重叠路径下的项目
+        推迟到全部扫描结束后再送出，清理前再按全流程的 dangerous 集合过滤一次。
 
         Args:
             scan_paths: 扫描路径列表
             scan_patterns: 扫描模式
             is_dry_run: 是否为演练模式
             skip_review: 是否跳过审查
+            chunk_size: 每个流水线块的项目数
 
         Returns:
             完整流程结果
@@ -130,75 +247,168 @@ class AgentIntegration:
             "error": None
         }
 
-        try:
-            logger.info(f"[AGENT_INTEGRATION] 开始完整清理流程: {scan_paths}")
-
-            # 阶段 1: 扫描
-            result["stage"] = "scan"
-            logger.info("[AGENT_INTEGRATION] 阶段 1/4: 扫描")
-            scan_result = self.scan_agent.scan(
-                scan_paths=scan_paths,
-                scan_patterns=scan_patterns
-            )
-            result["scan_result"] = scan_result
+        stop = threading.Event()
+        failure: Dict[str, str] = {}
+        failure_lock = threading.Lock()
+        review_queue: "queue.Queue" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        cleanup_queue: "queue.Queue" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        scan_results: List[Dict[str, Any]] = []
+        review_total = {"safe_to_proceed": True, "blocked_items": [], "reviewed_chunks": 0}
+        cleanup_total = _empty_cleanup_result(is_dry_run)
+        planned = [0]
+        dangerous: Set[str] = set()
+        dangerous_lock = threading.Lock()
+
+        def fail(stage: str, error: str):
+            with failure_lock:
+                if not failure:
+                    failure.update(stage=stage, error=error)
+            stop.set()
+
+        def send(items: List[Dict[str, Any]]):
+            for i in range(0, len(items), max(chunk_size, 1)):
+                if stop.is_set():
+                    break
+                review_queue.put(items[i:i + max(chunk_size, 1)])
+
+        def scan_stage():
+            # 逐个路径扫描，去重并过滤 dangerous 后分块送入审查队列
+            seen = set()
+            deferred = []
+            try:
+                for index, path in enumerate(scan_paths):
+                    if stop.is_set():
+                        break
+                    scan_result = self.scan_agent.scan(
+                        scan_paths=[path],
+                        scan_patterns=scan_patterns
+                    )
+                    scan_results.append(scan_result)
+                    if not scan_result.get("success", False):
+                        fail("scan", "扫描阶段失败")
+                        break
+
+                    with dangerous_lock:
+                        items = _extract_cleanup_items(scan_result.get("files", []), seen, dangerous)
+                    planned[0] += len(items)
+
+                    # 之后的重叠路径可能把同一项目标记为 dangerous，先不送出
+                    pending = [later for later in scan_paths[index + 1:] if _overlaps(path, later)]
+                    ready = []
+                    for item in items:
+                        if any(_overlaps(item["path"], later) for later in pending):
+                            deferred.append(item)
+                        else:
+                            ready.append(item)
+                    send(ready)
+
+                if deferred and not stop.is_set():
+                    with dangerous_lock:
+                        kept = [item for item in deferred if item["path"] not in dangerous]
+                    planned[0] -= len(deferred) - len(kept)
+                    send(kept)
+            except Exception as e:
+                fail("scan", str(e))
+            finally:
+                review_queue.put(_PIPELINE_DONE)
 
-            if not scan_result.get("success", False):
-                result["error"] = "扫描阶段失败"
-                return result
+        def review_stage():
+            # 即使流水线已停止也持续取出，保证上游 put 不会阻塞
+            try:
+                while True:
+                    chunk = review_queue.get()
+                    if chunk is _PIPELINE_DONE:
+                        break
+                    if stop.is_set():
+                        continue
+                    if skip_review:
+                        cleanup_queue.put(chunk)
+                        continue
+
+                    review_result = self.review_agent.review_cleanup_plan(chunk)
+                    review_total["reviewed_chunks"] += 1
+                    blocked = review_result.get("blocked_items", [])
+                    review_total["blocked_items"].extend(blocked)
+                    if not review_result.get("safe_to_proceed", True):
+                        review_total["safe_to_proceed"] = False
+                        review_total["reason"] = review_result.get("reason")
+                        fail("review", f"审查未通过: {review_result.get('reason')}")
+                        continue
+
+                    # 移除被阻断的项目
+                    blocked_paths = {f.get("path") for f in blocked}
+                    approved = [item for item in chunk if item["path"] not in blocked_paths]
+                    if approved:
+                        cleanup_queue.put(approved)
+            except Exception as e:
+                fail("review", str(e))
+                while review_queue.get() is not _PIPELINE_DONE:
+                    pass
+            finally:
+                cleanup_queue.put(_PIPELINE_DONE)
 
-            # 提取要清理的项目
-            cleanup_items = [
-                {"path": f.get("path"), "type": "file", "size": f.get("size", 0)}
-                for f in scan_result.get("files", [])
-                if f.get("is_garbage", False)
-            ]
+        try:
+            logger.info(f"[AGENT_INTEGRATION] 开始完整清理流程: {scan_paths}, "
+                        f"块大小: {chunk_size}, 审查: {not skip_review}")
+            result["stage"] = "scan"
 
-            # 过滤掉 dangerous 级别的文件
-            cleanup_items = [
-                item for item in cleanup_items
-                if any(f.get("path") == item["path"] and f.get("risk") != "dangerous"
-                       for f in scan_result.get("files", []))
+            workers = [
+                threading.Thread(target=scan_stage, name="agent-pipeline-scan", daemon=True),
+                threading.Thread(target=review_stage, name="agent-pipeline-review", daemon=True),
             ]
+            for worker in workers:
+                worker.start()
+
+            # 清理阶段在当前线程执行，逐块增量合并结果
+            while True:
+                chunk = cleanup_queue.get()
+                if chunk is _PIPELINE_DONE:
+                    break
+                if stop.is_set():
+                    continue
+                with dangerous_lock:
+                    chunk = [item for item in chunk if item["path"] not in dangerous]
+                if not chunk:
+                    continue
+                try:
+                    cleanup_result = self.cleanup_agent.execute_cleanup(
+                        cleanup_items=chunk,
+                        is_dry_run=is_dry_run
+                    )
+                except Exception as e:
+                    fail("cleanup", str(e))
+                    continue
+                _merge_cleanup_result(cleanup_total, cleanup_result)
+                logger.info(f"[AGENT_INTEGRATION] 已清理 {cleanup_total['total_planned']} 个项目, "
+                            f"释放 {cleanup_total['total_freed_bytes']} 字节")
+
+            for worker in workers:
+                worker.join()
+
+            result["scan_result"] = _merge_scan_results(scan_results)
+            if not skip_review and review_total["reviewed_chunks"]:
+                result["review_result"] = review_total
+            if cleanup_total["total_planned"]:
+                result["cleanup_result"] = cleanup_total
+
+            if failure:
+                result["stage"] = failure["stage"]
+                result["error"] = failure["error"]
+                return result
 
-            if not cleanup_items:
+            if not planned[0]:
                 result["error"] = "没有找到可清理的文件"
                 return result
 
-            logger.info(f"[AGENT_INTEGRATION] 发现 {len(cleanup_items)} 个可清理项目")
-
-            # 阶段 2: 审查
-            result["stage"] = "review"
-            if not skip_review:
-                logger.info("[AGENT_INTEGRATION] 阶段 2/4: 审查")
-                review_result = self.review_agent.review_cleanup_plan(cleanup_items)
-                result["review_result"] = review_result
-
-                if not review_result.get("safe_to_proceed", True):
-                    result["error"] = f"审查未通过: {review_result.get('reason')}"
-                    return result
-
-                # 移除被阻断的项目
-                blocked_paths = {f.get("path") for f in review_result.get("blocked_items", [])}
-                cleanup_items = [item for item in cleanup_items if item["path"] not in blocked_paths]
-                logger.info(f"[AGENT_INTEGRATION] 审查通过，可清理 {len(cleanup_items)} 个项目")
-            else:
-                logger.info("[AGENT_INTEGRATION] 跳过审查")
-
-            # 阶段 3: 清理
-            result["stage"] = "cleanup"
-            logger.info("[AGENT_INTEGRATION] 阶段 3/4: 清理")
-            cleanup_result = self.cleanup_agent.execute_cleanup(
-                cleanup_items=cleanup_items,
-                is_dry_run=is_dry_run
-            )
-            result["cleanup_result"] = cleanup_result
+            logger.info(f"[AGENT_INTEGRATION] 共发现 {planned[0]} 个可清理项目, "
+                        f"阻断 {len(review_total['blocked_items'])} 项")
 
-            # 阶段 4: 报告
+            result["cleanup_result"] = cleanup_total
             result["stage"] = "report"
-            logger.info("[AGENT_INTEGRATION] 阶段 4/4: 生成报告")
+            logger.info("[AGENT_INTEGRATION] 生成报告")
             report = self.report_agent.generate_report(
-                scan_result=scan_result,
-                cleanup_result=cleanup_result
+                scan_result=result["scan_result"],
+                cleanup_result=cleanup_total
             )
             result["report"] = report
 
@@ -210,6 +420,7 @@ class AgentIntegration:
 
         except Exception as e:
             logger.error(f"[AGENT_INTEGRATION] 清理流程出错: {e}")
+            stop.set()
             result["error"] = str(e)
             result["stage"] = "error"
             return result
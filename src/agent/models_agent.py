@@ -52,6 +52,38 @@ class AgentMessage:
             "content": [block.to_dict() for block in self.content]
         }
 
+    def to_api_dict(self) -> Dict[str, Any]:
+        """转换为 Messages API 格式"""
+        content_blocks = []
+
+        for block in self.content:
+            block_data = block.content
+
+            if block.type == "text":
+                content_blocks.append({
+                    "type": "text",
+                    "text": block_data.get("text", "")
+                })
+            elif block.type == "tool_use":
+                content_blocks.append({
+                    "type": "tool_use",
+                    "id": block_data.get("tool_id"),
+                    "name": block_data.get("tool_name"),
+                    "input": block_data.get("input_json", {})
+                })
+            elif block.type == "tool_result":
+                content_blocks.append({
+                    "type": "tool_result",
+                    "tool_use_id": block_data.get("tool_use_id") or block_data.get("tool_id"),
+                    "content": block_data.get("content", ""),
+                    "is_error": block_data.get("is_error", False)
+                })
+
+        return {
+            "role": self.role.value,
+            "content": content_blocks
+        }
+
 
 @dataclass
 class AgentToolCall:
@@ -122,6 +154,11 @@ class AgentSession:
     tool_calls: List[Dict[str, Any]] = field(default_factory=list)
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    # API 格式消息缓存：与 messages 的前缀对应，每轮只转换新增消息
+    _api_messages: List[Dict[str, Any]] = field(default_factory=list, init=False, repr=False, compare=False)
+    _api_converted: int = field(default=0, init=False, repr=False, compare=False)
+    _api_last: Optional[AgentMessage] = field(default=None, init=False, repr=False, compare=False)
+
     def add_message(self, role: AgentRole, content: List[ContentBlock]):
         """添加消息到会话"""
         self.messages.append(AgentMessage(role=role, content=content))
@@ -147,3 +184,32 @@ class AgentSession:
     def get_all_messages(self) -> List[AgentMessage]:
         """获取所有消息"""
         return self.messages.copy()
+
+    def get_api_messages(self) -> List[Dict[str, Any]]:
+        """获取 Messages API 格式的消息列表
+
+        已转换的消息会被缓存，每次只转换新追加的消息；messages 被截断或替换时
+        自动重建。系统消息不包含在内（通过 system 参数单独传递）。
+
+        Returns:
+            API 格式消息列表（副本）
+        """
+        converted = self._api_converted
+        if converted > len(self.messages) or (
+            converted and self.messages[converted - 1] is not self._api_last
+        ):
+            self.invalidate_api_cache()
+
+        for message in self.messages[self._api_converted:]:
+            if message.role != AgentRole.SYSTEM:
+                self._api_messages.append(message.to_api_dict())
+
+        self._api_converted = len(self.messages)
+        self._api_last = self.messages[-1] if self.messages else None
+        return list(self._api_messages)
+
+    def invalidate_api_cache(self):
+        """清除 API 格式消息缓存（原地修改已有消息后调用）"""
+        self._api_messages = []
+        self._api_converted = 0
+        self._api_last = None
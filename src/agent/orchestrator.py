@@ -8,18 +8,29 @@ Agent Orchestrator - 智能体编排器
 3. 处理工具调用和结果返回
 4. 管理会话状态
 5. 提供异常处理和自动恢复
+6. 同一轮中的只读工具调用并发执行
+7. 按 token 预算整理会话上下文
+8. 提示词缓存（系统提示词、工具定义、会话历史前缀）
+9. 流式输出（文本增量、tool_use 块结束即开始执行工具）
+10. 会话内只读工具结果缓存
 """
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Tuple
 from enum import Enum
+import itertools
 import json
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 
 from .models_agent import (
-    AgentSession, AgentMessage, AgentRole, AgentToolCall,
+    AgentSession, AgentRole, AgentToolCall,
     AgentToolResult, ContentBlock, AgentConfig
 )
-from .tools import get_tool, get_tools_schema, print_tools_info, execute_tool_safely, format_tool_error_for_user
+from .tools import (
+    get_tool, get_tools_schema, print_tools_info, execute_tool_safely,
+    format_tool_error_for_user, is_read_only_tool
+)
 from .exceptions import (
     AgentException, AgentStateException, ToolExecutionException,
     ToolNotFoundException, AIAuthenticationException, AIRateLimitException,
@@ -27,6 +38,8 @@ from .exceptions import (
     format_error_for_user
 )
 from .recovery import get_recovery_manager, RecoveryConfig
+from .context_manager import ContextManager, ContextConfig
+from .tool_cache import ToolResultCache
 from .error_logger import log_exception
 from utils.logger import get_logger
 
@@ -51,6 +64,99 @@ class ToolExecutionException(Exception):
     pass
 
 
+# 共享的 Anthropic 客户端，按 (api_key, base_url) 复用。
+# 客户端内部的 httpx 连接池跨轮次、跨会话保持长连接，避免每轮重新建立 TLS 连接
+_anthropic_clients: Dict[Tuple[str, str], Any] = {}
+_anthropic_clients_lock = threading.Lock()
+
+
+def get_anthropic_client(api_key: str, base_url: Optional[str] = None):
+    """获取共享的 Anthropic 客户端
+
+    Args:
+        api_key: API Key
+        base_url: API 地址（为空使用 SDK 默认地址）
+
+    Returns:
+        anthropic.Anthropic 实例
+
+    Raises:
+        ImportError: 未安装 anthropic SDK
+    """
+    key = (api_key, base_url or "")
+    with _anthropic_clients_lock:
+        client = _anthropic_clients.get(key)
+        if client is None:
+            from anthropic import Anthropic
+
+            kwargs = {"api_key": api_key}
+            if base_url:
+                kwargs["base_url"] = base_url
+            client = Anthropic(**kwargs)
+            _anthropic_clients[key] = client
+            logger.debug(f"[ORCHESTRATOR] 创建 Anthropic 客户端: {base_url or '默认地址'}")
+        return client
+
+
+class _ToolCallScheduler:
+    """按到达顺序调度同一轮中的工具调用
+
+    只读调用提交后立即在线程池中并发执行；修改类调用等待之前提交的全部调用
+    完成后才执行，之后提交的调用又等待它完成（屏障），读写顺序与 AI 给出的一致。
+    流式模式下 tool_use 块一结束就可以提交，无需等待整条消息。
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[str, Dict[str, Any], Optional[str]], Dict[str, Any]],
+        workspace: Optional[str],
+        max_workers: int,
+        on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            execute: 执行单个工具的函数 (tool_name, input, workspace) -> 结果
+            workspace: 工作目录
+            max_workers: 最大并发线程数
+            on_result: 单个调用完成时的回调 (call, result)，在工作线程中调用
+        """
+        self._execute = execute
+        self._workspace = workspace
+        self._on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent_tool")
+        self._futures: List[Future] = []
+        self._barrier: Optional[Future] = None
+        self._since_barrier: List[Future] = []
+
+    def submit(self, call: Dict[str, Any]):
+        """提交一个工具调用（含 tool_name / input）"""
+        deps = [self._barrier] if self._barrier else []
+        if is_read_only_tool(call["tool_name"]):
+            future = self._executor.submit(self._run, call, deps)
+            self._since_barrier.append(future)
+        else:
+            future = self._executor.submit(self._run, call, deps + self._since_barrier)
+            self._barrier = future
+            self._since_barrier = []
+        self._futures.append(future)
+
+    def _run(self, call: Dict[str, Any], deps: List[Future]) -> Dict[str, Any]:
+        # 依赖总是先提交的任务，线程池按提交顺序取任务，因此不会互相等待死锁
+        if deps:
+            wait(deps)
+        result = self._execute(call["tool_name"], call["input"], self._workspace)
+        if self._on_result:
+            self._on_result(call, result)
+        return result
+
+    def results(self) -> List[Dict[str, Any]]:
+        """等待全部调用完成，按提交顺序返回结果"""
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown(wait=True)
+
+
 @dataclass
 class AIConfig:
     """AI 配置"""
@@ -59,6 +165,14 @@ class AIConfig:
     base_url: str = "https://api.anthropic.com"
     max_tokens: int = 8192
     temperature: float = 0.7
+    prompt_caching: bool = True  # 将稳定前缀标记为可缓存
+
+
+# 会话ID序号
+_session_counter = itertools.count(1)
+
+# 提示词缓存断点标记
+CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class AgentOrchestrator:
@@ -72,7 +186,11 @@ class AgentOrchestrator:
         self,
         ai_config: Optional[AIConfig] = None,
         enable_recovery: bool = True,
-        recovery_config: Optional[RecoveryConfig] = None
+        recovery_config: Optional[RecoveryConfig] = None,
+        max_tool_workers: int = 8,
+        context_config: Optional[ContextConfig] = None,
+        cost_controller=None,
+        enable_tool_cache: bool = True
     ):
         """初始化编排器
 
@@ -80,6 +198,10 @@ class AgentOrchestrator:
             ai_config: AI 配置对象
             enable_recovery: 是否启用自动恢复
             recovery_config: 恢复配置
+            max_tool_workers: 同一轮中并发执行只读工具的最大线程数
+            context_config: 上下文预算配置
+            cost_controller: 成本控制器（记录每轮 token 用量，含缓存读写）
+            enable_tool_cache: 是否在会话内缓存只读工具结果
         """
         self.ai_config = ai_config or AIConfig(
             api_key="",  # 将从配置加载
@@ -88,6 +210,14 @@ class AgentOrchestrator:
         self.sessions: Dict[str, AgentSession] = {}
         self.active_agent_type: Optional[AgentType] = None
         self.current_session_id: Optional[str] = None
+        self.max_tool_workers = max(1, max_tool_workers)
+        self.context_manager = ContextManager(context_config)
+        self.cost_controller = cost_controller
+        self.enable_tool_cache = enable_tool_cache
+        # 会话ID -> 只读工具结果缓存
+        self._tool_caches: Dict[str, ToolResultCache] = {}
+        # (原始工具列表, API 格式工具列表)，工具列表不变时复用转换结果
+        self._api_tools_cache: Optional[Tuple[List[Dict], List[Dict]]] = None
 
         # 配置恢复管理器
         self.enable_recovery = enable_recovery
@@ -117,7 +247,8 @@ class AgentOrchestrator:
         Returns:
             AgentSession: 创建的会话
         """
-        session_id = f"{agent_type.value}_{int(time.time())}"
+        # 序号保证同一秒内创建的会话ID不冲突（流水线并发、回放基准会连续创建会话）
+        session_id = f"{agent_type.value}_{int(time.time())}_{next(_session_counter)}"
 
         session = AgentSession(
             session_id=session_id,
@@ -156,7 +287,8 @@ class AgentOrchestrator:
         self,
         message: str,
         session_id: Optional[str] = None,
-        tools_enabled: bool = True
+        tools_enabled: bool = True,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """处理用户消息
 
@@ -164,6 +296,12 @@ class AgentOrchestrator:
             message: 用户消息
             session_id: 会话ID，如果为 None 使用当前会话
             tools_enabled: 是否启用工具调用
+            on_event: 流式事件回调 (事件类型, 数据)，提供时以流式模式调用 AI:
+                - text_delta: {"text"} 文本增量
+                - tool_use: {"call_id", "tool_name", "input"} tool_use 块结束，随即开始执行
+                - tool_result: {"call_id", "tool_name", "output", "is_error"} 工具执行完成
+                  （在工具线程中回调）
+                - message_stop: {"stop_reason", "usage"} 本轮结束（工具已全部完成）
 
         Returns:
             处理结果字典
@@ -182,23 +320,66 @@ class AgentOrchestrator:
         if tools_enabled:
             available_tools = get_tools_schema()
 
-        # 调用 AI 获取响应
-        response = self._call_ai(
-            messages=session.get_all_messages(),
-            system_prompt=self._get_system_prompt(AgentType(session.agent_type)),
-            tools=available_tools
+        # 工具调用在 tool_use 块到达时提交执行，结果按原始顺序收集
+        tool_calls: List[Dict[str, Any]] = []
+        def emit_tool_result(call: Dict[str, Any], tool_result: Dict[str, Any]):
+            on_event("tool_result", {
+                "call_id": call["call_id"],
+                "tool_name": call["tool_name"],
+                "output": tool_result.get("output", ""),
+                "is_error": tool_result.get("is_error", False)
+            })
+
+        scheduler = _ToolCallScheduler(
+            lambda name, tool_input, workspace: self._execute_session_tool(
+                session_id, name, tool_input, workspace
+            ),
+            session.workspace, self.max_tool_workers,
+            emit_tool_result if on_event is not None else None
         )
 
+        def on_tool_use(content: Dict[str, Any]):
+            call = {
+                "call_id": content.get("id") or f"call_{int(time.time())}",
+                "tool_name": content.get("name"),
+                "input": content.get("input", {})
+            }
+            tool_calls.append(call)
+            if on_event is not None:
+                on_event("tool_use", dict(call))
+            if tools_enabled:
+                scheduler.submit(call)
+
+        # 调用 AI 获取响应（历史按上下文预算整理）
+        request = {
+            "messages": self.context_manager.prepare(session),
+            "system_prompt": self._get_system_prompt(AgentType(session.agent_type)),
+            "tools": available_tools
+        }
+        try:
+            if on_event is None:
+                response = self._call_ai(**request)
+                for content in response.get("content", []):
+                    if content.get("type") == "tool_use":
+                        on_tool_use(content)
+            else:
+                response = self._call_ai_stream(on_event=on_event, on_tool_use=on_tool_use, **request)
+        finally:
+            tool_results = scheduler.results()
+
         # 处理响应
         result = {
             "session_id": session_id,
             "response_text": "",
-            "tool_calls": [],
-            "tool_results": [],
-            "is_complete": False
+            "tool_calls": tool_calls,
+            "tool_results": tool_results if tools_enabled else [],
+            "is_complete": False,
+            "usage": response.get("usage", {})
         }
+        self._record_usage(result["usage"])
 
-        # 解析响应内容
+        # 按原始顺序写回会话
+        tool_index = 0
         for content in response.get("content", []):
             content_type = content.get("type")
 
@@ -207,37 +388,83 @@ class AgentOrchestrator:
                 session.add_assistant_message(result["response_text"])
 
             elif content_type == "tool_use":
-                tool_call = content
-                call_id = tool_call.get("id", f"call_{int(time.time())}")
-                tool_name = tool_call.get("name")
-                tool_input = tool_call.get("input", {})
-
-                result["tool_calls"].append({
-                    "call_id": call_id,
-                    "tool_name": tool_name,
-                    "input": tool_input
-                })
+                tool_call = tool_calls[tool_index]
 
-                # 执行工具
                 if tools_enabled:
-                    tool_result = self._execute_tool(tool_name, tool_input, session.workspace)
-                    result["tool_results"].append(tool_result)
+                    tool_result = tool_results[tool_index]
 
                     # 添加工具结果到会话
                     session.add_message(
                         AgentRole.USER,
                         [ContentBlock(type="tool_result", content={
-                            "tool_use_id": call_id,
-                            "tool_name": tool_name,
+                            "tool_use_id": tool_call["call_id"],
+                            "tool_name": tool_call["tool_name"],
                             "content": tool_result.get("output", ""),
                             "is_error": tool_result.get("is_error", False)
                         })]
                     )
+                tool_index += 1
 
         result["is_complete"] = response.get("stop_reason") == "end_turn"
 
+        if on_event is not None:
+            on_event("message_stop", {
+                "stop_reason": response.get("stop_reason"),
+                "usage": result["usage"]
+            })
+
+        return result
+
+    def _execute_session_tool(
+        self,
+        session_id: str,
+        tool_name: str,
+        tool_input: Dict[str, Any],
+        workspace: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """在会话中执行工具（只读工具先查缓存，修改类工具使相关缓存失效）
+
+        Args:
+            session_id: 会话ID
+            tool_name: 工具名称
+            tool_input: 工具输入
+            workspace: 工作目录
+
+        Returns:
+            工具执行结果，命中缓存时含 "cached": True
+        """
+        if not self.enable_tool_cache:
+            return self._execute_tool(tool_name, tool_input, workspace)
+
+        cache = self._tool_caches.setdefault(session_id, ToolResultCache())
+        tool = get_tool(tool_name)
+
+        if tool is not None and tool.READ_ONLY:
+            cached = cache.get(tool_name, tool_input, workspace)
+            if cached is not None:
+                logger.debug(f"[ORCHESTRATOR] 工具结果命中缓存: {tool_name}")
+                return cached
+
+            result = self._execute_tool(tool_name, tool_input, workspace)
+            paths = self._affected_paths(tool, tool_input, workspace)
+            if not result["is_error"] and paths is not None:
+                cache.put(tool_name, tool_input, workspace, paths, result)
+            return result
+
+        result = self._execute_tool(tool_name, tool_input, workspace)
+        if tool is not None:
+            cache.invalidate(self._affected_paths(tool, tool_input, workspace))
         return result
 
+    @staticmethod
+    def _affected_paths(tool, tool_input: Dict[str, Any], workspace: Optional[str]) -> Optional[List[str]]:
+        """工具涉及的路径，无法确定时返回 None"""
+        try:
+            return tool.affected_paths(tool_input, workspace)
+        except Exception as e:
+            logger.debug(f"[ORCHESTRATOR] 获取工具路径失败: {tool.NAME}, {e}")
+            return None
+
     def _execute_tool(
         self,
         tool_name: str,
@@ -293,14 +520,14 @@ class AgentOrchestrator:
 
     def _call_ai(
         self,
-        messages: List[AgentMessage],
+        messages: List[Dict[str, Any]],
         system_prompt: Optional[str] = None,
         tools: Optional[List[Dict]] = None
     ) -> Dict[str, Any]:
         """调用 AI API
 
         Args:
-            messages: 消息列表
+            messages: API 格式消息列表（AgentSession.get_api_messages）
             system_prompt: 系统提示词
             tools: 工具列表
 
@@ -308,79 +535,17 @@ class AgentOrchestrator:
             AI 响应
         """
         def _make_api_call():
-            from anthropic import Anthropic
-
-            client = Anthropic(api_key=self.ai_config.api_key)
-
-            # 转换消息格式
-            api_messages = []
-            for msg in messages:
-                role = msg.role.value
-                content_blocks = []
-
-                for block in msg.content:
-                    block_type = block.type
-                    block_data = block.content
-
-                    if block_type == "text":
-                        content_blocks.append({
-                            "type": "text",
-                            "text": block_data.get("text", "")
-                        })
-                    elif block_type == "tool_use":
-                        content_blocks.append({
-                            "type": "tool_use",
-                            "id": block_data.get("tool_id"),
-                            "name": block_data.get("tool_name"),
-                            "input": block_data.get("input_json", {})
-                        })
-                    elif block_type == "tool_result":
-                        content_blocks.append({
-                            "type": "tool_result",
-                            "tool_use_id": block_data.get("tool_id"),
-                            "content": block_data.get("content", ""),
-                            "is_error": block_data.get("is_error", False)
-                        })
-
-                api_messages.append({
-                    "role": role,
-                    "content": content_blocks
-                })
+            client = get_anthropic_client(self.ai_config.api_key, self.ai_config.base_url)
 
             # 调用 API
             response = client.messages.create(
                 model=self.ai_config.model,
                 max_tokens=self.ai_config.max_tokens,
                 temperature=self.ai_config.temperature,
-                system=system_prompt,
-                messages=api_messages,
-                tools=tools or []
+                **self._build_request(messages, system_prompt, tools)
             )
 
-            # 转换响应格式
-            result = {
-                "id": response.id,
-                "model": response.model,
-                "stop_reason": response.stop_reason,
-                "content": []
-            }
-
-            for content in response.content:
-                content_type = getattr(content, "type", None)
-
-                if content_type == "text":
-                    result["content"].append({
-                        "type": "text",
-                        "text": content.text
-                    })
-                elif content_type == "tool_use":
-                    result["content"].append({
-                        "type": "tool_use",
-                        "id": content.id,
-                        "name": content.name,
-                        "input": content.input
-                    })
-
+            result = self._convert_response(response)
             logger.debug(f"[ORCHESTRATOR] AI 调用完成, stop_reason: {response.stop_reason}")
             return result
 
@@ -421,14 +586,16 @@ class AgentOrchestrator:
 
         # 使用恢复管理器执行（如果启用）
         if self._recovery_manager:
+            responses = []
             try:
                 result = self._recovery_manager.execute_with_recovery(
-                    func=_make_api_call,
+                    func=lambda: responses.append(_make_api_call()),
                     name=f"ai_call_{self.ai_config.model}"
                 )
                 if not result.success and result.error:
                     raise result.error
-                return _make_api_call()
+                if responses:
+                    return responses[-1]
             except Exception as e:
                 # 已在恢复管理器中处理
                 pass
@@ -443,11 +610,11 @@ class AgentOrchestrator:
             # 检查是否有最后一个用户消息
             last_user_message = None
             for msg in reversed(messages):
-                if msg.role == AgentRole.USER:
+                if msg["role"] == AgentRole.USER.value:
                     content_text = ""
-                    for block in msg.content:
-                        if block.type == "text":
-                            content_text = block.content.get("text", "")
+                    for block in msg["content"]:
+                        if block["type"] == "text":
+                            content_text = block.get("text", "")
                             break
                     if content_text:
                         last_user_message = content_text
@@ -505,6 +672,200 @@ class AgentOrchestrator:
                 ]
             }
 
+    def _call_ai_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        tools: Optional[List[Dict]],
+        on_event: Callable[[str, Dict[str, Any]], None],
+        on_tool_use: Callable[[Dict[str, Any]], None]
+    ) -> Dict[str, Any]:
+        """以流式方式调用 AI API
+
+        文本增量到达即回调 text_delta，tool_use 块结束即回调 on_tool_use。
+        SDK 不可用或在产生任何输出之前失败时，退回 _call_ai 并按顺序补发事件。
+
+        Args:
+            messages: API 格式消息列表
+            system_prompt: 系统提示词
+            tools: 工具列表
+            on_event: 流式事件回调
+            on_tool_use: tool_use 块完成回调
+
+        Returns:
+            AI 响应（与 _call_ai 格式相同）
+        """
+        emitted = False
+        try:
+            client = get_anthropic_client(self.ai_config.api_key, self.ai_config.base_url)
+
+            with client.messages.stream(
+                model=self.ai_config.model,
+                max_tokens=self.ai_config.max_tokens,
+                temperature=self.ai_config.temperature,
+                **self._build_request(messages, system_prompt, tools)
+            ) as stream:
+                for event in stream:
+                    event_type = getattr(event, "type", None)
+                    if event_type == "text":
+                        emitted = True
+                        on_event("text_delta", {"text": event.text})
+                    elif event_type == "content_block_stop":
+                        block = event.content_block
+                        if getattr(block, "type", None) == "tool_use":
+                            emitted = True
+                            on_tool_use({"type": "tool_use", "id": block.id,
+                                         "name": block.name, "input": block.input})
+                response = stream.get_final_message()
+
+        except Exception as e:
+            if emitted:
+                # 已有部分输出，不能再整体重试
+                logger.error(f"[ORCHESTRATOR] 流式调用中断: {e}")
+                log_exception(
+                    Exception(f"AI 流式调用中断: {str(e)}"),
+                    session_id=self.current_session_id
+                )
+                return {
+                    "id": "error_response",
+                    "model": "error",
+                    "stop_reason": "error",
+                    "content": [{"type": "text", "text": format_error_for_user(e, include_details=True)}]
+                }
+
+            logger.warning(f"[ORCHESTRATOR] 流式调用不可用，改用普通调用: {e}")
+            result = self._call_ai(messages=messages, system_prompt=system_prompt, tools=tools)
+            self._emit_response_events(result, on_event, on_tool_use)
+            return result
+
+        logger.debug(f"[ORCHESTRATOR] AI 流式调用完成, stop_reason: {response.stop_reason}")
+        return self._convert_response(response)
+
+    @staticmethod
+    def _emit_response_events(
+        result: Dict[str, Any],
+        on_event: Callable[[str, Dict[str, Any]], None],
+        on_tool_use: Callable[[Dict[str, Any]], None]
+    ):
+        """按顺序为完整响应补发流式事件（非流式响应的退化路径）"""
+        for content in result.get("content", []):
+            if content.get("type") == "text":
+                on_event("text_delta", {"text": content.get("text", "")})
+            elif content.get("type") == "tool_use":
+                on_tool_use(content)
+
+    @staticmethod
+    def _convert_response(response) -> Dict[str, Any]:
+        """将 SDK 响应转换为字典格式"""
+        usage = getattr(response, "usage", None)
+        result = {
+            "id": response.id,
+            "model": response.model,
+            "stop_reason": response.stop_reason,
+            "content": [],
+            "usage": {
+                "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+                "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+                "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+                "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0
+            }
+        }
+
+        for content in response.content:
+            content_type = getattr(content, "type", None)
+
+            if content_type == "text":
+                result["content"].append({
+                    "type": "text",
+                    "text": content.text
+                })
+            elif content_type == "tool_use":
+                result["content"].append({
+                    "type": "tool_use",
+                    "id": content.id,
+                    "name": content.name,
+                    "input": content.input
+                })
+
+        return result
+
+    def _build_request(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        tools: Optional[List[Dict]]
+    ) -> Dict[str, Any]:
+        """构造请求中的 system / tools / messages，并标记缓存断点
+
+        缓存前缀顺序为 tools → system → messages，断点依次放在:
+        最后一个工具定义、系统提示词、最后一条消息的最后一个内容块。
+        下一轮请求的前缀与本轮相同，可直接命中缓存。
+
+        Args:
+            messages: API 格式消息列表（不修改，标记时复制最后一条）
+            system_prompt: 系统提示词
+            tools: 工具列表（OpenAI 格式）
+
+        Returns:
+            messages.create 的关键字参数
+        """
+        caching = self.ai_config.prompt_caching
+        api_tools = self._get_api_tools(tools or [])
+        params: Dict[str, Any] = {"messages": messages, "tools": api_tools}
+
+        if system_prompt:
+            system_block = {"type": "text", "text": system_prompt}
+            if caching:
+                system_block["cache_control"] = CACHE_CONTROL
+            params["system"] = [system_block]
+
+        if caching and messages and messages[-1].get("content"):
+            # 消息字典与会话缓存共享，标记时复制
+            last = messages[-1]
+            blocks = list(last["content"])
+            blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+            params["messages"] = messages[:-1] + [{**last, "content": blocks}]
+
+        return params
+
+    def _get_api_tools(self, tools: List[Dict]) -> List[Dict]:
+        """将工具列表转换为 API 格式（工具列表不变时复用上次结果）"""
+        cached = self._api_tools_cache
+        if cached is not None and cached[0] is tools:
+            return cached[1]
+
+        api_tools = []
+        for tool in tools:
+            function = tool.get("function")
+            if function is None:
+                api_tools.append(dict(tool))
+            else:
+                api_tools.append({
+                    "name": function.get("name"),
+                    "description": function.get("description", ""),
+                    "input_schema": function.get("parameters") or {"type": "object", "properties": {}}
+                })
+        if api_tools and self.ai_config.prompt_caching:
+            api_tools[-1]["cache_control"] = CACHE_CONTROL
+
+        self._api_tools_cache = (tools, api_tools)
+        return api_tools
+
+    def _record_usage(self, usage: Dict[str, Any]):
+        """记录本轮 token 用量到成本控制器"""
+        if not usage or self.cost_controller is None:
+            return
+
+        try:
+            self.cost_controller.record_call(
+                input_tokens=usage.get("input_tokens", 0),
+                output_tokens=usage.get("output_tokens", 0),
+                cache_read_tokens=usage.get("cache_read_input_tokens", 0),
+                cache_write_tokens=usage.get("cache_creation_input_tokens", 0)
+            )
+        except Exception as e:
+            logger.debug(f"[ORCHESTRATOR] 记录 token 用量失败: {e}")
+
     def _get_system_prompt(self, agent_type: AgentType) -> Optional[str]:
         """获取智能体的系统提示词
 
@@ -534,7 +895,8 @@ class AgentOrchestrator:
         initial_message: str,
         workspace: Optional[str] = None,
         max_turns: int = 20,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """运行智能体循环
 
@@ -544,6 +906,7 @@ class AgentOrchestrator:
             workspace: 工作目录
             max_turns: 最大轮次
             metadata: 元数据
+            on_event: 流式事件回调，见 process_message
 
         Returns:
             执行结果
@@ -591,7 +954,7 @@ class AgentOrchestrator:
 
         # 处理初始消息
         try:
-            result = self.process_message(initial_message, session.session_id)
+            result = self.process_message(initial_message, session.session_id, on_event=on_event)
             results["responses"].append(result["response_text"])
             results["tool_calls"].extend(result["tool_calls"])
             results["is_complete"] = result["is_complete"]
@@ -600,7 +963,7 @@ class AgentOrchestrator:
             # 继续循环直到完成或达到最大轮次
             while not results["is_complete"] and results["turns"] < max_turns:
                 try:
-                    result = self.process_message("请继续", session.session_id)
+                    result = self.process_message("请继续", session.session_id, on_event=on_event)
                     results["responses"].append(result["response_text"])
                     results["tool_calls"].extend(result["tool_calls"])
                     results["is_complete"] = result["is_complete"]
@@ -666,6 +1029,7 @@ class AgentOrchestrator:
         Args:
             session_id: 会话ID
         """
+        self._tool_caches.pop(session_id, None)
         if session_id in self.sessions:
             del self.sessions[session_id]
             logger.info(f"[ORCHESTRATOR] 关闭会话: {session_id}")
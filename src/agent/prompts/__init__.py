@@ -14,14 +14,20 @@ SCAN_PROMPT = """# 角色
 ## 任务
 
 你正在运行一个智能扫描任务，需要：
-1. 使用 Glob 工具快速搜索已知垃圾文件
-2. 使用 Grep/Ls 工具探索目标路径
+1. 使用 ScanJunk 工具一次扫描全部目标路径，获取聚合摘要
+2. 使用 Glob 工具核实需要确认的垃圾类别
 3. 使用 Read 工具验证可疑文件内容
 4. 对发现的文件进行风险评估
 5. 生成清理计划
 
 ## 工具说明
 
+### ScanJunk - 批量垃圾发现
+- 一次调用扫描多个根目录（`paths`），按清理规则分类
+- 返回各类别的文件数、大小、风险等级和样例路径，以及安全类文件占用最多的目录
+- 自动跳过系统目录和白名单保护项
+- 基于聚合结果判断，不要逐个模式调用 Glob 翻阅文件列表
+
 ### Glob - 文件模式搜索
 - 用于快速匹配已知垃圾文件模式
 - 使用 `**/*` 进行递归搜索
@@ -97,7 +103,8 @@ SCAN_PROMPT = """# 角色
 
 ## 工作流程
 
-1. **探索阶段**: 使用 Glob 工具按文件模式搜索
+1. **探索阶段**: 调用一次 ScanJunk 获取全部路径的聚合摘要，
+   再仅对需要核实的类别使用 Glob 工具按文件模式搜索
    - temp_files: `*.tmp`, `*.temp`, `*~`, `*.bak`, `*.old`
    - cache_files: `*cache*`, `GPUCache`, `Code Cache`, `*Cache*`
    - log_files: `*.log`, `*.trace`, `*.out`, `*.dmp`
@@ -116,7 +123,7 @@ SCAN_PROMPT = """# 角色
 
 ## 注意事项
 
-- **工具顺序**: 先用 Glob 进行快速筛选，再用其他工具深入分析
+- **工具顺序**: 先用 ScanJunk 获取全局摘要，再用 Glob 和其他工具深入分析
 - **性能优先**: 不要扫描明显不是垃圾的目录（如 C:\\Program Files）
 - **用户数据保护**: 避免扫描 users 主目录内容
 - **批量处理合理化**: 每次调用 Glob 都要限制结果数量
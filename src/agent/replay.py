@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+录制/回放 - 离线测量智能体循环性能
+
+1. 录制: RecordingOrchestrator 按会话记录模型响应（含 usage、耗时）和工具输入输出，
+   保存为 JSON（设置环境变量 AGENT_RECORD_PATH 后 AgentIntegration 自动启用）
+2. 回放: ReplayOrchestrator 替换 _call_ai，按会话顺序返回录制的响应，
+   可配置模拟延迟；工具默认返回录制结果，也可以真实执行
+3. 基准: run_benchmark 回放全部会话，按阶段（智能体类型）统计轮次、工具耗时、
+   请求序列化耗时和 token 用量
+
+回放不访问网络，编排器优化可以在 CI 中测量和做回归测试。
+会话按 (智能体类型, 初始消息) 与录制匹配，同一会话内的响应按轮次顺序返回。
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Union
+
+from .orchestrator import AgentOrchestrator, AgentType, AIConfig
+from .exceptions import AIReplayMismatchException
+from .tool_cache import ToolResultCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+RECORDING_VERSION = 1
+
+USAGE_KEYS = (
+    "input_tokens", "output_tokens",
+    "cache_read_input_tokens", "cache_creation_input_tokens"
+)
+
+
+class AgentRecording:
+    """录制数据: 按会话保存模型响应和工具输入输出
+
+    会话结构:
+        {"agent_type", "initial_message", "workspace", "metadata",
+         "turns": [{"message", "response", "duration_ms"}],
+         "tools": [{"tool_name", "input", "workspace", "result", "duration_ms"}]}
+    """
+
+    def __init__(self, sessions: Optional[List[Dict[str, Any]]] = None, model: str = ""):
+        self.sessions: List[Dict[str, Any]] = sessions if sessions is not None else []
+        self.model = model
+        # 多个编排器共享同一录制时使用的锁
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": RECORDING_VERSION,
+            "model": self.model,
+            "created_at": datetime.now().isoformat(),
+            "sessions": self.sessions
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentRecording":
+        version = data.get("version")
+        if version != RECORDING_VERSION:
+            raise ValueError(f"不支持的录制版本: {version}")
+        return cls(list(data.get("sessions", [])), data.get("model", ""))
+
+    def save(self, path: str):
+        """保存为 JSON（先写临时文件再替换，避免中途失败留下半个文件）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "AgentRecording":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+class RecordingOrchestrator(AgentOrchestrator):
+    """录制模式编排器: 正常调用 AI，同时记录每个会话的响应和工具输入输出"""
+
+    def __init__(self, ai_config: Optional[AIConfig] = None, record_path: Optional[str] = None,
+                 recording: Optional[AgentRecording] = None, **kwargs):
+        """
+        Args:
+            ai_config: AI 配置对象
+            record_path: 录制文件路径，提供时每次 run_agent_loop 结束后自动保存
+            recording: 共享的录制数据（多个编排器并发录制到同一文件时传入）
+            **kwargs: 传给 AgentOrchestrator
+        """
+        super().__init__(ai_config, **kwargs)
+        self.record_path = record_path
+        self.recording = recording if recording is not None else AgentRecording(model=self.ai_config.model)
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._record_lock = self.recording.lock
+        # 当前线程正在处理的会话ID（_call_ai 没有会话参数）
+        self._local = threading.local()
+
+    def process_message(self, message: str, session_id: Optional[str] = None, *args, **kwargs) -> Dict[str, Any]:
+        session_id = session_id or self.current_session_id
+        session = self.sessions.get(session_id)
+        if session is not None:
+            with self._record_lock:
+                record = self._records.get(session_id)
+                if record is None:
+                    record = {
+                        "agent_type": session.agent_type,
+                        "initial_message": message,
+                        "workspace": session.workspace,
+                        "metadata": dict(session.metadata),
+                        "turns": [],
+                        "tools": []
+                    }
+                    self._records[session_id] = record
+                    self.recording.sessions.append(record)
+            self._local.message = message
+        self._local.session_id = session_id
+        return super().process_message(message, session_id, *args, **kwargs)
+
+    def _call_ai(self, messages, system_prompt=None, tools=None) -> Dict[str, Any]:
+        start_time = time.time()
+        response = super()._call_ai(messages, system_prompt, tools)
+        self._record_turn(response, start_time)
+        self._local.recorded = True
+        return response
+
+    def _call_ai_stream(self, messages, system_prompt, tools, on_event, on_tool_use) -> Dict[str, Any]:
+        # 流式调用失败时会退回 _call_ai，此时响应已经记录
+        self._local.recorded = False
+        start_time = time.time()
+        response = super()._call_ai_stream(messages, system_prompt, tools, on_event, on_tool_use)
+        if not self._local.recorded:
+            self._record_turn(response, start_time)
+        return response
+
+    def _record_turn(self, response: Dict[str, Any], start_time: float):
+        record = self._records.get(getattr(self._local, "session_id", None))
+        if record is None:
+            return
+        with self._record_lock:
+            record["turns"].append({
+                "message": getattr(self._local, "message", ""),
+                "response": response,
+                "duration_ms": int((time.time() - start_time) * 1000)
+            })
+
+    def _execute_session_tool(self, session_id, tool_name, tool_input, workspace=None) -> Dict[str, Any]:
+        # 工具在线程池中执行，线程局部的会话ID需要重新设置
+        self._local.session_id = session_id
+        return super()._execute_session_tool(session_id, tool_name, tool_input, workspace)
+
+    def _execute_tool(self, tool_name, tool_input, workspace=None) -> Dict[str, Any]:
+        # 只记录真实执行（缓存命中不记录），回放时缓存行为与录制一致
+        start_time = time.time()
+        result = super()._execute_tool(tool_name, tool_input, workspace)
+        record = self._records.get(getattr(self._local, "session_id", None))
+        if record is not None:
+            entry = {
+                "tool_name": tool_name,
+                "input": tool_input,
+                "workspace": workspace,
+                "result": result,
+                "duration_ms": int((time.time() - start_time) * 1000)
+            }
+            with self._record_lock:
+                record["tools"].append(entry)
+        return result
+
+    def run_agent_loop(self, *args, **kwargs) -> Dict[str, Any]:
+        results = super().run_agent_loop(*args, **kwargs)
+        if self.record_path:
+            self.save(self.record_path)
+        return results
+
+    def save(self, path: str):
+        """保存录制文件"""
+        with self._record_lock:
+            self.recording.save(path)
+        logger.info(f"[REPLAY] 已保存录制: {path}, {len(self.recording.sessions)} 个会话")
+
+
+def _new_stage_metrics() -> Dict[str, Any]:
+    metrics = {
+        "sessions": 0,
+        "turns": 0,
+        "tool_calls": 0,
+        "cached_tool_calls": 0,
+        "tool_ms": 0.0,
+        "serialization_ms": 0.0,
+        "request_bytes": 0,
+        "simulated_latency_ms": 0.0,
+    }
+    metrics.update({key: 0 for key in USAGE_KEYS})
+    return metrics
+
+
+class ReplayOrchestrator(AgentOrchestrator):
+    """回放模式编排器: _call_ai 返回录制的响应，不访问网络
+
+    每轮仍按真实路径构建并序列化请求（_build_request + JSON），
+    以便测量请求构建的开销；模拟延迟 = latency_ms + per_token_ms × 输出 token 数。
+    """
+
+    def __init__(
+        self,
+        recording: AgentRecording,
+        latency_ms: float = 0.0,
+        per_token_ms: float = 0.0,
+        execute_tools: bool = False,
+        ai_config: Optional[AIConfig] = None,
+        **kwargs
+    ):
+        """
+        Args:
+            recording: 录制数据
+            latency_ms: 每次 AI 调用的固定模拟延迟（毫秒）
+            per_token_ms: 每个输出 token 的模拟延迟（毫秒）
+            execute_tools: True 时真实执行工具，False 时返回录制的工具结果
+            ai_config: AI 配置对象，默认使用录制的模型名
+            **kwargs: 传给 AgentOrchestrator（默认禁用自动恢复）
+        """
+        kwargs.setdefault("enable_recovery", False)
+        super().__init__(ai_config or AIConfig(api_key="", model=recording.model or "replay"), **kwargs)
+        self.recording = recording
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.execute_tools = execute_tools
+        self.mismatches = 0
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        # 会话ID -> {"record", "turn", "tools": {键: 结果队列}}
+        self._cursors: Dict[str, Dict[str, Any]] = {}
+        self._consumed: set = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stage(self, agent_type: str) -> Dict[str, Any]:
+        return self.metrics.setdefault(agent_type, _new_stage_metrics())
+
+    def _bind_session(self, session_id: str, message: str) -> Dict[str, Any]:
+        """为新会话找到第一个未使用的、类型和初始消息都一致的录制会话"""
+        session = self.sessions[session_id]
+        for index, record in enumerate(self.recording.sessions):
+            if index in self._consumed:
+                continue
+            if record.get("agent_type") == session.agent_type and record.get("initial_message") == message:
+                self._consumed.add(index)
+                tools: Dict[Any, Deque[Dict[str, Any]]] = {}
+                for entry in record.get("tools", []):
+                    key = ToolResultCache.make_key(entry["tool_name"], entry.get("input", {}), entry.get("workspace"))
+                    tools.setdefault(key, deque()).append(entry["result"])
+                cursor = {"record": record, "agent_type": session.agent_type, "turn": 0, "tools": tools}
+                self._cursors[session_id] = cursor
+                self._stage(session.agent_type)["sessions"] += 1
+                return cursor
+
+        self.mismatches += 1
+        raise AIReplayMismatchException(
+            f"录制中没有匹配的会话: {session.agent_type}, 初始消息: {message[:50]}",
+            session_id=session_id
+        )
+
+    def process_message(self, message: str, session_id: Optional[str] = None, *args, **kwargs) -> Dict[str, Any]:
+        session_id = session_id or self.current_session_id
+        with self._lock:
+            if session_id not in self._cursors and session_id in self.sessions:
+                self._bind_session(session_id, message)
+        self._local.session_id = session_id
+        return super().process_message(message, session_id, *args, **kwargs)
+
+    def _call_ai(self, messages, system_prompt=None, tools=None) -> Dict[str, Any]:
+        session_id = getattr(self._local, "session_id", None)
+        cursor = self._cursors.get(session_id)
+        if cursor is None:
+            raise AIReplayMismatchException("回放会话未绑定录制", session_id=session_id)
+
+        # 与真实调用相同的请求构建和序列化
+        start_time = time.perf_counter()
+        payload = json.dumps(self._build_request(messages, system_prompt, tools), ensure_ascii=False, default=str)
+        serialization_ms = (time.perf_counter() - start_time) * 1000
+
+        with self._lock:
+            turns = cursor["record"].get("turns", [])
+            if cursor["turn"] >= len(turns):
+                self.mismatches += 1
+                raise AIReplayMismatchException(
+                    f"录制的响应已用尽: 共 {len(turns)} 轮", session_id=session_id
+                )
+            response = turns[cursor["turn"]]["response"]
+            cursor["turn"] += 1
+
+            usage = response.get("usage", {})
+            delay_ms = self.latency_ms + self.per_token_ms * usage.get("output_tokens", 0)
+            stage = self._stage(cursor["agent_type"])
+            stage["turns"] += 1
+            stage["serialization_ms"] += serialization_ms
+            stage["request_bytes"] += len(payload.encode("utf-8"))
+            stage["simulated_latency_ms"] += delay_ms
+            for key in USAGE_KEYS:
+                stage[key] += usage.get(key, 0)
+
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        return json.loads(json.dumps(response))
+
+    def _call_ai_stream(self, messages, system_prompt, tools, on_event, on_tool_use) -> Dict[str, Any]:
+        response = self._call_ai(messages, system_prompt, tools)
+        self._emit_response_events(response, on_event, on_tool_use)
+        return response
+
+    def _execute_tool(self, tool_name, tool_input, workspace=None) -> Dict[str, Any]:
+        if self.execute_tools:
+            return super()._execute_tool(tool_name, tool_input, workspace)
+
+        cursor = self._cursors.get(getattr(self._local, "session_id", None))
+        key = ToolResultCache.make_key(tool_name, tool_input, workspace)
+        with self._lock:
+            pending = cursor["tools"].get(key) if cursor else None
+            if pending:
+                # 相同调用按录制顺序返回，最后一个结果保留给之后的重复调用
+                return dict(pending.popleft() if len(pending) > 1 else pending[0])
+            self.mismatches += 1
+        logger.warning(f"[REPLAY] 录制中没有该工具调用: {tool_name} {tool_input}")
+        return {"output": f"回放记录中没有该工具调用: {tool_name}", "is_error": True}
+
+    def _execute_session_tool(self, session_id, tool_name, tool_input, workspace=None) -> Dict[str, Any]:
+        # 工具在线程池中执行，线程局部的会话ID需要重新设置
+        self._local.session_id = session_id
+        start_time = time.perf_counter()
+        result = super()._execute_session_tool(session_id, tool_name, tool_input, workspace)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        cursor = self._cursors.get(session_id)
+        if cursor is not None:
+            with self._lock:
+                stage = self._stage(cursor["agent_type"])
+                stage["tool_calls"] += 1
+                stage["tool_ms"] += elapsed_ms
+                if result.get("cached"):
+                    stage["cached_tool_calls"] += 1
+        return result
+
+
+def _round_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in metrics.items()}
+
+
+def run_benchmark(
+    recording: Union[AgentRecording, str],
+    repeat: int = 1,
+    latency_ms: float = 0.0,
+    per_token_ms: float = 0.0,
+    execute_tools: bool = False,
+    **orchestrator_kwargs
+) -> Dict[str, Any]:
+    """回放录制中的全部会话并统计性能
+
+    Args:
+        recording: 录制数据或录制文件路径
+        repeat: 重复次数（每次使用新的编排器）
+        latency_ms: 每次 AI 调用的固定模拟延迟（毫秒）
+        per_token_ms: 每个输出 token 的模拟延迟（毫秒）
+        execute_tools: 是否真实执行工具
+        **orchestrator_kwargs: 传给 ReplayOrchestrator（如 max_tool_workers、enable_tool_cache）
+
+    Returns:
+        {"repeat", "sessions", "wall_ms": {"min", "median", "max"},
+         "runs": [{"wall_ms", "stages", "total", "mismatches", "completed"}]}
+    """
+    if isinstance(recording, str):
+        recording = AgentRecording.load(recording)
+
+    runs = []
+    for _ in range(max(repeat, 1)):
+        orchestrator = ReplayOrchestrator(
+            recording, latency_ms=latency_ms, per_token_ms=per_token_ms,
+            execute_tools=execute_tools, **orchestrator_kwargs
+        )
+        completed = 0
+        start_time = time.perf_counter()
+        for record in recording.sessions:
+            results = orchestrator.run_agent_loop(
+                AgentType(record["agent_type"]),
+                record["initial_message"],
+                workspace=record.get("workspace"),
+                max_turns=max(len(record.get("turns", [])), 1),
+                metadata=record.get("metadata")
+            )
+            completed += bool(results["is_complete"])
+            orchestrator.close_session(results["session_id"])
+        wall_ms = (time.perf_counter() - start_time) * 1000
+
+        total = _new_stage_metrics()
+        for stage in orchestrator.metrics.values():
+            for key, value in stage.items():
+                total[key] += value
+        runs.append({
+            "wall_ms": round(wall_ms, 3),
+            "stages": {name: _round_metrics(stage) for name, stage in orchestrator.metrics.items()},
+            "total": _round_metrics(total),
+            "mismatches": orchestrator.mismatches,
+            "completed": completed
+        })
+
+    walls = [run["wall_ms"] for run in runs]
+    report = {
+        "repeat": len(runs),
+        "sessions": len(recording.sessions),
+        "wall_ms": {"min": min(walls), "median": round(statistics.median(walls), 3), "max": max(walls)},
+        "runs": runs
+    }
+    logger.info(f"[REPLAY] 基准完成: {len(recording.sessions)} 个会话 × {len(runs)} 次, "
+                f"中位耗时 {report['wall_ms']['median']:.1f}ms")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="回放录制并输出基准统计（JSON）")
+    parser.add_argument("recording", help="录制文件路径")
+    parser.add_argument("--repeat", type=int, default=1, help="重复次数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每次 AI 调用的模拟延迟")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="每个输出 token 的模拟延迟")
+    parser.add_argument("--execute-tools", action="store_true", help="真实执行工具")
+    args = parser.parse_args()
+
+    print(json.dumps(
+        run_benchmark(args.recording, args.repeat, args.latency_ms, args.per_token_ms, args.execute_tools),
+        ensure_ascii=False, indent=2
+    ))
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+工具结果缓存 - 会话内复用只读工具的结果
+
+智能体经常在后续轮次重复相同的 read/glob/grep 调用（例如核对刚列出的文件）。
+本模块按 (工具名, 规范化输入, 工作目录) 缓存只读工具的成功结果:
+
+1. 校验: 命中时比较相关路径的 mtime（文件还比较大小），变化则视为未命中
+2. 过期: 目录的 mtime 不反映深层文件的修改和删除，目录范围的结果
+   （grep/glob/scan_junk 等）只在 DIRECTORY_TTL 秒内复用
+3. 失效: 修改类工具（write/edit）执行后，清除与其路径重叠（祖先或后代）的条目；
+   工具之外的清理（如 CleanupAgent 直接删除文件）通过 invalidate_tool_caches 失效所有会话
+4. 标记: 命中的输出带有 CACHED_MARKER（文件）或 CACHED_DIR_MARKER（目录）前缀，
+   告知模型这是缓存结果
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+CACHED_MARKER = "[缓存结果: 相关路径自上次调用后未变化]\n"
+CACHED_DIR_MARKER = "[缓存结果: {age} 秒前的目录结果，其后目录树内的修改可能未反映]\n"
+
+# 目录范围结果的最长复用时间（秒）
+DIRECTORY_TTL = 60.0
+
+# 所有存活的缓存实例，供工具之外的清理统一失效
+_live_caches: "weakref.WeakSet[ToolResultCache]" = weakref.WeakSet()
+
+
+def _path_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """路径的变化标记: 文件为 (mtime_ns, 大小)，目录为 (mtime_ns, -1)，不存在为 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    size = -1 if os.path.isdir(path) else stat.st_size
+    return stat.st_mtime_ns, size
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """两个绝对路径是否相同或互为祖先/后代"""
+    a = os.path.normcase(a)
+    b = os.path.normcase(b)
+    if a == b:
+        return True
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return longer.startswith(shorter.rstrip(os.sep) + os.sep)
+
+
+class ToolResultCache:
+    """单个会话的只读工具结果缓存（线程安全，LRU 淘汰）"""
+
+    def __init__(self, max_entries: int = 128, directory_ttl: float = DIRECTORY_TTL):
+        self.max_entries = max_entries
+        self.directory_ttl = directory_ttl
+        # 键 -> (路径, 路径标记, 结果, 写入时间, 是否目录范围)
+        self._entries: "OrderedDict[Tuple, Tuple[List[str], Tuple, Dict[str, Any], float, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _live_caches.add(self)
+
+    @staticmethod
+    def make_key(tool_name: str, inputs: Dict[str, Any], workspace: Optional[str]) -> Tuple:
+        """缓存键: 工具名 + 规范化输入（键排序）+ 工作目录"""
+        normalized = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+        return tool_name, normalized, workspace or ""
+
+    def get(self, tool_name: str, inputs: Dict[str, Any], workspace: Optional[str]) -> Optional[Dict[str, Any]]:
+        """查找缓存结果
+
+        Returns:
+            带缓存标记的结果副本，未命中、路径已变化或目录结果过期时返回 None
+        """
+        key = self.make_key(tool_name, inputs, workspace)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            paths, stamps, result, stored_at, is_directory = entry
+            if ((is_directory and now - stored_at > self.directory_ttl)
+                    or tuple(_path_stamp(path) for path in paths) != stamps):
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        if is_directory:
+            marker = CACHED_DIR_MARKER.format(age=int(now - stored_at))
+        else:
+            marker = CACHED_MARKER
+        cached = dict(result)
+        cached["output"] = marker + str(result.get("output", ""))
+        cached["cached"] = True
+        cached["duration_ms"] = 0
+        return cached
+
+    def put(self, tool_name: str, inputs: Dict[str, Any], workspace: Optional[str],
+            paths: List[str], result: Dict[str, Any]):
+        """缓存结果（路径标记在写入时记录）"""
+        key = self.make_key(tool_name, inputs, workspace)
+        stamps = tuple(_path_stamp(path) for path in paths)
+        is_directory = any(stamp is not None and stamp[1] == -1 for stamp in stamps)
+        with self._lock:
+            self._entries[key] = (list(paths), stamps, dict(result), time.monotonic(), is_directory)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, paths: Optional[List[str]]):
+        """使与给定路径重叠的条目失效
+
+        Args:
+            paths: 被修改的路径，None 表示无法确定，清空全部
+        """
+        with self._lock:
+            if paths is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [
+                    key for key, (cached_paths, *_) in self._entries.items()
+                    if any(_overlaps(a, b) for a in cached_paths for b in paths)
+                ]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+
+        if removed:
+            logger.debug(f"[TOOL_CACHE] 失效 {removed} 条缓存")
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def invalidate_tool_caches(paths: Optional[List[str]] = None):
+    """使所有会话中与给定路径重叠的缓存条目失效（工具之外修改文件系统后调用）
+
+    Args:
+        paths: 被修改的路径，None 表示清空全部
+    """
+    for cache in list(_live_caches):
+        cache.invalidate(paths)
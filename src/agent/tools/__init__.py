@@ -21,6 +21,9 @@ logger = get_logger(__name__)
 
 _tools_registry: Dict[str, ToolBase] = {}
 
+# get_tools_schema 的缓存，注册新工具时失效
+_tools_schema_cache: Optional[List[Dict[str, Any]]] = None
+
 
 def register_tool(tool_class: Type[ToolBase]) -> Type[ToolBase]:
     """工具注册装饰器
@@ -34,8 +37,10 @@ def register_tool(tool_class: Type[ToolBase]) -> Type[ToolBase]:
         def execute(self, input_json, workspace):
             ...
     """
+    global _tools_schema_cache
     tool_instance = tool_class()
     _tools_registry[tool_instance.NAME] = tool_instance
+    _tools_schema_cache = None
     return tool_instance
 
 
@@ -51,6 +56,19 @@ def get_tool(name: str) -> Optional[ToolBase]:
     return _tools_registry.get(name)
 
 
+def is_read_only_tool(name: str) -> bool:
+    """工具是否为只读（未注册的工具按非只读处理）
+
+    Args:
+        name: 工具名称
+
+    Returns:
+        是否只读
+    """
+    tool = _tools_registry.get(name)
+    return bool(tool is not None and tool.READ_ONLY)
+
+
 def get_all_tools() -> Dict[str, ToolBase]:
     """获取所有已注册的工具
 
@@ -63,9 +81,15 @@ def get_all_tools() -> Dict[str, ToolBase]:
 def get_tools_schema() -> List[Dict[str, Any]]:
     """获取所有工具的 Schema 列表
 
+    结果会被缓存（注册新工具时失效），多轮对话复用同一个列表对象，调用方不应修改。
+
     Returns:
         工具 Schema 列表 (OpenAI 格式)
     """
+    global _tools_schema_cache
+    if _tools_schema_cache is not None:
+        return _tools_schema_cache
+
     tools = []
 
     for name, tool in _tools_registry.items():
@@ -83,6 +107,7 @@ def get_tools_schema() -> List[Dict[str, Any]]:
         except Exception as e:
             logger.warning(f"[TOOLS] 获取工具 {name} schema 失败: {e}")
 
+    _tools_schema_cache = tools
     return tools
 
 
@@ -2,7 +2,8 @@
 """
 工具基类 - 所有智能体工具的基类
 """
-from typing import Dict, Any, Optional
+import os
+from typing import Dict, Any, List, Optional
 from abc import ABC, abstractmethod
 
 
@@ -11,6 +12,8 @@ class ToolBase(ABC):
 
     NAME: str = ""
     DESCRIPTION: str = ""
+    # 只读工具不修改文件系统，同一轮中的多个只读调用可以并发执行
+    READ_ONLY: bool = False
 
     @abstractmethod
     def execute(self, input_json: Dict[str, Any], workspace: Optional[str] = None) -> str:
@@ -32,3 +35,18 @@ class ToolBase(ABC):
             工具 Schema
         """
         return {}
+
+    def affected_paths(self, input_json: Dict[str, Any],
+                       workspace: Optional[str] = None) -> Optional[List[str]]:
+        """工具读取（只读工具）或修改（其他工具）的路径，用于结果缓存的校验和失效
+
+        默认取输入中的 path（相对路径基于工作目录，缺省为工作目录）；
+        返回 None 表示无法确定（修改类工具将使全部缓存失效）。
+
+        Returns:
+            绝对路径列表
+        """
+        path = input_json.get("path") or workspace or "."
+        if workspace and not os.path.isabs(path):
+            path = os.path.join(workspace, path)
+        return [os.path.abspath(path)]
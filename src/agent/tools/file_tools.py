@@ -5,10 +5,13 @@
 提供 Read, Write, Ls, Glob, Grep 等文件系统操作工具
 """
 import os
+import heapq
 import json
+import mmap
 import re
-from typing import Dict, Any, Optional, List
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Optional, List, Tuple
+from pathlib import PurePath
 
 from .base import ToolBase
 from utils.logger import get_logger
@@ -16,11 +19,114 @@ from utils.logger import get_logger
 logger = get_logger(__name__)
 
 
+def _to_json(data: Dict[str, Any]) -> str:
+    """工具输出统一使用紧凑 JSON（无缩进），减少发送给 AI 的 token"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# 搜索类工具的并发文件读取线程数（I/O 密集）
+SEARCH_WORKERS = 8
+
+# Windows 文件系统不区分大小写
+_PATH_FLAGS = re.IGNORECASE if os.name == "nt" else 0
+
+
+def _walk_files(root: str, max_depth: Optional[int] = None,
+                skip_dirs: frozenset = frozenset()) -> Iterator[Tuple[str, os.DirEntry]]:
+    """基于 os.scandir 的迭代遍历，产出 (以 / 分隔的相对路径, DirEntry)
+
+    不跟随目录符号链接（避免循环），跳过无权限目录；
+    max_depth 限制目录层数（1 表示只列 root 下的文件），skip_dirs 中的目录名被剪枝。
+    同一目录内按名称排序，输出顺序稳定。
+    """
+    stack = [(root, "", 0)]
+    while stack:
+        dir_path, rel, depth = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in skip_dirs and (max_depth is None or depth + 1 < max_depth):
+                        subdirs.append((entry.path, f"{rel}{entry.name}/", depth + 1))
+                elif entry.is_file():
+                    yield f"{rel}{entry.name}", entry
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def _translate_segment(segment: str) -> str:
+    """将单个路径分量的通配符转换为正则（* 和 ? 不跨越 /）"""
+    out = []
+    i, n = 0, len(segment)
+    while i < n:
+        ch = segment[i]
+        i += 1
+        if ch == "*":
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        elif ch == "[":
+            j = i
+            if j < n and segment[j] == "!":
+                j += 1
+            if j < n and segment[j] == "]":
+                j += 1
+            j = segment.find("]", j)
+            if j < 0:
+                out.append(re.escape(ch))
+            else:
+                body = segment[i:j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                elif body.startswith("^"):
+                    body = "\\" + body
+                out.append(f"[{body}]")
+                i = j + 1
+        else:
+            out.append(re.escape(ch))
+    return "".join(out)
+
+
+def _split_glob(pattern: str) -> Tuple[str, Optional["re.Pattern"], Optional[int]]:
+    """拆分 glob 模式
+
+    Returns:
+        (不含通配符的目录前缀, 相对前缀的路径正则, 最大目录层数；含 ** 时为 None)
+    """
+    parts = [part for part in pattern.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts:
+        return "", None, None
+
+    # 前导的无通配符分量直接拼到起始路径上，不必遍历
+    prefix = []
+    while len(parts) > 1 and not any(c in parts[0] for c in "*?[") and parts[0] != "**":
+        prefix.append(parts.pop(0))
+
+    regex = []
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == "**":
+            regex.append(".*" if last else "(?:.*/)?")
+        else:
+            regex.append(_translate_segment(part) + ("" if last else "/"))
+
+    max_depth = None if "**" in parts else len(parts)
+    return "/".join(prefix), re.compile("".join(regex) + r"\Z", _PATH_FLAGS), max_depth
+
+
 class ReadTool(ToolBase):
     """读取文件内容工具"""
 
     NAME = "read"
     DESCRIPTION = "读取文件内容或列出目录内容。支持目录递归列举、文件 offset/limit 分页读取。"
+    READ_ONLY = True
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -80,7 +186,6 @@ class ReadTool(ToolBase):
 
                     entries.append({
                         "name": display_name,
-                        "path": entry_path,
                         "size": size,
                         "is_directory": is_dir
                     })
@@ -89,12 +194,12 @@ class ReadTool(ToolBase):
                     pass
 
             # 转换为 JSON 格式
-            return json.dumps({
+            return _to_json({
                 "type": "directory",
                 "path": dir_path,
                 "entries": entries,
                 "count": len(entries)
-            }, ensure_ascii=False, indent=2)
+            })
 
         except Exception as e:
             return f"列出目录失败: {str(e)}"
@@ -115,13 +220,13 @@ class ReadTool(ToolBase):
 
             content = "".join(lines)
 
-            return json.dumps({
+            return _to_json({
                 "type": "file",
                 "path": file_path,
                 "content": content,
                 "lines": len(lines),
                 "line_offset": offset
-            }, ensure_ascii=False)
+            })
 
         except UnicodeDecodeError:
             try:
@@ -129,12 +234,12 @@ class ReadTool(ToolBase):
                 with open(file_path, "rb") as f:
                     data = f.read()
 
-                return json.dumps({
+                return _to_json({
                     "type": "binary",
                     "path": file_path,
                     "size": len(data),
                     "preview": data[:100].hex()
-                }, ensure_ascii=False)
+                })
             except Exception as e:
                 return f"二进制读取也失败: {str(e)}"
 
@@ -263,7 +368,8 @@ class GlobTool(ToolBase):
     """文件模式搜索工具"""
 
     NAME = "glob"
-    DESCRIPTION = "使用模式匹配搜索文件。支持 **/* 递归搜索。"
+    DESCRIPTION = "使用模式匹配搜索文件。支持 **/* 递归搜索，结果按修改时间从新到旧排序。"
+    READ_ONLY = True
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -279,7 +385,7 @@ class GlobTool(ToolBase):
                 },
                 "limit": {
                     "type": "integer",
-                    "description": "最大返回结果数（默认100）"
+                    "description": "最大返回结果数，超出时返回最新的文件（默认100）"
                 }
             },
             "required": ["pattern"]
@@ -297,31 +403,46 @@ class GlobTool(ToolBase):
             else:
                 full_path = search_path
 
-            # 使用 pathlib glob
-            path_obj = Path(full_path)
-            results = []
+            if os.path.isabs(pattern):
+                return f"搜索失败: 不支持绝对路径模式: {pattern}"
 
-            # 搜索文件
-            for file_path in path_obj.glob(pattern):
-                if file_path.is_file():
-                    results.append({
-                        "path": str(file_path),
-                        "name": file_path.name,
-                        "size": file_path.stat().st_size
-                    })
+            # 模式的固定前缀直接定位，没有 ** 时按层数剪枝
+            prefix, regex, max_depth = _split_glob(pattern)
+            if regex is None:
+                return f"搜索失败: 无效的模式: {pattern}"
+            root = os.path.join(full_path, prefix) if prefix else full_path
 
-                    if limit > 0 and len(results) >= limit:
-                        break
-
-            # 按修改时间排序（如果可能）
-            # 这里简化处理，直接返回
-
-            return json.dumps({
+            # 遍历全部匹配，用最小堆只保留最新的 limit 个
+            results = []
+            matched = 0
+            for rel_path, entry in _walk_files(root, max_depth):
+                if not regex.match(rel_path):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                matched += 1
+                result = (stat.st_mtime, entry.path, stat.st_size)
+                if limit <= 0 or len(results) < limit:
+                    heapq.heappush(results, result)
+                else:
+                    heapq.heappushpop(results, result)
+
+            # 按修改时间排序（最新的在前）
+            results.sort(reverse=True)
+            truncated = len(results) < matched
+
+            output = {
                 "pattern": pattern,
                 "search_path": full_path,
                 "count": len(results),
-                "results": results
-            }, ensure_ascii=False, indent=2)
+                "results": [{"path": path, "size": size} for _, path, size in results]
+            }
+            if truncated:
+                output["truncated"] = True
+                output["total_matches"] = matched
+            return _to_json(output)
 
         except Exception as e:
             logger.error(f"[GlobTool] 搜索失败: {pattern}, 错误: {e}")
@@ -329,10 +450,28 @@ class GlobTool(ToolBase):
 
 
 class GrepTool(ToolBase):
-    """内容搜索工具"""
+    """内容搜索工具
+
+    目录搜索使用 scandir 遍历（剪枝版本控制目录），多线程并发读取文件；
+    跳过二进制文件和超过 MAX_FILE_SIZE 的文件，大文件通过 mmap 搜索，
+    匹配数达到 limit 后停止。
+    """
 
     NAME = "grep"
-    DESCRIPTION = "在文件中搜索包含指定内容的文本。支持正则表达式。"
+    DESCRIPTION = "在文件中搜索包含指定内容的文本。支持正则表达式，自动跳过二进制文件。"
+    READ_ONLY = True
+
+    DEFAULT_LIMIT = 200                      # 默认最大匹配数
+    MAX_FILE_SIZE = 20 * 1024 * 1024         # 目录搜索时跳过更大的文件
+    MMAP_THRESHOLD = 1024 * 1024             # 超过该大小的文件使用 mmap 搜索
+    BINARY_SNIFF_BYTES = 8192                # 检测二进制（NUL 字节）的头部长度
+    BATCH_SIZE = 64                          # 每批并发搜索的文件数
+    SKIP_DIRS = frozenset({".git", ".svn", ".hg"})
+
+    # 字节模式下与文本模式语义不同的转义（Unicode 字符类、单词边界、整段锚点、
+    # 可能表示非 ASCII 字符的码点转义、反向引用）
+    _TEXT_ONLY_ESCAPES = frozenset("wWdDsSbBAZxuUN0123456789")
+    _IGNORECASE_FLAG = re.compile(r"\(\?[a-zA-Z]*i")
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -353,6 +492,10 @@ class GrepTool(ToolBase):
                 "context": {
                     "type": "integer",
                     "description": "显示匹配行前后的行数（默认0）"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "最大匹配数（默认200）"
                 }
             },
             "required": ["pattern", "path"]
@@ -363,6 +506,7 @@ class GrepTool(ToolBase):
         search_path = input_json.get("path", "")
         include = input_json.get("include", "")
         context = input_json.get("context", 0)
+        limit = input_json.get("limit", self.DEFAULT_LIMIT)
 
         try:
             # 解析路径
@@ -376,60 +520,241 @@ class GrepTool(ToolBase):
                 regex = re.compile(pattern)
             except re.error as e:
                 return f"正则表达式错误: {str(e)}"
+            bregex = self._compile_bytes(pattern)
 
             results = []
-
-            def search_file(file_path: Path):
-                """搜索单个文件"""
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        lines = f.readlines()
-
-                    for i, line in enumerate(lines):
-                        if regex.search(line):
-                            # 获取上下文
-                            start = max(0, i - context)
-                            end = min(len(lines), i + context + 1)
-
-                            context_lines = []
-                            for j in range(start, end):
-                                prefix = ">" if j == i else " "
-                                context_lines.append(f"{prefix}{j+1:4d}: {lines[j].rstrip()}")
-
-                            results.append({
-                                "file": str(file_path),
-                                "line_number": i + 1,
-                                "line": line.rstrip(),
-                                "context": context_lines
-                            })
-                except (OSError, UnicodeDecodeError):
-                    pass
-
-            path_obj = Path(full_path)
-
-            if path_obj.is_file():
-                search_file(path_obj)
-            elif path_obj.is_dir():
-                # 搜索目录中的文件
-                for file_path in path_obj.rglob("*"):
-                    if file_path.is_file():
-                        # 检查 include 模式
-                        if include:
-                            if not file_path.match(include):
-                                continue
-                        search_file(file_path)
-
-            return json.dumps({
+            skipped = {"binary": 0, "too_large": 0}
+
+            if os.path.isfile(full_path):
+                # 显式指定的文件不受大小限制
+                status, matches = self._search_file(full_path, regex, bregex, context, limit)
+                if status == "binary":
+                    skipped["binary"] += 1
+                results.extend(matches)
+            elif os.path.isdir(full_path):
+                self._search_directory(full_path, include, regex, bregex, context,
+                                       limit, results, skipped)
+
+            truncated = limit > 0 and len(results) >= limit
+            if truncated:
+                del results[limit:]
+
+            output = {
                 "pattern": pattern,
                 "path": full_path,
                 "matches": len(results),
                 "results": results
-            }, ensure_ascii=False, indent=2)
+            }
+            if truncated:
+                output["truncated"] = True
+            if any(skipped.values()):
+                output["skipped"] = {k: v for k, v in skipped.items() if v}
+            return _to_json(output)
 
         except Exception as e:
             logger.error(f"[GrepTool] 搜索失败: {pattern}, 错误: {e}")
             return f"搜索失败: {str(e)}"
 
+    def _compile_bytes(self, pattern: str) -> Optional["re.Pattern"]:
+        """编译字节模式正则，用于不解码的快速预筛和 mmap 搜索
+
+        仅当文本匹配的行在字节模式下一定也能匹配时返回（MULTILINE 使 ^ 匹配每行行首），
+        否则预筛会漏掉真实匹配
+        """
+        if not self._bytes_compatible(pattern):
+            return None
+        try:
+            return re.compile(pattern.encode("ascii"), re.MULTILINE)
+        except re.error:
+            return None
+
+    @classmethod
+    def _bytes_compatible(cls, pattern: str) -> bool:
+        """判断字节模式是否覆盖文本模式的全部匹配
+
+        单个 . 和否定字符类在字节模式下只匹配一个字节而不是一个 UTF-8 字符，
+        \\A/\\Z 作用于整个缓冲区而不是单行，$ 不匹配 CRLF 中的 \\r 之前，
+        这些写法都只走文本匹配。.* 和 .+ 可以跨越多字节字符，保留字节预筛。
+        """
+        if not pattern.isascii() or cls._IGNORECASE_FLAG.search(pattern):
+            return False
+
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            following = pattern[i + 1:i + 2]
+            if char == "\\":
+                if following in cls._TEXT_ONLY_ESCAPES:
+                    return False
+                i += 2
+                continue
+            if char == "$":
+                return False
+            if char == "." and following not in ("*", "+"):
+                return False
+            if char == "[" and following == "^":
+                return False
+            i += 1
+        return True
+
+    def _search_directory(self, root: str, include: str, regex, bregex, context: int,
+                          limit: int, results: List[Dict[str, Any]], skipped: Dict[str, int]):
+        """并发搜索目录，按遍历顺序汇总结果，达到 limit 后停止"""
+        def candidates():
+            for rel_path, entry in _walk_files(root, skip_dirs=self.SKIP_DIRS):
+                # 检查 include 模式
+                if include and not PurePath(entry.path).match(include):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if size > self.MAX_FILE_SIZE:
+                    skipped["too_large"] += 1
+                    continue
+                yield entry.path
+
+        def search(path: str):
+            return self._search_file(path, regex, bregex, context, limit)
+
+        with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as pool:
+            files = candidates()
+            while True:
+                batch = [path for _, path in zip(range(self.BATCH_SIZE), files)]
+                if not batch:
+                    break
+                for status, matches in pool.map(search, batch):
+                    if status == "binary":
+                        skipped["binary"] += 1
+                    results.extend(matches)
+                if limit > 0 and len(results) >= limit:
+                    break
+
+    def _search_file(self, file_path: str, regex, bregex, context: int,
+                     limit: int) -> Tuple[str, List[Dict[str, Any]]]:
+        """搜索单个文件
+
+        Returns:
+            (状态 "ok" / "binary" / "error", 匹配列表)
+        """
+        try:
+            with open(file_path, "rb") as f:
+                head = f.read(self.BINARY_SNIFF_BYTES)
+                if b"\0" in head:
+                    return "binary", []
+
+                if bregex is not None and len(head) == self.BINARY_SNIFF_BYTES:
+                    size = os.fstat(f.fileno()).st_size
+                    if size >= self.MMAP_THRESHOLD:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            return "ok", self._search_mmap(file_path, mm, regex, bregex, context, limit)
+
+                data = head + f.read()
+        except (OSError, ValueError):
+            return "error", []
+
+        # 不解码的快速预筛
+        if bregex is not None and not bregex.search(data):
+            return "ok", []
+
+        text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n")
+        lines = text.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+
+        results = []
+        for i, line in enumerate(lines):
+            if regex.search(line):
+                match = {
+                    "file": file_path,
+                    "line_number": i + 1,
+                    "line": line.rstrip()
+                }
+
+                # 获取上下文（仅在请求时输出，避免重复匹配行）
+                if context > 0:
+                    start = max(0, i - context)
+                    end = min(len(lines), i + context + 1)
+                    match["context"] = [
+                        f"{'>' if j == i else ' '}{j+1:4d}: {lines[j].rstrip()}"
+                        for j in range(start, end)
+                    ]
+
+                results.append(match)
+                if limit > 0 and len(results) >= limit:
+                    break
+
+        return "ok", results
+
+    @staticmethod
+    def _search_mmap(file_path: str, mm, regex, bregex, context: int,
+                     limit: int) -> List[Dict[str, Any]]:
+        """在 mmap 上直接搜索，只解码匹配行及其上下文
+
+        字节正则定位候选行，再用文本正则确认（跨行匹配不计入）
+        """
+        def decode(start: int, end: int) -> str:
+            return mm[start:end].decode("utf-8", errors="ignore").rstrip()
+
+        def line_end(start: int) -> int:
+            end = mm.find(b"\n", start)
+            return len(mm) if end < 0 else end
+
+        results = []
+        pos = 0
+        line_number = 1
+        counted_to = 0
+        while pos <= len(mm):
+            m = bregex.search(mm, pos)
+            if m is None:
+                break
+
+            start = mm.rfind(b"\n", 0, m.start()) + 1
+            end = line_end(m.start())
+            line_number += mm[counted_to:start].count(b"\n")
+            counted_to = start
+            pos = end + 1
+
+            line = decode(start, end)
+            if not regex.search(line):
+                continue
+
+            match = {
+                "file": file_path,
+                "line_number": line_number,
+                "line": line
+            }
+
+            if context > 0:
+                lines = []
+                # 向前取上下文
+                s = start
+                for k in range(context):
+                    if s == 0:
+                        break
+                    prev = mm.rfind(b"\n", 0, s - 1) + 1
+                    lines.insert(0, (line_number - k - 1, prev, s - 1))
+                    s = prev
+                lines.append((line_number, start, end))
+                # 向后取上下文
+                e = end
+                for k in range(context):
+                    if e >= len(mm) - 1:
+                        break
+                    nxt = line_end(e + 1)
+                    lines.append((line_number + k + 1, e + 1, nxt))
+                    e = nxt
+                match["context"] = [
+                    f"{'>' if n == line_number else ' '}{n:4d}: {decode(a, b)}"
+                    for n, a, b in lines
+                ]
+
+            results.append(match)
+            if limit > 0 and len(results) >= limit:
+                break
+
+        return results
+
 
 # 注册工具
 from . import register_tool
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+扫描工具实现
+
+提供 ScanJunk 批量垃圾发现工具: 一次调用遍历多个根目录，
+使用项目自身的扫描策略（DepthDiskScanner 的目录跳过规则、白名单）
+和规则引擎分类，返回按类别聚合的摘要，而不是逐个文件的列表。
+"""
+import os
+import time
+from typing import Dict, Any, Optional, List
+
+from .base import ToolBase
+from .file_tools import _to_json
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Bucket:
+    """聚合桶: 文件数、大小和样例路径"""
+    __slots__ = ("count", "size", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.size = 0
+        self.samples: List[tuple] = []
+
+    def add(self, path: str, size: int, max_samples: int):
+        self.count += 1
+        self.size += size
+        if max_samples > 0:
+            # 保留最大的若干个文件作为样例
+            if len(self.samples) < max_samples:
+                self.samples.append((size, path))
+                self.samples.sort(reverse=True)
+            elif size > self.samples[-1][0]:
+                self.samples[-1] = (size, path)
+                self.samples.sort(reverse=True)
+
+
+class ScanJunkTool(ToolBase):
+    """批量垃圾发现工具"""
+
+    NAME = "scan_junk"
+    DESCRIPTION = (
+        "一次扫描多个目录，按清理规则分类并返回聚合摘要（各类别文件数/大小/样例、"
+        "风险等级汇总、占用最多的目录）。优先使用本工具发现垃圾文件，再用 glob/read 核实具体类别。"
+    )
+    READ_ONLY = True
+
+    DEFAULT_MAX_FILES = 200000    # 单次调用最多处理的文件数
+    UNMATCHED = "未匹配规则"
+    USER_FEEDBACK = "用户标记"
+
+    def get_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "要扫描的根目录列表"
+                },
+                "min_size": {
+                    "type": "integer",
+                    "description": "忽略小于该大小的文件（字节，默认0）"
+                },
+                "include_hidden": {
+                    "type": "boolean",
+                    "description": "是否包含隐藏文件（默认false）"
+                },
+                "top_n": {
+                    "type": "integer",
+                    "description": "返回的类别和目录数量上限（默认10）"
+                },
+                "samples": {
+                    "type": "integer",
+                    "description": "每个类别的样例路径数（默认3）"
+                },
+                "max_files": {
+                    "type": "integer",
+                    "description": "最多处理的文件数（默认200000）"
+                }
+            },
+            "required": ["paths"]
+        }
+
+    def affected_paths(self, input_json: Dict[str, Any],
+                       workspace: Optional[str] = None) -> Optional[List[str]]:
+        return [self._resolve(path, workspace) for path in input_json.get("paths", [])]
+
+    @staticmethod
+    def _resolve(path: str, workspace: Optional[str]) -> str:
+        if workspace and not os.path.isabs(path):
+            path = os.path.join(workspace, path)
+        return os.path.abspath(path)
+
+    def execute(self, input_json: Dict[str, Any], workspace: Optional[str] = None) -> str:
+        from core.depth_disk_scanner import should_skip_dir
+        from core.rule_engine import get_rule_engine
+        from core.whitelist import get_whitelist
+
+        roots = [self._resolve(path, workspace) for path in input_json.get("paths", [])]
+        min_size = input_json.get("min_size", 0)
+        include_hidden = input_json.get("include_hidden", False)
+        top_n = input_json.get("top_n", 10)
+        max_samples = input_json.get("samples", 3)
+        max_files = input_json.get("max_files", self.DEFAULT_MAX_FILES)
+
+        start_time = time.time()
+        rule_engine = get_rule_engine()
+        whitelist = get_whitelist()
+
+        categories: Dict[str, _Bucket] = {}
+        category_risk: Dict[str, str] = {}
+        by_risk: Dict[str, _Bucket] = {}
+        dir_totals: Dict[str, _Bucket] = {}
+        stats = {"files": 0, "dirs": 0, "skipped_dirs": 0, "protected": 0, "errors": 0}
+        truncated = False
+        missing = []
+
+        try:
+            for root in roots:
+                if not os.path.isdir(root):
+                    missing.append(root)
+                    continue
+
+                stack = [root]
+                while stack and not truncated:
+                    dir_path = stack.pop()
+                    if should_skip_dir(dir_path) or whitelist.is_protected(dir_path):
+                        stats["skipped_dirs"] += 1
+                        continue
+                    stats["dirs"] += 1
+
+                    try:
+                        with os.scandir(dir_path) as entries:
+                            entries = list(entries)
+                    except OSError:
+                        stats["errors"] += 1
+                        continue
+
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            if not include_hidden and entry.name.startswith('.'):
+                                continue
+                            size = entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            stats["errors"] += 1
+                            continue
+                        if size < min_size:
+                            continue
+
+                        path = entry.path
+                        if whitelist.is_protected(path):
+                            stats["protected"] += 1
+                            continue
+
+                        # 与扫描器一致: 用户反馈优先，其次按规则优先级匹配
+                        feedback = rule_engine.user_feedback.get(path)
+                        if feedback is not None:
+                            category, risk = self.USER_FEEDBACK, feedback.value
+                        else:
+                            rule = rule_engine.match_rule(path, size, None, True)
+                            if rule is None:
+                                category, risk = self.UNMATCHED, "suspicious"
+                            else:
+                                category, risk = rule.name, rule.risk_level.value
+
+                        categories.setdefault(category, _Bucket()).add(path, size, max_samples)
+                        category_risk.setdefault(category, risk)
+                        by_risk.setdefault(risk, _Bucket()).add(path, size, 0)
+                        if risk == "safe":
+                            dir_totals.setdefault(dir_path, _Bucket()).add(path, size, 0)
+
+                        stats["files"] += 1
+                        if max_files > 0 and stats["files"] >= max_files:
+                            truncated = True
+                            break
+
+                if truncated:
+                    break
+
+        except Exception as e:
+            logger.error(f"[ScanJunkTool] 扫描失败: {roots}, 错误: {e}")
+            return f"扫描失败: {str(e)}"
+
+        ranked = sorted(categories.items(), key=lambda kv: kv[1].size, reverse=True)
+        top_dirs = sorted(dir_totals.items(), key=lambda kv: kv[1].size, reverse=True)
+
+        output = {
+            "roots": roots,
+            "scanned_files": stats["files"],
+            "scanned_dirs": stats["dirs"],
+            "total_size": sum(bucket.size for bucket in by_risk.values()),
+            "by_risk": {
+                risk: {"count": bucket.count, "size": bucket.size}
+                for risk, bucket in by_risk.items()
+            },
+            "categories": [
+                {
+                    "name": name,
+                    "risk": category_risk[name],
+                    "count": bucket.count,
+                    "size": bucket.size,
+                    "samples": [path for _, path in bucket.samples]
+                }
+                for name, bucket in ranked[:top_n]
+            ],
+            # 安全类文件占用最多的目录
+            "top_dirs": [
+                {"path": path, "count": bucket.count, "size": bucket.size}
+                for path, bucket in top_dirs[:top_n]
+            ],
+            "duration_ms": int((time.time() - start_time) * 1000)
+        }
+        if len(ranked) > top_n:
+            output["more_categories"] = len(ranked) - top_n
+        for key in ("skipped_dirs", "protected", "errors"):
+            if stats[key]:
+                output[key] = stats[key]
+        if missing:
+            output["missing"] = missing
+        if truncated:
+            output["truncated"] = True
+
+        logger.info(
+            f"[ScanJunkTool] 扫描完成: {stats['files']} 个文件, {len(categories)} 个类别, "
+            f"耗时 {output['duration_ms']}ms"
+        )
+        return _to_json(output)
+
+
+# 注册工具
+from . import register_tool
+
+register_tool(ScanJunkTool)
+
+logger.info(f"[SCAN_TOOLS] 已注册扫描工具: ScanJunk")
@@ -92,6 +92,9 @@ class PurifyAIApp(QWidget):
         if scheduler_enabled:
             self.scheduler.start()
 
+        # 空闲时段数据库维护（历史数据保留 + VACUUM）
+        self.scheduler.start_maintenance()
+
     def init_ui(self):
         self.main_layout = QHBoxLayout(self)
         self.main_layout.setSpacing(0)
@@ -337,6 +340,7 @@ class PurifyAIApp(QWidget):
         # 停止调度器
         if self.scheduler.is_running():
             self.scheduler.stop()
+        self.scheduler.stop_maintenance()
 
         # 隐藏托盘
         if self.tray:
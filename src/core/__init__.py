@@ -85,6 +85,9 @@ from .recovery_manager import (
     RestoreStatus, get_recovery_manager
 )
 
+# 清理项分页与详情加载
+from .cleanup_item_pager import CleanupItemCursor, ItemDetailLoader
+
 # AI 成本控制
 from .cost_controller import (
     CostController, CostConfig, CostStats,
@@ -167,6 +170,9 @@ __all__ = [
     'RecoveryStats',
     'RestoreStatus',
     'get_recovery_manager',
+    # 清理项分页与详情加载
+    'CleanupItemCursor',
+    'ItemDetailLoader',
     # AI 成本控制
     'CostController',
     'CostConfig',
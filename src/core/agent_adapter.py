@@ -435,6 +435,76 @@ class AgentExecutor(QThread):
         self.is_running = False
 
 
+class AgentStreamWorker(QThread):
+    """流式智能体工作线程
+
+    在后台线程运行智能体循环，将流式事件转换为 Qt 信号（跨线程排队投递），
+    供 AgentThinkingStream 实时显示文本增量和工具执行状态
+    """
+
+    text_delta = pyqtSignal(str)              # 文本增量
+    tool_started = pyqtSignal(str, str)       # call_id, 工具名
+    tool_finished = pyqtSignal(str, str)      # call_id, 工具名
+    turn_finished = pyqtSignal(dict)          # stop_reason, usage
+    loop_finished = pyqtSignal(dict)          # run_agent_loop 结果
+    error = pyqtSignal(str)
+
+    def __init__(
+        self,
+        agent_type: AgentType,
+        message: str,
+        workspace: Optional[str] = None,
+        max_turns: int = 20,
+        ai_config: Optional[AIConfig] = None
+    ):
+        super().__init__()
+        self.agent_type = agent_type
+        self.message = message
+        self.workspace = workspace
+        self.max_turns = max_turns
+        self.ai_config = ai_config
+
+        self.logger = logger
+
+    def run(self):
+        """运行智能体循环"""
+        try:
+            if self.ai_config is None:
+                config = _get_app_config()
+                self.ai_config = AIConfig(
+                    api_key=config.get("ai", {}).get("api_key", ""),
+                    model=config.get("ai", {}).get("model", "claude-opus-4-6")
+                )
+            orchestrator = get_orchestrator(self.ai_config)
+
+            result = orchestrator.run_agent_loop(
+                self.agent_type,
+                self.message,
+                workspace=self.workspace,
+                max_turns=self.max_turns,
+                on_event=self._on_event
+            )
+
+            if result.get("error"):
+                self.error.emit(result["error"])
+            self.loop_finished.emit(result)
+
+        except Exception as e:
+            self.logger.error(f"[AGENT_STREAM] 运行异常: {e}")
+            self.error.emit(str(e))
+
+    def _on_event(self, event_type: str, data: Dict):
+        """流式事件 -> Qt 信号（可能在工具线程中调用）"""
+        if event_type == "text_delta":
+            self.text_delta.emit(data.get("text", ""))
+        elif event_type == "tool_use":
+            self.tool_started.emit(data.get("call_id", ""), data.get("tool_name", ""))
+        elif event_type == "tool_result":
+            self.tool_finished.emit(data.get("call_id", ""), data.get("tool_name", ""))
+        elif event_type == "message_stop":
+            self.turn_finished.emit(dict(data))
+
+
 def get_agent_scanner(
     scan_type: str,
     scan_target: str = "",
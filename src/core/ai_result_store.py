@@ -6,6 +6,7 @@ import json
 import logging
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
+from PyQt5.QtCore import QSettings
 
 from core.models import ScanItem
 from core.rule_engine import RiskLevel
@@ -207,8 +207,8 @@ class AnnotationGenerator:
 
         # === 第三层: AI评估 ===
         # 尝试从缓存获取
-        from core.annotation_storage import AnnotationStorage
-        storage = AnnotationStorage()
+        from core.annotation_storage import get_annotation_storage
+        storage = get_annotation_storage()
 
         cached_annotation = storage.get_annotation(path)
         if cached_annotation and cached_annotation.assessment_method == AssessmentMethod.AI.value:
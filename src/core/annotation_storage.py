@@ -1,10 +1,18 @@
 """
 批注存储层 - SQLite实现
+
+读取路径:
+- 每个线程复用一个连接，避免每次查询都重新打开数据库
+- 批量查询按块拆分，避免超过 SQLite 变量数量上限
+- 前置 LRU 缓存 (路径 + mtime)，未命中的路径也会缓存，
+  界面渲染数千个批注标记只需一两次查询
 """
 import sqlite3
 import os
 import json
-from typing import Optional, List
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -14,11 +22,15 @@ from core.annotation import ScanAnnotation, AssessmentMethod, generate_annotatio
 class AnnotationStorage:
     """批注存储接口"""
 
-    def __init__(self, db_path: str = None):
+    # 单条 IN 查询的最大变量数（SQLite 默认上限 999）
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, db_path: str = None, cache_size: int = 4096):
         """初始化存储
 
         Args:
             db_path: 数据库文件路径，默认放在用户数据目录
+            cache_size: 批注 LRU 缓存容量
         """
         if db_path is None:
             data_dir = Path.home() / '.purifyai'
@@ -26,8 +38,72 @@ class AnnotationStorage:
             db_path = data_dir / 'annotations.db'
 
         self.db_path = db_path
+        self._local = threading.local()
+
+        # LRU: item_path -> (mtime, ScanAnnotation 或 None)
+        self._cache: 'OrderedDict[str, Tuple[Optional[float], Optional[ScanAnnotation]]]' = OrderedDict()
+        self._cache_size = max(1, cache_size)
+        self._cache_lock = threading.Lock()
+
         self._init_database()
 
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的复用连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------------------------------------------------------------
+    # LRU 缓存
+    # ------------------------------------------------------------------
+
+    def _cache_get(self, item_path: str, mtime: Optional[float]):
+        """查询缓存
+
+        Returns:
+            (是否命中, 批注或 None)
+        """
+        with self._cache_lock:
+            entry = self._cache.get(item_path)
+            if entry is None:
+                return False, None
+            cached_mtime, annotation = entry
+            # 文件已修改，缓存失效
+            if mtime is not None and cached_mtime is not None and cached_mtime != mtime:
+                del self._cache[item_path]
+                return False, None
+            self._cache.move_to_end(item_path)
+            return True, annotation
+
+    def _cache_put(self, item_path: str, mtime: Optional[float], annotation: Optional[ScanAnnotation]):
+        with self._cache_lock:
+            self._cache[item_path] = (mtime, annotation)
+            self._cache.move_to_end(item_path)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate_cache(self, item_path: str = None):
+        """使缓存失效
+
+        Args:
+            item_path: 文件路径，None 表示清空全部
+        """
+        with self._cache_lock:
+            if item_path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(item_path, None)
+
     def _init_database(self):
         """初始化数据库表结构"""
         # 确保父目录存在
@@ -97,6 +173,7 @@ class AnnotationStorage:
             conn.execute("CREATE INDEX IF NOT EXISTS idx_assessment_method ON annotations(assessment_method)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_timestamp ON annotations(scan_timestamp)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_user_reviewed ON annotations(user_reviewed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_item_path ON annotations(item_path)")
 
             # FTS 表用于全文搜索
             conn.execute("""
@@ -104,33 +181,30 @@ class AnnotationStorage:
                 USING FTS5(item_path_to_index, annotation_to_index, content='', tokenize='unicode61')
             """)
 
-            # 修复的触发器：使用 INSERT OR REPLACE 而不是 UPDATE
+            # 触发器: contentless FTS5 表不支持 DELETE/UPDATE，需使用 'delete' 命令并提供旧值
             conn.execute("""
                 CREATE TRIGGER IF NOT EXISTS annotations_fts_insert
                 AFTER INSERT ON annotations BEGIN
-                    INSERT OR REPLACE INTO annotations_fts(rowid, item_path_to_index, annotation_to_index)
-                    VALUES (
-                        (SELECT rowid FROM annotations_fts WHERE rowid = new.rowid),
-                        new.item_path || ' ' || new.file_name,
-                        new.annotation_note
-                    )
+                    INSERT INTO annotations_fts(rowid, item_path_to_index, annotation_to_index)
+                    VALUES (new.rowid, new.item_path || ' ' || new.file_name, new.annotation_note);
                 END
             """)
 
             conn.execute("""
                 CREATE TRIGGER IF NOT EXISTS annotations_fts_delete
                 AFTER DELETE ON annotations BEGIN
-                    DELETE FROM annotations_fts WHERE rowid = old.rowid
+                    INSERT INTO annotations_fts(annotations_fts, rowid, item_path_to_index, annotation_to_index)
+                    VALUES ('delete', old.rowid, old.item_path || ' ' || old.file_name, old.annotation_note);
                 END
             """)
 
             conn.execute("""
                 CREATE TRIGGER IF NOT EXISTS annotations_fts_update_old
                 AFTER UPDATE ON annotations BEGIN
-                    UPDATE annotations_fts SET
-                        item_path_to_index = new.item_path || ' ' || new.file_name,
-                        annotation_to_index = new.annotation_note
-                    WHERE rowid = new.rowid
+                    INSERT INTO annotations_fts(annotations_fts, rowid, item_path_to_index, annotation_to_index)
+                    VALUES ('delete', old.rowid, old.item_path || ' ' || old.file_name, old.annotation_note);
+                    INSERT INTO annotations_fts(rowid, item_path_to_index, annotation_to_index)
+                    VALUES (new.rowid, new.item_path || ' ' || new.file_name, new.annotation_note);
                 END
             """)
 
@@ -166,12 +240,12 @@ class AnnotationStorage:
 
                         cache_hit, cache_key, cache_ttl,
 
-                        last_modified, updated_at,
+                        last_modified, created_at, updated_at,
 
                         user_reviewed, user_safe_confirmed,
 
                         scan_source, parent_scan_id
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     annotation.id,
                     annotation.item_path,
@@ -202,6 +276,7 @@ class AnnotationStorage:
                     annotation.cache_ttl,
 
                     annotation.last_modified,
+                    annotation.created_at,
                     annotation.updated_at,
 
                     int(annotation.user_reviewed),
@@ -212,6 +287,7 @@ class AnnotationStorage:
                 ))
                 conn.commit()
 
+            self.invalidate_cache(annotation.item_path)
             return True
 
         except Exception as e:
@@ -219,148 +295,132 @@ class AnnotationStorage:
             logging.error(f"保存批注失败: {e}")
             return False
 
-    def get_annotation(self, item_path: str) -> Optional[ScanAnnotation]:
+    def get_annotation(self, item_path: str, mtime: float = None) -> Optional[ScanAnnotation]:
         """根据路径获取批注
 
         Args:
             item_path: 文件路径
+            mtime: 文件修改时间（提供时与缓存记录不一致则重新查询）
 
         Returns:
             批注对象或None
         """
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-
-                cur = conn.execute("""
-                    SELECT * FROM annotations WHERE item_path = ?
-                """, (item_path,))
-
-                row = cur.fetchone()
-                if row:
-                    tags = row['annotation_tags'].split('|') if row['annotation_tags'] else []
-
-                    note = ScanAnnotation(
-                        id=row['id'],
-                        item_path=row['item_path'],
-                        item_type=row['item_type'],
-                        scan_timestamp=row['scan_timestamp'],
-
-                        file_size=row['file_size'],
-                        file_name=row['file_name'],
-                        file_extension=row['file_extension'],
-
-                        risk_level=row['risk_level'],
-                        risk_score=row['risk_score'],
-                        confidence=row['confidence'],
-
-                        assessment_method=row['assessment_method'],
-                        assessment_source=row['assessment_source'],
-                        assessment_details=row['assessment_details'],
-
-                        annotation_note=row['annotation_note'],
-                        annotation_tags=tags,
+        hit, annotation = self._cache_get(item_path, mtime)
+        if hit:
+            return annotation
 
-                        recommendation=row['recommendation'],
-
-                        ai_confidence=row['ai_confidence'],
-                        rule_match_count=row['rule_match_count'],
-
-                        cache_hit=bool(row['cache_hit']),
-                        cache_key=row['cache_key'],
-                        cache_ttl=row['cache_ttl'],
-
-                        last_modified=row['last_modified'],
-                        created_at=row['created_at'],
-                        updated_at=row['updated_at'],
-
-                        user_reviewed=bool(row['user_reviewed']),
-                        user_safe_confirmed=row['user_safe_confirmed'],
-
-                        scan_source=row['scan_source'],
-                        parent_scan_id=row['parent_scan_id'],
-                    )
+        try:
+            conn = self._get_connection()
+            cur = conn.execute("""
+                SELECT * FROM annotations WHERE item_path = ?
+            """, (item_path,))
 
-                    return note
-                return None
+            row = cur.fetchone()
+            annotation = self._row_to_annotation(row) if row else None
+            self._cache_put(item_path, mtime, annotation)
+            return annotation
 
         except Exception as e:
             import logging
             logging.error(f"获取批注失败: {e}")
             return None
 
-    def get_batch_annotations(self, paths: List[str]) -> dict:
+    def get_batch_annotations(self, paths: List[str], mtimes: Dict[str, float] = None) -> dict:
         """批量获取批注
 
+        先查 LRU 缓存，未命中的路径按块查询数据库。
+
         Args:
             paths: 文件路径列表
+            mtimes: {路径: 修改时间}（可选，用于校验缓存）
 
         Returns:
             {路径: 批注对象}
         """
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-
-                placeholders = ','.join(['?' for _ in paths])
-                query = f"SELECT * FROM annotations WHERE item_path IN ({placeholders})"
+        mtimes = mtimes or {}
+        notes_dict = {}
+        missing = []
+
+        for path in dict.fromkeys(paths):
+            hit, annotation = self._cache_get(path, mtimes.get(path))
+            if not hit:
+                missing.append(path)
+            elif annotation is not None:
+                notes_dict[path] = annotation
+
+        if not missing:
+            return notes_dict
 
-                cur = conn.execute(query, paths)
-                results = cur.fetchall()
+        try:
+            conn = self._get_connection()
+            found = {}
+            for start in range(0, len(missing), self.QUERY_CHUNK_SIZE):
+                chunk = missing[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                cur = conn.execute(
+                    f"SELECT * FROM annotations WHERE item_path IN ({placeholders})", chunk
+                )
+                for row in cur.fetchall():
+                    found[row['item_path']] = self._row_to_annotation(row)
 
-            notes_dict = {}
-            for row in results:
-                tags = row['annotation_tags'].split('|') if row['annotation_tags'] else []
+            for path in missing:
+                annotation = found.get(path)
+                self._cache_put(path, mtimes.get(path), annotation)
+                if annotation is not None:
+                    notes_dict[path] = annotation
 
-                note = ScanAnnotation(
-                    id=row['id'],
-                    item_path=row['item_path'],
-                    item_type=row['item_type'],
-                    scan_timestamp=row['scan_timestamp'],
+            return notes_dict
 
-                    file_size=row['file_size'],
-                    file_name=row['file_name'],
-                    file_extension=row['file_extension'],
+        except Exception as e:
+            import logging
+            logging.error(f"批量获取批注失败: {e}")
+            return notes_dict
 
-                    risk_level=row['risk_level'],
-                    risk_score=row['risk_score'],
-                    confidence=row['confidence'],
+    @staticmethod
+    def _row_to_annotation(row: sqlite3.Row) -> ScanAnnotation:
+        """数据库行转换为批注对象"""
+        tags = row['annotation_tags'].split('|') if row['annotation_tags'] else []
 
-                    assessment_method=row['assessment_method'],
-                    assessment_source=row['assessment_source'],
-                    assessment_details=row['assessment_details'],
+        return ScanAnnotation(
+            id=row['id'],
+            item_path=row['item_path'],
+            item_type=row['item_type'],
+            scan_timestamp=row['scan_timestamp'],
 
-                    annotation_note=row['annotation_note'],
-                    annotation_tags=tags,
+            file_size=row['file_size'],
+            file_name=row['file_name'],
+            file_extension=row['file_extension'],
 
-                    recommendation=row['recommendation'],
+            risk_level=row['risk_level'],
+            risk_score=row['risk_score'],
+            confidence=row['confidence'],
 
-                    ai_confidence=row['ai_confidence'],
-                    rule_match_count=row['rule_match_count'],
+            assessment_method=row['assessment_method'],
+            assessment_source=row['assessment_source'],
+            assessment_details=row['assessment_details'],
 
-                    cache_hit=bool(row['cache_hit']),
-                    cache_key=row['cache_key'],
-                    cache_ttl=row['cache_ttl'],
+            annotation_note=row['annotation_note'],
+            annotation_tags=tags,
 
-                    last_modified=row['last_modified'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
+            recommendation=row['recommendation'],
 
-                    user_reviewed=bool(row['user_reviewed']),
-                    user_safe_confirmed=row['user_safe_confirmed'],
+            ai_confidence=row['ai_confidence'],
+            rule_match_count=row['rule_match_count'],
 
-                    scan_source=row['scan_source'],
-                    parent_scan_id=row['parent_scan_id'],
-                )
+            cache_hit=bool(row['cache_hit']),
+            cache_key=row['cache_key'],
+            cache_ttl=row['cache_ttl'],
 
-                notes_dict[row['item_path']] = note
+            last_modified=row['last_modified'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
 
-            return notes_dict
+            user_reviewed=bool(row['user_reviewed']),
+            user_safe_confirmed=row['user_safe_confirmed'],
 
-        except Exception as e:
-            import logging
-            logging.error(f"批量获取批注失败: {e}")
-            return {}
+            scan_source=row['scan_source'],
+            parent_scan_id=row['parent_scan_id'],
+        )
 
     def delete_annotation(self, annotation_id: str) -> bool:
         """删除批注
@@ -375,6 +435,11 @@ class AnnotationStorage:
             with sqlite3.connect(self.db_path) as conn:
                 conn.execute("DELETE FROM annotations WHERE id = ?", (annotation_id,))
                 conn.commit()
+            with self._cache_lock:
+                stale = [path for path, (_, note) in self._cache.items()
+                         if note is not None and note.id == annotation_id]
+                for path in stale:
+                    del self._cache[path]
             return True
         except Exception as e:
             import logging
@@ -639,6 +704,8 @@ class AnnotationStorage:
                 """, (cutoff,))
                 conn.commit()
 
+            self.invalidate_cache()
+
         except Exception as e:
             import logging
             logging.error(f"清除缓存失败: {e}")
@@ -659,6 +726,30 @@ class AnnotationStorage:
                 """, (cutoff,))
                 conn.commit()
 
+            self.invalidate_cache()
+
         except Exception as e:
             import logging
             logging.error(f"清理旧批注失败: {e}")
+
+
+# 全局实例（共享 LRU 缓存）
+_storage_instance: Optional[AnnotationStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_annotation_storage() -> AnnotationStorage:
+    """获取批注存储单例（线程安全）"""
+    global _storage_instance
+    if _storage_instance is None:
+        with _storage_lock:
+            if _storage_instance is None:
+                _storage_instance = AnnotationStorage()
+    return _storage_instance
+
+
+def invalidate_annotation_cache():
+    """清空批注存储单例的 LRU 缓存（其他连接直接删改批注后调用）"""
+    storage = _storage_instance
+    if storage is not None:
+        storage.invalidate_cache()
@@ -10,7 +10,7 @@ from pathlib import Path
 
 from .models import ScanItem
 from .rule_engine import get_rule_engine, RiskLevel
-from .annotation_storage import AnnotationStorage
+from .annotation_storage import get_annotation_storage
 
 logger = logging.getLogger(__name__)
 
@@ -85,7 +85,7 @@ class AppDataScanner(QObject):
         self.is_cancelled = False
         self.scan_thread = None
         self.scan_results: List[ScanItem] = []
-        self.annotation_storage = AnnotationStorage()
+        self.annotation_storage = get_annotation_storage()
 
     def reload_ai_config(self):
         """重新加载AI配置"""
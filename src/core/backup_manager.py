@@ -6,14 +6,18 @@ Phase 3 Day 5.5 MVP功能:
 - 备份记录管理
 - 自动清理（7天）
 - 恢复功能
+- 完整备份经由内容寻址存储去重，目录备份并行复制（core/backup_store.py）
+- 目录硬链接备份：镜像目录结构并逐文件硬链接，跨卷文件才复制
 
 问题4修复 - 完整BackupManager设计
 """
 import os
+import errno
 import shutil
 import sqlite3
 import hashlib
-from typing import List, Optional, Dict
+import threading
+from typing import List, Optional, Dict, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -24,6 +28,8 @@ from PyQt5.QtCore import QObject, pyqtSignal
 from .rule_engine import RiskLevel
 from .models_smart import CleanupItem, BackupInfo, BackupType, RecoveryRecord
 from .database import Database, get_database
+from .backup_store import ContentStore, BackupCopier
+from .tree_deleter import delete_tree
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -42,6 +48,7 @@ class BackupStats:
     full_backups: int = 0
     total_size: int = 0
     restored_count: int = 0
+    deduplicated_size: int = 0          # 内容去重节省的大小
 
 
 class BackupManager(QObject):
@@ -68,12 +75,14 @@ class BackupManager(QObject):
     backup_deleted = pyqtSignal(str)        # backup_id
     cleanup_completed = pyqtSignal(int)      # count
 
-    def __init__(self, backup_root: Optional[str] = None, db: Optional[Database] = None):
+    def __init__(self, backup_root: Optional[str] = None, db: Optional[Database] = None,
+                 copy_workers: int = 4):
         """初始化备份管理器
 
         Args:
             backup_root: 备份根目录
             db: 数据库实例
+            copy_workers: 完整备份的并行复制线程数
         """
         super().__init__()
 
@@ -90,6 +99,7 @@ class BackupManager(QObject):
 
         self.logger = logger
         self._stats = BackupStats()
+        self._stats_lock = threading.Lock()  # 并行执行/批量恢复时在线程池中更新
 
         # 内存缓存备份信息（用于 restore/delete 操作，不依赖数据库）
         self._backup_cache: Dict[str, BackupInfo] = {}
@@ -99,6 +109,10 @@ class BackupManager(QObject):
         os.makedirs(os.path.join(self.backup_root, 'hardlinks'), exist_ok=True)
         os.makedirs(os.path.join(self.backup_root, 'full'), exist_ok=True)
 
+        # 完整备份的内容存储（相同内容只保存一份）
+        self.content_store = ContentStore(os.path.join(self.backup_root, 'objects'))
+        self._copier = BackupCopier(max_workers=copy_workers)
+
         self.logger.info(f"[BACKUP] 备份管理器初始化完成: {self.backup_root}")
 
     def create_backup(self, item: CleanupItem) -> Optional[BackupInfo]:
@@ -144,8 +158,19 @@ class BackupManager(QObject):
             backup_name = self._generate_backup_name(item)
             backup_path = os.path.join(self.backup_root, 'hardlinks', backup_name)
 
-            # 尝试创建硬链接
-            os.link(item.path, backup_path)
+            if os.path.isdir(item.path) and not os.path.islink(item.path):
+                # 目录：镜像目录结构，逐个文件硬链接（只写元数据）
+                copy_result = self._copier.copy(item.path, backup_path, self._link_file)
+                if copy_result.errors:
+                    # 清除不完整的镜像，交由下方回退到完整备份
+                    delete_tree(backup_path)
+                    failed_path, error = copy_result.errors[0]
+                    raise OSError(f"{len(copy_result.errors)} 个文件无法链接 (如 {failed_path}: {error})")
+                backup_size = copy_result.total_size
+            else:
+                # 尝试创建硬链接
+                os.link(item.path, backup_path)
+                backup_size = os.path.getsize(backup_path)
 
             # 创建备份记录
             backup_info = BackupInfo.create(item, backup_path, BackupType.HARDLINK)
@@ -154,12 +179,10 @@ class BackupManager(QObject):
             self._backup_cache[backup_info.backup_id] = backup_info
             self._save_backup_to_db(backup_info)
 
-            self._stats.hardlink_backups += 1
-            self._stats.total_backups += 1
-
-            # 获取文件大小
-            backup_size = os.path.getsize(backup_path)
-            self._stats.total_size += backup_size
+            with self._stats_lock:
+                self._stats.hardlink_backups += 1
+                self._stats.total_backups += 1
+                self._stats.total_size += backup_size
 
             self.logger.info(f"[BACKUP] 硬链接备份创建成功: {item.path} -> {backup_name}")
             self.backup_created.emit(backup_info)
@@ -181,6 +204,24 @@ class BackupManager(QObject):
             self.backup_failed.emit(item.path, error_msg)
             return None
 
+    def _link_file(self, src: str, dest: str) -> Tuple[int, int]:
+        """硬链接单个文件，跨卷时经由内容存储复制
+
+        Args:
+            src: 源文件
+            dest: 备份文件路径
+
+        Returns:
+            (源文件大小, 新写入的大小)
+        """
+        try:
+            os.link(src, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            return self.content_store.store_file(src, dest)
+        return os.path.getsize(dest), 0
+
     def _create_full_backup(self, item: CleanupItem) -> Optional[BackupInfo]:
         """创建完整备份
 
@@ -199,11 +240,11 @@ class BackupManager(QObject):
             backup_name = self._generate_backup_name(item)
             backup_path = os.path.join(self.backup_root, 'full', backup_name)
 
-            # 复制文件
-            if os.path.isfile(item.path):
-                shutil.copy2(item.path, backup_path)
-            else:  # 目录
-                shutil.copytree(item.path, backup_path)
+            # 经由内容存储并行复制，大小在复制过程中累计
+            copy_result = self._copier.copy(item.path, backup_path, self.content_store.store_file)
+            if copy_result.errors:
+                failed_path, error = copy_result.errors[0]
+                raise BackupError(f"{len(copy_result.errors)} 个文件复制失败 (如 {failed_path}: {error})")
 
             # 创建备份记录
             backup_info = BackupInfo.create(item, backup_path, BackupType.FULL)
@@ -212,19 +253,11 @@ class BackupManager(QObject):
             self._backup_cache[backup_info.backup_id] = backup_info
             self._save_backup_to_db(backup_info)
 
-            self._stats.full_backups += 1
-            self._stats.total_backups += 1
-
-            # 获取备份大小
-            backup_size = os.path.getsize(backup_path) if os.path.isfile(backup_path) else 0
-            if os.path.isdir(backup_path):
-                backup_size = sum(
-                    os.path.getsize(os.path.join(dirpath, filename))
-                    for dirpath, _, filenames in os.walk(backup_path)
-                    for filename in filenames
-                )
-
-            self._stats.total_size += backup_size
+            with self._stats_lock:
+                self._stats.full_backups += 1
+                self._stats.total_backups += 1
+                self._stats.total_size += copy_result.total_size
+                self._stats.deduplicated_size += copy_result.saved_size
 
             self.logger.info(f"[BACKUP] 完整备份创建成功: {item.path} -> {backup_name}")
             self.backup_created.emit(backup_info)
@@ -237,6 +270,42 @@ class BackupManager(QObject):
             self.backup_failed.emit(item.path, error_msg)
             return None
 
+    def register_staged(self, item: CleanupItem, staged_path: str,
+                        plan_id: str = "unknown") -> BackupInfo:
+        """登记已重命名到暂存区的项目
+
+        暂存项在被后台回收前可以像普通备份一样恢复（重命名回原路径）。
+
+        Args:
+            item: 清理项
+            staged_path: 暂存路径
+            plan_id: 计划ID
+
+        Returns:
+            BackupInfo 备份信息
+        """
+        backup_info = BackupInfo.create(item, staged_path, BackupType.STAGED)
+
+        try:
+            log_id = self.db.add_recovery_log(
+                plan_id=plan_id,
+                item_id=item.item_id,
+                original_path=item.path,
+                backup_path=staged_path,
+                backup_type=BackupType.STAGED.value
+            )
+            if log_id is not None:
+                # 使用恢复记录ID，重启后仍可通过数据库恢复
+                backup_info.backup_id = str(log_id)
+        except Exception as e:
+            self.logger.warning(f"[BACKUP] 保存暂存记录失败 (非致命): {e}")
+
+        self._backup_cache[backup_info.backup_id] = backup_info
+        self.logger.debug(f"[BACKUP] 已暂存: {item.path} -> {staged_path}")
+        self.backup_created.emit(backup_info)
+
+        return backup_info
+
     def _generate_backup_name(self, item: CleanupItem) -> str:
         """生成备份文件名
 
@@ -290,8 +359,24 @@ class BackupManager(QObject):
             self.logger.error(f"[BACKUP] 备份不存在: {backup_id}")
             return False
 
+        return self.restore_from_info(backup_info, destination)
+
+    def restore_from_info(self, backup_info: BackupInfo, destination: Optional[str] = None,
+                          mark_restored: bool = True) -> bool:
+        """按已加载的备份信息恢复
+
+        Args:
+            backup_info: 备份信息
+            destination: 恢复目标路径，None 恢复到原路径
+            mark_restored: 是否立即在数据库中标记暂存项已恢复
+                           （批量恢复时由调用方统一标记）
+
+        Returns:
+            是否成功
+        """
+        backup_id = backup_info.backup_id
         try:
-            if not os.path.exists(backup_info.backup_path):
+            if not backup_info.backup_path or not os.path.exists(backup_info.backup_path):
                 self.logger.error(f"[BACKUP] 备份文件不存在: {backup_info.backup_path}")
                 return False
 
@@ -311,7 +396,15 @@ class BackupManager(QObject):
             os.makedirs(parent_dir, exist_ok=True)
 
             # 恢复文件
-            if os.path.isfile(backup_info.backup_path):
+            if backup_info.backup_type == BackupType.STAGED:
+                # 暂存项与原路径同卷，直接重命名回去（不覆盖已存在的目标）
+                if os.path.exists(target_path):
+                    self.logger.error(f"[BACKUP] 目标已存在，无法恢复暂存项: {target_path}")
+                    return False
+                os.rename(backup_info.backup_path, target_path)
+                if mark_restored and str(backup_id).isdigit():
+                    self.db.mark_recovery_restored(int(backup_id))
+            elif os.path.isfile(backup_info.backup_path):
                 shutil.copy2(backup_info.backup_path, target_path)
             else:  # 目录
                 if os.path.exists(target_path):
@@ -321,7 +414,8 @@ class BackupManager(QObject):
             # 更新恢复状态
             backup_info.restored = True
             backup_info.restored_at = datetime.now()
-            self._stats.restored_count += 1
+            with self._stats_lock:
+                self._stats.restored_count += 1
 
             self.logger.info(f"[BACKUP] 备份恢复成功: {backup_id} -> {target_path}")
             self.backup_restored.emit(backup_info)
@@ -386,7 +480,11 @@ class BackupManager(QObject):
                 file_time = datetime.fromtimestamp(file_stat.st_mtime)
 
                 if file_time < cutoff:
-                    os.remove(file_path)
+                    if os.path.isdir(file_path) and not os.path.islink(file_path):
+                        # 目录硬链接备份
+                        delete_tree(file_path)
+                    else:
+                        os.remove(file_path)
                     count += 1
                     self.logger.debug(f"[BACKUP] 清理旧备份: {filename}")
             except Exception as e:
@@ -416,6 +514,9 @@ class BackupManager(QObject):
             except Exception as e:
                 self.logger.warning(f"[BACKUP] 清理失败 {filename}: {e}")
 
+        # 回收不再被任何备份引用的存储对象
+        self.content_store.prune()
+
         self.cleanup_completed.emit(count)
         self.logger.info(f"[BACKUP] 清理旧备份完成: {count} 个文件")
 
@@ -455,17 +556,9 @@ class BackupManager(QObject):
             ''', (backup_id,))
 
             row = cursor.fetchone()
-            conn.close()
 
             if row:
-                backup_info = BackupInfo(
-                    backup_id=row['id'],
-                    item_id=row['item_id'],
-                    backup_path=row['backup_path'],
-                    backup_type=BackupType.from_value(row['backup_type']),
-                    created_at=datetime.fromisoformat(row['timestamp']),
-                    restored=bool(row['restored'])
-                )
+                backup_info = self._row_to_backup_info(row)
                 # 也添加到缓存
                 self._backup_cache[backup_id] = backup_info
                 return backup_info
@@ -474,6 +567,48 @@ class BackupManager(QObject):
 
         return None
 
+    def get_backup_infos(self, backup_ids: List[str]) -> Dict[str, BackupInfo]:
+        """批量获取备份信息（缓存未命中的记录一次查询）
+
+        Args:
+            backup_ids: 备份ID列表
+
+        Returns:
+            备份ID -> BackupInfo，不存在的ID不包含在内
+        """
+        infos = {}
+        missing = []
+        for backup_id in backup_ids:
+            backup_id = str(backup_id)
+            if backup_id in self._backup_cache:
+                infos[backup_id] = self._backup_cache[backup_id]
+            elif backup_id.isdigit():
+                missing.append(int(backup_id))
+
+        if missing:
+            try:
+                for row in self.db.get_recovery_logs(missing):
+                    backup_info = self._row_to_backup_info(row)
+                    self._backup_cache[backup_info.backup_id] = backup_info
+                    infos[backup_info.backup_id] = backup_info
+            except Exception as e:
+                self.logger.error(f"[BACKUP] 批量查询备份信息失败: {e}")
+
+        return infos
+
+    @staticmethod
+    def _row_to_backup_info(row) -> BackupInfo:
+        """recovery_log 记录 -> BackupInfo"""
+        return BackupInfo(
+            backup_id=str(row['id']),
+            item_id=row['item_id'],
+            original_path=row['original_path'],
+            backup_path=row['backup_path'],
+            backup_type=BackupType.from_value(row['backup_type']),
+            created_at=datetime.fromisoformat(row['timestamp']),
+            restored=bool(row['restored'])
+        )
+
     def _get_original_path(self, backup_id: str) -> Optional[str]:
         """获取原始路径
 
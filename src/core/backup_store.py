@@ -0,0 +1,254 @@
+"""
+备份存储引擎 (Backup Store)
+
+BackupManager 的完整备份原先逐项调用 shutil.copytree/copy2，复制后还要再
+os.walk 一遍统计大小；同一份缓存内容（如多个浏览器配置文件下的相同资源）
+每备份一次就占用一份磁盘空间。
+
+本模块提供:
+- ContentStore: 按 SHA-256 寻址的内容存储，相同内容只保存一份，
+  备份文件以硬链接指向存储对象
+- BackupCopier: 单次 scandir 遍历镜像目录结构，文件操作提交到线程池并行执行，
+  大小在复制过程中累计
+
+存储对象在没有任何备份文件引用时（链接数为 1）由 ContentStore.prune 回收。
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class CopyResult:
+    """一次备份复制的结果
+
+    Attributes:
+        files: 处理的文件数
+        total_size: 源文件总大小
+        stored_size: 实际新写入磁盘的大小
+        deduplicated_files: 内容已存在而无需写入的文件数
+        errors: 失败的 (路径, 错误信息)
+    """
+    files: int = 0
+    total_size: int = 0
+    stored_size: int = 0
+    deduplicated_files: int = 0
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def saved_size(self) -> int:
+        """去重节省的大小"""
+        return self.total_size - self.stored_size
+
+
+class ContentStore:
+    """内容寻址存储
+
+    对象路径为 <root>/<hash[:2]>/<hash>。备份文件与对象之间是硬链接，
+    文件系统不支持硬链接时退化为普通复制（无去重）。
+    """
+
+    def __init__(self, root: str, chunk_size: int = HASH_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        # 保护对象的 创建/链接 与 回收，避免回收刚写入、尚未链接的对象
+        self._lock = threading.Lock()
+        self._writing: Set[str] = set()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def hash_file(self, path: str) -> str:
+        """计算文件内容的 SHA-256"""
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def store_file(self, src: str, dest: str) -> Tuple[int, int]:
+        """将 src 备份到 dest（经由内容存储）
+
+        Args:
+            src: 源文件
+            dest: 备份文件路径
+
+        Returns:
+            (源文件大小, 新写入的大小)
+        """
+        digest = self.hash_file(src)
+        obj = self._object_path(digest)
+        stored = 0
+        tmp = None
+
+        try:
+            if not os.path.exists(obj):
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                # 先写临时文件再原子替换，并发写入相同内容时互不影响
+                tmp = f"{obj}.{uuid.uuid4().hex[:8]}.tmp"
+                with self._lock:
+                    self._writing.add(tmp)
+                shutil.copy2(src, tmp)
+
+            with self._lock:
+                if tmp is not None:
+                    os.replace(tmp, obj)
+                    stored = os.path.getsize(obj)
+                try:
+                    os.link(obj, dest)
+                    linked = True
+                except OSError:
+                    linked = False
+        finally:
+            if tmp is not None:
+                with self._lock:
+                    self._writing.discard(tmp)
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+        if not linked:
+            # 不支持硬链接（如 FAT32）：直接复制
+            shutil.copy2(src, dest)
+            stored += os.path.getsize(dest)
+
+        return os.path.getsize(dest), stored
+
+    def prune(self) -> int:
+        """回收不再被任何备份引用的对象
+
+        Returns:
+            回收的对象数
+        """
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+
+        with os.scandir(self.root) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(bucket.path) as objects:
+                    for obj in objects:
+                        with self._lock:
+                            if obj.path in self._writing:
+                                continue
+                            try:
+                                # DirEntry.stat() 在 Windows 上的 st_nlink 恒为 0，必须用 os.stat
+                                if (obj.name.endswith('.tmp')
+                                        or os.stat(obj.path, follow_symlinks=False).st_nlink <= 1):
+                                    os.remove(obj.path)
+                                    removed += 1
+                            except OSError as e:
+                                logger.debug(f"[BACKUP_STORE] 回收对象失败: {obj.path}, {e}")
+
+        if removed:
+            logger.info(f"[BACKUP_STORE] 回收 {removed} 个未引用的存储对象")
+        return removed
+
+
+class BackupCopier:
+    """并行备份复制器
+
+    遍历线程负责镜像目录结构，文件操作 (src, dest) -> (size, stored)
+    提交到线程池执行。
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, max_workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='purifyai-backup'
+                )
+            return self._pool
+
+    def shutdown(self):
+        """关闭线程池"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def copy(self, src: str, dest: str,
+             file_op: Callable[[str, str], Tuple[int, int]]) -> CopyResult:
+        """备份单个文件或整个目录
+
+        Args:
+            src: 源路径
+            dest: 备份路径（不能已存在）
+            file_op: 单文件操作，返回 (源文件大小, 新写入的大小)
+
+        Returns:
+            CopyResult
+        """
+        result = CopyResult()
+
+        if not os.path.isdir(src) or os.path.islink(src):
+            self._apply(result, src, lambda: file_op(src, dest))
+            return result
+
+        pool = self._get_pool()
+        futures = []
+
+        # 遍历与建目录在当前线程完成，文件操作并行
+        stack = [(src, dest)]
+        while stack:
+            src_dir, dest_dir = stack.pop()
+            try:
+                os.makedirs(dest_dir, exist_ok=True)
+                shutil.copystat(src_dir, dest_dir)
+                with os.scandir(src_dir) as entries:
+                    for entry in entries:
+                        target = os.path.join(dest_dir, entry.name)
+                        if entry.is_symlink():
+                            self._copy_symlink(entry.path, target)
+                        elif entry.is_dir():
+                            stack.append((entry.path, target))
+                        else:
+                            futures.append((entry.path, pool.submit(file_op, entry.path, target)))
+            except OSError as e:
+                result.errors.append((src_dir, str(e)))
+
+        for path, future in futures:
+            self._apply(result, path, future.result)
+
+        return result
+
+    @staticmethod
+    def _apply(result: CopyResult, path: str, op: Callable[[], Tuple[int, int]]):
+        try:
+            size, stored = op()
+        except OSError as e:
+            result.errors.append((path, str(e)))
+            return
+        result.files += 1
+        result.total_size += size
+        result.stored_size += stored
+        if stored == 0 and size > 0:
+            result.deduplicated_files += 1
+
+    @staticmethod
+    def _copy_symlink(src: str, dest: str):
+        """保留符号链接本身，不跟随到目录树之外"""
+        try:
+            os.symlink(os.readlink(src), dest)
+        except OSError as e:
+            # Windows 无权限创建符号链接时跳过（链接本身不含数据）
+            logger.debug(f"[BACKUP_STORE] 跳过符号链接: {src}, {e}")
@@ -134,6 +134,9 @@ class Cleaner(QObject):
             total = len(items)
             logger.debug(f"[清理:THREAD] 准备清理 {total} 个项目")
 
+            # 自定义回收站：先并行压缩所有项目，失败的项目在下方回退到系统回收站
+            recycled = self._recycle_batch(items) if self._use_custom_recycle and self.custom_recycle_bin else None
+
             for i, item in enumerate(items):
                 if self.is_cancelled:
                     logger.info("[清理:CANCELLED] 清理被用户取消")
@@ -148,7 +151,11 @@ class Cleaner(QObject):
                         logger.debug(f"[清理:WHITELIST] 跳过白名单保护项: {item.path}")
                         continue
 
-                    size_deleted = self._delete_item(item)
+                    if recycled is not None and recycled.get(os.path.normpath(item.path)):
+                        logger.info(f"[清理:RECYCLE] 已添加到自定义回收站 - {item.description}")
+                        size_deleted = item.size
+                    else:
+                        size_deleted = self._delete_item(item, use_custom=recycled is None)
                     if size_deleted > 0:
                         deleted_count += 1
                         deleted_size += size_deleted
@@ -211,12 +218,42 @@ class Cleaner(QObject):
             self.is_running = False
             logger.debug("[清理:THREAD] 清理线程结束")
 
-    def _delete_item(self, item: ScanItem) -> int:
+    def _recycle_batch(self, items: List[ScanItem]) -> dict:
+        """
+        批量压缩到自定义回收站
+
+        Args:
+            items: 待清理的项目（白名单项目会被跳过）
+
+        Returns:
+            规范化路径 -> 是否成功回收
+        """
+        batch = [
+            {
+                'item_path': os.path.normpath(item.path),
+                'original_size': item.size,
+                'description': item.description,
+                'risk_level': self._normalize_risk_level(item.risk_level)
+            }
+            for item in items if not self.whitelist.is_safe(item.path)
+        ]
+        if not batch:
+            return {}
+
+        def on_progress(done: int, total: int):
+            self.progress.emit(f'Compressing to recycle bin ({done}/{total})...')
+
+        return self.custom_recycle_bin.recycle_items(
+            batch, progress=on_progress, should_stop=lambda: self.is_cancelled
+        )
+
+    def _delete_item(self, item: ScanItem, use_custom: bool = True) -> int:
         """
         删除文件或文件夹（安全删除到回收站）
 
         Args:
             item: 要删除的 ScanItem
+            use_custom: 是否尝试自定义回收站（批量回收失败的项目直接使用系统回收站）
 
         Returns:
             删除的项目大小
@@ -237,7 +274,7 @@ class Cleaner(QObject):
                 return 0
 
             # 检查是否使用自定义回收站
-            if self._use_custom_recycle and self.custom_recycle_bin:
+            if use_custom and self._use_custom_recycle and self.custom_recycle_bin:
                 # 使用自定义回收站（压缩后保存）
                 success = self.custom_recycle_bin.recycle_item(
                     item_path=normalized_path,
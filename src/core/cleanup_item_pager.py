@@ -0,0 +1,238 @@
+"""
+清理项分页与详情按需加载 (Cleanup Item Pager)
+
+大计划（数十万项）浏览优化:
+- CleanupItemCursor: 基于 id 的键集分页，每页一次索引定位，避免深 OFFSET 扫描
+- ItemDetailLoader: ItemDetail 按需加载，带小容量 LRU 缓存，支持批量预取
+
+CleanupItem 仅携带核心字段，原因等详细信息只有在界面展开某一项时才加载。
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .models_smart import CleanupItem, ItemDetail
+from .database import Database, get_database
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CleanupItemCursor:
+    """清理项键集分页游标
+
+    以上一页最后一个 item_id 作为游标向后翻页，
+    翻到第 N 页的代价与第 1 页相同。
+
+    Example:
+        cursor = CleanupItemCursor(plan_id, page_size=200)
+        for page in cursor:
+            model.append_items(page)
+    """
+
+    def __init__(
+        self,
+        plan_id: str,
+        page_size: int = 500,
+        status: Optional[str] = None,
+        db: Optional[Database] = None
+    ):
+        """初始化游标
+
+        Args:
+            plan_id: 计划ID
+            page_size: 每页数量
+            status: 状态过滤（None 表示全部）
+            db: 数据库实例
+        """
+        self.plan_id = plan_id
+        self.page_size = max(1, page_size)
+        self.status = status
+        self.db = db or get_database()
+
+        self._last_id = 0
+        self._exhausted = False
+
+    @property
+    def last_id(self) -> int:
+        """当前游标位置（已返回的最后一个 item_id）"""
+        return self._last_id
+
+    @property
+    def has_more(self) -> bool:
+        """是否可能还有下一页"""
+        return not self._exhausted
+
+    def seek(self, after_id: int):
+        """将游标定位到指定 item_id 之后
+
+        Args:
+            after_id: 下一页从该 ID 之后开始
+        """
+        self._last_id = after_id
+        self._exhausted = False
+
+    def reset(self):
+        """回到第一页"""
+        self.seek(0)
+
+    def fetch_next(self) -> List[CleanupItem]:
+        """获取下一页
+
+        Returns:
+            CleanupItem 列表，没有更多数据时返回空列表
+        """
+        if self._exhausted:
+            return []
+
+        rows = self.db.get_cleanup_items_after(
+            self.plan_id,
+            after_id=self._last_id,
+            limit=self.page_size,
+            status=self.status
+        )
+
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if rows:
+            self._last_id = rows[-1]['id']
+
+        return [self._row_to_item(row) for row in rows]
+
+    def __iter__(self) -> Iterator[List[CleanupItem]]:
+        """逐页迭代直到数据耗尽"""
+        while True:
+            page = self.fetch_next()
+            if not page:
+                return
+            yield page
+
+    @staticmethod
+    def _row_to_item(row: Dict) -> CleanupItem:
+        """数据库行转换为轻量 CleanupItem"""
+        return CleanupItem(
+            item_id=row['id'],
+            path=row['path'],
+            size=row['size'],
+            item_type=row['item_type'],
+            original_risk=row['original_risk'],
+            ai_risk=row['ai_risk']
+        )
+
+
+class ItemDetailLoader:
+    """ItemDetail 按需加载器（LRU 缓存）
+
+    详细信息只在首次访问时查询数据库，最近使用的条目保留在内存中，
+    超出容量时淘汰最久未使用的条目。prefetch 可一次查询整页的详情。
+    """
+
+    def __init__(self, capacity: int = 256, db: Optional[Database] = None):
+        """初始化加载器
+
+        Args:
+            capacity: LRU 缓存容量
+            db: 数据库实例
+        """
+        self.capacity = max(1, capacity)
+        self.db = db or get_database()
+
+        self._cache: 'OrderedDict[int, ItemDetail]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, item_id: int) -> Optional[ItemDetail]:
+        """获取单个项目的详细信息
+
+        Args:
+            item_id: 项目ID
+
+        Returns:
+            ItemDetail，项目不存在时返回 None
+        """
+        with self._lock:
+            detail = self._cache.get(item_id)
+            if detail is not None:
+                self._cache.move_to_end(item_id)
+                self.hits += 1
+                return detail
+            self.misses += 1
+
+        loaded = self._load([item_id])
+        return loaded.get(item_id)
+
+    def prefetch(self, item_ids: Iterable[int]) -> Dict[int, ItemDetail]:
+        """批量预取详细信息（只查询未缓存的项目）
+
+        Args:
+            item_ids: 项目ID列表
+
+        Returns:
+            {item_id: ItemDetail}
+        """
+        result = {}
+        missing = []
+
+        with self._lock:
+            for item_id in item_ids:
+                detail = self._cache.get(item_id)
+                if detail is not None:
+                    self._cache.move_to_end(item_id)
+                    result[item_id] = detail
+                else:
+                    missing.append(item_id)
+
+        if missing:
+            result.update(self._load(missing))
+        return result
+
+    def invalidate(self, item_id: Optional[int] = None):
+        """使缓存失效
+
+        Args:
+            item_id: 项目ID，None 表示清空全部
+        """
+        with self._lock:
+            if item_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(item_id, None)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _load(self, item_ids: List[int]) -> Dict[int, ItemDetail]:
+        """从数据库加载并放入缓存"""
+        try:
+            rows = self.db.get_cleanup_item_details(item_ids)
+        except Exception as e:
+            logger.error(f"[ITEM_DETAIL] 加载详细信息失败: {e}")
+            return {}
+
+        loaded = {item_id: self._row_to_detail(row) for item_id, row in rows.items()}
+
+        with self._lock:
+            for item_id, detail in loaded.items():
+                self._cache[item_id] = detail
+                self._cache.move_to_end(item_id)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+        return loaded
+
+    @staticmethod
+    def _row_to_detail(row: Dict) -> ItemDetail:
+        """数据库行转换为 ItemDetail"""
+        last_modified = None
+        if row.get('updated_at'):
+            try:
+                last_modified = datetime.fromisoformat(row['updated_at'])
+            except ValueError:
+                pass
+
+        return ItemDetail(
+            ai_reason=row.get('reason') or '',
+            last_modified=last_modified
+        )
@@ -11,6 +11,10 @@ AI 成本控制器 (AI Cost Controller)
 - Input: $0.01 / 1M tokens
 - Output: $0.03 / 1M tokens
 - 每次调用约 1000 tokens 输入 + 500 tokens 输出 = $0.025 / 次
+
+提示词缓存（Prompt Caching）单独统计：
+- 缓存写入按输入单价 × cache_write_cost_multiplier 计费
+- 缓存读取按输入单价 × cache_read_cost_multiplier 计费
 """
 from typing import Dict, Optional, Callable
 from dataclasses import dataclass, field
@@ -48,6 +52,8 @@ class CostStats:
     total_cost: float = 0.0
     total_input_tokens: int = 0
     total_output_tokens: int = 0
+    total_cache_read_tokens: int = 0
+    total_cache_write_tokens: int = 0
     calls_in_current_period: int = 0
     cost_in_current_period: float = 0.0
 
@@ -64,6 +70,8 @@ class CostStats:
             "total_cost": round(self.total_cost, 4),
             "total_input_tokens": self.total_input_tokens,
             "total_output_tokens": self.total_output_tokens,
+            "total_cache_read_tokens": self.total_cache_read_tokens,
+            "total_cache_write_tokens": self.total_cache_write_tokens,
             "calls_in_current_period": self.calls_in_current_period,
             "cost_in_current_period": round(self.cost_in_current_period, 4)
         }
@@ -85,6 +93,8 @@ class CostConfig:
     # 成本率（USD per token，基于 GLM-4-Flash 定价）
     input_cost_per_million: float = 0.14   # $0.14 / 1M input tokens
     output_cost_per_million: float = 0.28  # $0.28 / 1M output tokens
+    cache_write_cost_multiplier: float = 1.25  # 缓存写入相对输入单价的倍数
+    cache_read_cost_multiplier: float = 0.1    # 缓存读取相对输入单价的倍数
 
     # 降级设置
     fallback_to_rules: bool = True         # 超限降级到规则引擎
@@ -104,6 +114,8 @@ class CostConfig:
             "max_budget_per_month": self.max_budget_per_month,
             "input_cost_per_million": self.input_cost_per_million,
             "output_cost_per_million": self.output_cost_per_million,
+            "cache_write_cost_multiplier": self.cache_write_cost_multiplier,
+            "cache_read_cost_multiplier": self.cache_read_cost_multiplier,
             "fallback_to_rules": self.fallback_to_rules,
             "alert_threshold": self.alert_threshold,
             "mode": self.mode.value
@@ -209,27 +221,33 @@ class CostController:
         self,
         input_tokens: int = 1000,
         output_tokens: int = 500,
-        cost: Optional[float] = None
+        cost: Optional[float] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
     ) -> Dict:
         """记录一次 AI 调用
 
         Args:
-            input_tokens: 输入 tokens
+            input_tokens: 输入 tokens（不含缓存读写部分）
             output_tokens: 输出 tokens
             cost: 实际成本（如果未提供则自动计算）
+            cache_read_tokens: 从提示词缓存读取的 tokens
+            cache_write_tokens: 写入提示词缓存的 tokens
 
         Returns:
             调用统计信息
         """
         # 计算成本
         if cost is None:
-            cost = self._calculate_cost(input_tokens, output_tokens)
+            cost = self._calculate_cost(input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
 
         # 更新统计
         self.stats.total_calls += 1
         self.stats.total_cost += cost
         self.stats.total_input_tokens += input_tokens
         self.stats.total_output_tokens += output_tokens
+        self.stats.total_cache_read_tokens += cache_read_tokens
+        self.stats.total_cache_write_tokens += cache_write_tokens
         self.stats.calls_in_current_period += 1
         self.stats.cost_in_current_period += cost
 
@@ -268,17 +286,29 @@ class CostController:
             "is_degraded": self._is_degraded
         }
 
-    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def _calculate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
         """计算成本
 
         Args:
             input_tokens: 输入 tokens
             output_tokens: 输出 tokens
+            cache_read_tokens: 缓存读取 tokens
+            cache_write_tokens: 缓存写入 tokens
 
         Returns:
             成本（USD）
         """
-        input_cost = (input_tokens / 1_000_000) * self.config.input_cost_per_million
+        cached_input = (
+            cache_read_tokens * self.config.cache_read_cost_multiplier
+            + cache_write_tokens * self.config.cache_write_cost_multiplier
+        )
+        input_cost = ((input_tokens + cached_input) / 1_000_000) * self.config.input_cost_per_million
         output_cost = (output_tokens / 1_000_000) * self.config.output_cost_per_million
         return input_cost + output_cost
 
@@ -433,6 +463,12 @@ class CostController:
         if self.config.max_budget_per_scan > 0:
             budget_usage = (self.stats.cost_in_current_period / self.config.max_budget_per_scan) * 100
 
+        # 缓存命中率 = 缓存读取 / 全部输入（含缓存读写）
+        cache_read = self.stats.total_cache_read_tokens
+        cache_write = self.stats.total_cache_write_tokens
+        prompt_tokens = self.stats.total_input_tokens + cache_read + cache_write
+        cache_hit_rate = (cache_read / prompt_tokens * 100) if prompt_tokens else 0.0
+
         return {
             "current_scan": {
                 "calls": self.stats.calls_in_current_period,
@@ -458,6 +494,11 @@ class CostController:
                 "calls": self.stats.total_calls,
                 "cost": round(self.stats.total_cost, 4)
             },
+            "prompt_cache": {
+                "read_tokens": cache_read,
+                "write_tokens": cache_write,
+                "hit_rate_percent": round(cache_hit_rate, 1)
+            },
             "alert_level": self._current_alert_level.value,
             "is_degraded": self._is_degraded,
             "degradation_reason": self._degradation_reason
@@ -559,7 +600,9 @@ class CostController:
                     total_calls=stats_data.get("total_calls", 0),
                     total_cost=stats_data.get("total_cost", 0.0),
                     total_input_tokens=stats_data.get("total_input_tokens", 0),
-                    total_output_tokens=stats_data.get("total_output_tokens", 0)
+                    total_output_tokens=stats_data.get("total_output_tokens", 0),
+                    total_cache_read_tokens=stats_data.get("total_cache_read_tokens", 0),
+                    total_cache_write_tokens=stats_data.get("total_cache_write_tokens", 0)
                 )
 
             # 加载每日统计
@@ -2,15 +2,27 @@ import sqlite3
 import os
 import threading
 import hashlib
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Callable, Iterable, Tuple
 import json
 from utils.logger import get_logger
+from .database_migration import DatabaseMigration, MigrationRunner
 
 
 class Database:
     """Database manager for scan results caching with thread-safe connections"""
 
+    # Max bound variables per statement (SQLite default limit is 999)
+    SQL_VARIABLE_CHUNK = 500
+
+    # Pending reason reference increments before a flush
+    REASON_FLUSH_THRESHOLD = 1000
+
+    # Max interned reasons kept in memory (least recently used are evicted)
+    REASON_CACHE_SIZE = 10000
+
     # Class-level flag for first-time table creation
     _tables_created = False
     _tables_created_lock = threading.Lock()
@@ -28,11 +40,24 @@ class Database:
         self._tables_created = False
         self.logger = get_logger(__name__)
 
+        # 原因驻留表 (LRU): reason 文本 -> reason_id，以及待写回的引用计数增量
+        self._reason_ids: 'OrderedDict[str, int]' = OrderedDict()
+        self._reason_ref_deltas: Dict[int, int] = {}
+        self._pending_reason_refs = 0
+        # 可重入：删除原因记录的一方在持有期间还会写回增量
+        self._reason_lock = threading.RLock()
+
         # Create tables on first instantiation
         self._create_tables_once()
 
     def _create_tables_once(self):
-        """Create tables only once (thread-safe)"""
+        """Create tables only once (thread-safe)
+
+        The idempotent CREATE ... IF NOT EXISTS schema is always applied, so
+        tables and indexes added later exist on older databases; the migration
+        runner only applies data migrations newer than the recorded version.
+        Large-table backfills are deferred to run_pending_backfills.
+        """
         with Database._tables_created_lock:
             if not Database._tables_created:
                 try:
@@ -40,11 +65,41 @@ class Database:
                     conn = sqlite3.connect(self.db_path)
                     conn.row_factory = sqlite3.Row
                     self._create_tables_schema(conn)
+                    runner = MigrationRunner(conn, DatabaseMigration(self.db_path).get_steps())
+                    if runner.pending_steps():
+                        applied = runner.apply_pending()
+                        self.logger.info(f"[DATABASE] Applied schema migrations: {applied}")
                     Database._tables_created = True
                 finally:
                     if 'conn' in locals():
                         conn.close()
 
+    def run_pending_backfills(
+        self,
+        progress_callback: Optional[Callable[[str, int, int], None]] = None,
+        max_batches: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """Run deferred migration backfills in resumable batches
+
+        Args:
+            progress_callback: (task_name, processed_rowid, max_rowid)
+            max_batches: Maximum number of batches for this call
+            should_stop: Return True to stop between batches
+
+        Returns:
+            True if every backfill has completed
+        """
+        conn = self._get_connection()
+        # 回填会按实际引用重算 reference_count，先写回内存中的增量
+        self.flush_reason_refs(conn)
+        try:
+            runner = MigrationRunner(conn, DatabaseMigration(self.db_path).get_steps())
+            return runner.run_backfills(progress_callback, max_batches, should_stop)
+        except Exception as e:
+            self.logger.error(f"[DATABASE] Backfill failed: {e}")
+            return False
+
     def _get_connection(self) -> sqlite3.Connection:
         """Get a database connection for the current thread
 
@@ -288,6 +343,8 @@ class Database:
             ('idx_cleanup_items_plan_id', 'cleanup_items', 'plan_id'),
             ('idx_cleanup_items_status', 'cleanup_items', 'status'),
             ('idx_cleanup_items_reason_id', 'cleanup_items', 'reason_id'),
+            # 键集分页: (plan_id, status) + 隐式 rowid，支持 WHERE plan_id=? AND status=? AND id>?
+            ('idx_cleanup_items_plan_status', 'cleanup_items', 'plan_id, status'),
             ('idx_cleanup_executions_plan_id', 'cleanup_executions', 'plan_id'),
             ('idx_cleanup_executions_status', 'cleanup_executions', 'status'),
             ('idx_recovery_log_plan_id', 'recovery_log', 'plan_id'),
@@ -309,41 +366,182 @@ class Database:
         self,
         conn: sqlite3.Connection,
         reason: str
-    ) -> int:
+    ) -> Tuple[int, bool]:
         """获取或创建原因ID（使用提供的连接，不关闭）
 
+        先查进程内的原因驻留表，命中时只记录引用计数增量，
+        增量由 flush_reason_refs 批量写回；未命中才访问数据库。
+
+        新插入的原因在调用方提交前对其他线程不存在，不进入驻留表；
+        调用方提交后调用 _intern_created_reason。
+
         Args:
             conn: 数据库连接
             reason: 原因文本
 
         Returns:
-            原因ID
+            (原因ID, 是否为本次新插入)
         """
+        with self._reason_lock:
+            reason_id = self._reason_ids.get(reason)
+            if reason_id is not None:
+                self._reason_ids.move_to_end(reason)
+                self._reason_ref_deltas[reason_id] = self._reason_ref_deltas.get(reason_id, 0) + 1
+                self._pending_reason_refs += 1
+                return reason_id, False
+
         cursor = conn.cursor()
         reason_hash = self._get_reason_hash(reason)
         now = self.get_current_timestamp()
 
-        # 查询是否存在
-        cursor.execute('''
-            SELECT id FROM cleanup_reasons WHERE hash = ?
-        ''', (reason_hash,))
-        row = cursor.fetchone()
+        # 查询与登记在同一临界区内：原因记录只在持有该锁时被删除（见 reason_refs_locked），
+        # 查到的 ID 在增量写回前不会失效
+        with self._reason_lock:
+            cursor.execute('''
+                SELECT id FROM cleanup_reasons WHERE hash = ?
+            ''', (reason_hash,))
+            row = cursor.fetchone()
 
-        if row:
-            # 已存在，增加引用计数
-            reason_id = row[0]
+            if row:
+                # 已存在，记录引用计数增量
+                reason_id = row[0]
+                self._reason_ref_deltas[reason_id] = self._reason_ref_deltas.get(reason_id, 0) + 1
+                self._pending_reason_refs += 1
+                self._intern_reason(reason, reason_id)
+                return reason_id, False
+
+            # 不存在，插入新记录（引用计数随插入写入，无需增量）
             cursor.execute('''
-                UPDATE cleanup_reasons SET reference_count = reference_count + 1
-                WHERE id = ?
-            ''', (reason_id,))
-            return reason_id
+                INSERT INTO cleanup_reasons (reason, hash, created_at, reference_count)
+                VALUES (?, ?, ?, 1)
+            ''', (reason, reason_hash, now))
+            return cursor.lastrowid, True
+
+    def _intern_created_reason(self, reason: str, reason_id: int):
+        """插入原因的事务提交后，将其加入驻留表"""
+        with self._reason_lock:
+            self._intern_reason(reason, reason_id)
+
+    def _intern_reason(self, reason: str, reason_id: int):
+        """加入驻留表，超过容量时淘汰最久未使用的条目（调用方持有 _reason_lock）"""
+        self._reason_ids[reason] = reason_id
+        self._reason_ids.move_to_end(reason)
+        while len(self._reason_ids) > self.REASON_CACHE_SIZE:
+            self._reason_ids.popitem(last=False)
+
+    def preload_reasons(self, plan_id: str = None, limit: int = 1000) -> int:
+        """预加载原因驻留表
 
-        # 不存在，插入新记录
-        cursor.execute('''
-            INSERT INTO cleanup_reasons (reason, hash, created_at, reference_count)
-            VALUES (?, ?, ?, 1)
-        ''', (reason, reason_hash, now))
-        return cursor.lastrowid
+        Args:
+            plan_id: 计划ID，加载该计划已引用的原因；
+                     None 时加载引用次数最多的原因
+            limit: plan_id 为 None 时的最大加载数量
+
+        Returns:
+            驻留表中的原因数量
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        if plan_id:
+            cursor.execute('''
+                SELECT cr.id, cr.reason
+                FROM cleanup_reasons cr
+                WHERE cr.id IN (
+                    SELECT DISTINCT reason_id FROM cleanup_items WHERE plan_id = ?
+                )
+            ''', (plan_id,))
+        else:
+            cursor.execute('''
+                SELECT id, reason FROM cleanup_reasons
+                ORDER BY reference_count DESC
+                LIMIT ?
+            ''', (limit,))
+
+        rows = cursor.fetchall()
+        with self._reason_lock:
+            for row in rows:
+                self._intern_reason(row['reason'], row['id'])
+            return len(self._reason_ids)
+
+    def flush_reason_refs(self, conn: sqlite3.Connection = None) -> int:
+        """将累积的原因引用计数增量批量写回数据库（独立事务，立即提交）
+
+        Args:
+            conn: 数据库连接（None 时使用当前线程连接）
+
+        Returns:
+            写回的原因数量
+        """
+        # 持有锁直到提交：增量取出后、写入前，不能有原因因计数未更新而被删除
+        with self._reason_lock:
+            if not self._reason_ref_deltas:
+                return 0
+            deltas = self._reason_ref_deltas
+            self._reason_ref_deltas = {}
+            self._pending_reason_refs = 0
+
+            conn = conn or self._get_connection()
+            try:
+                conn.executemany('''
+                    UPDATE cleanup_reasons SET reference_count = reference_count + ?
+                    WHERE id = ?
+                ''', [(delta, reason_id) for reason_id, delta in deltas.items()])
+                conn.commit()
+            except Exception as e:
+                self.logger.error(f"[DATABASE] 写回原因引用计数失败: {e}")
+                conn.rollback()
+                # 放回未写入的增量，下次重试
+                for reason_id, delta in deltas.items():
+                    self._reason_ref_deltas[reason_id] = self._reason_ref_deltas.get(reason_id, 0) + delta
+                    self._pending_reason_refs += delta
+                return 0
+
+        return len(deltas)
+
+    @contextmanager
+    def reason_refs_locked(self):
+        """删除原因记录的临界区
+
+        持有期间其他线程不能取得或登记原因 ID。删除原因的一方应在其中
+        写回增量、删除、调用 evict_reasons 并提交，提交前不得退出。
+        """
+        with self._reason_lock:
+            yield
+
+    def evict_reasons(self, reason_ids: Iterable[int]):
+        """从驻留表中移除已删除的原因（在 reason_refs_locked 中调用）"""
+        evicted = set(reason_ids)
+        if not evicted:
+            return
+        with self._reason_lock:
+            for reason in [r for r, rid in self._reason_ids.items() if rid in evicted]:
+                del self._reason_ids[reason]
+            for reason_id in evicted & self._reason_ref_deltas.keys():
+                self._pending_reason_refs = max(
+                    0, self._pending_reason_refs - self._reason_ref_deltas.pop(reason_id)
+                )
+
+    def _discard_reason(self, reason_id: int, created: bool):
+        """事务回滚后撤销本次引用
+
+        新插入的原因记录已随事务回滚，且从未进入驻留表，无需处理；
+        已存在的原因撤销本次记录的引用计数增量。
+        """
+        if created:
+            return
+        with self._reason_lock:
+            if reason_id in self._reason_ref_deltas:
+                self._reason_ref_deltas[reason_id] -= 1
+                self._pending_reason_refs = max(0, self._pending_reason_refs - 1)
+                if self._reason_ref_deltas[reason_id] <= 0:
+                    del self._reason_ref_deltas[reason_id]
+
+    def clear_reason_cache(self):
+        """写回引用计数并清空原因驻留表（删除原因记录后调用）"""
+        self.flush_reason_refs()
+        with self._reason_lock:
+            self._reason_ids.clear()
 
     def add_or_get_reason(self, reason: str) -> int:
         """添加或获取原因ID（去重）
@@ -355,36 +553,22 @@ class Database:
             原因ID
         """
         conn = self._get_connection()
-        cursor = conn.cursor()
-
-        reason_hash = self._get_reason_hash(reason)
-        now = self.get_current_timestamp()
-
-        # 查询是否存在
-        cursor.execute('''
-            SELECT id FROM cleanup_reasons WHERE hash = ?
-        ''', (reason_hash,))
-        row = cursor.fetchone()
-
-        if row:
-            # 已存在，增加引用计数
-            reason_id = row[0]
-            cursor.execute('''
-                UPDATE cleanup_reasons SET reference_count = reference_count + 1
-                WHERE id = ?
-            ''', (reason_id,))
-            conn.commit()
-            return reason_id
-
-        # 不存在，插入新记录
-        cursor.execute('''
-            INSERT INTO cleanup_reasons (reason, hash, created_at, reference_count)
-            VALUES (?, ?, ?, 1)
-        ''', (reason, reason_hash, now))
-        reason_id = cursor.lastrowid
+        self._maybe_flush_reason_refs(conn)
+        reason_id, created = self._get_or_create_reason_id(conn, reason)
         conn.commit()
+        if created:
+            self._intern_created_reason(reason, reason_id)
         return reason_id
 
+    def _maybe_flush_reason_refs(self, conn: sqlite3.Connection):
+        """累积增量达到阈值时写回并提交
+
+        必须在调用方开启自身写事务之前调用：增量已从内存中取出，
+        若与后续语句处于同一事务，回滚会使这些增量永久丢失。
+        """
+        if self._pending_reason_refs >= self.REASON_FLUSH_THRESHOLD:
+            self.flush_reason_refs(conn)
+
     def _get_reason_hash(self, reason: str) -> str:
         """生成原因的 MD5 哈希
 
@@ -426,11 +610,19 @@ class Database:
                 VALUES (?, ?, ?, ?, 0, 0, 0, 'pending', ?, ?)
             ''', (plan_id, plan_name, scan_type, scan_target, now, now))
             conn.commit()
-            return True
         except Exception as e:
             self.logger.error(f"[DATABASE] 创建清理计划失败: {e}")
             return False
 
+        # 规则生成的原因在计划之间高度重复，预热驻留表
+        try:
+            if not self._reason_ids:
+                self.preload_reasons()
+            self.preload_reasons(plan_id)
+        except Exception as e:
+            self.logger.warning(f"[DATABASE] 预加载原因失败: {e}")
+        return True
+
     def update_cleanup_plan(
         self,
         plan_id: str,
@@ -470,6 +662,9 @@ class Database:
             updates.append('status = ?')
             params.append(status)
 
+        # 计划更新通常意味着一批项目已写入，顺带写回原因引用计数（独立事务）
+        self.flush_reason_refs(conn)
+
         if updates:
             updates.append('updated_at = ?')
             params.append(self.get_current_timestamp())
@@ -483,6 +678,7 @@ class Database:
             conn.commit()
             return True
 
+        conn.commit()
         return False
 
     def add_cleanup_item(
@@ -512,9 +708,14 @@ class Database:
         conn = self._get_connection()
         cursor = conn.cursor()
 
+        # 在本项目的事务之外写回累积的增量，避免随插入失败的回滚丢失
+        self._maybe_flush_reason_refs(conn)
+
+        reason_id = None
+        created = False
         try:
             # 获取或创建 reason_id（使用同一个连接）
-            reason_id = self._get_or_create_reason_id(conn, reason)
+            reason_id, created = self._get_or_create_reason_id(conn, reason)
 
             now = self.get_current_timestamp()
             cursor.execute('''
@@ -536,12 +737,17 @@ class Database:
             ''', (size, now, plan_id))
 
             conn.commit()
-            return item_id
         except Exception as e:
             self.logger.error(f"[DATABASE] 添加清理项目失败: {e}")
             conn.rollback()
+            if reason_id is not None:
+                self._discard_reason(reason_id, created)
             return None
 
+        if created:
+            self._intern_created_reason(reason, reason_id)
+        return item_id
+
     def get_cleanup_plan(self, plan_id: str) -> Optional[Dict[str, Any]]:
         """获取清理计划
 
@@ -604,6 +810,78 @@ class Database:
 
         return [dict(row) for row in rows]
 
+    def get_cleanup_items_after(
+        self,
+        plan_id: str,
+        after_id: int = 0,
+        limit: int = 500,
+        status: str = None
+    ) -> List[Dict[str, Any]]:
+        """键集分页获取清理项目（仅核心字段）
+
+        与 get_cleanup_items 的 OFFSET 分页不同，这里以上一页最后一个 id
+        作为游标，每页查询都是一次索引定位，不随页码增大而变慢。
+        原因等详细信息不在此处 JOIN，需要时通过 get_cleanup_item_details 加载。
+
+        Args:
+            plan_id: 计划ID
+            after_id: 上一页最后一个项目ID（首页为 0）
+            limit: 每页数量
+            status: 状态过滤
+
+        Returns:
+            按 id 升序排列的项目列表
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        query = '''
+            SELECT id, plan_id, path, size, item_type, original_risk, ai_risk,
+                   reason_id, status
+            FROM cleanup_items
+            WHERE plan_id = ?
+        '''
+        params = [plan_id]
+
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+
+        query += ' AND id > ? ORDER BY id LIMIT ?'
+        params.extend([after_id, limit])
+
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_cleanup_item_details(self, item_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """批量获取清理项目的详细信息
+
+        Args:
+            item_ids: 项目ID列表
+
+        Returns:
+            {item_id: 详细信息字典}，包含 reason、retry_count、updated_at
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        details = {}
+        ids = list(dict.fromkeys(item_ids))
+        # 分块查询，避免超过 SQLite 变量数量上限
+        for start in range(0, len(ids), self.SQL_VARIABLE_CHUNK):
+            chunk = ids[start:start + self.SQL_VARIABLE_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT ci.id, ci.retry_count, ci.updated_at, cr.reason
+                FROM cleanup_items ci
+                LEFT JOIN cleanup_reasons cr ON ci.reason_id = cr.id
+                WHERE ci.id IN ({placeholders})
+            ''', chunk)
+            for row in cursor.fetchall():
+                details[row['id']] = dict(row)
+
+        return details
+
     def create_execution(
         self,
         plan_id: str,
@@ -730,6 +1008,111 @@ class Database:
             self.logger.error(f"[DATABASE] 添加恢复记录失败: {e}")
             return None
 
+    def get_staged_recovery_logs(self, before: str, limit: int = 500) -> List[Dict]:
+        """获取待回收的暂存记录
+
+        Args:
+            before: 只返回早于该时间（ISO 格式）暂存的记录
+            limit: 返回数量限制
+
+        Returns:
+            记录列表 (id, original_path, backup_path, timestamp)，按 id 升序
+        """
+        conn = self._get_connection()
+        rows = conn.execute('''
+            SELECT id, original_path, backup_path, timestamp FROM recovery_log
+            WHERE backup_type = 'staged' AND restored = 0
+              AND backup_path IS NOT NULL AND timestamp < ?
+            ORDER BY id
+            LIMIT ?
+        ''', (before, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def clear_recovery_backup_paths(self, log_ids: List[int]) -> int:
+        """清空恢复记录的备份路径（备份文件已删除，不可再恢复）
+
+        Args:
+            log_ids: 恢复记录ID列表
+
+        Returns:
+            更新的记录数
+        """
+        if not log_ids:
+            return 0
+        conn = self._get_connection()
+        updated = 0
+        for start in range(0, len(log_ids), self.SQL_VARIABLE_CHUNK):
+            chunk = log_ids[start:start + self.SQL_VARIABLE_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor = conn.execute(
+                f'UPDATE recovery_log SET backup_path = NULL WHERE id IN ({placeholders})', chunk
+            )
+            updated += cursor.rowcount
+        conn.commit()
+        return updated
+
+    def get_recovery_logs(self, log_ids: List[int]) -> List[Dict]:
+        """按ID批量获取恢复记录
+
+        Args:
+            log_ids: 恢复记录ID列表
+
+        Returns:
+            记录列表（不存在的ID被忽略）
+        """
+        if not log_ids:
+            return []
+        conn = self._get_connection()
+        rows = []
+        for start in range(0, len(log_ids), self.SQL_VARIABLE_CHUNK):
+            chunk = log_ids[start:start + self.SQL_VARIABLE_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            rows.extend(conn.execute(
+                f'SELECT * FROM recovery_log WHERE id IN ({placeholders})', chunk
+            ).fetchall())
+        return [dict(row) for row in rows]
+
+    def mark_recoveries_restored(self, log_ids: List[int]) -> int:
+        """批量标记恢复记录为已恢复
+
+        Args:
+            log_ids: 恢复记录ID列表
+
+        Returns:
+            更新的记录数
+        """
+        if not log_ids:
+            return 0
+        conn = self._get_connection()
+        updated = 0
+        for start in range(0, len(log_ids), self.SQL_VARIABLE_CHUNK):
+            chunk = log_ids[start:start + self.SQL_VARIABLE_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor = conn.execute(
+                f'UPDATE recovery_log SET restored = 1 WHERE id IN ({placeholders})', chunk
+            )
+            updated += cursor.rowcount
+        conn.commit()
+        return updated
+
+    def mark_recovery_restored(self, log_id: int) -> bool:
+        """标记恢复记录为已恢复
+
+        Args:
+            log_id: 恢复记录ID
+
+        Returns:
+            是否成功
+        """
+        try:
+            conn = self._get_connection()
+            conn.execute('UPDATE recovery_log SET restored = 1 WHERE id = ?', (log_id,))
+            conn.commit()
+            return True
+        except Exception as e:
+            self.logger.error(f"[DATABASE] 更新恢复记录失败: {e}")
+            return False
+
     # ==========================================================================
     # 清理报告数据库操作方法 (Feature 1: Report Persistence)
     # ==========================================================================
@@ -1231,8 +1614,7 @@ class Database:
         conn = self._get_connection()
         cursor = conn.cursor()
 
-        cutoff_date = (datetime.now() -
-                      datetime.timedelta(days=days)).isoformat()
+        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
 
         cursor.execute('''
             DELETE FROM ai_classifications
@@ -1246,6 +1628,7 @@ class Database:
         if hasattr(threading.current_thread(), '_db_connection'):
             conn = threading.current_thread()._db_connection
             if conn:
+                self.flush_reason_refs(conn)
                 conn.close()
                 threading.current_thread()._db_connection = None
 
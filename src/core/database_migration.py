@@ -14,16 +14,242 @@
 3. cleanup_plans
 4. cleanup_executions
 5. recovery_log
+
+版本化迁移 (MigrationRunner):
+- 每个迁移步骤带版本号，启动时只执行尚未应用的步骤
+- 大表回填 (BackfillTask) 按 rowid 分批执行，检查点写入 settings 表，
+  中断后可从断点继续，并通过回调报告进度
 """
 import sqlite3
 import os
 import hashlib
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, List, Callable
 from datetime import datetime
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 当前数据库模式版本
+SCHEMA_VERSION = 3
+
+
+@dataclass
+class BackfillTask:
+    """分批回填任务
+
+    Attributes:
+        name: 任务名称（用作检查点键）
+        table: 按 rowid 分批扫描的表
+        process_range: 处理一批数据 (cursor, low_rowid, high_rowid)，区间为 (low, high]
+        batch_size: 每批 rowid 跨度
+    """
+    name: str
+    table: str
+    process_range: Callable[[sqlite3.Cursor, int, int], None]
+    batch_size: int = 5000
+
+
+@dataclass
+class MigrationStep:
+    """版本化迁移步骤
+
+    Attributes:
+        version: 应用后的模式版本号
+        name: 步骤说明
+        upgrade: 模式变更函数（应尽量轻量，大表数据处理放入 backfills）
+        backfills: 该步骤注册的回填任务，在后台分批执行
+    """
+    version: int
+    name: str
+    upgrade: Callable[[sqlite3.Cursor], None]
+    backfills: List[BackfillTask] = field(default_factory=list)
+
+
+class MigrationRunner:
+    """版本化迁移执行器
+
+    - apply_pending: 按版本顺序执行未应用的步骤，每步一个事务
+    - run_backfills: 分批执行待处理的回填任务，可限制批数、可中途停止
+
+    版本号保存在 settings.schema_version，
+    回填检查点保存在 settings 的 backfill:<name> 键（值为已处理的最大 rowid 或 done）。
+    """
+
+    BACKFILL_PREFIX = 'backfill:'
+    BACKFILL_DONE = 'done'
+
+    def __init__(self, conn: sqlite3.Connection, steps: List[MigrationStep]):
+        """初始化执行器
+
+        Args:
+            conn: 数据库连接
+            steps: 全部迁移步骤
+        """
+        self.conn = conn
+        self.steps = sorted(steps, key=lambda step: step.version)
+        self.logger = logger
+        self._ensure_settings_table()
+
+    def _ensure_settings_table(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def _get_setting(self, key: str) -> Optional[str]:
+        row = self.conn.execute(
+            'SELECT value FROM settings WHERE key = ?', (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_setting(self, key: str, value: str):
+        self.conn.execute('''
+            INSERT OR REPLACE INTO settings (key, value, updated_at)
+            VALUES (?, ?, ?)
+        ''', (key, value, datetime.now().isoformat()))
+
+    def current_version(self) -> int:
+        """获取当前模式版本（未记录时视为 1）"""
+        value = self._get_setting('schema_version')
+        return int(value) if value else 1
+
+    def pending_steps(self) -> List[MigrationStep]:
+        """获取尚未应用的迁移步骤"""
+        current = self.current_version()
+        return [step for step in self.steps if step.version > current]
+
+    def apply_pending(self) -> List[int]:
+        """执行所有未应用的迁移步骤
+
+        Returns:
+            本次应用的版本号列表
+
+        Raises:
+            sqlite3.Error: 某一步骤失败（该步骤已回滚，之前的步骤保持已提交）
+        """
+        applied = []
+        for step in self.pending_steps():
+            self.logger.info(f"[DB_MIGRATION] 应用迁移 v{step.version}: {step.name}")
+            cursor = self.conn.cursor()
+            try:
+                step.upgrade(cursor)
+                for task in step.backfills:
+                    key = self.BACKFILL_PREFIX + task.name
+                    if self._get_setting(key) is None:
+                        self._set_setting(key, '0')
+                self._set_setting('schema_version', str(step.version))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            applied.append(step.version)
+        return applied
+
+    def pending_backfills(self) -> List[BackfillTask]:
+        """获取未完成的回填任务"""
+        pending = []
+        for step in self.steps:
+            for task in step.backfills:
+                value = self._get_setting(self.BACKFILL_PREFIX + task.name)
+                if value is not None and value != self.BACKFILL_DONE:
+                    pending.append(task)
+        return pending
+
+    def run_backfills(
+        self,
+        progress_callback: Optional[Callable[[str, int, int], None]] = None,
+        max_batches: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """分批执行待处理的回填任务
+
+        每批处理与检查点更新在同一事务中提交，中断后从检查点继续。
+
+        Args:
+            progress_callback: 进度回调 (task_name, processed_rowid, max_rowid)
+            max_batches: 本次最多执行的批数（None 表示不限）
+            should_stop: 返回 True 时在批次之间停止
+
+        Returns:
+            是否全部回填完成
+        """
+        batches = 0
+        for task in self.pending_backfills():
+            key = self.BACKFILL_PREFIX + task.name
+            checkpoint = int(self._get_setting(key) or 0)
+            # 迁移之后新增的行由正常写入路径维护，只需回填到当前最大 rowid
+            row = self.conn.execute(f'SELECT MAX(rowid) FROM {task.table}').fetchone()
+            max_rowid = row[0] or 0
+
+            while checkpoint < max_rowid:
+                if max_batches is not None and batches >= max_batches:
+                    return False
+                if should_stop and should_stop():
+                    return False
+
+                high = min(checkpoint + task.batch_size, max_rowid)
+                cursor = self.conn.cursor()
+                try:
+                    task.process_range(cursor, checkpoint, high)
+                    self._set_setting(key, str(high))
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                checkpoint = high
+                batches += 1
+
+                if progress_callback:
+                    progress_callback(task.name, checkpoint, max_rowid)
+
+            self._set_setting(key, self.BACKFILL_DONE)
+            self.conn.commit()
+            self.logger.info(f"[DB_MIGRATION] 回填完成: {task.name}")
+
+        return True
+
+
+def _backfill_reason_reference_count(cursor: sqlite3.Cursor, low: int, high: int):
+    """按实际引用重新计算 cleanup_reasons.reference_count"""
+    cursor.execute('''
+        UPDATE cleanup_reasons
+        SET reference_count = (
+            SELECT COUNT(*) FROM cleanup_items WHERE reason_id = cleanup_reasons.id
+        )
+        WHERE id > ? AND id <= ?
+    ''', (low, high))
+
+
+def _create_reports_and_keyset_index(cursor: sqlite3.Cursor):
+    """v3: 清理报告表与清理项键集分页索引"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cleanup_reports (
+            report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plan_id TEXT UNIQUE NOT NULL,
+            execution_id INTEGER,
+            report_summary TEXT NOT NULL,
+            report_statistics TEXT NOT NULL,
+            report_failures TEXT,
+            generated_at TEXT NOT NULL,
+            scan_type TEXT,
+            total_freed_size INTEGER DEFAULT 0,
+            FOREIGN KEY (plan_id) REFERENCES cleanup_plans(plan_id),
+            FOREIGN KEY (execution_id) REFERENCES cleanup_executions(execution_id)
+        )
+    ''')
+    for index_name, table, column in [
+        ('idx_cleanup_reports_plan_id', 'cleanup_reports', 'plan_id'),
+        ('idx_cleanup_reports_generated_at', 'cleanup_reports', 'generated_at'),
+        ('idx_cleanup_reports_scan_type', 'cleanup_reports', 'scan_type'),
+        ('idx_cleanup_items_plan_status', 'cleanup_items', 'plan_id, status'),
+    ]:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})')
+
 
 class DatabaseMigration:
     """数据库迁移管理类"""
@@ -60,40 +286,47 @@ class DatabaseMigration:
         """
         return hashlib.md5(reason.encode('utf-8')).hexdigest()
 
+    def get_steps(self) -> List[MigrationStep]:
+        """获取全部迁移步骤（按版本号）"""
+        def create_smart_cleanup_tables(cursor: sqlite3.Cursor):
+            self._create_cleanup_reasons_table(cursor)
+            self._create_cleanup_plans_table(cursor)
+            self._create_cleanup_items_table(cursor)
+            self._create_cleanup_executions_table(cursor)
+            self._create_recovery_log_table(cursor)
+            self._create_indexes(cursor)
+
+        return [
+            MigrationStep(2, '智能清理表结构', create_smart_cleanup_tables),
+            MigrationStep(
+                3, '清理报告表与键集分页索引', _create_reports_and_keyset_index,
+                backfills=[BackfillTask(
+                    'cleanup_reasons_reference_count', 'cleanup_reasons',
+                    _backfill_reason_reference_count, batch_size=2000
+                )]
+            ),
+        ]
+
     def run_migrations(self) -> bool:
-        """运行所有迁移
+        """运行所有未应用的迁移步骤
+
+        只执行模式变更；大表回填需调用 run_backfills 在后台分批完成。
 
         Returns:
             是否成功
         """
+        conn = None
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
+            runner = MigrationRunner(conn, self.get_steps())
 
-            # 检查是否需要迁移
-            current_version = self._get_schema_version(cursor)
-            if current_version >= 2:
+            current_version = runner.current_version()
+            if not runner.pending_steps():
                 self.logger.info(f"[DB_MIGRATION] 数据库版本 {current_version}，无需迁移")
-                conn.close()
                 return True
 
-            self.logger.info(f"[DB_MIGRATION] 开始迁移数据库 (版本 {current_version} -> 2)")
-
-            # 执行迁移
-            self._create_cleanup_reasons_table(cursor)
-            self._create_cleanup_plans_table(cursor)
-            self._create_cleanup_items_table(cursor)
-            self._create_cleanup_executions_table(cursor)
-            self._create_recovery_log_table(cursor)
-
-            # 创建索引
-            self._create_indexes(cursor)
-
-            # 更新版本号
-            self._update_schema_version(cursor, version=2)
-
-            conn.commit()
-            conn.close()
+            self.logger.info(f"[DB_MIGRATION] 开始迁移数据库 (版本 {current_version} -> {SCHEMA_VERSION})")
+            runner.apply_pending()
 
             self.logger.info("[DB_MIGRATION] 数据库迁移完成")
             return True
@@ -101,6 +334,35 @@ class DatabaseMigration:
         except Exception as e:
             self.logger.error(f"[DB_MIGRATION] 迁移失败: {e}", exc_info=True)
             return False
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def run_backfills(
+        self,
+        progress_callback: Optional[Callable[[str, int, int], None]] = None,
+        max_batches: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """分批执行待处理的回填任务（可中断、可续跑）
+
+        Args:
+            progress_callback: 进度回调 (task_name, processed_rowid, max_rowid)
+            max_batches: 本次最多执行的批数
+            should_stop: 返回 True 时停止
+
+        Returns:
+            是否全部回填完成
+        """
+        conn = self.get_connection()
+        try:
+            runner = MigrationRunner(conn, self.get_steps())
+            return runner.run_backfills(progress_callback, max_batches, should_stop)
+        except Exception as e:
+            self.logger.error(f"[DB_MIGRATION] 回填失败: {e}", exc_info=True)
+            return False
+        finally:
+            conn.close()
 
     def _get_schema_version(self, cursor: sqlite3.Cursor) -> int:
         """获取数据库模式版本
@@ -111,9 +373,13 @@ class DatabaseMigration:
         Returns:
             版本号
         """
-        cursor.execute('''
-            SELECT value FROM settings WHERE key = 'schema_version'
-        ''')
+        try:
+            cursor.execute('''
+                SELECT value FROM settings WHERE key = 'schema_version'
+            ''')
+        except sqlite3.OperationalError:
+            # settings 表不存在，视为初始版本
+            return 1
         row = cursor.fetchone()
         if row:
             return int(row['value'])
@@ -60,6 +60,38 @@ DEFAULT_SKIP_NAMES = {
     'site-packages',
 }
 
+_SYSTEM_SKIP_PREFIXES = tuple(os.path.normpath(p).lower() for p in SYSTEM_SKIP_DIRS)
+
+
+def should_skip_dir(path: str, skip_dirs: Optional[Set[str]] = None,
+                    skip_system_dirs: bool = True) -> bool:
+    """检查是否应该跳过目录（系统目录、默认跳过名称、自定义跳过目录）
+
+    Args:
+        path: 目录路径
+        skip_dirs: 自定义跳过目录集合
+        skip_system_dirs: 是否跳过系统目录
+
+    Returns:
+        是否跳过
+    """
+    normalized_path = os.path.normpath(path).lower()
+
+    # 检查系统目录
+    if skip_system_dirs and normalized_path.startswith(_SYSTEM_SKIP_PREFIXES):
+        return True
+
+    # 检查默认跳过名称
+    if os.path.basename(path) in DEFAULT_SKIP_NAMES:
+        return True
+
+    # 检查自定义跳过目录
+    for skip_dir in skip_dirs or ():
+        if normalized_path.startswith(os.path.normpath(skip_dir).lower()):
+            return True
+
+    return False
+
 
 @dataclass
 class ScanProgress:
@@ -304,25 +336,7 @@ class DepthDiskScannerThread(QThread):
         Returns:
             是否跳过
         """
-        # 检查系统目录
-        if self.skip_system_dirs:
-            normalized_path = os.path.normpath(path).lower()
-            for skip_path in SYSTEM_SKIP_DIRS:
-                if normalized_path.startswith(os.path.normpath(skip_path).lower()):
-                    return True
-
-        # 检查默认跳过名称
-        dir_name = os.path.basename(path)
-        if dir_name in DEFAULT_SKIP_DIRS:
-            return True
-
-        # 检查自定义跳过目录
-        normalized_path = os.path.normpath(path).lower()
-        for skip_dir in self.skip_dirs:
-            if normalized_path.startswith(os.path.normpath(skip_dir).lower()):
-                return True
-
-        return False
+        return should_skip_dir(path, self.skip_dirs, self.skip_system_dirs)
 
     def stop(self):
         """停止扫描"""
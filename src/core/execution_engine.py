@@ -7,6 +7,9 @@ Phase 3 Day 6 MVP功能:
 - 进度报告和取消支持
 - 执行结果记录到数据库
 - 错误处理和恢复建议
+- 并行执行模式（有界线程池 + 每卷并发上限，进度信号聚合发送）
+- 暂存删除模式（重命名到同卷暂存区立即完成，后台低优先级回收）
+- 执行前预估成本并排序（免备份项优先、同目录相邻），按成本加权报告 ETA
 
 设计原则:
 - 使用 QThread 实现异步执行
@@ -15,10 +18,12 @@ Phase 3 Day 6 MVP功能:
 - 详细的错误分类和处理建议
 """
 import os
-import shutil
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from enum import Enum
-from typing import List, Dict, Optional, Callable
+from typing import List, Dict, Optional, Callable, Tuple
 from dataclasses import dataclass
 
 from PyQt5.QtCore import QObject, pyqtSignal, QThread, QMutex, QMutexLocker
@@ -30,6 +35,10 @@ from .models_smart import (
 from .backup_manager import BackupManager, BackupStats
 from .database import Database, get_database
 from .rule_engine import RiskLevel
+from .tree_deleter import delete_tree
+from .volumes import volume_key, NestedPathGate
+from .staging import StagingArea, StagingReaper, ReaperThread
+from .execution_planner import ExecutionPlanner, ExecutionPlan, ProgressTracker
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -72,6 +81,11 @@ class ExecutionConfig:
     log_all_operations: bool = True             # 记录所有操作
     abort_on_error: bool = False                 # 出错时中止
     chunk_size: int = 100                        # 批量处理大小
+    parallel_workers: int = 1                    # 并行工作线程数（1 为顺序执行）
+    per_volume_limit: int = 4                    # 同一卷上的最大并发数
+    progress_interval: float = 0.2               # 并行模式下进度信号的聚合间隔（秒）
+    staged_delete: bool = False                  # 暂存删除（重命名到同卷暂存区，后台回收）
+    plan_order: bool = True                      # 按预估成本和目录局部性排序执行
 
 
 class ExecutionThread(QThread):
@@ -82,6 +96,8 @@ class ExecutionThread(QThread):
     item_started = pyqtSignal(str)              # item_path
     item_completed = pyqtSignal(str, str)       # item_path, status (success/failed/skipped)
     item_progress = pyqtSignal(str, int, int)    # item_path, current, total (for large files)
+    items_completed = pyqtSignal(list)          # [(item_path, status), ...] 并行模式聚合发送
+    eta_updated = pyqtSignal(float, float)      # 预计剩余秒数, 完成比例（按成本加权）
 
     # 结果信号
     execution_started = pyqtSignal()
@@ -119,6 +135,13 @@ class ExecutionThread(QThread):
         self.skipped_count = 0
         self.freed_size = 0
 
+        self.staging = StagingArea() if self.config.staged_delete else None
+
+        # 执行计划与进度（_prepare_items 中生成）
+        self.execution_plan: Optional[ExecutionPlan] = None
+        self.progress_tracker: Optional[ProgressTracker] = None
+        self._last_eta_emit = 0.0
+
         self.logger = logger
 
     def run(self):
@@ -143,9 +166,12 @@ class ExecutionThread(QThread):
             result.total_size = sum(item.size for item in items)
 
             self.phase_started.emit("preparing", 0, result.total_items)
+            self._emit_eta(force=True)
 
             # 执行清理
+            self._set_phase(ExecutionPhase.DELETING)
             self._execute_cleanup(items, result)
+            self._emit_eta(force=True)
 
             # 完成阶段
             self._set_phase(ExecutionPhase.FINALIZING)
@@ -159,13 +185,17 @@ class ExecutionThread(QThread):
             self.logger.error(f"[EXECUTOR] {error_msg}")
             self.execution_failed.emit(error_msg)
 
+        finally:
+            # 关闭本线程的数据库连接（备份/暂存记录写入时创建）
+            self.backup_mgr.db.close()
+
     def _prepare_items(self) -> List[CleanupItem]:
         """准备清理项目
 
-        筛选需要清理的项目（根据状态）
+        筛选需要清理的项目（根据状态），预估成本并排序执行顺序
 
         Returns:
-            待清理的项目列表
+            待清理的项目列表（执行顺序）
         """
         items = []
         for item in self.plan.items:
@@ -173,8 +203,18 @@ class ExecutionThread(QThread):
             # TODO: 这里可以从数据库读取项目状态
             items.append(item)
 
-        self.logger.info(f"[EXECUTOR] 准备完成 - {len(items)} 个项目待清理")
-        return items
+        planner = ExecutionPlanner(
+            enable_backup=self.config.enable_backup,
+            staged=self.config.staged_delete
+        )
+        self.execution_plan = planner.plan(items, reorder=self.config.plan_order)
+        self.progress_tracker = ProgressTracker(self.execution_plan)
+
+        self.logger.info(
+            f"[EXECUTOR] 准备完成 - {len(items)} 个项目待清理, "
+            f"预计 {self.execution_plan.total_seconds:.1f} 秒"
+        )
+        return self.execution_plan.items
 
     def _execute_cleanup(self, items: List[CleanupItem], result: ExecutionResult):
         """执行清理
@@ -183,6 +223,10 @@ class ExecutionThread(QThread):
             items: 清理项目列表
             result: 执行结果对象
         """
+        if self.config.parallel_workers > 1 and len(items) > 1:
+            self._execute_cleanup_parallel(items, result)
+            return
+
         total = len(items)
 
         for i, item in enumerate(items):
@@ -198,37 +242,203 @@ class ExecutionThread(QThread):
             try:
                 # 执行单个项目
                 status = self._execute_item(item)
-
-                # 更新统计
-                if status == CleanupStatus.SUCCESS:
-                    self.success_count += 1
-                    result.success_items += 1
-                    self.freed_size += item.size
-                    result.freed_size += item.size
-                elif status == CleanupStatus.FAILED:
-                    self.failed_count += 1
-                    result.failed_items += 1
-                    result.failed_size += item.size
-                else:  # SKIPPED
-                    self.skipped_count += 1
-                    result.skipped_items += 1
+                self._record_status(item, status, result)
 
                 self.item_completed.emit(item.path, status.value)
                 self.phase_started.emit("deleting", i + 1, total)
 
             except Exception as e:
-                error_msg = f"项目清理异常: {str(e)}"
-                self.logger.error(f"[EXECUTOR] {error_msg}")
+                self._record_error(item, e, result)
+                self.item_completed.emit(item.path, "failed")
 
-                # 添加失败信息
-                result.add_failure(
-                    item,
-                    ErrorType.UNKNOWN.value,
-                    error_msg,
-                    "skip"
-                )
+            self._emit_eta()
 
-                self.item_completed.emit(item.path, "failed")
+    def _execute_cleanup_parallel(self, items: List[CleanupItem], result: ExecutionResult):
+        """并行执行清理
+
+        项目按所在卷分组，由有界线程池执行（每个项目的备份和删除在同一工作线程内
+        顺序完成，不同项目之间相互重叠）。同一卷上的在途任务数不超过
+        per_volume_limit，避免机械硬盘因随机寻道退化。
+
+        目录项目在其下的所有项目完成（含备份）之后才提交，避免祖先目录的
+        整树删除先于子项目的备份执行。
+
+        统计由本线程在任务完成时汇总。item_started 在提交时发送；完成结果按
+        progress_interval 聚合，刷新时逐项补发 item_completed（兼容现有页面），
+        同时以 items_completed 批量发送。工作线程的数据库连接在线程池关闭前释放。
+
+        Args:
+            items: 清理项目列表
+            result: 执行结果对象
+        """
+        total = len(items)
+        max_workers = self.config.parallel_workers
+        per_volume = max(1, self.config.per_volume_limit)
+
+        # 按卷分组（队列中为项目下标），保持原有顺序
+        queues: Dict[object, deque] = {}
+        volume_cache: Dict[str, object] = {}
+        for index, item in enumerate(items):
+            queues.setdefault(volume_key(item.path, volume_cache), deque()).append(index)
+        gate = NestedPathGate([item.path for item in items])
+
+        in_flight: Dict[object, int] = {volume: 0 for volume in queues}
+        pending = {}
+        completed: List[Tuple[str, str]] = []
+        done_count = 0
+        last_flush = time.monotonic()
+        cancelled = False
+
+        self.logger.info(
+            f"[EXECUTOR] 并行执行 - {total} 个项目, {len(queues)} 个卷, "
+            f"{max_workers} 个工作线程, 每卷上限 {per_volume}"
+        )
+
+        workers: List[threading.Thread] = []
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='purifyai-exec',
+                                initializer=lambda: workers.append(threading.current_thread())) as pool:
+            while True:
+                if not cancelled and self._is_cancelled():
+                    cancelled = True
+                    self.logger.info("[EXECUTOR] 执行被取消，等待在途任务完成")
+
+                # 轮询各卷，在并发上限内提交任务
+                if not cancelled:
+                    submitted = True
+                    while submitted and len(pending) < max_workers:
+                        submitted = False
+                        for volume, queue in queues.items():
+                            if not queue or in_flight[volume] >= per_volume:
+                                continue
+                            index = gate.pop_ready(queue)
+                            if index is None:
+                                continue
+                            item = items[index]
+                            self.item_started.emit(item.path)
+                            pending[pool.submit(self._execute_item, item)] = (index, volume)
+                            in_flight[volume] += 1
+                            submitted = True
+                            if len(pending) >= max_workers:
+                                break
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, timeout=self.config.progress_interval,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, volume = pending.pop(future)
+                    item = items[index]
+                    gate.done(index)
+                    in_flight[volume] -= 1
+                    done_count += 1
+                    try:
+                        status = future.result()
+                        self._record_status(item, status, result)
+                        completed.append((item.path, status.value))
+                    except Exception as e:
+                        self._record_error(item, e, result)
+                        completed.append((item.path, "failed"))
+
+                self.current_item_index = done_count
+                now = time.monotonic()
+                if completed and now - last_flush >= self.config.progress_interval:
+                    self._flush_completed(completed, done_count, total)
+                    self._emit_eta(force=True)
+                    completed = []
+                    last_flush = now
+
+            self._close_worker_connections(pool, len(workers))
+
+        if completed:
+            self._flush_completed(completed, done_count, total)
+
+        if cancelled:
+            result.status = ExecutionStatus.CANCELLED
+            self.execution_cancelled.emit()
+
+    def _flush_completed(self, completed: List[Tuple[str, str]], done_count: int, total: int):
+        """发送一批已完成项目的进度
+
+        Args:
+            completed: [(item_path, status), ...]
+            done_count: 已完成项目数
+            total: 项目总数
+        """
+        for path, status in completed:
+            self.item_completed.emit(path, status)
+        self.items_completed.emit(completed)
+        self.phase_started.emit("deleting", done_count, total)
+
+    def _close_worker_connections(self, pool: ThreadPoolExecutor, worker_count: int):
+        """在每个工作线程内关闭其线程本地数据库连接
+
+        sqlite 连接只能在创建它的线程中关闭。每个工作线程恰好领取一个关闭任务:
+        任务关闭连接后在屏障处等待，直到所有工作线程都已领取。
+
+        Args:
+            pool: 线程池（所有清理任务已完成）
+            worker_count: 线程池已创建的工作线程数
+        """
+        if worker_count == 0:
+            return
+        barrier = threading.Barrier(worker_count)
+
+        def close_connection():
+            self.backup_mgr.db.close()
+            try:
+                barrier.wait(timeout=5.0)
+            except threading.BrokenBarrierError:
+                pass
+
+        for _ in range(worker_count):
+            pool.submit(close_connection)
+
+    def _record_status(self, item: CleanupItem, status: CleanupStatus, result: ExecutionResult):
+        """按清理状态更新统计
+
+        Args:
+            item: 清理项目
+            status: 清理状态
+            result: 执行结果对象
+        """
+        if self.progress_tracker is not None:
+            self.progress_tracker.complete(item)
+
+        if status == CleanupStatus.SUCCESS:
+            self.success_count += 1
+            result.success_items += 1
+            self.freed_size += item.size
+            result.freed_size += item.size
+        elif status == CleanupStatus.FAILED:
+            self.failed_count += 1
+            result.failed_items += 1
+            result.failed_size += item.size
+        else:  # SKIPPED
+            self.skipped_count += 1
+            result.skipped_items += 1
+
+    def _record_error(self, item: CleanupItem, error: Exception, result: ExecutionResult):
+        """记录项目清理异常
+
+        Args:
+            item: 清理项目
+            error: 异常
+            result: 执行结果对象
+        """
+        if self.progress_tracker is not None:
+            self.progress_tracker.complete(item)
+
+        error_msg = f"项目清理异常: {str(error)}"
+        self.logger.error(f"[EXECUTOR] {error_msg}")
+
+        # 添加失败信息
+        result.add_failure(
+            item,
+            ErrorType.UNKNOWN.value,
+            error_msg,
+            "skip"
+        )
 
     def _execute_item(self, item: CleanupItem) -> CleanupStatus:
         """执行单个项目的清理
@@ -244,6 +454,16 @@ class ExecutionThread(QThread):
             self.logger.warning(f"[EXECUTOR] 文件不存在: {item.path}")
             return CleanupStatus.SKIPPED
 
+        # 暂存模式：重命名到同卷暂存区，由后台回收器删除；回收前可恢复，
+        # 暂存项本身即为备份，无需再复制
+        if self.staging is not None:
+            staged_path = self.staging.stage(item.path)
+            if staged_path:
+                self.backup_mgr.register_staged(item, staged_path, self.plan.plan_id)
+                self.logger.info(f"[EXECUTOR] 已暂存: {item.path}")
+                return CleanupStatus.SUCCESS
+            # 暂存失败时回退到备份后删除
+
         # 备份（如果需要）
         if self.config.enable_backup:
             backup_info = self.backup_mgr.create_backup(item)
@@ -281,35 +501,18 @@ class ExecutionThread(QThread):
                         except:
                             pass
                     os.remove(path)
+                elif os.path.islink(path):
+                    # 指向目录的链接只删除链接本身
+                    os.unlink(path)
                 elif os.path.isdir(path):
-                    # Windows 特殊处理：处理被锁定的文件
-                    if os.name == 'nt':
-                        self._clear_readonly(path)
-                        # 强制删除，忽略错误
-                        try:
-                            shutil.rmtree(path, ignore_errors=False)
-                        except OSError as e:
-                            # [WinError 145] 目录不是空的 - 可能包含被锁定的文件
-                            if hasattr(e, 'winerror') and e.winerror == 145:
-                                # 尝试删除子文件
-                                self._delete_directory_contents(path)
-                                # 再次尝试删除空目录
-                                try:
-                                    os.rmdir(path)
-                                except:
-                                    raise
-                            elif 'Directory not empty' in str(e):
-                                # 类似错误
-                                self._delete_directory_contents(path)
-                                try:
-                                    os.rmdir(path)
-                                except:
-                                    raise
-                            else:
-                                raise
-                    else:
-                        # Unix/Linux
-                        shutil.rmtree(path)
+                    # 单遍自底向上删除，只读/锁定条目就地处理
+                    tree_result = delete_tree(path)
+                    if not tree_result.success:
+                        failed_path, error = tree_result.failures[0]
+                        raise OSError(
+                            f"{len(tree_result.failures)} 个项目无法删除 "
+                            f"(如 {failed_path}: {error})"
+                        )
                 else:
                     return CleanupStatus.SKIPPED
 
@@ -345,56 +548,19 @@ class ExecutionThread(QThread):
 
         return CleanupStatus.FAILED
 
-    def _clear_readonly(self, path: str):
-        """清除目录中所有文件的只读属性（Windows）
+    def _emit_eta(self, force: bool = False):
+        """发送 ETA（按 progress_interval 节流）
 
         Args:
-            path: 目录路径
+            force: 忽略节流立即发送
         """
-        import stat
-        if os.name != 'nt':
+        if self.progress_tracker is None:
             return
-
-        try:
-            for root, dirs, files in os.walk(path):
-                for name in files + dirs:
-                    full_path = os.path.join(root, name)
-                    try:
-                        os.chmod(full_path, stat.S_IWRITE)
-                    except:
-                        pass
-        except:
-            pass
-
-    def _delete_directory_contents(self, path: str):
-        """尝试删除目录中的内容（处理被锁定的文件）
-
-        Args:
-            path: 目录路径
-        """
-        import stat
-        if os.name != 'nt':
+        now = time.monotonic()
+        if not force and now - self._last_eta_emit < self.config.progress_interval:
             return
-
-        try:
-            for item_name in os.listdir(path):
-                item_path = os.path.join(path, item_name)
-                try:
-                    if os.path.isfile(item_path):
-                        try:
-                            os.chmod(item_path, stat.S_IWRITE)
-                        except:
-                            pass
-                        os.remove(item_path)
-                    elif os.path.isdir(item_path):
-                        self._clear_readonly(item_path)
-                        shutil.rmtree(item_path, ignore_errors=True)
-                except Exception as e:
-                    self.logger.debug(f"[EXECUTOR] 跳过被锁定的项目: {item_path}, 原因: {e}")
-                    pass
-        except Exception as e:
-            self.logger.debug(f"[EXECUTOR] 删除目录内容异常: {path}, 原因: {e}")
-            pass
+        self._last_eta_emit = now
+        self.eta_updated.emit(self.progress_tracker.remaining_seconds(), self.progress_tracker.fraction)
 
     def _set_phase(self, phase: ExecutionPhase):
         """设置执行阶段
@@ -436,7 +602,9 @@ class SmartCleanupExecutor(QObject):
     execution_progress = pyqtSignal(str, int, int)  # plan_id, current, total
     item_started = pyqtSignal(str, str)         # plan_id, item_path
     item_completed = pyqtSignal(str, str, str) # plan_id, item_path, status
+    items_completed = pyqtSignal(str, list)     # plan_id, [(item_path, status), ...]
     phase_changed = pyqtSignal(str, str)        # plan_id, phase_name
+    execution_eta = pyqtSignal(str, float, float)  # plan_id, 预计剩余秒数, 完成比例
 
     # 结果信号
     execution_completed = pyqtSignal(object)     # ExecutionResult
@@ -467,6 +635,7 @@ class SmartCleanupExecutor(QObject):
         self.config = config or ExecutionConfig()
 
         self.current_thread: Optional[ExecutionThread] = None
+        self.reaper_thread: Optional[ReaperThread] = None
         self.is_executing = False
 
         self.logger = logger
@@ -531,6 +700,12 @@ class SmartCleanupExecutor(QObject):
         thread.item_completed.connect(
             lambda path, status: self.item_completed.emit(plan_id, path, status)
         )
+        thread.items_completed.connect(
+            lambda completed: self.items_completed.emit(plan_id, completed)
+        )
+        thread.eta_updated.connect(
+            lambda remaining, fraction: self.execution_eta.emit(plan_id, remaining, fraction)
+        )
 
         # 备份信号
         thread.backup_created.connect(
@@ -549,6 +724,33 @@ class SmartCleanupExecutor(QObject):
         self.logger.info(f"[EXECUTOR] 执行完成: {result.plan_id}")
         self.execution_completed.emit(result)
 
+    def start_reaper(self, grace_seconds: Optional[float] = None) -> bool:
+        """启动后台暂存回收线程
+
+        暂存项默认由空闲维护任务回收，这里供手动立即回收使用。
+
+        Args:
+            grace_seconds: 回收宽限期（秒），None 时读取配置 staging/grace_hours
+
+        Returns:
+            是否启动（已有回收线程在运行时返回 False）
+        """
+        if self.reaper_thread and self.reaper_thread.isRunning():
+            return False
+
+        self.reaper_thread = ReaperThread(StagingReaper(db=self.db, grace_seconds=grace_seconds))
+        self.reaper_thread.reap_completed.connect(
+            lambda reaped, failed: self.logger.info(f"[EXECUTOR] 暂存回收完成: {reaped} 项, 失败 {failed} 项")
+        )
+        self.reaper_thread.start()
+        return True
+
+    def stop_reaper(self):
+        """停止后台回收（未回收的暂存项保留到下次回收）"""
+        if self.reaper_thread and self.reaper_thread.isRunning():
+            self.reaper_thread.request_stop()
+            self.reaper_thread.wait(5000)
+
     def _on_execution_failed(self, plan_id: str, error_message: str):
         """执行失败回调
 
@@ -0,0 +1,232 @@
+"""
+执行计划器 (Execution Planner) - 清理前的 I/O 成本预估与执行排序
+
+ExecutionThread 原先按计划中的顺序逐项执行，进度只有"第几项/共几项"，
+而不同项目的代价相差几个数量级：无需备份的安全项只是元数据操作，
+完整备份则要读写全部数据。
+
+本模块:
+- 按大小、文件数和备份类型估算每个项目的耗时与 I/O 字节数
+- 排序: 廉价的免备份项优先，其次硬链接备份，最后完整备份；
+  同组内按 (卷, 路径) 排序，使同一目录下的删除相邻执行。
+  计划中互相包含的项目保持 后代先于祖先: 祖先取其下所有项目中最高的备份等级，
+  同组内后代排在前面，避免先删除祖先导致后代的备份从未执行
+- ETA: 按成本加权的完成比例，并用已观测的实际耗时校准模型
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .models_smart import CleanupItem, BackupType
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CostModel:
+    """成本模型（秒），默认值对应普通 SSD 的量级
+
+    Attributes:
+        delete_per_file: 删除单个文件的元数据开销
+        stage_per_item: 暂存模式下重命名单个项目的开销
+        link_per_file: 为单个文件建立硬链接的开销
+        copy_per_file: 完整备份时单个文件的固定开销（创建、哈希、链接）
+        copy_bytes_per_second: 完整备份的吞吐（读取 + 写入）
+        avg_file_size: 目录文件数无法统计时用于推算的平均文件大小
+    """
+    delete_per_file: float = 0.0005
+    stage_per_item: float = 0.001
+    link_per_file: float = 0.0005
+    copy_per_file: float = 0.002
+    copy_bytes_per_second: float = 100 * 1024 * 1024
+    avg_file_size: int = 64 * 1024
+
+
+@dataclass
+class ItemCost:
+    """单个项目的预估成本"""
+    item: CleanupItem
+    backup_type: BackupType
+    file_count: int
+    seconds: float
+    io_bytes: int
+
+
+@dataclass
+class ExecutionPlan:
+    """排序后的执行计划"""
+    costs: List[ItemCost] = field(default_factory=list)
+
+    @property
+    def items(self) -> List[CleanupItem]:
+        return [cost.item for cost in self.costs]
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(cost.seconds for cost in self.costs)
+
+    @property
+    def total_io_bytes(self) -> int:
+        return sum(cost.io_bytes for cost in self.costs)
+
+
+class ExecutionPlanner:
+    """预估清理成本并排序执行顺序"""
+
+    # 小于该项数的目录逐项统计文件数，超过后按大小推算
+    COUNT_LIMIT = 2000
+
+    def __init__(self, cost_model: Optional[CostModel] = None,
+                 enable_backup: bool = True, staged: bool = False):
+        """初始化计划器
+
+        Args:
+            cost_model: 成本模型
+            enable_backup: 执行时是否备份
+            staged: 执行时是否使用暂存删除
+        """
+        self.model = cost_model or CostModel()
+        self.enable_backup = enable_backup
+        self.staged = staged
+
+    def estimate(self, item: CleanupItem) -> ItemCost:
+        """估算单个项目的成本
+
+        暂存模式下暂存项本身即可恢复，不再单独备份，只计一次重命名。
+        """
+        if self.enable_backup and not self.staged:
+            backup_type = BackupType.from_risk(item.ai_risk)
+        else:
+            backup_type = BackupType.NONE
+        file_count = self._file_count(item)
+        model = self.model
+
+        if self.staged:
+            seconds = model.stage_per_item
+        else:
+            seconds = file_count * model.delete_per_file
+
+        io_bytes = 0
+        if backup_type == BackupType.HARDLINK:
+            seconds += file_count * model.link_per_file
+        elif backup_type == BackupType.FULL:
+            seconds += file_count * model.copy_per_file + item.size / model.copy_bytes_per_second
+            io_bytes = item.size * 2
+
+        return ItemCost(item=item, backup_type=backup_type, file_count=file_count,
+                        seconds=seconds, io_bytes=io_bytes)
+
+    def plan(self, items: List[CleanupItem], reorder: bool = True) -> ExecutionPlan:
+        """生成执行计划
+
+        Args:
+            items: 待清理项目
+            reorder: 是否按成本和局部性重新排序（False 保持原顺序，只做预估）
+
+        Returns:
+            ExecutionPlan
+        """
+        costs = [self.estimate(item) for item in items]
+        if reorder:
+            keys = self._order_keys(costs)
+            costs.sort(key=lambda cost: keys[id(cost)])
+
+        plan = ExecutionPlan(costs=costs)
+        logger.info(
+            f"[PLANNER] {len(costs)} 个项目, 预计 {plan.total_seconds:.1f} 秒, "
+            f"备份 I/O {plan.total_io_bytes / (1024 * 1024):.1f} MB"
+        )
+        return plan
+
+    # 路径分量之后追加的结束标记，大于任何文件名，使目录排在其内容之后
+    _PATH_END = chr(0x10FFFF)
+
+    @classmethod
+    def _order_keys(cls, costs: List[ItemCost]) -> Dict[int, Tuple]:
+        """计算排序键 id(cost) -> (备份等级, 卷, 路径分量)
+
+        备份类型成本递增: NONE < HARDLINK < FULL；同组内按路径分量排序，
+        同一目录下的项目相邻（也使同一卷的项目相邻）。
+        祖先项目的等级提升为其下所有项目中的最高等级，且路径键排在后代之后。
+        """
+        paths = {id(cost): os.path.normcase(os.path.abspath(cost.item.path)) for cost in costs}
+        ranks: Dict[str, int] = {}
+        for cost in costs:
+            rank = {BackupType.NONE: 0, BackupType.HARDLINK: 1}.get(cost.backup_type, 2)
+            path = paths[id(cost)]
+            ranks[path] = max(rank, ranks.get(path, 0))
+
+        # 将每个项目的等级传递给计划中的祖先项目
+        effective = dict(ranks)
+        for path, rank in ranks.items():
+            parent = os.path.dirname(path)
+            while parent != path:
+                if parent in effective and effective[parent] < rank:
+                    effective[parent] = rank
+                path, parent = parent, os.path.dirname(parent)
+
+        keys = {}
+        for cost in costs:
+            path = paths[id(cost)]
+            drive, rest = os.path.splitdrive(path)
+            keys[id(cost)] = (effective[path], drive, rest.split(os.sep) + [cls._PATH_END])
+        return keys
+
+    def _file_count(self, item: CleanupItem) -> int:
+        """统计（或推算）项目包含的文件数"""
+        if item.item_type != 'directory':
+            return 1
+
+        estimated = max(1, item.size // self.model.avg_file_size)
+        count = 0
+        stack = [item.path]
+        try:
+            while stack:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        count += 1
+                        if count >= self.COUNT_LIMIT:
+                            return max(count, estimated)
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+        except OSError:
+            return estimated
+        return max(1, count)
+
+
+class ProgressTracker:
+    """按成本加权的进度与 ETA
+
+    ETA = 剩余预估成本 × (实际耗时 / 已完成预估成本)，
+    完成比例较小时直接使用模型预估。
+    """
+
+    # 完成比例达到该值后才用实际耗时校准
+    CALIBRATION_THRESHOLD = 0.02
+
+    def __init__(self, plan: ExecutionPlan):
+        self.total = plan.total_seconds
+        self._costs: Dict[int, float] = {id(cost.item): cost.seconds for cost in plan.costs}
+        self.completed = 0.0
+        self.started_at = time.monotonic()
+
+    def complete(self, item: CleanupItem):
+        """记录项目完成"""
+        self.completed += self._costs.pop(id(item), 0.0)
+
+    @property
+    def fraction(self) -> float:
+        """完成比例（按成本加权）"""
+        if self.total <= 0:
+            return 1.0 if not self._costs else 0.0
+        return min(1.0, self.completed / self.total)
+
+    def remaining_seconds(self) -> float:
+        """预计剩余时间（秒）"""
+        remaining = max(0.0, self.total - self.completed)
+        if self.total > 0 and self.fraction >= self.CALIBRATION_THRESHOLD:
+            elapsed = time.monotonic() - self.started_at
+            return remaining * (elapsed / self.completed)
+        return remaining
@@ -79,6 +79,15 @@ class BackupType(Enum):
     NONE = "none"           # 不备份
     HARDLINK = "hardlink"   # 硬链接
     FULL = "full"           # 完整备份
+    STAGED = "staged"       # 重命名暂存（回收前可恢复）
+
+    @staticmethod
+    def from_value(value: str) -> 'BackupType':
+        """从字符串值获取备份类型（未知值返回 NONE）"""
+        try:
+            return BackupType(value)
+        except ValueError:
+            return BackupType.NONE
 
     @staticmethod
     def from_risk(risk: RiskLevel) -> 'BackupType':
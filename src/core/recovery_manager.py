@@ -13,14 +13,16 @@ Features:
 - 按时间、风险等级、备份类型过滤
 - 恢复到原路径或指定路径
 - 显示备份详情
-- 批量操作支持
+- 批量操作支持（一次加载元数据，按目标卷分组并行恢复）
 - 一键恢复所有失败项
 """
 import os
 import shutil
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 from PyQt5.QtCore import QObject, pyqtSignal, QThread
@@ -32,6 +34,7 @@ from .models_smart import (
 )
 from .database import Database, get_database
 from .backup_manager import BackupManager, get_backup_manager
+from .volumes import volume_key, path_key, NestedPathGate
 from .rule_engine import RiskLevel
 from utils.logger import get_logger
 
@@ -140,6 +143,7 @@ class RecoveryManager(QObject):
         # 恢复任务管理
         self.recovery_tasks: Dict[str, RecoveryTask] = {}
         self.mutex = QMutex()
+        self._cancel_requested = False
 
         self.logger = logger
 
@@ -281,53 +285,156 @@ class RecoveryManager(QObject):
     def batch_restore(
         self,
         backup_ids: List[str],
-        progress_callback: Optional[Callable[[int, int], None]] = None
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        max_workers: int = 8,
+        per_volume_limit: int = 4,
+        should_stop: Optional[Callable[[], bool]] = None
     ) -> Tuple[int, int, int]:
         """
         批量恢复备份
 
+        所有备份信息一次加载（缓存 + 一次分块查询），按目标所在卷分组后由线程池
+        并行恢复，同一卷上的在途任务数不超过 per_volume_limit。
+        同一目标路径只恢复最新的备份，其余计入跳过数；目录恢复会先删除目标，
+        因此嵌套目标按祖先在前的顺序执行，避免覆盖已恢复的后代。
+        数据库中的恢复状态在结束时统一更新。
+
         Args:
             backup_ids: 备份 ID 列表
-            progress_callback: 进度回调 (current, total)
+            progress_callback: 进度回调 (current, total)，在调用线程中触发
+            max_workers: 工作线程数
+            per_volume_limit: 每个卷的最大并发恢复数
+            should_stop: 返回 True 时不再提交新的恢复任务（也可调用 cancel_batch_restore）
 
         Returns:
-            (成功数, 失败数, 跳过数)
+            (成功数, 失败数, 跳过数)，取消后未执行的项目计入跳过数
         """
         success_count = 0
         failed_count = 0
         skipped_count = 0
         total = len(backup_ids)
+        self._cancel_requested = False
 
         self.logger.info(f"[RECOVERY] 开始批量恢复: {total} 个备份")
+        if not backup_ids:
+            return 0, 0, 0
 
-        for i, backup_id in enumerate(backup_ids):
-            progress_callback(i, total)
+        infos = self.backup_mgr.get_backup_infos(backup_ids)
 
-            backup_info = self.get_backup_details(backup_id)
+        # 同一目标只保留最新的备份（创建时间相同时取列表中靠后的）
+        latest: Dict[str, BackupInfo] = {}
+        for backup_id in backup_ids:
+            backup_info = infos.get(str(backup_id))
             if not backup_info:
                 self.logger.warning(f"[RECOVERY] 备份不存在: {backup_id}")
                 failed_count += 1
-                continue
-
-            if backup_info.restored:
+            elif backup_info.restored:
                 self.logger.info(f"[RECOVERY] 备份已恢复: {backup_id}")
                 skipped_count += 1
-                continue
-
+            elif not backup_info.original_path:
+                self.logger.warning(f"[RECOVERY] 无法确定恢复路径: {backup_id}")
+                failed_count += 1
+            else:
+                key = path_key(backup_info.original_path)
+                current = latest.get(key)
+                if current is not None and current.created_at > backup_info.created_at:
+                    current, backup_info = backup_info, current
+                if current is not None:
+                    self.logger.info(
+                        f"[RECOVERY] 跳过同一目标的旧备份: {current.backup_id} -> {current.original_path}"
+                    )
+                    skipped_count += 1
+                latest[key] = backup_info
+
+        # 按目标卷分组，保持原有顺序；队列中保存 restores 的下标
+        restores = list(latest.values())
+        gate = NestedPathGate([info.original_path for info in restores], ancestors_first=True)
+        queues: Dict[object, deque] = {}
+        volume_cache: Dict[str, object] = {}
+        for index, backup_info in enumerate(restores):
+            volume = volume_key(backup_info.original_path, volume_cache)
+            queues.setdefault(volume, deque()).append(index)
+
+        done_count = success_count + failed_count + skipped_count
+        if progress_callback:
+            progress_callback(done_count, total)
+
+        max_workers = max(1, max_workers)
+        per_volume = max(1, per_volume_limit)
+        in_flight: Dict[object, int] = {volume: 0 for volume in queues}
+        pending = {}
+        restored_ids: List[int] = []
+        cancelled = False
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='purifyai-restore') as pool:
+            while True:
+                if not cancelled and (self._cancel_requested or (should_stop and should_stop())):
+                    cancelled = True
+                    self.logger.info("[RECOVERY] 批量恢复被取消，等待在途任务完成")
+
+                # 轮询各卷，在并发上限内提交任务
+                if not cancelled:
+                    submitted = True
+                    while submitted and len(pending) < max_workers:
+                        submitted = False
+                        for volume, queue in queues.items():
+                            if not queue or in_flight[volume] >= per_volume:
+                                continue
+                            index = gate.pop_ready(queue)
+                            if index is None:
+                                continue
+                            future = pool.submit(
+                                self.backup_mgr.restore_from_info, restores[index], None, False
+                            )
+                            pending[future] = (index, volume)
+                            in_flight[volume] += 1
+                            submitted = True
+                            if len(pending) >= max_workers:
+                                break
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, volume = pending.pop(future)
+                    backup_info = restores[index]
+                    in_flight[volume] -= 1
+                    gate.done(index)
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        self.logger.error(f"[RECOVERY] 恢复失败: {backup_info.backup_id}, {e}")
+                        success = False
+
+                    if success:
+                        success_count += 1
+                        if backup_info.backup_id.isdigit():
+                            restored_ids.append(int(backup_info.backup_id))
+                    else:
+                        failed_count += 1
+
+                done_count += len(done)
+                if progress_callback:
+                    progress_callback(done_count, total)
+
+        if cancelled:
+            skipped_count += sum(len(queue) for queue in queues.values())
+
+        if restored_ids:
             try:
-                success = self.restore_backup(backup_id)
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
+                self.db.mark_recoveries_restored(restored_ids)
             except Exception as e:
-                self.logger.error(f"[RECOVERY] 恢复失败: {backup_id}, {e}")
-                failed_count += 1
+                self.logger.error(f"[RECOVERY] 更新恢复状态失败: {e}")
 
         self.logger.info(f"[RECOVERY] 批量恢复完成: 成功 {success_count}, 失败 {failed_count}, 跳过 {skipped_count}")
 
         return success_count, failed_count, skipped_count
 
+    def cancel_batch_restore(self):
+        """请求取消正在进行的批量恢复（在途任务会完成）"""
+        self._cancel_requested = True
+
     def restore_failed_items(self, plan_id: Optional[str] = None) -> int:
         """
         恢复所有失败项的备份
@@ -347,7 +454,7 @@ class RecoveryManager(QObject):
                 query = '''
                     SELECT r.*
                     FROM recovery_log r
-                    JOIN cleanup_plan_items cp ON r.item_id =.cp.item_id
+                    JOIN cleanup_plan_items cp ON r.item_id = cp.item_id
                     WHERE cp.plan_id = ? AND cp.status = ?
                 '''
                 params = [plan_id, CleanupStatus.FAILED.value]
@@ -0,0 +1,415 @@
+"""
+历史数据保留与压缩引擎 (Retention Engine)
+
+历史表（cleanup_items、recovery_log、cleanup_executions、clean_history、
+annotations）只增不减，数据库文件和查询时间会随使用年限增长。
+
+本模块提供:
+- 按表配置保留天数，分批删除过期记录（每批一个事务，不长时间锁库）
+- 可选归档: 删除前将记录追加写入 gzip 压缩的 JSON Lines 文件
+- 数据库维护: 增量 VACUUM 回收空间 + ANALYZE 更新查询统计
+
+由 core/scheduler.py 在空闲时段通过 MaintenanceThread 调度执行，
+同时回收上次运行遗留的暂存删除项（core/staging.py）。
+"""
+import gzip
+import json
+import os
+import sqlite3
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from .database import Database, get_database
+from .config_manager import get_config_manager
+from .annotation_storage import invalidate_annotation_cache
+from .staging import StagingReaper
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 数据库标识
+MAIN_DB = 'main'
+ANNOTATIONS_DB = 'annotations'
+
+
+@dataclass
+class RetentionPolicy:
+    """单表保留策略
+
+    Attributes:
+        table: 表名
+        timestamp_column: 用于判断过期的时间列（ISO 格式字符串）
+        days: 保留天数，0 表示永久保留
+        database: 所在数据库 (MAIN_DB / ANNOTATIONS_DB)
+        extra_condition: 额外删除条件（SQL 片段）
+        on_delete: 每批删除前的回调 (db, conn, rows)，在同一事务中执行；
+                   设置后该批在 db.reason_refs_locked() 中删除并提交
+    """
+    table: str
+    timestamp_column: str
+    days: int
+    database: str = MAIN_DB
+    extra_condition: str = ''
+    on_delete: Optional[Callable[[Database, sqlite3.Connection, List[sqlite3.Row]], None]] = None
+
+
+def _release_reasons(db: Database, conn: sqlite3.Connection, rows: List[sqlite3.Row]):
+    """删除清理项前递减原因引用计数，移除不再被引用的原因并使其驻留条目失效"""
+    counts = Counter(row['reason_id'] for row in rows if row['reason_id'] is not None)
+    if not counts:
+        return
+    conn.executemany('''
+        UPDATE cleanup_reasons SET reference_count = reference_count - ?
+        WHERE id = ?
+    ''', [(count, reason_id) for reason_id, count in counts.items()])
+    released = [row[0] for row in conn.execute(
+        'SELECT id FROM cleanup_reasons WHERE reference_count <= 0'
+    )]
+    if released:
+        conn.executemany('DELETE FROM cleanup_reasons WHERE id = ?', [(rid,) for rid in released])
+        db.evict_reasons(released)
+
+
+def default_policies() -> List[RetentionPolicy]:
+    """默认保留策略（可通过配置 retention/<table>_days 覆盖）"""
+    return [
+        RetentionPolicy('cleanup_items', 'created_at', 90, on_delete=_release_reasons),
+        RetentionPolicy('cleanup_executions', 'created_at', 180),
+        # 备份默认 7 天自动清理，超期的恢复记录已无对应备份；
+        # 未回收的暂存记录保留，否则暂存文件将无法回收或恢复
+        RetentionPolicy('recovery_log', 'timestamp', 90,
+                        extra_condition="NOT (backup_type = 'staged' AND restored = 0 "
+                                        "AND backup_path IS NOT NULL)"),
+        RetentionPolicy('clean_history', 'timestamp_cleaned_at', 365),
+        RetentionPolicy('ai_classifications', 'cached_at', 30),
+        # 用户审核/确认过的批注属于用户数据，不做过期清理
+        RetentionPolicy('annotations', 'created_at', 90, database=ANNOTATIONS_DB,
+                        extra_condition='user_reviewed = 0'),
+    ]
+
+
+@dataclass
+class RetentionResult:
+    """一次保留任务的执行结果"""
+    deleted: Dict[str, int] = field(default_factory=dict)
+    archived: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    vacuumed_pages: int = 0
+    analyzed: bool = False
+    stopped: bool = False
+
+    def to_dict(self) -> Dict:
+        return {
+            'deleted': dict(self.deleted),
+            'archived': dict(self.archived),
+            'errors': dict(self.errors),
+            'vacuumed_pages': self.vacuumed_pages,
+            'analyzed': self.analyzed,
+            'stopped': self.stopped,
+        }
+
+
+class RetentionEngine:
+    """历史数据保留引擎
+
+    Example:
+        engine = RetentionEngine()
+        result = engine.run_maintenance()
+    """
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        policies: Optional[List[RetentionPolicy]] = None,
+        archive_dir: Optional[str] = None,
+        annotations_db_path: Optional[str] = None,
+        batch_size: int = 500,
+        archive: Optional[bool] = None
+    ):
+        """初始化保留引擎
+
+        Args:
+            db: 主数据库实例
+            policies: 保留策略（None 时使用默认策略 + 配置覆盖）
+            archive_dir: 归档目录（None 时放在主数据库旁的 archive 目录）
+            annotations_db_path: 批注数据库路径（None 时使用 AnnotationStorage 默认路径）
+            batch_size: 每批删除数量
+            archive: 删除前是否归档（None 时读取配置 retention/archive）
+        """
+        self.db = db or get_database()
+        self.batch_size = max(1, batch_size)
+
+        config = get_config_manager()
+        self.policies = policies if policies is not None else self._load_policies(config)
+        self.archive = archive if archive is not None else config.get('retention/archive', False)
+
+        if archive_dir is None:
+            archive_dir = os.path.join(os.path.dirname(os.path.abspath(self.db.db_path)), 'archive')
+        self.archive_dir = archive_dir
+
+        if annotations_db_path is None:
+            annotations_db_path = str(Path.home() / '.purifyai' / 'annotations.db')
+        self.annotations_db_path = annotations_db_path
+
+        # run_maintenance 当前使用的连接，interrupt 用于中止长时间的 VACUUM
+        self._active_conn: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def _load_policies(config) -> List[RetentionPolicy]:
+        policies = default_policies()
+        for policy in policies:
+            policy.days = int(config.get(f'retention/{policy.table}_days', policy.days))
+        return policies
+
+    def _connect(self, database: str) -> Optional[sqlite3.Connection]:
+        """打开独立连接（维护任务在后台线程运行，不复用线程连接）"""
+        path = self.db.db_path if database == MAIN_DB else self.annotations_db_path
+        if not path or not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ------------------------------------------------------------------
+    # 分批清理
+    # ------------------------------------------------------------------
+
+    def prune(
+        self,
+        policy: RetentionPolicy,
+        conn: sqlite3.Connection,
+        now: Optional[datetime] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """按策略分批删除过期记录
+
+        Args:
+            policy: 保留策略
+            conn: 数据库连接
+            now: 当前时间（测试用）
+            should_stop: 返回 True 时在批次之间停止
+
+        Returns:
+            删除的记录数
+        """
+        if policy.days <= 0:
+            return 0
+
+        cutoff = ((now or datetime.now()) - timedelta(days=policy.days)).isoformat()
+        where = f'{policy.timestamp_column} < ?'
+        if policy.extra_condition:
+            where += f' AND ({policy.extra_condition})'
+
+        deleted = 0
+        while True:
+            if should_stop and should_stop():
+                break
+
+            rows = conn.execute(f'''
+                SELECT rowid AS _rowid, * FROM {policy.table}
+                WHERE {where}
+                ORDER BY rowid
+                LIMIT ?
+            ''', (cutoff, self.batch_size)).fetchall()
+            if not rows:
+                break
+
+            if self.archive:
+                self._archive_rows(policy.table, rows)
+
+            rowids = [row['_rowid'] for row in rows]
+            if policy.on_delete:
+                # 回调依赖引用计数（cleanup_reasons）：持有原因锁直到提交，
+                # 先写回内存中的增量，期间其他线程不能取得将被删除的原因 ID
+                with self.db.reason_refs_locked():
+                    self.db.flush_reason_refs(conn)
+                    policy.on_delete(self.db, conn, rows)
+                    self._delete_rowids(conn, policy.table, rowids)
+            else:
+                self._delete_rowids(conn, policy.table, rowids)
+            deleted += len(rowids)
+
+            if len(rows) < self.batch_size:
+                break
+
+        if deleted:
+            logger.info(f"[RETENTION] {policy.table}: 删除 {deleted} 条过期记录 (早于 {cutoff})")
+        return deleted
+
+    @staticmethod
+    def _delete_rowids(conn: sqlite3.Connection, table: str, rowids: List[int]):
+        placeholders = ', '.join('?' * len(rowids))
+        conn.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', rowids)
+        conn.commit()
+
+    def _archive_path(self, table: str) -> str:
+        return os.path.join(self.archive_dir, f"{table}-{datetime.now().strftime('%Y%m')}.jsonl.gz")
+
+    def _archive_rows(self, table: str, rows: List[sqlite3.Row]):
+        """追加写入压缩归档（gzip 多成员格式，可直接连续读取）"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with gzip.open(self._archive_path(table), 'at', encoding='utf-8') as f:
+            for row in rows:
+                record = {key: row[key] for key in row.keys() if key != '_rowid'}
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    # ------------------------------------------------------------------
+    # 空间回收与统计
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+        """将数据库切换为增量 VACUUM 模式
+
+        切换需要一次完整 VACUUM，只在首次维护时执行。
+
+        Returns:
+            是否执行了切换
+        """
+        mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        if mode == 2:  # INCREMENTAL
+            return False
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+
+    @staticmethod
+    def incremental_vacuum(conn: sqlite3.Connection, max_pages: int = 2000) -> int:
+        """回收最多 max_pages 个空闲页
+
+        Returns:
+            回收的页数
+        """
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if before == 0:
+            return 0
+        conn.execute(f'PRAGMA incremental_vacuum({int(max_pages)})')
+        after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return before - after
+
+    def run_maintenance(
+        self,
+        should_stop: Optional[Callable[[], bool]] = None,
+        vacuum_pages: int = 2000
+    ) -> RetentionResult:
+        """执行完整维护: 分批清理 -> 增量 VACUUM -> ANALYZE
+
+        Args:
+            should_stop: 返回 True 时尽快停止
+            vacuum_pages: 每个数据库本次最多回收的页数
+
+        Returns:
+            RetentionResult
+        """
+        result = RetentionResult()
+
+        for database in (MAIN_DB, ANNOTATIONS_DB):
+            conn = self._connect(database)
+            if conn is None:
+                continue
+            self._active_conn = conn
+            try:
+                for policy in self.policies:
+                    if policy.database != database:
+                        continue
+                    try:
+                        result.deleted[policy.table] = self.prune(policy, conn, should_stop=should_stop)
+                        if self.archive and result.deleted[policy.table]:
+                            result.archived[policy.table] = self._archive_path(policy.table)
+                    except sqlite3.Error as e:
+                        conn.rollback()
+                        result.errors[policy.table] = str(e)
+                        logger.error(f"[RETENTION] 清理 {policy.table} 失败: {e}")
+
+                if should_stop and should_stop():
+                    result.stopped = True
+                    break
+
+                try:
+                    self.enable_incremental_vacuum(conn)
+                    result.vacuumed_pages += self.incremental_vacuum(conn, vacuum_pages)
+                    conn.execute('ANALYZE')
+                    conn.commit()
+                    result.analyzed = True
+                except sqlite3.Error as e:
+                    if should_stop and should_stop():
+                        # interrupt() 中止了 VACUUM/ANALYZE
+                        result.stopped = True
+                        break
+                    result.errors[f'{database}:vacuum'] = str(e)
+                    logger.warning(f"[RETENTION] 数据库维护失败 ({database}): {e}")
+            finally:
+                self._active_conn = None
+                conn.close()
+
+        # 批注通过独立连接删除，批注存储单例的 LRU 缓存需要失效
+        if result.deleted.get('annotations'):
+            invalidate_annotation_cache()
+
+        return result
+
+    def interrupt(self):
+        """中止当前正在执行的 SQL 语句（可从其他线程调用）"""
+        conn = self._active_conn
+        if conn is not None:
+            conn.interrupt()
+
+
+class MaintenanceThread(QThread):
+    """后台数据库维护线程
+
+    Signals:
+        backfill_progress: (task_name, processed_rowid, max_rowid) - 迁移回填进度
+        maintenance_completed: dict - RetentionResult.to_dict()
+    """
+
+    backfill_progress = pyqtSignal(str, int, int)
+    maintenance_completed = pyqtSignal(dict)
+
+    def __init__(self, engine: Optional[RetentionEngine] = None, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self._stop_requested = False
+        # 每个回填任务上次记录日志时的进度百分比（按 10% 节流）
+        self._logged_percent = {}
+
+    def request_stop(self):
+        """请求停止：批次之间退出，并中止正在执行的 VACUUM/ANALYZE"""
+        self._stop_requested = True
+        if self.engine is not None:
+            self.engine.interrupt()
+
+    def _on_backfill_progress(self, task_name: str, processed: int, total: int):
+        """转发回填进度，并按 10% 间隔写日志"""
+        self.backfill_progress.emit(task_name, processed, total)
+        percent = processed * 100 // total if total > 0 else 100
+        if percent // 10 > self._logged_percent.get(task_name, -1) // 10:
+            self._logged_percent[task_name] = percent
+            logger.info(f"[RETENTION] 回填 {task_name}: {processed}/{total} ({percent}%)")
+
+    def run(self):
+        try:
+            db = get_database()
+            # 先完成迁移遗留的回填任务和暂存回收，再做保留清理
+            db.run_pending_backfills(
+                progress_callback=self._on_backfill_progress,
+                should_stop=lambda: self._stop_requested
+            )
+            StagingReaper(db=db).reap(should_stop=lambda: self._stop_requested)
+            if self.engine is None:
+                self.engine = RetentionEngine(db=db)
+            result = self.engine.run_maintenance(should_stop=lambda: self._stop_requested)
+            result.stopped = result.stopped or self._stop_requested
+            self.maintenance_completed.emit(result.to_dict())
+        except Exception as e:
+            logger.error(f"[RETENTION] 维护任务失败: {e}")
+            self.maintenance_completed.emit({'errors': {'maintenance': str(e)}})
+        finally:
+            # 关闭本线程的数据库连接
+            get_database().close()
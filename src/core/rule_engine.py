@@ -7,7 +7,7 @@ import re
 import json
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Callable
 from datetime import datetime, timedelta
 
 
@@ -375,28 +375,36 @@ class RuleEngine:
         if path in self.user_feedback:
             return self.user_feedback[path]
 
-        # 2. 检查内置规则（按优先级：危险 > 疑似 > 安全）
-        # 先检查危险规则
-        dangerous_matches = [r for r in self.rules if r.risk_level == RiskLevel.DANGEROUS]
-        for rule in dangerous_matches:
-            if self._matches_rule(path, size, last_accessed, is_file, rule):
-                return RiskLevel.DANGEROUS
-
-        # 检查疑似规则
-        suspicious_matches = [r for r in self.rules if r.risk_level == RiskLevel.SUSPICIOUS]
-        for rule in suspicious_matches:
-            if self._matches_rule(path, size, last_accessed, is_file, rule):
-                return RiskLevel.SUSPICIOUS
-
-        # 检查安全规则
-        safe_matches = [r for r in self.rules if r.risk_level == RiskLevel.SAFE]
-        for rule in safe_matches:
-            if self._matches_rule(path, size, last_accessed, is_file, rule):
-                return RiskLevel.SAFE
+        # 2. 检查规则（按优先级：危险 > 疑似 > 安全）
+        rule = self.match_rule(path, size, last_accessed, is_file)
+        if rule is not None:
+            return rule.risk_level
 
         # 3. 默认为疑似
         return RiskLevel.SUSPICIOUS
 
+    def match_rule(self, path: str, size: int = 0, last_accessed: Optional[datetime] = None,
+                   is_file: bool = True) -> Optional[Rule]:
+        """查找决定分类结果的规则（不考虑用户反馈）
+
+        按优先级 危险 > 疑似 > 安全 依次检查，返回第一个匹配的规则
+
+        Args:
+            path: 文件/文件夹路径
+            size: 大小（字节）
+            last_accessed: 最后访问时间
+            is_file: 是否为文件（False 为文件夹）
+
+        Returns:
+            Optional[Rule]: 匹配的规则，无匹配时返回 None
+        """
+        for risk_level in (RiskLevel.DANGEROUS, RiskLevel.SUSPICIOUS, RiskLevel.SAFE):
+            for rule in self.rules:
+                if rule.risk_level == risk_level and \
+                   self._matches_rule(path, size, last_accessed, is_file, rule):
+                    return rule
+        return None
+
     def evaluate_path(self, path: str, size: int = 0, last_accessed=None,
                       is_file: bool = True) -> RiskLevel:
         """
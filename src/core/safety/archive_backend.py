@@ -0,0 +1,324 @@
+"""
+回收站归档后端
+将文件/文件夹打包为可恢复的归档文件，供 CustomRecycleBin 使用
+
+- zip: 标准库实现，已压缩格式（图片、音视频、压缩包等）直接存储不再压缩，
+  其余文件使用低压缩级别的 DEFLATE，以 I/O 速度为主
+- zstd: 安装 zstandard 时可用，tar 流经多线程 zstd 压缩写出（.tar.zst），
+  已压缩格式的成员写入最快级别的独立帧
+
+默认使用 zip：中央目录支持随机读取，选择性恢复不必顺序解压整个归档。
+恢复时按归档扩展名选择后端，因此旧的 .zip 归档始终可以恢复。
+
+符号链接、设备文件等特殊条目无法可靠还原，write 遇到时抛出 UnsupportedEntryError，
+由调用方改用系统回收站，原始文件保持不动。
+
+write 返回归档清单 [(归档内名称, 大小)]，供回收站缓存后选择性恢复单个文件：
+zip 按中央目录随机读取成员，tar.zst 流式解压到所需成员后即停止。
+"""
+import os
+import stat
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+
+# 已压缩的文件格式，再次压缩几乎没有收益
+INCOMPRESSIBLE_EXTENSIONS = frozenset({
+    # 图片
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif', '.jxl',
+    # 音视频
+    '.mp3', '.aac', '.m4a', '.ogg', '.opus', '.flac', '.wma',
+    '.mp4', '.m4v', '.mkv', '.avi', '.mov', '.webm', '.wmv', '.flv',
+    # 压缩包与安装包
+    '.zip', '.7z', '.rar', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4', '.br',
+    '.cab', '.msi', '.jar', '.apk', '.nupkg', '.whl',
+    # 内部已压缩的文档与字体
+    '.docx', '.xlsx', '.pptx', '.pdf', '.woff', '.woff2',
+})
+
+
+def is_incompressible(path: str) -> bool:
+    """根据扩展名判断文件是否已压缩"""
+    return os.path.splitext(path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS
+
+
+# 归档清单: [(归档内名称, 原始大小)]
+Manifest = List[Tuple[str, int]]
+
+
+class UnsupportedEntryError(OSError):
+    """项目中包含无法归档后还原的条目（符号链接、设备文件等）"""
+
+
+def _walk(item_path: str) -> Iterator[Tuple[str, str, int, bool]]:
+    """遍历待归档的条目（目录先于其内容）
+
+    Yields:
+        (路径, 归档内名称, 大小, 是否目录)，归档内名称以项目名开头
+
+    Raises:
+        UnsupportedEntryError: 遇到普通文件和目录以外的条目
+    """
+    base = os.path.dirname(item_path)
+    mode = os.lstat(item_path).st_mode
+    if stat.S_ISREG(mode):
+        yield item_path, os.path.basename(item_path), os.path.getsize(item_path), False
+        return
+    if not stat.S_ISDIR(mode):
+        raise UnsupportedEntryError(f"不支持归档的条目: {item_path}")
+
+    stack = [item_path]
+    while stack:
+        current = stack.pop()
+        yield current, os.path.relpath(current, base).replace(os.sep, '/'), 0, True
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield (entry.path, os.path.relpath(entry.path, base).replace(os.sep, '/'),
+                           entry.stat(follow_symlinks=False).st_size, False)
+                else:
+                    raise UnsupportedEntryError(f"不支持归档的条目: {entry.path}")
+
+
+def _iter_files(item_path: str) -> Iterator[Tuple[str, str, int]]:
+    """遍历待归档的文件
+
+    Yields:
+        (文件路径, 归档内名称, 大小)，归档内名称以项目名开头
+
+    Raises:
+        UnsupportedEntryError: 遇到普通文件和目录以外的条目
+    """
+    for path, arcname, size, is_dir in _walk(item_path):
+        if not is_dir:
+            yield path, arcname, size
+
+
+class ArchiveBackend:
+    """归档后端基类"""
+
+    name = ''
+    extension = ''
+
+    def write(self, item_path: str, archive_path: str) -> Manifest:
+        """将 item_path 归档到 archive_path，返回归档清单"""
+        raise NotImplementedError
+
+    def extract(self, archive_path: str, dest_dir: str):
+        """将归档解压到 dest_dir"""
+        raise NotImplementedError
+
+    def members(self, archive_path: str) -> Manifest:
+        """读取归档清单（用于没有缓存清单的旧归档）"""
+        raise NotImplementedError
+
+    def open_members(self, archive_path: str,
+                     names: Iterable[str]) -> Iterator[Tuple[str, BinaryIO]]:
+        """按需读取部分成员
+
+        Yields:
+            (归档内名称, 只读文件对象)，文件对象仅在下一次迭代前有效
+        """
+        raise NotImplementedError
+
+
+class ZipArchiveBackend(ArchiveBackend):
+    """zip 归档（按文件选择存储或 DEFLATE）"""
+
+    name = 'zip'
+    extension = '.zip'
+
+    def __init__(self, compresslevel: int = 1):
+        self.compresslevel = compresslevel
+
+    def write(self, item_path: str, archive_path: str) -> Manifest:
+        manifest = []
+        # 先完整遍历，遇到不支持的条目时不做任何压缩
+        files = list(_iter_files(item_path))
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED,
+                             compresslevel=self.compresslevel) as zf:
+            for file_path, arcname, size in files:
+                if is_incompressible(file_path):
+                    zf.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+                else:
+                    zf.write(file_path, arcname)
+                manifest.append((arcname, size))
+        return manifest
+
+    def extract(self, archive_path: str, dest_dir: str):
+        with zipfile.ZipFile(archive_path, 'r') as zf:
+            zf.extractall(dest_dir)
+
+    def members(self, archive_path: str) -> Manifest:
+        with zipfile.ZipFile(archive_path, 'r') as zf:
+            return [(info.filename, info.file_size) for info in zf.infolist() if not info.is_dir()]
+
+    def open_members(self, archive_path: str,
+                     names: Iterable[str]) -> Iterator[Tuple[str, BinaryIO]]:
+        # 中央目录随机访问，只解压所需成员
+        with zipfile.ZipFile(archive_path, 'r') as zf:
+            for name in names:
+                with zf.open(name) as f:
+                    yield name, f
+
+
+class _FrameWriter:
+    """tar 写入目标：按成员类型切换 zstd 帧
+
+    可压缩成员与已压缩成员分别写入不同压缩级别的独立帧，连续的同类成员共用一帧。
+    tarfile 以非流模式写入时不缓冲，成员边界即帧边界。
+    """
+
+    def __init__(self, f: BinaryIO, compressors: Tuple['zstandard.ZstdCompressor', ...]):
+        self._f = f
+        self._compressors = compressors
+        self._writer = None
+        self._current = None
+        self._pos = 0
+
+    def select(self, index: int):
+        """后续写入使用 compressors[index]"""
+        if index == self._current:
+            return
+        self._finish_frame()
+        self._writer = self._compressors[index].stream_writer(self._f, closefd=False)
+        self._current = index
+
+    def write(self, data) -> int:
+        self._writer.write(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._finish_frame()
+
+    def _finish_frame(self):
+        if self._writer is not None:
+            self._writer.flush(zstandard.FLUSH_FRAME)
+            self._writer.close()
+            self._writer = None
+            self._current = None
+
+
+class ZstdArchiveBackend(ArchiveBackend):
+    """tar + zstd 流式归档（需要 zstandard）"""
+
+    name = 'zstd'
+    extension = '.tar.zst'
+
+    # 已压缩成员使用的级别：最快，基本只做原样存储
+    STORE_LEVEL = -100
+
+    def __init__(self, level: int = 3, threads: int = -1):
+        if not HAS_ZSTD:
+            raise RuntimeError('zstandard 未安装')
+        self.level = level
+        self.threads = threads
+
+    def write(self, item_path: str, archive_path: str) -> Manifest:
+        manifest = []
+        # 先完整遍历，遇到不支持的条目时不做任何压缩
+        entries = list(_walk(item_path))
+        compressors = (
+            zstandard.ZstdCompressor(level=self.level, threads=self.threads),
+            zstandard.ZstdCompressor(level=self.STORE_LEVEL, threads=self.threads),
+        )
+        with open(archive_path, 'wb') as f:
+            out = _FrameWriter(f, compressors)
+            out.select(0)
+            with tarfile.open(fileobj=out, mode='w', format=tarfile.PAX_FORMAT) as tar:
+                for path, arcname, size, is_dir in entries:
+                    out.select(1 if not is_dir and is_incompressible(path) else 0)
+                    tar.add(path, arcname=arcname, recursive=False)
+                    if not is_dir:
+                        manifest.append((arcname, size))
+                out.select(0)
+            out.close()
+        return manifest
+
+    def extract(self, archive_path: str, dest_dir: str):
+        decompressor = zstandard.ZstdDecompressor()
+        with open(archive_path, 'rb') as f:
+            with decompressor.stream_reader(f, read_across_frames=True) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    if hasattr(tarfile, 'data_filter'):
+                        tar.extractall(dest_dir, filter='data')
+                    else:
+                        tar.extractall(dest_dir)
+
+    def members(self, archive_path: str) -> Manifest:
+        decompressor = zstandard.ZstdDecompressor()
+        with open(archive_path, 'rb') as f:
+            with decompressor.stream_reader(f, read_across_frames=True) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    return [(info.name, info.size) for info in tar if info.isfile()]
+
+    def open_members(self, archive_path: str,
+                     names: Iterable[str]) -> Iterator[Tuple[str, BinaryIO]]:
+        # tar 流不能随机访问：顺序解压，所需成员全部读到后立即停止
+        wanted = set(names)
+        if not wanted:
+            return
+        decompressor = zstandard.ZstdDecompressor()
+        with open(archive_path, 'rb') as f:
+            with decompressor.stream_reader(f, read_across_frames=True) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    for info in tar:
+                        if info.name in wanted and info.isfile():
+                            yield info.name, tar.extractfile(info)
+                            wanted.discard(info.name)
+                            if not wanted:
+                                return
+
+
+def get_archive_backend(name: str = 'auto', level: Optional[int] = None) -> ArchiveBackend:
+    """获取归档后端
+
+    Args:
+        name: 'auto'（zip，支持随机读取成员）、'zip' 或 'zstd'
+        level: 压缩级别，None 使用后端默认值
+
+    Returns:
+        ArchiveBackend
+    """
+    if name == 'auto':
+        name = 'zip'
+
+    if name == 'zstd' and HAS_ZSTD:
+        return ZstdArchiveBackend(level=level) if level is not None else ZstdArchiveBackend()
+    return ZipArchiveBackend(compresslevel=level) if level is not None else ZipArchiveBackend()
+
+
+def backend_for_archive(filename: str) -> Optional[ArchiveBackend]:
+    """根据归档文件名选择解压后端"""
+    if filename.endswith(ZstdArchiveBackend.extension):
+        return ZstdArchiveBackend() if HAS_ZSTD else None
+    if filename.endswith(ZipArchiveBackend.extension):
+        return ZipArchiveBackend()
+    return None
+
+
+def is_archive_name(filename: str) -> bool:
+    """是否为回收站支持的归档文件名"""
+    return filename.endswith((ZipArchiveBackend.extension, ZstdArchiveBackend.extension))
+
+
+def archive_stem(filename: str) -> str:
+    """去掉归档扩展名"""
+    for ext in (ZstdArchiveBackend.extension, ZipArchiveBackend.extension):
+        if filename.endswith(ext):
+            return filename[:-len(ext)]
+    return filename
+
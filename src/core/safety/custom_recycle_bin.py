@@ -2,16 +2,24 @@
 自定义回收站模块
 支持将删除的文件压缩保存到指定目录，以便恢复
 支持扫描和管理回收站内的所有文件（包括用户手动添加的）
+
+归档格式由 archive_backend 提供：已压缩的文件直接存储，批量回收时多个项目并行压缩。
+回收时缓存归档清单，可以只恢复归档中的部分文件而不解压整个归档。
 """
 import os
 import shutil
-import zipfile
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
+from .archive_backend import (
+    ArchiveBackend, get_archive_backend, backend_for_archive, is_archive_name, archive_stem
+)
+from .recycle_catalog import RecycleCatalog, CATALOG_FILES
+from ..tree_deleter import delete_tree
+
 
 @dataclass
 class RecycleItem:
@@ -34,54 +42,29 @@ class CustomRecycleBin:
     将删除的文件压缩保存到指定目录，支持恢复功能
     """
 
-    def __init__(self, recycle_path: Optional[str] = None):
+    def __init__(self, recycle_path: Optional[str] = None,
+                 backend: Optional[ArchiveBackend] = None, max_workers: int = 4):
         """
         初始化自定义回收站
 
         Args:
             recycle_path: 回收站路径，如果为 None 使用默认路径
+            backend: 归档后端，None 时使用 zip
+            max_workers: 批量回收时的并行压缩线程数
         """
         if not recycle_path:
             recycle_path = os.path.join(os.path.expanduser('~'), 'PurifyAI_RecycleBin')
 
         self.recycle_path = os.path.normpath(recycle_path)
+        self.backend = backend or get_archive_backend()
+        self.max_workers = max(1, max_workers)
         self._ensure_recycle_dir()
 
     def _ensure_recycle_dir(self):
         """确保回收站目录存在"""
         os.makedirs(self.recycle_path, exist_ok=True)
-        # 创建索引文件
-        self._init_index()
-
-    def _get_index_file(self) -> str:
-        """获取索引文件路径"""
-        return os.path.join(self.recycle_path, 'recycle_index.json')
-
-    def _init_index(self):
-        """初始化索引文件"""
-        index_file = self._get_index_file()
-        if not os.path.exists(index_file):
-            self._save_index({'items': []})
-
-    def _load_index(self) -> Dict[str, Any]:
-        """加载索引"""
-        index_file = self._get_index_file()
-        try:
-            with open(index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {'items': []}
-
-    def _save_index(self, index: Dict[str, Any]):
-        """保存索引"""
-        index_file = self._get_index_file()
-        try:
-            with open(index_file, 'w', encoding='utf-8') as f:
-                json.dump(index, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            # 如果保存失败，至少打印错误
-            import logging
-            logging.error(f"[回收站:ERROR] 保存索引失败: {e}")
+        # 打开项目目录（首次打开时导入旧的 JSON 索引）
+        self.catalog = RecycleCatalog(self.recycle_path)
 
     def recycle_item(self, item_path: str, original_size: int,
                      description: str = '', risk_level: str = 'safe') -> bool:
@@ -101,51 +84,13 @@ class CustomRecycleBin:
             return False
 
         try:
-            # 生成唯一ID
-            item_id = self._generate_item_id(item_path)
-            timestamp = datetime.now().isoformat()
-
-            # 创建临时压缩文件路径
-            zip_name = f"{item_id}.zip"
-            zip_path = os.path.join(self.recycle_path, zip_name)
-
-            # 压缩文件
-            item_name = os.path.basename(item_path)
-            if os.path.isdir(item_path):
-                # 压缩整个目录
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    for root, dirs, files in os.walk(item_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, os.path.dirname(item_path))
-                            zf.write(file_path, arcname)
-            else:
-                # 压缩单个文件
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    zf.write(item_path, item_name)
+            item_info = self._archive_item(item_path, original_size, description, risk_level)
 
             # 记录到索引
-            index = self._load_index()
-            item_info = {
-                'id': item_id,
-                'original_path': os.path.normpath(item_path),
-                'original_name': item_name,
-                'description': description,
-                'risk_level': risk_level,
-                'original_size': original_size,
-                'zip_size': os.path.getsize(zip_path),
-                'deleted_at': timestamp,
-                'zip_file': zip_name
-            }
-            index['items'].append(item_info)
-            self._save_index(index)
+            self.catalog.add(item_info)
 
             # 删除原始文件/文件夹
-            if os.path.isdir(item_path):
-                shutil.rmtree(item_path)
-            else:
-                os.remove(item_path)
-
+            self._remove_original(item_path)
             return True
 
         except Exception as e:
@@ -153,6 +98,111 @@ class CustomRecycleBin:
             logging.error(f"[回收站:ERROR] 回收项目失败 {item_path}: {e}")
             return False
 
+    def recycle_items(self, items: List[Dict[str, Any]],
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, bool]:
+        """
+        批量回收项目（并行压缩）
+
+        压缩全部完成后一次性写入索引，再删除原始文件，
+        保证任何原始文件被删除前其归档已登记。
+
+        Args:
+            items: 项目列表，每项为 recycle_item 的关键字参数
+                   (item_path, original_size, description, risk_level)
+            progress: 进度回调 (已完成数, 总数)
+            should_stop: 返回 True 时不再提交新的压缩任务
+
+        Returns:
+            Dict[str, bool]: 路径 -> 是否成功回收
+        """
+        results = {item['item_path']: False for item in items}
+        pending = [item for item in items if os.path.exists(item['item_path'])]
+        total = len(pending)
+        archived: List[Tuple[str, Dict[str, Any]]] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='purifyai-recycle') as pool:
+            futures = {}
+            for item in pending:
+                if should_stop and should_stop():
+                    break
+                future = pool.submit(
+                    self._archive_item, item['item_path'], item.get('original_size', 0),
+                    item.get('description', ''), item.get('risk_level', 'safe')
+                )
+                futures[future] = item['item_path']
+
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    archived.append((path, future.result()))
+                except Exception as e:
+                    import logging
+                    logging.error(f"[回收站:ERROR] 回收项目失败 {path}: {e}")
+                if progress:
+                    progress(done, total)
+
+            if not archived:
+                return results
+
+            self.catalog.add_many(info for _, info in archived)
+
+            removals = {pool.submit(self._remove_original, path): path for path, _ in archived}
+            for future in as_completed(removals):
+                path = removals[future]
+                try:
+                    future.result()
+                    results[path] = True
+                except Exception as e:
+                    import logging
+                    logging.error(f"[回收站:ERROR] 删除原始项目失败 {path}: {e}")
+
+        return results
+
+    def _archive_item(self, item_path: str, original_size: int,
+                      description: str, risk_level: str) -> Dict[str, Any]:
+        """压缩单个项目，返回索引记录（不修改索引、不删除原始文件）"""
+        # 生成唯一ID
+        item_id = self._generate_item_id(item_path)
+        timestamp = datetime.now().isoformat()
+
+        archive_name = f"{item_id}{self.backend.extension}"
+        archive_path = os.path.join(self.recycle_path, archive_name)
+
+        try:
+            manifest = self.backend.write(item_path, archive_path)
+        except Exception:
+            # 不留下不完整的归档
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            raise
+
+        return {
+            'id': item_id,
+            'original_path': os.path.normpath(item_path),
+            'original_name': os.path.basename(item_path),
+            'description': description,
+            'risk_level': risk_level,
+            'original_size': original_size,
+            'zip_size': os.path.getsize(archive_path),
+            'deleted_at': timestamp,
+            'zip_file': archive_name,
+            'archive_format': self.backend.name,
+            'manifest': manifest
+        }
+
+    @staticmethod
+    def _remove_original(item_path: str):
+        """删除已归档的原始文件/文件夹"""
+        if os.path.isdir(item_path) and not os.path.islink(item_path):
+            result = delete_tree(item_path)
+            if not result.success:
+                path, error = result.failures[0]
+                raise OSError(f"{len(result.failures)} 项删除失败，首个: {path}: {error}")
+        else:
+            os.remove(item_path)
+
     def restore_item(self, item_id: str, target_path: Optional[str] = None) -> bool:
         """
         恢复回收站中的项目
@@ -164,24 +214,17 @@ class CustomRecycleBin:
         Returns:
             bool: 是否成功恢复
         """
-        index = self._load_index()
-
-        # 查找项目
-        item_info = None
-        item_index = -1
-        for i, item in enumerate(index['items']):
-            if item['id'] == item_id:
-                item_info = item
-                item_index = i
-                break
-
+        # 先取出记录，同一项目的并发恢复只有一方继续
+        item_info = self.catalog.claim(item_id)
         if not item_info:
             return False
 
         try:
             # 解压文件
             zip_path = os.path.join(self.recycle_path, item_info['zip_file'])
-            if not os.path.exists(zip_path):
+            backend = backend_for_archive(item_info['zip_file'])
+            if not os.path.exists(zip_path) or backend is None:
+                self.catalog.add(item_info)
                 return False
 
             # 确定目标路径
@@ -201,17 +244,15 @@ class CustomRecycleBin:
 
             # 解压
             extract_dir = os.path.dirname(target_path)
-            with zipfile.ZipFile(zip_path, 'r') as zf:
-                zf.extractall(extract_dir)
+            backend.extract(zip_path, extract_dir)
 
             # 如果解压后的文件名不匹配，重命名
             extracted = os.path.join(extract_dir, item_info['original_name'])
             if extracted != target_path and os.path.exists(extracted):
                  shutil.move(extracted, target_path)
 
-            # 从索引中移除
-            index['items'].pop(item_index)
-            self._save_index(index)
+            # 从索引中移除（含归档清单）
+            self.catalog.remove(item_id)
 
             # 删除压缩文件
             try:
@@ -224,8 +265,90 @@ class CustomRecycleBin:
         except Exception as e:
             import logging
             logging.error(f"[回收站:ERROR] 恢复项目失败 {item_id}: {e}")
+            # 放回记录，之后可以重试
+            self.catalog.add(item_info)
             return False
 
+    def list_archive_contents(self, item_id: str) -> List[Dict[str, Any]]:
+        """
+        列出项目归档中的文件
+
+        优先使用回收时缓存的清单，旧归档首次查询时读取归档并缓存。
+
+        Args:
+            item_id: 项目ID
+
+        Returns:
+            List[Dict[str, Any]]: [{'name': 归档内名称, 'size': 原始大小}]
+        """
+        item_info = self.catalog.get(item_id)
+        if not item_info:
+            return []
+
+        manifest = self.catalog.get_manifest(item_id)
+        if manifest is None:
+            zip_path = os.path.join(self.recycle_path, item_info['zip_file'])
+            backend = backend_for_archive(item_info['zip_file'])
+            if backend is None or not os.path.exists(zip_path):
+                return []
+            try:
+                manifest = backend.members(zip_path)
+            except Exception as e:
+                import logging
+                logging.error(f"[回收站:ERROR] 读取归档清单失败 {item_id}: {e}")
+                return []
+            self.catalog.set_manifest(item_id, manifest)
+
+        return [{'name': name, 'size': size} for name, size in manifest]
+
+    def restore_files(self, item_id: str, names: List[str],
+                      target_dir: Optional[str] = None) -> List[str]:
+        """
+        从项目归档中恢复部分文件（不解压整个归档，项目仍保留在回收站中）
+
+        Args:
+            item_id: 项目ID
+            names: 要恢复的归档内名称（来自 list_archive_contents）
+            target_dir: 目标目录，None 时恢复到原始位置
+
+        Returns:
+            List[str]: 恢复后的文件路径
+        """
+        item_info = self.catalog.get(item_id)
+        if not item_info or not names:
+            return []
+
+        zip_path = os.path.join(self.recycle_path, item_info['zip_file'])
+        backend = backend_for_archive(item_info['zip_file'])
+        if backend is None or not os.path.exists(zip_path):
+            return []
+
+        # 归档内名称相对于原路径的父目录
+        base_dir = os.path.normpath(target_dir or os.path.dirname(item_info['original_path']))
+        restored = []
+        try:
+            for name, src in backend.open_members(zip_path, names):
+                dest = os.path.normpath(os.path.join(base_dir, *name.split('/')))
+                if not dest.startswith(base_dir + os.sep):
+                    import logging
+                    logging.warning(f"[回收站] 跳过越界的归档成员: {name}")
+                    continue
+
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                if os.path.exists(dest):
+                    # 添加时间戳后缀
+                    base, ext = os.path.splitext(dest)
+                    dest = f"{base}{datetime.now().strftime('_%Y%m%d_%H%M%S')}{ext}"
+
+                with open(dest, 'wb') as out:
+                    shutil.copyfileobj(src, out)
+                restored.append(dest)
+        except Exception as e:
+            import logging
+            logging.error(f"[回收站:ERROR] 恢复文件失败 {item_id}: {e}")
+
+        return restored
+
     def list_items(self, risk_level: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         列出回收站中的项目
@@ -236,18 +359,22 @@ class CustomRecycleBin:
         Returns:
             List[Dict[str, Any]]: 项目列表
         """
-        index = self._load_index()
-
-        items = []
-        for item in index['items']:
-            if risk_level is None or item.get('risk_level') == risk_level:
-                # 检查压缩文件是否仍存在
-                zip_path = os.path.join(self.recycle_path, item['zip_file'])
-                item['exists'] = os.path.exists(zip_path)
-                items.append(item)
+        # 一次列出目录，不再逐个检查压缩文件
+        present = self._archive_names()
+        items = self.catalog.list_items(risk_level)
+        for item in items:
+            item['exists'] = item['zip_file'] in present
 
         return items
 
+    def _archive_names(self) -> set:
+        """回收站目录中的文件名"""
+        try:
+            with os.scandir(self.recycle_path) as entries:
+                return {entry.name for entry in entries}
+        except OSError:
+            return set()
+
     def scan_all_items(self) -> List[Dict[str, Any]]:
         """
         扫描回收站目录中的所有项目（包括未管理的）
@@ -258,9 +385,7 @@ class CustomRecycleBin:
             - unmanaged_zip: 压缩文件但没有索引记录
             - regular: 普通文件或目录
         """
-        index = self._load_index()
-        indexed_zips = {item['zip_file'] for item in index['items']}
-        indexed_ids = {item['id'] for item in index['items']}
+        indexed = {item['zip_file']: item for item in self.catalog.list_items()}
 
         all_items = []
 
@@ -270,7 +395,7 @@ class CustomRecycleBin:
                 entry_name = entry.name
 
                 # 跳过索引文件
-                if entry_name == 'recycle_index.json':
+                if entry_name in CATALOG_FILES:
                     continue
 
                 # 获取文件信息
@@ -305,17 +430,15 @@ class CustomRecycleBin:
                     # 文件项
                     file_size = entry.stat(follow_symlinks=False).st_size
 
-                    if entry_name.endswith('.zip'):
+                    if is_archive_name(entry_name):
                         # 压缩文件
-                        if entry_name in indexed_zips:
+                        if entry_name in indexed:
                             # 已管理的压缩文件，从索引获取信息
-                            for item in index['items']:
-                                if item['zip_file'] == entry_name:
-                                    item['exists'] = True
-                                    item['is_managed'] = True
-                                    item['type'] = 'managed'
-                                    all_items.append(item.copy())
-                                    break
+                            item = indexed[entry_name]
+                            item['exists'] = True
+                            item['is_managed'] = True
+                            item['type'] = 'managed'
+                            all_items.append(item)
                         else:
                             # 未管理的压缩文件
                             item_data = {
@@ -324,7 +447,7 @@ class CustomRecycleBin:
                                 'name': entry_name,
                                 'path': entry.path,
                                 'original_path': '',
-                                'original_name': entry_name.replace('.zip', ''),
+                                'original_name': archive_stem(entry_name),
                                 'description': '用户添加',
                                 'risk_level': 'unknown',
                                 'original_size': file_size,
@@ -361,19 +484,11 @@ class CustomRecycleBin:
             return False
 
         try:
-            if file_path.endswith('.zip'):
-                # 解压压缩文件
-                if target_path is None:
-                    # 默认解压到当前目录
-                    extract_dir = os.path.dirname(file_path)
-                    with zipfile.ZipFile(file_path, 'r') as zf:
-                        zf.extractall(extract_dir)
-                    return True
-                else:
-                    # 解压到指定位置
-                    with zipfile.ZipFile(file_path, 'r') as zf:
-                        zf.extractall(target_path)
-                    return True
+            backend = backend_for_archive(file_path)
+            if backend is not None:
+                # 解压压缩文件，默认解压到当前目录
+                backend.extract(file_path, target_path or os.path.dirname(file_path))
+                return True
             else:
                 # 普通文件，移动到指定位置
                 if target_path is None:
@@ -415,24 +530,19 @@ class CustomRecycleBin:
         Returns:
             bool: 是否成功删除
         """
-        index = self._load_index()
-
-        # 查找并移除项目
-        for i, item in enumerate(index['items']):
-            if item['id'] == item_id:
-                # 删除压缩文件
-                zip_path = os.path.join(self.recycle_path, item['zip_file'])
-                try:
-                    os.remove(zip_path)
-                except:
-                    pass
+        item = self.catalog.get(item_id)
+        if not item:
+            return False
 
-                # 从索引移除
-                index['items'].pop(i)
-                self._save_index(index)
-                return True
+        # 删除压缩文件
+        zip_path = os.path.join(self.recycle_path, item['zip_file'])
+        try:
+            os.remove(zip_path)
+        except:
+            pass
 
-        return False
+        # 从索引移除
+        return self.catalog.remove(item_id)
 
     def clear_all(self) -> int:
         """
@@ -441,11 +551,10 @@ class CustomRecycleBin:
         Returns:
             int: 清除的项目数
         """
-        index = self._load_index()
-        count = len(index['items'])
+        items = self.catalog.list_items()
 
         # 删除所有压缩文件
-        for item in index['items']:
+        for item in items:
             zip_path = os.path.join(self.recycle_path, item['zip_file'])
             try:
                 os.remove(zip_path)
@@ -453,10 +562,7 @@ class CustomRecycleBin:
                 pass
 
         # 清空索引
-        index['items'] = []
-        self._save_index(index)
-
-        return count
+        return self.catalog.clear()
 
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -465,23 +571,9 @@ class CustomRecycleBin:
         Returns:
             Dict[str, Any]: 统计信息
         """
-        items = self.list_items()
-        total_size = sum(item.get('original_size', 0) for item in items)
-        zip_size = sum(item.get('zip_size', 0) for item in items)
-
-        # 按风险等级统计
-        by_risk = {}
-        for item in items:
-            risk = item.get('risk_level', 'unknown')
-            by_risk[risk] = by_risk.get(risk, 0) + 1
-
-        return {
-            'total_items': len(items),
-            'total_size': total_size,
-            'zip_size': zip_size,
-            'by_risk': by_risk,
-            'saved_space': total_size - zip_size
-        }
+        stats = self.catalog.stats()
+        stats['saved_space'] = stats['total_size'] - stats['zip_size']
+        return stats
 
     def _generate_item_id(self, path: str) -> str:
         """生成唯一项目ID"""
@@ -505,27 +597,16 @@ class CustomRecycleBin:
         cutoff = datetime.now() - timedelta(days=days)
         cutoff_str = cutoff.isoformat()
 
-        index = self._load_index()
-        removed_count = 0
-        new_items = []
-
-        for item in index['items']:
-            if item.get('deleted_at', '') < cutoff_str:
-                # 删除压缩文件
-                zip_path = os.path.join(self.recycle_path, item['zip_file'])
-                try:
-                    os.remove(zip_path)
-                except:
-                    pass
-                removed_count += 1
-            else:
-                new_items.append(item)
-
-        if removed_count > 0:
-            index['items'] = new_items
-            self._save_index(index)
+        old_items = self.catalog.list_before(cutoff_str)
+        for item in old_items:
+            # 删除压缩文件
+            zip_path = os.path.join(self.recycle_path, item['zip_file'])
+            try:
+                os.remove(zip_path)
+            except:
+                pass
 
-        return removed_count
+        return self.catalog.remove_many([item['id'] for item in old_items])
 
 
 # 全局实例
@@ -0,0 +1,312 @@
+"""
+回收站目录 - SQLite实现
+
+替代原先的 recycle_index.json：每次回收/恢复/删除只写入受影响的行，
+按 id 主键、原始路径、风险等级、删除时间建立索引。
+写入在事务中完成（WAL 模式），进程中断不会留下半截索引。
+
+首次打开时自动导入旧的 recycle_index.json，导入后重命名为 .migrated。
+
+recycle_manifest 缓存每个归档的成员清单，列出归档内容无需打开归档。
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+CATALOG_FILE_NAME = 'recycle_catalog.db'
+LEGACY_INDEX_NAME = 'recycle_index.json'
+
+# 目录自身的文件（扫描回收站目录时跳过）
+CATALOG_FILES = frozenset({
+    CATALOG_FILE_NAME, f'{CATALOG_FILE_NAME}-wal', f'{CATALOG_FILE_NAME}-shm',
+    f'{CATALOG_FILE_NAME}-journal', LEGACY_INDEX_NAME, f'{LEGACY_INDEX_NAME}.migrated',
+})
+
+_COLUMNS = (
+    'id', 'original_path', 'original_name', 'description', 'risk_level',
+    'original_size', 'zip_size', 'deleted_at', 'zip_file', 'archive_format',
+)
+
+
+class RecycleCatalog:
+    """回收站项目目录"""
+
+    # 单条 IN 查询的最大变量数（SQLite 默认上限 999）
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, recycle_path: str):
+        """初始化目录
+
+        Args:
+            recycle_path: 回收站目录，数据库文件保存在其中
+        """
+        self.recycle_path = recycle_path
+        self.db_path = os.path.join(recycle_path, CATALOG_FILE_NAME)
+        self._local = threading.local()
+        self._init_database()
+        self._import_legacy_index()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的复用连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _init_database(self):
+        """初始化表结构"""
+        conn = self._get_connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS recycle_items (
+                id TEXT PRIMARY KEY,
+                original_path TEXT NOT NULL,
+                original_name TEXT NOT NULL,
+                description TEXT DEFAULT '',
+                risk_level TEXT DEFAULT 'safe',
+                original_size INTEGER DEFAULT 0,
+                zip_size INTEGER DEFAULT 0,
+                deleted_at TEXT NOT NULL,
+                zip_file TEXT NOT NULL,
+                archive_format TEXT DEFAULT 'zip'
+            );
+            CREATE INDEX IF NOT EXISTS idx_recycle_original_path ON recycle_items(original_path);
+            CREATE INDEX IF NOT EXISTS idx_recycle_risk ON recycle_items(risk_level);
+            CREATE INDEX IF NOT EXISTS idx_recycle_deleted_at ON recycle_items(deleted_at);
+            CREATE INDEX IF NOT EXISTS idx_recycle_zip_file ON recycle_items(zip_file);
+            CREATE TABLE IF NOT EXISTS recycle_manifest (
+                item_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER DEFAULT 0,
+                PRIMARY KEY (item_id, name)
+            ) WITHOUT ROWID;
+        ''')
+        conn.commit()
+
+    def _import_legacy_index(self):
+        """导入旧版 JSON 索引"""
+        legacy = os.path.join(self.recycle_path, LEGACY_INDEX_NAME)
+        if not os.path.exists(legacy):
+            return
+
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = data.get('items', []) if isinstance(data, dict) else data
+            if not isinstance(entries, list):
+                entries = []
+                logger.warning("[回收站] 旧索引格式无法识别，未导入任何项目")
+
+            items = [item for item in entries if self._is_valid_legacy_item(item)]
+            if len(items) < len(entries):
+                logger.warning(f"[回收站] 旧索引中 {len(entries) - len(items)} 项格式错误，已跳过")
+            self.add_many(items)
+            os.replace(legacy, legacy + '.migrated')
+            logger.info(f"[回收站] 已导入旧索引 {len(items)} 项")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logger.error(f"[回收站] 导入旧索引失败: {e}")
+
+    @staticmethod
+    def _is_valid_legacy_item(item: Any) -> bool:
+        """旧索引条目是否包含登记所需的字段"""
+        return isinstance(item, dict) and all(
+            isinstance(item.get(key), str) and item.get(key)
+            for key in ('id', 'original_path', 'deleted_at', 'zip_file')
+        )
+
+    @staticmethod
+    def _row_values(item: Dict[str, Any]) -> tuple:
+        return (
+            item['id'],
+            item['original_path'],
+            item.get('original_name') or os.path.basename(item['original_path']),
+            item.get('description', ''),
+            item.get('risk_level', 'safe'),
+            item.get('original_size', 0),
+            item.get('zip_size', 0),
+            item['deleted_at'],
+            item['zip_file'],
+            item.get('archive_format', 'zip'),
+        )
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def add(self, item: Dict[str, Any]):
+        """登记单个项目"""
+        self.add_many([item])
+
+    def add_many(self, items: Iterable[Dict[str, Any]]):
+        """在一个事务中登记多个项目（含 manifest 键时一并写入归档清单）"""
+        items = list(items)
+        placeholders = ', '.join('?' for _ in _COLUMNS)
+        conn = self._get_connection()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO recycle_items ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                [self._row_values(item) for item in items]
+            )
+            for item in items:
+                if item.get('manifest'):
+                    self._write_manifest(conn, item['id'], item['manifest'])
+
+    def set_manifest(self, item_id: str, manifest: List[Tuple[str, int]]):
+        """缓存项目的归档清单"""
+        conn = self._get_connection()
+        with conn:
+            self._write_manifest(conn, item_id, manifest)
+
+    @staticmethod
+    def _write_manifest(conn: sqlite3.Connection, item_id: str, manifest: List[Tuple[str, int]]):
+        conn.execute('DELETE FROM recycle_manifest WHERE item_id = ?', (item_id,))
+        conn.executemany(
+            'INSERT OR REPLACE INTO recycle_manifest (item_id, name, size) VALUES (?, ?, ?)',
+            [(item_id, name, size) for name, size in manifest]
+        )
+
+    def claim(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """原子地取出项目记录（并发恢复同一项目时只有一方成功）
+
+        记录从目录中删除，归档清单保留；处理失败时用 add 放回。
+
+        Returns:
+            项目记录，不存在或已被取出返回 None
+        """
+        conn = self._get_connection()
+        with conn:
+            row = conn.execute('SELECT * FROM recycle_items WHERE id = ?', (item_id,)).fetchone()
+            if row is None:
+                return None
+            cursor = conn.execute('DELETE FROM recycle_items WHERE id = ?', (item_id,))
+        return dict(row) if cursor.rowcount > 0 else None
+
+    def remove(self, item_id: str) -> bool:
+        """移除项目记录
+
+        Returns:
+            是否存在该记录
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM recycle_items WHERE id = ?', (item_id,))
+            conn.execute('DELETE FROM recycle_manifest WHERE item_id = ?', (item_id,))
+        return cursor.rowcount > 0
+
+    def remove_many(self, item_ids: List[str]) -> int:
+        """批量移除项目记录
+
+        Returns:
+            移除的记录数
+        """
+        removed = 0
+        conn = self._get_connection()
+        with conn:
+            for i in range(0, len(item_ids), self.QUERY_CHUNK_SIZE):
+                chunk = item_ids[i:i + self.QUERY_CHUNK_SIZE]
+                placeholders = ', '.join('?' for _ in chunk)
+                cursor = conn.execute(f"DELETE FROM recycle_items WHERE id IN ({placeholders})", chunk)
+                conn.execute(f"DELETE FROM recycle_manifest WHERE item_id IN ({placeholders})", chunk)
+                removed += cursor.rowcount
+        return removed
+
+    def clear(self) -> int:
+        """清空目录
+
+        Returns:
+            清除的记录数
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM recycle_items')
+            conn.execute('DELETE FROM recycle_manifest')
+        return cursor.rowcount
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """按 id 查询项目"""
+        row = self._get_connection().execute(
+            'SELECT * FROM recycle_items WHERE id = ?', (item_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_manifest(self, item_id: str) -> Optional[List[Tuple[str, int]]]:
+        """获取缓存的归档清单
+
+        Returns:
+            [(归档内名称, 大小)]，未缓存返回 None
+        """
+        rows = self._get_connection().execute(
+            'SELECT name, size FROM recycle_manifest WHERE item_id = ? ORDER BY name', (item_id,)
+        ).fetchall()
+        return [(row['name'], row['size']) for row in rows] if rows else None
+
+    def get_by_zip_file(self, zip_file: str) -> Optional[Dict[str, Any]]:
+        """按归档文件名查询项目"""
+        row = self._get_connection().execute(
+            'SELECT * FROM recycle_items WHERE zip_file = ?', (zip_file,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_original_path(self, original_path: str) -> List[Dict[str, Any]]:
+        """按原始路径查询项目（最近删除的在前）"""
+        rows = self._get_connection().execute(
+            'SELECT * FROM recycle_items WHERE original_path = ? ORDER BY deleted_at DESC',
+            (os.path.normpath(original_path),)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_items(self, risk_level: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出项目（按删除时间排序）"""
+        if risk_level is None:
+            rows = self._get_connection().execute(
+                'SELECT * FROM recycle_items ORDER BY deleted_at'
+            ).fetchall()
+        else:
+            rows = self._get_connection().execute(
+                'SELECT * FROM recycle_items WHERE risk_level = ? ORDER BY deleted_at', (risk_level,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_before(self, cutoff: str) -> List[Dict[str, Any]]:
+        """列出删除时间早于 cutoff（ISO 格式）的项目"""
+        rows = self._get_connection().execute(
+            'SELECT * FROM recycle_items WHERE deleted_at < ?', (cutoff,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """汇总统计"""
+        conn = self._get_connection()
+        count, total_size, zip_size = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(original_size), 0), COALESCE(SUM(zip_size), 0) FROM recycle_items'
+        ).fetchone()
+        by_risk = {
+            row['risk_level'] or 'unknown': row['n']
+            for row in conn.execute('SELECT risk_level, COUNT(*) AS n FROM recycle_items GROUP BY risk_level')
+        }
+        return {
+            'total_items': count,
+            'total_size': total_size,
+            'zip_size': zip_size,
+            'by_risk': by_risk,
+        }
@@ -2,9 +2,11 @@
 定时清理调度器模块
 使用 QTimer 实现后台调度
 支持每日定时清理和磁盘空间阈值触发
+支持空闲时段的数据库维护（历史数据保留 + VACUUM/ANALYZE）
 """
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from typing import Optional
+import psutil
 from PyQt5.QtCore import QObject, pyqtSignal, QTimer
 from PyQt5.QtWidgets import QApplication
 
@@ -33,6 +35,8 @@ class Scheduler(QObject):
     scheduler_started = pyqtSignal()  # 调度器启动
     scheduler_stopped = pyqtSignal()  # 调度器停止
     next_run_time = pyqtSignal(str)  # 下次运行时间
+    maintenance_progress = pyqtSignal(str, int, int)  # 迁移回填进度 (任务名, 已处理 rowid, 最大 rowid)
+    maintenance_completed = pyqtSignal(dict)  # 数据库维护完成
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -55,6 +59,15 @@ class Scheduler(QObject):
         # 磁盘检查间隔（分钟）
         self.disk_check_interval = 30
 
+        # 数据库维护（空闲时执行，与清理调度是否启用无关）
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self._on_maintenance_timer)
+        self.maintenance_enabled = True
+        self.maintenance_interval = timedelta(hours=24)  # 两次维护的最短间隔
+        self.maintenance_cpu_threshold = 20.0  # CPU 占用低于该值（%）视为空闲
+        self._maintenance_thread = None
+        self._last_maintenance_time = None
+
         self._load_settings()
 
     def _load_settings(self):
@@ -77,6 +90,15 @@ class Scheduler(QObject):
         # 加载磁盘阈值
         self.disk_threshold = self.config_mgr.get('scheduler/disk_threshold', 10)
 
+        # 加载数据库维护设置
+        self.maintenance_enabled = self.config_mgr.get('retention/enabled', True)
+        last_maintenance = self.config_mgr.get('retention/last_run')
+        if last_maintenance:
+            try:
+                self._last_maintenance_time = datetime.fromisoformat(last_maintenance)
+            except ValueError:
+                self._last_maintenance_time = None
+
     def _save_settings(self):
         """保存设置"""
         self.config_mgr.set('scheduler/enabled', self.enabled)
@@ -248,6 +270,68 @@ class Scheduler(QObject):
         else:
             return '未启用'
 
+    # ========== 数据库维护 ==========
+
+    def start_maintenance(self, check_interval_minutes: int = 15):
+        """启动空闲维护检查
+
+        Args:
+            check_interval_minutes: 检查间隔（分钟）
+        """
+        if not self.maintenance_enabled:
+            return
+        # 初始化 CPU 采样基线，下一次调用返回两次调用之间的平均占用
+        psutil.cpu_percent(interval=None)
+        self.maintenance_timer.start(check_interval_minutes * 60000)
+
+    def stop_maintenance(self):
+        """停止空闲维护检查，并等待正在运行的维护结束
+
+        维护线程在批次之间检查停止请求，正在执行的 VACUUM/ANALYZE 会被中止，
+        因此等待时间有界；必须等到线程退出，不能在写库途中销毁线程。
+        """
+        self.maintenance_timer.stop()
+        if self._maintenance_thread and self._maintenance_thread.isRunning():
+            self._maintenance_thread.request_stop()
+            self._maintenance_thread.wait()
+
+    def is_idle(self) -> bool:
+        """系统是否空闲（自上次采样以来 CPU 平均占用低于阈值）"""
+        return psutil.cpu_percent(interval=None) < self.maintenance_cpu_threshold
+
+    def is_maintenance_due(self) -> bool:
+        """距上次维护是否已超过维护间隔"""
+        if self._last_maintenance_time is None:
+            return True
+        return datetime.now() - self._last_maintenance_time >= self.maintenance_interval
+
+    def _on_maintenance_timer(self):
+        """维护检查回调：到期且空闲时在后台线程执行维护"""
+        if self._maintenance_thread and self._maintenance_thread.isRunning():
+            return
+        if not self.is_maintenance_due() or not self.is_idle():
+            return
+        self.run_maintenance()
+
+    def run_maintenance(self):
+        """立即在后台线程执行数据库维护"""
+        if self._maintenance_thread and self._maintenance_thread.isRunning():
+            return
+
+        from .retention import MaintenanceThread
+
+        self._maintenance_thread = MaintenanceThread(parent=self)
+        self._maintenance_thread.backfill_progress.connect(self.maintenance_progress)
+        self._maintenance_thread.maintenance_completed.connect(self._on_maintenance_completed)
+        self._maintenance_thread.start()
+
+    def _on_maintenance_completed(self, result: dict):
+        """维护完成（只有完整且无错误的运行才记录为上次维护时间，否则下次空闲时重试）"""
+        if not result.get('stopped') and not result.get('errors'):
+            self._last_maintenance_time = datetime.now()
+            self.config_mgr.set('retention/last_run', self._last_maintenance_time.isoformat())
+        self.maintenance_completed.emit(result)
+
     def get_status(self) -> dict:
         """
         获取调度器状态
@@ -274,6 +274,7 @@ class SmartCleanConfig:
     # 执行配置
     max_retries: int = 3                 # 最大重试次数
     abort_on_error: bool = False         # 出错时中止
+    parallel_workers: int = 1            # 并行删除线程数（1 为顺序执行）
 
     # 过滤配置
     min_size_mb: int = 0                 # 最小文件大小 (MB)
@@ -767,7 +768,8 @@ class SmartCleaner(QObject):
         # 准备执行配置
         execution_config = ExecutionConfig(
             max_retries=self.config.max_retries,
-            enable_backup=self.config.enable_backup
+            enable_backup=self.config.enable_backup,
+            parallel_workers=self.config.parallel_workers
         )
 
         # 启动执行
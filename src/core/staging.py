@@ -0,0 +1,254 @@
+"""
+暂存删除 (Delete-by-Rename Staging)
+
+删除大型目录时用户需要等待整棵树被逐项删除。暂存模式将删除拆成两个阶段:
+
+1. 暂存: 将目标原子重命名到同卷的暂存目录（每项 O(1)），清理流程立即完成
+2. 回收: 超过宽限期（默认 72 小时，配置 staging/grace_hours）的暂存项
+   由空闲时段的维护任务（core/retention.py MaintenanceThread）按节流间隔真正删除
+
+暂存项通过 BackupManager.register_staged 登记到 recovery_log
+(backup_type = 'staged')，在被回收前可以重命名回原路径恢复。
+回收后 backup_path 置空，记录保留用于历史查看。
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from .database import Database, get_database
+from .config_manager import get_config_manager
+from .tree_deleter import delete_tree
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+STAGING_DIR_NAME = '.purifyai_staging'
+DEFAULT_GRACE_HOURS = 72
+
+
+def staging_grace_seconds() -> float:
+    """暂存项的回收宽限期（秒），读取配置 staging/grace_hours"""
+    hours = get_config_manager().get('staging/grace_hours', DEFAULT_GRACE_HOURS)
+    return max(0.0, float(hours)) * 3600
+
+
+def _volume_root(path: str) -> str:
+    """获取路径所在卷的挂载点（Windows 为盘符根目录）"""
+    path = os.path.abspath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class StagingArea:
+    """同卷暂存目录管理
+
+    优先使用卷根目录下的暂存目录（每卷一个，便于回收），
+    无权限时回退到目标所在目录下的暂存目录。
+    """
+
+    def __init__(self, dir_name: str = STAGING_DIR_NAME, base_dir: Optional[str] = None):
+        """初始化暂存区
+
+        Args:
+            dir_name: 暂存目录名
+            base_dir: 固定的暂存目录父目录（None 时使用卷根目录）
+        """
+        self.dir_name = dir_name
+        self.base_dir = base_dir
+        # 卷根/父目录 -> 可用的暂存目录（None 表示不可用）
+        self._dirs: Dict[str, Optional[str]] = {}
+
+    def _try_dir(self, base: str, device: int) -> Optional[str]:
+        if base in self._dirs:
+            return self._dirs[base]
+
+        staging_dir = os.path.join(base, self.dir_name)
+        try:
+            os.makedirs(staging_dir, exist_ok=True)
+            if os.stat(staging_dir).st_dev != device:
+                staging_dir = None
+        except OSError:
+            staging_dir = None
+
+        self._dirs[base] = staging_dir
+        return staging_dir
+
+    def staging_dir_for(self, path: str) -> Optional[str]:
+        """获取与 path 同卷的暂存目录
+
+        Args:
+            path: 待删除的路径
+
+        Returns:
+            暂存目录，无法创建返回 None
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        try:
+            device = os.stat(parent).st_dev
+        except OSError:
+            return None
+
+        base = self.base_dir if self.base_dir is not None else _volume_root(parent)
+        return self._try_dir(base, device) or self._try_dir(parent, device)
+
+    def stage(self, path: str) -> Optional[str]:
+        """将 path 重命名到暂存目录
+
+        Args:
+            path: 待删除的路径
+
+        Returns:
+            暂存路径，失败（跨卷、被占用等）返回 None，由调用方回退到直接删除
+        """
+        staging_dir = self.staging_dir_for(path)
+        if staging_dir is None:
+            return None
+
+        # 暂存目录本身或其中的内容不再暂存
+        abs_path = os.path.abspath(path)
+        if abs_path == staging_dir or abs_path.startswith(staging_dir + os.sep):
+            return None
+
+        staged_path = os.path.join(
+            staging_dir, f"{uuid.uuid4().hex[:12]}_{os.path.basename(abs_path)}"
+        )
+        try:
+            os.rename(abs_path, staged_path)
+        except OSError as e:
+            logger.debug(f"[STAGING] 暂存失败，回退到直接删除: {path}, 原因: {e}")
+            return None
+        return staged_path
+
+
+class StagingReaper:
+    """暂存回收器
+
+    按登记顺序删除超过宽限期的暂存项，每项之间休眠 throttle_delay 秒，
+    避免与前台 I/O 争抢磁盘。
+    """
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        grace_seconds: Optional[float] = None,
+        throttle_delay: float = 0.05,
+        batch_size: int = 200
+    ):
+        """初始化回收器
+
+        Args:
+            db: 数据库实例
+            grace_seconds: 宽限期（秒），暂存未超过该时长的项目暂不回收
+                (None 时读取配置 staging/grace_hours)
+            throttle_delay: 每项删除后的休眠时间（秒）
+            batch_size: 每次查询的记录数
+        """
+        self.db = db or get_database()
+        self.grace_seconds = staging_grace_seconds() if grace_seconds is None else grace_seconds
+        self.throttle_delay = throttle_delay
+        self.batch_size = max(1, batch_size)
+
+    def reap(self, should_stop: Optional[Callable[[], bool]] = None) -> Tuple[int, int]:
+        """回收暂存项
+
+        Args:
+            should_stop: 返回 True 时在项目之间停止
+
+        Returns:
+            (回收数, 失败数)
+        """
+        before = (datetime.now() - timedelta(seconds=self.grace_seconds)).isoformat()
+        reaped = 0
+        failed = 0
+        failed_ids = set()
+
+        while True:
+            rows = [
+                row for row in self.db.get_staged_recovery_logs(before, self.batch_size + len(failed_ids))
+                if row['id'] not in failed_ids
+            ]
+            if not rows:
+                break
+
+            done = []
+            for row in rows:
+                if should_stop and should_stop():
+                    self.db.clear_recovery_backup_paths(done)
+                    return reaped + len(done), failed
+
+                if self._delete(row['backup_path']):
+                    done.append(row['id'])
+                else:
+                    failed_ids.add(row['id'])
+                    failed += 1
+
+                if self.throttle_delay:
+                    time.sleep(self.throttle_delay)
+
+            self.db.clear_recovery_backup_paths(done)
+            reaped += len(done)
+
+        if reaped or failed:
+            logger.info(f"[STAGING] 回收暂存项: 成功 {reaped}, 失败 {failed}")
+        return reaped, failed
+
+    @staticmethod
+    def _delete(path: str) -> bool:
+        """删除单个暂存项（不存在视为成功）"""
+        try:
+            if os.path.islink(path) or os.path.isfile(path):
+                os.remove(path)
+            elif os.path.isdir(path):
+                result = delete_tree(path)
+                if not result.success:
+                    logger.warning(f"[STAGING] 暂存项未完全删除: {path}, {len(result.failures)} 项失败")
+                    return False
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            logger.warning(f"[STAGING] 删除暂存项失败: {path}, 原因: {e}")
+            return False
+
+
+class ReaperThread(QThread):
+    """后台回收线程（以最低优先级启动）
+
+    Signals:
+        reap_completed: (int, int) - 回收数, 失败数
+    """
+
+    reap_completed = pyqtSignal(int, int)
+
+    def __init__(self, reaper: Optional[StagingReaper] = None, parent=None):
+        super().__init__(parent)
+        self.reaper = reaper
+        self._stop_requested = False
+
+    def request_stop(self):
+        """请求在项目之间停止"""
+        self._stop_requested = True
+
+    def start(self, priority=QThread.IdlePriority):
+        super().start(priority)
+
+    def run(self):
+        reaper = self.reaper or StagingReaper()
+        try:
+            reaped, failed = reaper.reap(should_stop=lambda: self._stop_requested)
+            self.reap_completed.emit(reaped, failed)
+        except Exception as e:
+            logger.error(f"[STAGING] 回收任务失败: {e}")
+            self.reap_completed.emit(0, 0)
+        finally:
+            # 关闭本线程的数据库连接
+            reaper.db.close()
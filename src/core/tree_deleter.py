@@ -0,0 +1,269 @@
+"""
+单遍目录树删除 (Tree Deleter)
+
+shutil.rmtree 失败后，旧实现会先遍历整棵树清除只读属性，再遍历一次逐项删除，
+大型缓存目录最多被遍历三次。
+
+本模块用 os.scandir 自底向上一次遍历完成删除:
+- POSIX 上通过 dir_fd 相对打开/删除，避免重复解析长路径，也不会跟随符号链接
+- 只读/被锁定的条目就地处理（清除只读属性后重试一次）
+- 无法删除的条目记录到失败列表，不中断也不重新遍历
+
+Example:
+    result = delete_tree('/path/to/cache')
+    if not result.success:
+        for path, error in result.failures:
+            ...
+"""
+import os
+import stat
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# POSIX 上需要 scandir(fd) / open(dir_fd) / unlink(dir_fd) 支持才能走 fd 路径
+_USE_DIR_FD = (
+    os.name != 'nt'
+    and os.scandir in os.supports_fd
+    and os.open in os.supports_dir_fd
+    and os.unlink in os.supports_dir_fd
+    and os.rmdir in os.supports_dir_fd
+)
+
+_DIR_OPEN_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_NOFOLLOW', 0)
+
+
+@dataclass
+class TreeDeleteResult:
+    """目录树删除结果
+
+    Attributes:
+        path: 删除的根路径
+        deleted_files: 删除的文件（含符号链接）数
+        deleted_dirs: 删除的目录数
+        failures: 删除失败的 (路径, 错误信息)
+    """
+    path: str
+    deleted_files: int = 0
+    deleted_dirs: int = 0
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        """是否全部删除成功"""
+        return not self.failures
+
+    def add_failure(self, path: str, error: OSError):
+        self.failures.append((path, error.strerror or str(error)))
+
+
+def _is_junction(entry: os.DirEntry) -> bool:
+    """Windows 目录联接只删除联接本身，不进入目标目录"""
+    is_junction = getattr(entry, 'is_junction', None)
+    if is_junction is not None:
+        return is_junction()
+    try:
+        st = entry.stat(follow_symlinks=False)
+    except OSError:
+        return False
+    return bool(getattr(st, 'st_file_attributes', 0) & getattr(stat, 'FILE_ATTRIBUTE_REPARSE_POINT', 0))
+
+
+def _make_writable(path: str, dir_fd: Optional[int] = None):
+    """清除只读属性（失败忽略，由调用方的重试报告错误）"""
+    try:
+        if dir_fd is not None:
+            os.chmod(path, stat.S_IRWXU, dir_fd=dir_fd)
+        else:
+            os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+    except OSError:
+        pass
+
+
+def _make_fd_writable(fd: int):
+    """放开目录权限，使其中的条目可以删除"""
+    try:
+        os.fchmod(fd, stat.S_IRWXU)
+    except OSError:
+        pass
+
+
+def _retry_writable(func, name: str, dir_fd: Optional[int], fix: Callable[[], None]):
+    """执行删除，遇到权限错误时调用 fix 清除只读属性后重试一次"""
+    kwargs = {'dir_fd': dir_fd} if dir_fd is not None else {}
+    try:
+        func(name, **kwargs)
+    except PermissionError:
+        fix()
+        func(name, **kwargs)
+
+
+class _TreeDeleter:
+    """单次删除任务的遍历状态"""
+
+    def __init__(self, root: str):
+        self.result = TreeDeleteResult(path=root)
+
+    # ------------------------------------------------------------------
+    # POSIX: dir_fd 相对操作
+    # ------------------------------------------------------------------
+
+    def delete_fd(self, dir_fd: int, path: str) -> bool:
+        """删除 dir_fd 指向目录下的所有内容
+
+        Returns:
+            目录是否已清空
+        """
+        empty = True
+        with os.scandir(dir_fd) as entries:
+            for entry in entries:
+                child = os.path.join(path, entry.name)
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    try:
+                        child_fd = os.open(entry.name, _DIR_OPEN_FLAGS, dir_fd=dir_fd)
+                    except PermissionError:
+                        # 目录不可读：放开权限后重试
+                        _make_writable(entry.name, dir_fd)
+                        try:
+                            child_fd = os.open(entry.name, _DIR_OPEN_FLAGS, dir_fd=dir_fd)
+                        except OSError as e:
+                            self.result.add_failure(child, e)
+                            empty = False
+                            continue
+                    except OSError as e:
+                        self.result.add_failure(child, e)
+                        empty = False
+                        continue
+
+                    try:
+                        child_empty = self.delete_fd(child_fd, child)
+                    finally:
+                        os.close(child_fd)
+
+                    if not child_empty:
+                        empty = False
+                        continue
+                    try:
+                        os.rmdir(entry.name, dir_fd=dir_fd)
+                        self.result.deleted_dirs += 1
+                    except OSError as e:
+                        self.result.add_failure(child, e)
+                        empty = False
+                else:
+                    try:
+                        # 删除文件需要父目录可写
+                        _retry_writable(os.unlink, entry.name, dir_fd, lambda: _make_fd_writable(dir_fd))
+                        self.result.deleted_files += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        self.result.add_failure(child, e)
+                        empty = False
+        return empty
+
+    # ------------------------------------------------------------------
+    # Windows / 无 dir_fd 支持: 路径操作
+    # ------------------------------------------------------------------
+
+    def delete_path(self, path: str) -> bool:
+        """删除 path 目录下的所有内容
+
+        Returns:
+            目录是否已清空
+        """
+        empty = True
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False) and not _is_junction(entry)
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    try:
+                        child_empty = self.delete_path(entry.path)
+                    except OSError as e:
+                        self.result.add_failure(entry.path, e)
+                        empty = False
+                        continue
+
+                    if not child_empty:
+                        empty = False
+                        continue
+                    try:
+                        _retry_writable(os.rmdir, entry.path, None, lambda: _make_writable(entry.path))
+                        self.result.deleted_dirs += 1
+                    except OSError as e:
+                        self.result.add_failure(entry.path, e)
+                        empty = False
+                else:
+                    try:
+                        if entry.is_dir(follow_symlinks=True) and not entry.is_symlink():
+                            # 目录联接
+                            _retry_writable(os.rmdir, entry.path, None, lambda: _make_writable(entry.path))
+                        else:
+                            _retry_writable(os.unlink, entry.path, None, lambda: _make_writable(entry.path))
+                        self.result.deleted_files += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        self.result.add_failure(entry.path, e)
+                        empty = False
+        return empty
+
+
+def delete_tree(path: str) -> TreeDeleteResult:
+    """单遍自底向上删除目录树（包括根目录本身）
+
+    不抛出单个条目的删除错误，失败条目记录在 result.failures 中；
+    根目录不存在时返回空结果。
+
+    Args:
+        path: 目录路径
+
+    Returns:
+        TreeDeleteResult
+    """
+    deleter = _TreeDeleter(path)
+    result = deleter.result
+
+    try:
+        if _USE_DIR_FD:
+            parent, name = os.path.split(os.path.abspath(path))
+            parent_fd = os.open(parent, _DIR_OPEN_FLAGS)
+            try:
+                try:
+                    root_fd = os.open(name, _DIR_OPEN_FLAGS, dir_fd=parent_fd)
+                except PermissionError:
+                    _make_writable(name, parent_fd)
+                    root_fd = os.open(name, _DIR_OPEN_FLAGS, dir_fd=parent_fd)
+                try:
+                    empty = deleter.delete_fd(root_fd, path)
+                finally:
+                    os.close(root_fd)
+                if empty:
+                    os.rmdir(name, dir_fd=parent_fd)
+                    result.deleted_dirs += 1
+            finally:
+                os.close(parent_fd)
+        else:
+            if deleter.delete_path(path):
+                _retry_writable(os.rmdir, path, None, lambda: _make_writable(path))
+                result.deleted_dirs += 1
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        result.add_failure(path, e)
+
+    if result.failures:
+        logger.debug(f"[TREE_DELETE] {path}: {len(result.failures)} 项删除失败")
+    return result
@@ -0,0 +1,108 @@
+"""
+卷标识与嵌套路径门控 (Volume Keys / Nested Path Gate)
+
+并行清理和批量恢复按目标所在的卷分组，限制同一卷上的在途任务数，
+避免机械硬盘因随机寻道退化。
+
+同一批中的路径可能互相嵌套（目录及其中的文件）。NestedPathGate 保证
+祖先路径与其下路径的任务按固定先后执行（清理时后代在前，恢复时祖先在前），
+重复路径按原有顺序依次执行，与顺序执行时的结果一致。
+
+Example:
+    cache = {}
+    for path in paths:
+        queues.setdefault(volume_key(path, cache), deque()).append(path)
+"""
+import os
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+
+def volume_key(path: str, cache: Dict[str, object]) -> object:
+    """获取路径所在卷的标识
+
+    Windows 使用盘符（含 UNC 共享），其他平台使用父目录的设备号。
+
+    Args:
+        path: 文件路径
+        cache: 父目录 -> 卷标识缓存，避免重复 stat
+
+    Returns:
+        卷标识
+    """
+    if os.name == 'nt':
+        return os.path.splitdrive(os.path.abspath(path))[0].upper()
+
+    parent = os.path.dirname(os.path.abspath(path))
+    key = cache.get(parent)
+    if key is None:
+        try:
+            key = os.stat(parent).st_dev
+        except OSError:
+            key = parent
+        cache[parent] = key
+    return key
+
+
+def path_key(path: str) -> str:
+    """规范化路径，用于比较两个路径是否指向同一位置"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class NestedPathGate:
+    """嵌套路径的执行门控
+
+    任务以在 paths 中的下标标识。任务 i 在以下任务全部完成前不放行:
+    - 路径位于 paths[i] 之下的任务（ancestors_first 时改为 paths[i] 的祖先路径任务）
+    - 路径与 paths[i] 相同且排在它之前的任务
+    """
+
+    def __init__(self, paths: Sequence[str], ancestors_first: bool = False):
+        keys = [path_key(path) for path in paths]
+        by_key: Dict[str, List[int]] = {}
+        for index, key in enumerate(keys):
+            by_key.setdefault(key, []).append(index)
+        # 重复路径串成链：每个任务只阻塞同路径的下一个任务
+        next_same: Dict[int, int] = {}
+        for indices in by_key.values():
+            next_same.update(zip(indices, indices[1:]))
+
+        # 任务完成后解除阻塞的任务列表，以及每个任务尚未完成的阻塞数
+        self._unblocks: List[List[int]] = [[] for _ in keys]
+        self._blockers: List[int] = [0] * len(keys)
+        for index, key in enumerate(keys):
+            if index in next_same:
+                self._add_edge(index, next_same[index])
+            parent = os.path.dirname(key)
+            while parent != key:
+                for ancestor in by_key.get(parent, ()):
+                    if ancestors_first:
+                        self._add_edge(ancestor, index)
+                    else:
+                        self._add_edge(index, ancestor)
+                key, parent = parent, os.path.dirname(parent)
+
+    def _add_edge(self, before: int, after: int):
+        self._unblocks[before].append(after)
+        self._blockers[after] += 1
+
+    def ready(self, index: int) -> bool:
+        """任务是否可以开始"""
+        return self._blockers[index] == 0
+
+    def done(self, index: int):
+        """标记任务完成（包括失败和跳过）"""
+        for target in self._unblocks[index]:
+            self._blockers[target] -= 1
+
+    def pop_ready(self, queue: deque) -> Optional[int]:
+        """从队列中取出第一个可以开始的任务
+
+        Returns:
+            任务下标，队列中没有可开始的任务时返回 None
+        """
+        for position, index in enumerate(queue):
+            if self.ready(index):
+                del queue[position]
+                return index
+        return None
@@ -668,6 +668,18 @@ class AgentHubPage(QWidget):
         """添加 AI 思考"""
         self.thinking_stream.add_thinking(thought)
 
+    def connect_agent_stream(self, worker):
+        """连接流式智能体工作线程（AgentStreamWorker）到思考流
+
+        信号跨线程排队投递，文本增量在 UI 线程中节流刷新
+        """
+        worker.text_delta.connect(self.thinking_stream.append_assistant_delta)
+        worker.tool_started.connect(self.thinking_stream.add_tool_started)
+        worker.tool_finished.connect(self.thinking_stream.add_tool_finished)
+        worker.turn_finished.connect(lambda _: self.thinking_stream.end_assistant_stream())
+        worker.loop_finished.connect(lambda _: self.thinking_stream.end_assistant_stream())
+        worker.error.connect(self.thinking_stream.add_system_message)
+
     def _update_status_text(self, text: str):
         """更新状态文本"""
         self.status_text.setText(text)
@@ -63,6 +63,7 @@ class MessageBubble(QFrame):
         self.content = content
         self.tool_name = tool_name
         self.collapsed = False
+        self.text_label = None
         self.collapsible = msg_type in [
             MessageType.ASSISTANT,
             MessageType.TOOL,
@@ -190,6 +191,13 @@ class MessageBubble(QFrame):
                 """)
 
             self.content_layout.addWidget(text_label)
+            self.text_label = text_label
+
+    def set_text(self, text: str):
+        """更新内容文本（流式输出时逐步刷新）"""
+        self.content = text
+        if self.text_label is not None:
+            self.text_label.setText(text)
 
     def _toggle_collapse(self):
         """切换折叠状态"""
@@ -238,6 +246,7 @@ class ThinkingStreamWidget(QWidget):
     - 可折叠：点击展开/折叠每条消息
     - 类型区分：文本/工具调用/思考使用不同样式
     - 性能优化：限制消息数量，批量处理更新
+    - 流式输出：文本增量合并后按节流间隔刷新到同一气泡
     """
 
     message_added = pyqtSignal(str)
@@ -255,6 +264,14 @@ class ThinkingStreamWidget(QWidget):
         self._scroll_throttle.setSingleShot(True)
         self._scroll_throttle.timeout.connect(self._do_scroll_to_bottom)
 
+        # 流式输出状态
+        self._stream_bubble = None
+        self._stream_text = ""
+        self._tool_bubbles = {}
+        self._stream_flush = QTimer()
+        self._stream_flush.setSingleShot(True)
+        self._stream_flush.timeout.connect(self._flush_assistant_stream)
+
         self._init_ui()
         self._setup_scroll_behavior()
 
@@ -424,6 +441,8 @@ class ThinkingStreamWidget(QWidget):
         if self.auto_collapse_historical and len(self.messages) > 5:
             self._collapse_historical()
 
+        return bubble
+
     def _do_scroll_to_bottom(self):
         """执行滚动到底部"""
         self.scroll_area.verticalScrollBar().setValue(
@@ -454,6 +473,48 @@ class ThinkingStreamWidget(QWidget):
         """添加系统消息"""
         self._add_message(MessageType.SYSTEM, text)
 
+    def append_assistant_delta(self, text: str):
+        """追加助手流式文本增量
+
+        首个增量立即创建气泡，之后的增量合并，每 VISIBLE_THROTTLE_MS 刷新一次
+        """
+        if self._stream_bubble is None:
+            self._stream_text = ""
+            self._stream_bubble = self._add_message(MessageType.ASSISTANT, "…")
+        self._stream_text += text
+        if not self._stream_flush.isActive():
+            self._stream_flush.start(self.VISIBLE_THROTTLE_MS)
+
+    def end_assistant_stream(self):
+        """结束当前助手流式消息"""
+        if self._stream_bubble is None:
+            return
+        self._stream_flush.stop()
+        self._flush_assistant_stream()
+        self._stream_bubble = None
+        self._stream_text = ""
+        self.message_added.emit(MessageType.ASSISTANT)
+
+    def _flush_assistant_stream(self):
+        """将累积的流式文本刷新到气泡"""
+        if self._stream_bubble is None or self._stream_bubble not in self.messages:
+            return
+        self._stream_bubble.set_text(self._stream_text or "…")
+        if self.auto_scroll:
+            self._scroll_throttle.start(self.VISIBLE_THROTTLE_MS)
+
+    def add_tool_started(self, call_id: str, tool_name: str):
+        """工具开始执行（流式模式下 tool_use 块结束即调用）"""
+        self.end_assistant_stream()
+        self._tool_bubbles[call_id] = self._add_message(MessageType.TOOL, "执行中…", tool_name)
+
+    def add_tool_finished(self, call_id: str, tool_name: str):
+        """工具执行完成"""
+        bubble = self._tool_bubbles.pop(call_id, None)
+        if bubble is not None and bubble in self.messages:
+            bubble.set_text("已完成")
+        self.tool_executed.emit(tool_name, "")
+
     def toggle_collapse_all(self, collapsed: bool):
         """切换所有消息折叠状态"""
         for bubble in self.messages:
@@ -479,6 +540,10 @@ class ThinkingStreamWidget(QWidget):
         for bubble in self.messages:
             bubble.deleteLater()
         self.messages.clear()
+        self._stream_flush.stop()
+        self._stream_bubble = None
+        self._stream_text = ""
+        self._tool_bubbles.clear()
         self._update_count()
         logger.info("[ThinkingStream] 已清空消息历史")
 
@@ -21,6 +21,7 @@ from qfluentwidgets import (
     InfoBarPosition
 )
 from core.safety.custom_recycle_bin import get_custom_recycle_bin, get_custom_recycle_path
+from core.safety.recycle_catalog import CATALOG_FILES
 from core.config_manager import get_config_manager
 
 
@@ -466,7 +467,7 @@ class RecoveryPage(QWidget):
                     if os.path.isdir(entry_path):
                         shutil.rmtree(entry_path)
                         remaining_count += 1
-                    elif entry != 'recycle_index.json':
+                    elif entry not in CATALOG_FILES:
                         try:
                             os.remove(entry_path)
                             remaining_count += 1
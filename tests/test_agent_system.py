@@ -7,7 +7,10 @@
 import pytest
 import tempfile
 import os
+import threading
+import time
 from pathlib import Path
+from types import SimpleNamespace
 
 # 核心导入
 from agent import (
@@ -116,6 +119,446 @@ class TestAgentOrchestrator:
         assert len(orchestrator.sessions) == 0
 
 
+class SleepReadTool(ToolBase):
+    """测试用只读工具（模拟耗时 I/O）"""
+    NAME = "sleep_read"
+    DESCRIPTION = "测试只读工具"
+    READ_ONLY = True
+
+    events = []
+
+    def execute(self, input_json, workspace=None):
+        SleepReadTool.events.append(("start", input_json["id"]))
+        time.sleep(0.2)
+        SleepReadTool.events.append(("end", input_json["id"]))
+        return f"read {input_json['id']}"
+
+    def get_schema(self):
+        return {"type": "object", "properties": {"id": {"type": "integer"}}, "required": ["id"]}
+
+
+class MarkWriteTool(ToolBase):
+    """测试用修改类工具"""
+    NAME = "mark_write"
+    DESCRIPTION = "测试写入工具"
+
+    def execute(self, input_json, workspace=None):
+        SleepReadTool.events.append(("write", input_json["id"]))
+        return f"write {input_json['id']}"
+
+    def get_schema(self):
+        return {"type": "object", "properties": {"id": {"type": "integer"}}, "required": ["id"]}
+
+
+class TestParallelToolCalls:
+    """测试同一轮多个工具调用的并发执行"""
+
+    @pytest.fixture(autouse=True)
+    def tools(self):
+        register_tool(SleepReadTool)
+        register_tool(MarkWriteTool)
+        SleepReadTool.events = []
+        yield
+
+    def _respond(self, orchestrator, monkeypatch, calls):
+        content = [{"type": "text", "text": "处理中"}] + [
+            {"type": "tool_use", "id": f"call_{i}", "name": name, "input": {"id": i}}
+            for i, name in enumerate(calls)
+        ]
+        monkeypatch.setattr(orchestrator, "_call_ai", lambda **kwargs: {
+            "stop_reason": "tool_use", "content": content
+        })
+        orchestrator.create_session(AgentType.SCAN)
+        return orchestrator.process_message("扫描")
+
+    def test_read_only_calls_run_concurrently(self, orchestrator, monkeypatch):
+        """测试只读调用并发执行，结果按原始顺序写回"""
+        start = time.monotonic()
+        result = self._respond(orchestrator, monkeypatch, ["sleep_read"] * 4)
+        elapsed = time.monotonic() - start
+
+        assert elapsed < 0.6
+        assert [r["output"] for r in result["tool_results"]] == [f"read {i}" for i in range(4)]
+
+        session = orchestrator.get_session(result["session_id"])
+        tool_ids = [
+            m.content[0].content["tool_use_id"] for m in session.messages
+            if m.content and m.content[0].type == "tool_result"
+        ]
+        assert tool_ids == [f"call_{i}" for i in range(4)]
+
+    def test_write_calls_are_barriers(self, orchestrator, monkeypatch):
+        """测试修改类工具等待之前的读取完成，之后的读取在其后开始"""
+        result = self._respond(
+            orchestrator, monkeypatch, ["sleep_read", "sleep_read", "mark_write", "sleep_read"]
+        )
+
+        events = SleepReadTool.events
+        write_at = events.index(("write", 2))
+        assert {("end", 0), ("end", 1)} <= set(events[:write_at])
+        assert events[write_at + 1:] == [("start", 3), ("end", 3)]
+        assert result["tool_results"][2]["output"] == "write 2"
+
+
+class FakeMessages:
+    """记录调用参数的 messages 接口"""
+
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(
+            id="msg_test", model=kwargs["model"], stop_reason="end_turn",
+            content=[SimpleNamespace(type="text", text=f"第 {len(self.calls)} 轮")]
+        )
+
+
+class TestAIClientReuse:
+    """测试 API 客户端复用与消息增量转换"""
+
+    def test_api_messages_are_cached_incrementally(self):
+        """测试已转换的消息被复用，系统消息不进入消息列表"""
+        session = AgentSession(session_id="s1", agent_type="scan")
+        session.add_message(AgentRole.SYSTEM, [ContentBlock(type="text", content={"text": "系统"})])
+        session.add_user_message("你好")
+
+        first = session.get_api_messages()
+        assert first == [{"role": "user", "content": [{"type": "text", "text": "你好"}]}]
+
+        session.add_message(AgentRole.USER, [ContentBlock(type="tool_result", content={
+            "tool_use_id": "call_1", "content": "ok", "is_error": False
+        })])
+        second = session.get_api_messages()
+        assert second[0] is first[0]
+        assert second[1]["content"][0]["tool_use_id"] == "call_1"
+
+        # 截断后自动重建
+        session.messages = session.messages[:1]
+        assert session.get_api_messages() == []
+
+    def test_client_shared_and_called_once_per_turn(self, ai_config, monkeypatch):
+        """测试多轮、多编排器共享同一客户端，且每轮只调用一次 API"""
+        from agent import orchestrator as orchestrator_module
+
+        fake = SimpleNamespace(messages=FakeMessages())
+        factory_calls = []
+
+        def fake_factory(api_key, base_url=None):
+            factory_calls.append((api_key, base_url))
+            return fake
+
+        monkeypatch.setattr(orchestrator_module, "get_anthropic_client", fake_factory)
+
+        orch = get_orchestrator(ai_config)
+        session = orch.create_session(AgentType.SCAN)
+        for i in range(3):
+            result = orch.process_message(f"消息 {i}", session.session_id, tools_enabled=False)
+            assert result["response_text"] == f"第 {i + 1} 轮"
+
+        calls = fake.messages.calls
+        assert len(calls) == 3
+        assert [len(c["messages"]) for c in calls] == [1, 3, 5]
+        assert all(m["role"] != "system" for c in calls for m in c["messages"])
+
+    def test_shared_client_reuses_connection(self, ai_config):
+        """测试共享客户端通过本地桩服务器复用同一连接"""
+        pytest.importorskip("anthropic")
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from agent.orchestrator import get_anthropic_client
+
+        peers = []
+
+        class StubHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                peers.append(self.client_address)
+                body = json.dumps({
+                    "id": "msg_stub", "type": "message", "role": "assistant", "model": "stub",
+                    "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+                    "stop_sequence": None, "usage": {"input_tokens": 1, "output_tokens": 1}
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ai_config.base_url = f"http://127.0.0.1:{server.server_port}"
+            assert get_anthropic_client("k", ai_config.base_url) is get_anthropic_client("k", ai_config.base_url)
+
+            for _ in range(2):
+                orch = get_orchestrator(ai_config)
+                session = orch.create_session(AgentType.SCAN)
+                for i in range(3):
+                    orch.process_message(f"消息 {i}", session.session_id, tools_enabled=False)
+
+            assert len(peers) == 6
+            assert len(set(peers)) == 1
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestContextManager:
+    """测试上下文预算管理"""
+
+    def _session(self, turns, output_chars=2000):
+        session = AgentSession(session_id="ctx", agent_type="scan")
+        session.add_message(AgentRole.SYSTEM, [ContentBlock(type="text", content={"text": "系统"})])
+        for i in range(turns):
+            session.add_user_message(f"第 {i} 轮")
+            session.add_message(AgentRole.USER, [ContentBlock(type="tool_result", content={
+                "tool_use_id": f"call_{i}", "tool_name": "grep",
+                "content": "x" * output_chars, "is_error": False
+            })])
+        return session
+
+    def test_long_tool_result_truncated(self):
+        """测试超长工具结果保留首尾"""
+        from agent.context_manager import ContextManager, ContextConfig
+
+        session = self._session(1, output_chars=10000)
+        ContextManager(ContextConfig(max_tool_result_chars=1000)).prepare(session)
+
+        content = session.messages[-1].content[0].content["content"]
+        assert len(content) < 1100
+        assert "省略" in content
+
+    def test_old_results_compacted_within_budget(self):
+        """测试超出预算时压缩早期工具结果，最近的消息保持原样"""
+        from agent.context_manager import ContextManager, ContextConfig
+
+        session = self._session(10)
+        manager = ContextManager(ContextConfig(max_context_tokens=3000, keep_recent_messages=4))
+        messages = manager.prepare(session)
+
+        assert manager.count_tokens(session.messages) <= 3000
+        assert messages[0]["content"][0]["text"] == "第 0 轮"
+        assert messages[1]["content"][0]["content"].startswith("[已压缩] grep")
+        assert messages[-1]["content"][0]["content"] == "x" * 2000
+
+    def test_old_turns_folded_into_digest(self):
+        """测试压缩后仍超预算时折叠为摘要，再次折叠时合并摘要"""
+        from agent.context_manager import ContextManager, ContextConfig, DIGEST_HEADER
+
+        session = self._session(30, output_chars=100)
+        manager = ContextManager(ContextConfig(max_context_tokens=400, keep_recent_messages=4))
+        manager.prepare(session)
+
+        assert session.messages[0].role == AgentRole.SYSTEM
+        digest = session.messages[1].content[0].content["text"]
+        assert digest.startswith(DIGEST_HEADER)
+        assert "- grep 结果: xxx" in digest
+        assert manager.count_tokens(session.messages) <= 400
+
+        first_digest = session.messages[1]
+        for i in range(30, 50):
+            session.add_user_message(f"第 {i} 轮 " + "y" * 200)
+        messages = manager.prepare(session)
+        digests = [m for m in messages if m["content"][0].get("text", "").startswith(DIGEST_HEADER)]
+        assert len(digests) == 1
+        assert first_digest not in session.messages
+        assert manager.count_tokens(session.messages) <= 400
+
+    def test_grep_output_is_compact(self, test_dir):
+        """测试 grep 输出为紧凑 JSON，未请求上下文时不输出上下文行"""
+        import json
+        from agent.tools.file_tools import GrepTool
+
+        with open(os.path.join(test_dir, "a.log"), "w", encoding="utf-8") as f:
+            f.write("ok\nerror here\nok\n")
+
+        output = GrepTool().execute({"pattern": "error", "path": test_dir})
+        assert "\n" not in output
+        result = json.loads(output)
+        assert result["results"] == [
+            {"file": os.path.join(test_dir, "a.log"), "line_number": 2, "line": "error here"}
+        ]
+
+        with_context = json.loads(GrepTool().execute({"pattern": "error", "path": test_dir, "context": 1}))
+        assert len(with_context["results"][0]["context"]) == 3
+
+
+class TestPromptCaching:
+    """测试提示词缓存与缓存 token 统计"""
+
+    def test_tools_schema_memoized(self):
+        """测试工具 Schema 被缓存，注册新工具后失效"""
+        first = get_tools_schema()
+        assert get_tools_schema() is first
+
+        register_tool(DummyTool)
+        assert get_tools_schema() is not first
+
+    def test_request_marks_stable_prefix(self, orchestrator):
+        """测试工具定义、系统提示词和历史末尾被标记为缓存断点"""
+        register_tool(SleepReadTool)
+        session = AgentSession(session_id="cache", agent_type="scan")
+        session.add_user_message("第一轮")
+        session.add_user_message("第二轮")
+        messages = session.get_api_messages()
+        tools = get_tools_schema()
+
+        params = orchestrator._build_request(messages, "系统提示词", tools)
+
+        assert params["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert all("input_schema" in tool for tool in params["tools"])
+        assert params["system"] == [
+            {"type": "text", "text": "系统提示词", "cache_control": {"type": "ephemeral"}}
+        ]
+        assert params["messages"][-1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in params["messages"][0]["content"][-1]
+        # 会话缓存中的消息不被修改
+        assert "cache_control" not in session.get_api_messages()[-1]["content"][-1]
+        # 工具列表未变化时复用转换结果
+        assert orchestrator._build_request(messages, None, tools)["tools"] is params["tools"]
+
+    def test_cache_tokens_reported_to_cost_controller(self, ai_config, test_dir, monkeypatch):
+        """测试每轮的缓存读写 token 记录到成本控制器"""
+        from agent import orchestrator as orchestrator_module
+        from agent.orchestrator import AgentOrchestrator
+        from core.cost_controller import CostController, CostConfig
+
+        usage = SimpleNamespace(
+            input_tokens=100, output_tokens=50,
+            cache_read_input_tokens=1000, cache_creation_input_tokens=200
+        )
+        fake_messages = FakeMessages()
+        create = fake_messages.create
+
+        def create_with_usage(**kwargs):
+            response = create(**kwargs)
+            response.usage = usage
+            return response
+
+        fake_messages.create = create_with_usage
+        monkeypatch.setattr(orchestrator_module, "get_anthropic_client",
+                            lambda api_key, base_url=None: SimpleNamespace(messages=fake_messages))
+
+        controller = CostController(
+            CostConfig(input_cost_per_million=1.0, output_cost_per_million=2.0),
+            config_file=os.path.join(test_dir, "cost.json")
+        )
+        orch = AgentOrchestrator(ai_config, enable_recovery=False, cost_controller=controller)
+        session = orch.create_session(AgentType.SCAN)
+        result = orch.process_message("扫描", session.session_id, tools_enabled=False)
+
+        assert result["usage"]["cache_read_input_tokens"] == 1000
+        stats = controller.get_stats()
+        assert (stats.total_cache_read_tokens, stats.total_cache_write_tokens) == (1000, 200)
+        # 100 + 1000 * 0.1 + 200 * 1.25 = 450 输入单位, 50 输出
+        assert stats.total_cost == pytest.approx((450 * 1.0 + 50 * 2.0) / 1_000_000)
+
+        report = controller.get_usage_report()["prompt_cache"]
+        assert report == {"read_tokens": 1000, "write_tokens": 200, "hit_rate_percent": 76.9}
+
+
+class FakeStream:
+    """模拟 messages.stream 返回的流: 文本增量、tool_use 块结束、最终消息"""
+
+    def __init__(self, tool_ids):
+        self.tool_ids = tool_ids
+        self.tool_started_mid_stream = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        yield SimpleNamespace(type="text", text="先")
+        yield SimpleNamespace(type="text", text="看看")
+        yield SimpleNamespace(type="content_block_stop", index=0,
+                              content_block=SimpleNamespace(type="text", text="先看看"))
+        for i in self.tool_ids:
+            yield SimpleNamespace(type="content_block_stop", index=i + 1, content_block=self._tool(i))
+            # 流尚未结束时工具应已开始执行
+            deadline = time.monotonic() + 2
+            while ("start", i) not in SleepReadTool.events and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.tool_started_mid_stream = ("start", i) in SleepReadTool.events
+        yield SimpleNamespace(type="message_stop")
+
+    @staticmethod
+    def _tool(i):
+        return SimpleNamespace(type="tool_use", id=f"call_{i}", name="sleep_read", input={"id": i})
+
+    def get_final_message(self):
+        return SimpleNamespace(
+            id="msg_stream", model="test", stop_reason="tool_use",
+            content=[SimpleNamespace(type="text", text="先看看")] + [self._tool(i) for i in self.tool_ids],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5)
+        )
+
+
+class TestStreaming:
+    """测试流式输出与工具提前执行"""
+
+    @pytest.fixture(autouse=True)
+    def tools(self):
+        register_tool(SleepReadTool)
+        SleepReadTool.events = []
+        yield
+
+    def test_tools_start_before_stream_ends(self, ai_config, monkeypatch):
+        """测试 tool_use 块结束即开始执行，事件按序发出，结果按原始顺序写回"""
+        from agent import orchestrator as orchestrator_module
+        from agent.orchestrator import AgentOrchestrator
+
+        stream = FakeStream([0, 1])
+        fake_messages = SimpleNamespace(stream=lambda **kwargs: stream)
+        monkeypatch.setattr(orchestrator_module, "get_anthropic_client",
+                            lambda api_key, base_url=None: SimpleNamespace(messages=fake_messages))
+
+        events = []
+        orch = AgentOrchestrator(ai_config, enable_recovery=False)
+        session = orch.create_session(AgentType.SCAN)
+        result = orch.process_message("扫描", session.session_id,
+                                      on_event=lambda kind, data: events.append((kind, data)))
+
+        assert stream.tool_started_mid_stream
+        kinds = [kind for kind, _ in events]
+        assert kinds[:3] == ["text_delta", "text_delta", "tool_use"]
+        assert kinds[-1] == "message_stop"
+        assert sorted(data["call_id"] for kind, data in events if kind == "tool_result") == \
+            ["call_0", "call_1"]
+        assert events[-1][1]["usage"]["input_tokens"] == 10
+
+        assert result["response_text"] == "先看看"
+        assert [r["output"] for r in result["tool_results"]] == ["read 0", "read 1"]
+        tool_ids = [
+            m.content[0].content["tool_use_id"] for m in session.messages
+            if m.content and m.content[0].type == "tool_result"
+        ]
+        assert tool_ids == ["call_0", "call_1"]
+
+    def test_falls_back_to_non_streaming(self, ai_config):
+        """测试流式接口不可用时退回普通调用并补发事件"""
+        from agent.orchestrator import AgentOrchestrator
+
+        events = []
+        orchestrator = AgentOrchestrator(ai_config, enable_recovery=False)
+        orchestrator.create_session(AgentType.SCAN)
+        result = orchestrator.process_message(
+            "扫描", tools_enabled=False, on_event=lambda kind, data: events.append(kind)
+        )
+
+        assert events == ["text_delta", "message_stop"]
+        assert result["response_text"]
+
+
 class TestAgentTools:
     """测试工具系统"""
 
@@ -203,6 +646,182 @@ class TestAgentIntegration:
         assert integration is not None
 
 
+class TestCleanupPipeline:
+    """测试流水线清理流程"""
+
+    class FakeScan:
+        def __init__(self, files_by_root, gate=None):
+            self.files_by_root = files_by_root
+            self.gate = gate
+            self.calls = []
+
+        def scan(self, scan_paths, scan_patterns=None):
+            root = scan_paths[0]
+            self.calls.append(root)
+            if self.gate is not None and len(self.calls) > 1:
+                # 第二个路径等待首块清理完成后才返回扫描结果
+                assert self.gate.wait(5)
+            files = self.files_by_root[root]
+            return {
+                "success": True,
+                "scan_id": root,
+                "files": files,
+                "summary": {"total_files": len(files), "garbage_files": len(files)}
+            }
+
+    class FakeReview:
+        def __init__(self, blocked=(), unsafe=False):
+            self.blocked = set(blocked)
+            self.unsafe = unsafe
+            self.chunks = []
+
+        def review_cleanup_plan(self, items):
+            self.chunks.append([item["path"] for item in items])
+            if self.unsafe:
+                return {"safe_to_proceed": False, "reason": "风险过高"}
+            return {
+                "safe_to_proceed": True,
+                "blocked_items": [{"path": item["path"]} for item in items
+                                  if item["path"] in self.blocked]
+            }
+
+    class FakeCleanup:
+        def __init__(self, gate=None):
+            self.gate = gate
+            self.chunks = []
+
+        def execute_cleanup(self, cleanup_items, is_dry_run=True):
+            self.chunks.append([item["path"] for item in cleanup_items])
+            if self.gate is not None:
+                self.gate.set()
+            return {
+                "total_planned": len(cleanup_items),
+                "deleted_count": len(cleanup_items),
+                "failed_count": 0,
+                "deleted_files": [{"path": item["path"], "size": item["size"]}
+                                  for item in cleanup_items],
+                "failed_files": [],
+                "total_freed_bytes": sum(item["size"] for item in cleanup_items),
+                "is_dry_run": is_dry_run,
+                "success_rate": 1.0
+            }
+
+    @staticmethod
+    def _files(root, count, **extra):
+        return [dict({"path": f"{root}/f{i}", "size": 10, "is_garbage": True,
+                      "risk": "safe"}, **extra) for i in range(count)]
+
+    @pytest.fixture
+    def integration(self):
+        integration = get_agent_integration("")
+        integration.report_agent = SimpleNamespace(
+            generate_report=lambda scan_result, cleanup_result: {
+                "files": len(scan_result["files"]),
+                "deleted": cleanup_result["deleted_count"]
+            }
+        )
+        return integration
+
+    def test_filters_and_merges_chunks(self, integration):
+        """dangerous/非垃圾/重复/被阻断的项目被排除，块结果合并"""
+        files_a = self._files("/a", 3) + [
+            {"path": "/a/keep", "size": 10, "is_garbage": False, "risk": "safe"},
+            {"path": "/a/danger", "size": 10, "is_garbage": True, "risk": "dangerous"},
+        ]
+        # 第二个路径与第一个重叠，/a/f0 不应被重复清理
+        files_b = self._files("/b", 2) + [{"path": "/a/f0", "size": 10,
+                                           "is_garbage": True, "risk": "safe"}]
+        integration.scan_agent = self.FakeScan({"/a": files_a, "/b": files_b})
+        integration.review_agent = self.FakeReview(blocked={"/a/f1"})
+        integration.cleanup_agent = self.FakeCleanup()
+
+        result = integration.run_full_cleanup(["/a", "/b"], chunk_size=2)
+
+        assert result["success"] is True
+        assert result["stage"] == "completed"
+        assert integration.review_agent.chunks == [["/a/f0", "/a/f1"], ["/a/f2"], ["/b/f0", "/b/f1"]]
+        assert integration.cleanup_agent.chunks == [["/a/f0"], ["/a/f2"], ["/b/f0", "/b/f1"]]
+
+        cleanup = result["cleanup_result"]
+        assert cleanup["total_planned"] == 4
+        assert cleanup["deleted_count"] == 4
+        assert cleanup["total_freed_bytes"] == 40
+        assert cleanup["success_rate"] == 1.0
+        assert result["review_result"]["blocked_items"] == [{"path": "/a/f1"}]
+        assert result["scan_result"]["summary"]["total_files"] == 8
+        assert result["scan_result"]["scan_ids"] == ["/a", "/b"]
+        assert result["report"] == {"files": 8, "deleted": 4}
+
+    def test_dangerous_in_any_scan_is_never_cleaned(self, integration):
+        """任一扫描标记为 dangerous 的路径都不清理，包括之后扫描的重叠路径"""
+        files_a = self._files("/a", 2) + [
+            {"path": "/a/sub/db", "size": 10, "is_garbage": True, "risk": "safe"},
+            {"path": "/shared", "size": 10, "is_garbage": False, "risk": "dangerous"},
+        ]
+        files_sub = [{"path": "/a/sub/db", "size": 10, "is_garbage": False, "risk": "dangerous"}]
+        files_b = [{"path": "/shared", "size": 10, "is_garbage": True, "risk": "safe"}]
+        integration.scan_agent = self.FakeScan({"/a": files_a, "/a/sub": files_sub, "/b": files_b})
+        integration.review_agent = self.FakeReview()
+        integration.cleanup_agent = self.FakeCleanup()
+
+        result = integration.run_full_cleanup(["/a", "/a/sub", "/b"], skip_review=True)
+
+        assert result["success"] is True
+        cleaned = [path for chunk in integration.cleanup_agent.chunks for path in chunk]
+        assert cleaned == ["/a/f0", "/a/f1"]
+
+    def test_stages_use_separate_orchestrators(self):
+        """扫描、审查、清理阶段并发运行，各自使用独立的编排器"""
+        integration = get_agent_integration("")
+        orchestrators = {id(integration.scan_agent.orchestrator),
+                         id(integration.review_agent.orchestrator),
+                         id(integration.cleanup_agent.orchestrator)}
+        assert len(orchestrators) == 3
+
+    def test_cleanup_starts_before_scan_finishes(self, integration):
+        """第一个路径的块在第二个路径扫描结束前就已清理"""
+        gate = threading.Event()
+        integration.scan_agent = self.FakeScan(
+            {"/a": self._files("/a", 2), "/b": self._files("/b", 2)}, gate=gate
+        )
+        integration.review_agent = self.FakeReview()
+        integration.cleanup_agent = self.FakeCleanup(gate=gate)
+
+        result = integration.run_full_cleanup(["/a", "/b"], skip_review=True)
+
+        assert result["success"] is True
+        assert result["review_result"] is None
+        assert integration.review_agent.chunks == []
+        assert integration.cleanup_agent.chunks == [["/a/f0", "/a/f1"], ["/b/f0", "/b/f1"]]
+
+    def test_review_rejection_stops_pipeline(self, integration):
+        """审查未通过时不执行清理"""
+        integration.scan_agent = self.FakeScan({"/a": self._files("/a", 5)})
+        integration.review_agent = self.FakeReview(unsafe=True)
+        integration.cleanup_agent = self.FakeCleanup()
+
+        result = integration.run_full_cleanup(["/a"], chunk_size=2)
+
+        assert result["success"] is False
+        assert result["stage"] == "review"
+        assert "风险过高" in result["error"]
+        assert integration.cleanup_agent.chunks == []
+        assert result["cleanup_result"] is None
+
+    def test_no_cleanable_files(self, integration):
+        """没有可清理项目时返回错误"""
+        integration.scan_agent = self.FakeScan(
+            {"/a": self._files("/a", 2, risk="dangerous")}
+        )
+        integration.review_agent = self.FakeReview()
+        integration.cleanup_agent = self.FakeCleanup()
+
+        result = integration.run_full_cleanup(["/a"])
+
+        assert result["success"] is False
+        assert result["error"] == "没有找到可清理的文件"
+
+
 class TestFileTools:
     """测试文件工具"""
 
@@ -222,6 +841,364 @@ class TestFileTools:
         assert "path" in result
 
 
+class TestToolResultCache:
+    """测试会话内只读工具结果缓存"""
+
+    @pytest.fixture
+    def orch(self, ai_config):
+        from agent.orchestrator import AgentOrchestrator
+        from agent.tools import file_tools  # noqa: F401  注册文件工具
+
+        return AgentOrchestrator(ai_config, enable_recovery=False)
+
+    def test_repeated_read_is_cached_until_edit(self, orch, test_dir):
+        """测试重复读取命中缓存，edit 修改后失效"""
+        from agent.tool_cache import CACHED_MARKER
+
+        path = os.path.join(test_dir, "a.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("old")
+
+        def run(name, inputs):
+            return orch._execute_session_tool("s1", name, inputs, test_dir)
+
+        first = run("read", {"path": "a.txt"})
+        second = run("read", {"path": "a.txt"})
+        assert "cached" not in first
+        assert second["cached"] and second["output"] == CACHED_MARKER + first["output"]
+
+        run("edit", {"path": "a.txt", "old_str": "old", "new_str": "new"})
+        third = run("read", {"path": "a.txt"})
+        assert "cached" not in third and "new" in third["output"]
+
+        # 其他会话不共享缓存
+        assert "cached" not in orch._execute_session_tool("s2", "read", {"path": "a.txt"}, test_dir)
+
+    def test_directory_results_invalidated_by_write_and_mtime(self, orch, test_dir):
+        """测试目录下写入文件使 glob 缓存失效，外部修改通过 mtime 检测"""
+        def glob():
+            return orch._execute_session_tool("s1", "glob", {"pattern": "*.txt", "path": test_dir}, None)
+
+        assert "cached" not in glob()
+        assert glob()["cached"]
+
+        orch._execute_session_tool("s1", "write", {"path": os.path.join(test_dir, "b.txt"), "content": "x"}, None)
+        result = glob()
+        assert "cached" not in result and "b.txt" in result["output"]
+
+        assert glob()["cached"]
+        os.utime(test_dir, ns=(0, 0))
+        assert "cached" not in glob()
+
+    def test_directory_results_expire(self, orch, test_dir, monkeypatch):
+        """测试目录范围结果带目录标记，超过 TTL 后重新执行（深层修改不改变目录 mtime）"""
+        from agent import tool_cache
+
+        nested = os.path.join(test_dir, "sub", "deep.txt")
+        os.makedirs(os.path.dirname(nested))
+        with open(nested, "w", encoding="utf-8") as f:
+            f.write("needle")
+
+        def grep():
+            return orch._execute_session_tool("s1", "grep", {"pattern": "needle", "path": test_dir}, None)
+
+        assert "cached" not in grep()
+        cached = grep()
+        assert cached["cached"] and not cached["output"].startswith(tool_cache.CACHED_MARKER)
+
+        now = tool_cache.time.monotonic()
+        monkeypatch.setattr(tool_cache.time, "monotonic", lambda: now + tool_cache.DIRECTORY_TTL + 1)
+        assert "cached" not in grep()
+
+    def test_cleanup_agent_invalidates_all_sessions(self, orch, test_dir):
+        """测试 CleanupAgent 直接删除文件后，各会话中重叠路径的缓存失效"""
+        from agent.agents.cleanup_agent import CleanupAgent
+
+        path = os.path.join(test_dir, "sub", "junk.tmp")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("junk")
+
+        def glob():
+            return orch._execute_session_tool("s1", "glob", {"pattern": "**/*.tmp", "path": test_dir}, None)
+
+        glob()
+        assert glob()["cached"]
+
+        CleanupAgent(orch).execute_cleanup([{"path": path, "type": "file"}])
+        result = glob()
+        assert "cached" not in result and "junk.tmp" not in result["output"]
+
+    def test_cache_disabled(self, ai_config, test_dir):
+        """测试关闭缓存后每次都执行"""
+        from agent.orchestrator import AgentOrchestrator
+
+        orch = AgentOrchestrator(ai_config, enable_recovery=False, enable_tool_cache=False)
+        for _ in range(2):
+            result = orch._execute_session_tool("s1", "glob", {"pattern": "*", "path": test_dir}, None)
+            assert "cached" not in result
+
+
+class TestRecordReplay:
+    """测试录制/回放与离线基准"""
+
+    RESPONSES = [
+        {
+            "id": "msg_1", "model": "m", "stop_reason": "tool_use",
+            "content": [
+                {"type": "text", "text": "先列出临时文件"},
+                {"type": "tool_use", "id": "tu_1", "name": "glob", "input": {"pattern": "*.tmp"}}
+            ],
+            "usage": {"input_tokens": 100, "output_tokens": 20,
+                      "cache_read_input_tokens": 0, "cache_creation_input_tokens": 80}
+        },
+        {
+            "id": "msg_2", "model": "m", "stop_reason": "end_turn",
+            "content": [{"type": "text", "text": "发现 2 个临时文件"}],
+            "usage": {"input_tokens": 150, "output_tokens": 10,
+                      "cache_read_input_tokens": 80, "cache_creation_input_tokens": 0}
+        }
+    ]
+
+    @pytest.fixture
+    def recorded(self, ai_config, test_dir, monkeypatch):
+        """用脚本化的 AI 响应录制一次扫描会话，返回 (录制文件, 录制时的循环结果)"""
+        from agent.orchestrator import AgentOrchestrator
+        from agent.replay import RecordingOrchestrator
+        from agent.tools import file_tools  # noqa: F401  注册文件工具
+
+        for name in ("a.tmp", "b.tmp"):
+            with open(os.path.join(test_dir, name), "w") as f:
+                f.write("x")
+
+        responses = iter(self.RESPONSES)
+        monkeypatch.setattr(AgentOrchestrator, "_call_ai",
+                            lambda self, messages, system_prompt=None, tools=None: next(responses))
+
+        path = os.path.join(test_dir, "recording.json")
+        orch = RecordingOrchestrator(ai_config, record_path=path, enable_recovery=False)
+        result = orch.run_agent_loop(AgentType.SCAN, "扫描临时文件", workspace=test_dir, max_turns=5)
+        monkeypatch.undo()
+        return path, result
+
+    def test_recording_captures_responses_and_tools(self, recorded):
+        """录制文件包含每轮响应和工具输入输出"""
+        from agent.replay import AgentRecording
+
+        path, result = recorded
+        assert result["is_complete"] and result["turns"] == 2
+
+        session, = AgentRecording.load(path).sessions
+        assert session["agent_type"] == "scan"
+        assert session["initial_message"] == "扫描临时文件"
+        assert [turn["response"]["id"] for turn in session["turns"]] == ["msg_1", "msg_2"]
+        tool, = session["tools"]
+        assert tool["tool_name"] == "glob" and tool["input"] == {"pattern": "*.tmp"}
+        assert "a.tmp" in tool["result"]["output"]
+
+    def test_replay_is_deterministic_without_files(self, recorded, test_dir):
+        """回放返回录制的响应和工具结果，不依赖文件系统"""
+        from agent.replay import AgentRecording, ReplayOrchestrator
+
+        path, recorded_result = recorded
+        recording = AgentRecording.load(path)
+        for name in ("a.tmp", "b.tmp"):
+            os.remove(os.path.join(test_dir, name))
+
+        orch = ReplayOrchestrator(recording)
+        events = []
+        session = orch.create_session(AgentType.SCAN, workspace=test_dir)
+        first = orch.process_message("扫描临时文件", session.session_id,
+                                     on_event=lambda kind, data: events.append(kind))
+        assert "a.tmp" in first["tool_results"][0]["output"]
+        assert events[:2] == ["text_delta", "tool_use"] and events[-1] == "message_stop"
+
+        second = orch.process_message("请继续", session.session_id)
+        assert second["is_complete"]
+        assert [first["response_text"], second["response_text"]] == recorded_result["responses"]
+        assert orch.mismatches == 0
+
+    def test_benchmark_reports_stage_metrics(self, recorded):
+        """基准按阶段统计轮次、工具调用、序列化和 token"""
+        from agent.replay import run_benchmark
+
+        path, _ = recorded
+        report = run_benchmark(path, repeat=2, latency_ms=5)
+
+        assert report["repeat"] == 2 and report["sessions"] == 1
+        run = report["runs"][0]
+        assert run["mismatches"] == 0 and run["completed"] == 1
+        scan = run["stages"]["scan"]
+        assert scan["sessions"] == 1 and scan["turns"] == 2 and scan["tool_calls"] == 1
+        assert scan["input_tokens"] == 250 and scan["output_tokens"] == 30
+        assert scan["cache_read_input_tokens"] == 80
+        assert scan["request_bytes"] > 0 and scan["simulated_latency_ms"] == 10
+        assert report["wall_ms"]["min"] >= 10
+        assert run["total"]["turns"] == 2
+
+    def test_unmatched_session_is_reported(self, recorded):
+        """录制中没有匹配的会话时循环以错误结束"""
+        from agent.replay import AgentRecording, ReplayOrchestrator
+
+        orch = ReplayOrchestrator(AgentRecording.load(recorded[0]))
+        result = orch.run_agent_loop(AgentType.SCAN, "另一个请求", max_turns=3)
+
+        assert not result["is_complete"]
+        assert "E2006" in result["errors"][0]["error"]
+        assert orch.mismatches == 1
+
+
+class TestScanJunkTool:
+    """测试批量垃圾发现工具"""
+
+    def test_aggregates_by_rule_category(self, test_dir):
+        """测试按规则类别聚合，跳过默认目录和隐藏文件，样例按大小选取"""
+        import json
+        from agent.tools.scan_tools import ScanJunkTool
+
+        def write(rel, size):
+            path = os.path.join(test_dir, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+            return path
+
+        temp_files = [write(f"work/sub/f{i}.tmp", 2000 + i) for i in range(5)]
+        write("node_modules/pkg/a.tmp", 5000)
+        write(".hidden.tmp", 3000)
+        exe = write("bin/app.exe", 3000)
+
+        result = json.loads(ScanJunkTool().execute({"paths": [test_dir], "samples": 2}))
+
+        assert result["scanned_files"] == 6
+        assert result["skipped_dirs"] == 1
+        categories = {c["name"]: c for c in result["categories"]}
+        assert categories["临时文件"]["risk"] == "safe"
+        assert categories["临时文件"]["count"] == 5
+        assert categories["临时文件"]["samples"] == [temp_files[4], temp_files[3]]
+        assert categories["程序文件"]["samples"] == [exe]
+        assert result["by_risk"]["dangerous"] == {"count": 1, "size": 3000}
+        assert result["top_dirs"][0]["path"] == os.path.dirname(temp_files[0])
+
+        limited = json.loads(ScanJunkTool().execute({"paths": [test_dir], "max_files": 2, "top_n": 1}))
+        assert limited["scanned_files"] == 2 and limited["truncated"]
+        assert len(limited["categories"]) == 1
+
+
+class TestSearchTools:
+    """测试 Glob/Grep 的遍历、过滤和大文件搜索"""
+
+    @pytest.fixture
+    def tree(self, test_dir):
+        def write(rel, data, mode="w"):
+            path = os.path.join(test_dir, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, mode) as f:
+                f.write(data)
+            return path
+
+        write("a/x.py", "import os\nfoo = 1\n")
+        write("a/b/y.py", "foo\n")
+        write("a/b/c/z.txt", b"nothing\r\nfoo bar\r\nend\r\n", "wb")
+        write(".git/HEAD", "foo\n")
+        write("data.bin", b"foo\0\0", "wb")
+        write("big.log", "".join(f"line {i}\n" for i in range(5000)) + "tail foo\n")
+        return test_dir
+
+    def test_glob_patterns_and_mtime_order(self, tree):
+        """测试 ** 递归、单层模式和按修改时间排序"""
+        import json
+        from agent.tools.file_tools import GlobTool
+
+        os.utime(os.path.join(tree, "a", "x.py"), (1, 1))
+
+        def glob(pattern):
+            output = json.loads(GlobTool().execute({"pattern": pattern, "path": tree}))
+            return [os.path.relpath(r["path"], tree).replace(os.sep, "/") for r in output["results"]]
+
+        assert glob("**/*.py") == ["a/b/y.py", "a/x.py"]
+        assert glob("*.py") == []
+        assert glob("a/*.py") == ["a/x.py"]
+        assert glob("a/**/[xz].*") == ["a/b/c/z.txt", "a/x.py"]
+
+    def test_glob_limit_keeps_newest(self, tree):
+        """测试结果截断时返回最新的文件，而不是遍历中先遇到的文件"""
+        import json
+        from agent.tools.file_tools import GlobTool
+
+        for oldest in ("a/x.py", "a/b/y.py"):
+            for name in ("a/x.py", "a/b/y.py"):
+                mtime = 1 if name == oldest else 2
+                os.utime(os.path.join(tree, *name.split("/")), (mtime, mtime))
+            output = json.loads(GlobTool().execute({"pattern": "**/*.py", "path": tree, "limit": 1}))
+            newest = "a/b/y.py" if oldest == "a/x.py" else "a/x.py"
+            assert [os.path.relpath(r["path"], tree).replace(os.sep, "/")
+                    for r in output["results"]] == [newest]
+            assert output["truncated"] and output["total_matches"] == 2
+
+    def test_grep_skips_binary_and_vcs(self, tree):
+        """测试跳过二进制文件和版本控制目录，CRLF 文件行号正确"""
+        import json
+        from agent.tools.file_tools import GrepTool
+
+        result = json.loads(GrepTool().execute({"pattern": "^foo", "path": tree}))
+        found = {(os.path.relpath(r["file"], tree).replace(os.sep, "/"), r["line_number"])
+                 for r in result["results"]}
+        assert found == {("a/x.py", 2), ("a/b/y.py", 1), ("a/b/c/z.txt", 2)}
+        assert result["skipped"] == {"binary": 1}
+
+    def test_grep_large_files(self, tree, monkeypatch):
+        """测试 mmap 搜索与文本搜索结果一致，超限文件被跳过，达到 limit 后停止"""
+        import json
+        from agent.tools.file_tools import GrepTool
+
+        args = {"pattern": "foo|line 4999", "path": os.path.join(tree, "big.log"), "context": 1}
+        expected = json.loads(GrepTool().execute(args))
+
+        monkeypatch.setattr(GrepTool, "MMAP_THRESHOLD", 8192)
+        assert json.loads(GrepTool().execute(args)) == expected
+        assert [r["line_number"] for r in expected["results"]] == [5000, 5001]
+        assert expected["results"][1]["context"] == [" 5000: line 4999", ">5001: tail foo"]
+
+        monkeypatch.setattr(GrepTool, "MAX_FILE_SIZE", 1024)
+        result = json.loads(GrepTool().execute({"pattern": "foo", "path": tree}))
+        assert result["skipped"] == {"binary": 1, "too_large": 1}
+
+        limited = json.loads(GrepTool().execute({"pattern": "line", "path": args["path"], "limit": 3}))
+        assert limited["matches"] == 3 and limited["truncated"]
+
+    @pytest.mark.parametrize("pattern", [
+        "a.b", "a[^x]b", "a.{1}b", r"\Abar", r"\Aa.*b", "b$", r"\xe4",
+    ])
+    def test_grep_non_ascii_matches_text_semantics(self, test_dir, monkeypatch, pattern):
+        """测试字节预筛不漏掉多字节字符和整段锚点的匹配（与逐行文本匹配一致）"""
+        import json
+        import re
+        from agent.tools.file_tools import GrepTool
+
+        path = os.path.join(test_dir, "cjk.txt")
+        lines = ["a中b", "bar", "ä"] + [f"填充 {i}" for i in range(2000)]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        expected = [i + 1 for i, line in enumerate(lines) if re.search(pattern, line)]
+        assert expected
+
+        for threshold in (GrepTool.MMAP_THRESHOLD, 1024):
+            monkeypatch.setattr(GrepTool, "MMAP_THRESHOLD", threshold)
+            result = json.loads(GrepTool().execute({"pattern": pattern, "path": test_dir}))
+            assert [r["line_number"] for r in result["results"]] == expected
+
+    def test_grep_bytes_prefilter_only_for_safe_patterns(self):
+        """测试只有语义一致的模式才使用字节预筛"""
+        from agent.tools.file_tools import GrepTool
+
+        assert GrepTool._bytes_compatible("foo|line 4999")
+        assert GrepTool._bytes_compatible(r"^error.*timeout\.log")
+        for pattern in ("a.b", "[^x]", r"\Abar", r"bar\Z", "(?i)foo", r"\w+", "中"):
+            assert not GrepTool._bytes_compatible(pattern)
+
+
 class TestAgentScanner:
     """测试智能体扫描器"""
 
@@ -0,0 +1,113 @@
+"""
+Annotation Storage Unit Tests
+
+Test coverage:
+- save/get round trip
+- Chunked batch loading past SQLite's variable limit
+- LRU cache (path + mtime) and negative caching
+- Cache invalidation on save/delete
+"""
+import pytest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.annotation import ScanAnnotation
+from core.annotation_storage import AnnotationStorage
+
+
+@pytest.fixture
+def storage():
+    """Create an isolated annotation storage"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = AnnotationStorage(os.path.join(tmpdir, 'annotations.db'), cache_size=8)
+        yield store
+        store.close()
+
+
+def _annotation(path, note='cache'):
+    return ScanAnnotation(id=f'id:{path}', item_path=path, item_type='file', annotation_note=note)
+
+
+class _CountingConnection:
+    """Wraps a sqlite connection and counts executed queries"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.queries = 0
+
+    def execute(self, *args, **kwargs):
+        self.queries += 1
+        return self._conn.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_save_and_get_annotation(storage):
+    """Test basic round trip"""
+    assert storage.save_annotation(_annotation('/tmp/a.log')) is True
+    note = storage.get_annotation('/tmp/a.log')
+    assert note is not None
+    assert note.annotation_note == 'cache'
+
+
+def test_batch_annotations_chunked(storage):
+    """Test batch loading more paths than SQLite's variable limit"""
+    for i in range(5):
+        storage.save_annotation(_annotation(f'/tmp/{i}.log'))
+
+    paths = [f'/tmp/{i}.log' for i in range(1500)]
+    result = storage.get_batch_annotations(paths)
+    assert len(result) == 5
+
+
+def test_batch_annotations_use_cache(storage):
+    """Test a second batch call is served from the LRU"""
+    storage.save_annotation(_annotation('/tmp/a.log'))
+    storage._get_connection()
+    counter = _CountingConnection(storage._local.conn)
+    storage._local.conn = counter
+
+    paths = ['/tmp/a.log', '/tmp/missing.log']
+    first = storage.get_batch_annotations(paths)
+    queries = counter.queries
+    second = storage.get_batch_annotations(paths)
+
+    assert queries == 1
+    assert counter.queries == queries
+    assert set(first) == set(second) == {'/tmp/a.log'}
+    storage._local.conn = counter._conn
+
+
+def test_mtime_change_invalidates_entry(storage):
+    """Test a different mtime forces a reload"""
+    storage.save_annotation(_annotation('/tmp/a.log', note='old'))
+    assert storage.get_annotation('/tmp/a.log', mtime=1.0).annotation_note == 'old'
+
+    # 绕过 save_annotation 直接修改，只有 mtime 变化才会重新查询
+    conn = storage._get_connection()
+    conn.execute("UPDATE annotations SET annotation_note = 'new' WHERE item_path = ?", ('/tmp/a.log',))
+    conn.commit()
+
+    assert storage.get_annotation('/tmp/a.log', mtime=1.0).annotation_note == 'old'
+    assert storage.get_annotation('/tmp/a.log', mtime=2.0).annotation_note == 'new'
+
+
+def test_save_and_delete_invalidate_cache(storage):
+    """Test writes invalidate cached entries, including negative ones"""
+    assert storage.get_annotation('/tmp/a.log') is None
+    storage.save_annotation(_annotation('/tmp/a.log'))
+    note = storage.get_annotation('/tmp/a.log')
+    assert note is not None
+
+    storage.delete_annotation(note.id)
+    assert storage.get_annotation('/tmp/a.log') is None
+
+
+def test_lru_capacity(storage):
+    """Test the LRU never exceeds its capacity"""
+    storage.get_batch_annotations([f'/tmp/{i}.log' for i in range(20)])
+    assert len(storage._cache) == 8
@@ -276,3 +276,139 @@ def test_backup_type_mapping():
     assert BackupType.from_risk(RiskLevel.SAFE) == BackupType.NONE
     assert BackupType.from_risk(RiskLevel.SUSPICIOUS) == BackupType.HARDLINK
     assert BackupType.from_risk(RiskLevel.DANGEROUS) == BackupType.FULL
+
+
+# ============================================================================
+# Content-Deduplicated Full Backup
+# ============================================================================
+
+def _make_profile(root, name, shared_content):
+    """Create a fake browser profile cache with shared and unique files"""
+    cache = os.path.join(root, name, 'Cache')
+    os.makedirs(os.path.join(cache, 'sub'))
+    for i in range(3):
+        with open(os.path.join(cache, f'shared_{i}.bin'), 'w') as f:
+            f.write(shared_content * (i + 1))
+    with open(os.path.join(cache, 'sub', 'unique.bin'), 'w') as f:
+        f.write(name * 10)
+    return os.path.join(root, name)
+
+
+def test_full_backup_directory_deduplicated():
+    """Test identical content across directories is stored once"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, 'source')
+        shared = 'x' * 1000
+        profiles = [_make_profile(source, f'profile{i}', shared) for i in range(2)]
+
+        manager = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        infos = [
+            manager.create_backup(CleanupItem(i, path, 0, 'directory',
+                                              RiskLevel.DANGEROUS, RiskLevel.DANGEROUS))
+            for i, path in enumerate(profiles)
+        ]
+
+        assert all(info is not None for info in infos)
+        copied = os.path.join(infos[1].backup_path, 'Cache', 'sub', 'unique.bin')
+        with open(copied) as f:
+            assert f.read() == 'profile1' * 10
+
+        # 共享的 3 个文件第二次备份不再占用空间
+        assert manager._stats.deduplicated_size == 1000 + 2000 + 3000
+        assert manager.get_stats().full_backups == 2
+
+
+def test_full_backup_restore_directory():
+    """Test a deduplicated directory backup restores intact"""
+    import shutil
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profile = _make_profile(os.path.join(tmpdir, 'source'), 'p', 'data')
+        manager = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        info = manager.create_backup(CleanupItem(1, profile, 0, 'directory',
+                                                 RiskLevel.DANGEROUS, RiskLevel.DANGEROUS))
+
+        shutil.rmtree(profile)
+        assert manager.restore_backup(info.backup_id) is True
+        with open(os.path.join(profile, 'Cache', 'shared_2.bin')) as f:
+            assert f.read() == 'data' * 3
+
+
+def test_content_store_prune():
+    """Test objects are reclaimed once no backup references them"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, 'a.dat')
+        with open(source, 'w') as f:
+            f.write('payload')
+
+        manager = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        info = manager.create_backup(CleanupItem(1, source, 7, 'file',
+                                                 RiskLevel.DANGEROUS, RiskLevel.DANGEROUS))
+        store = manager.content_store
+
+        assert store.prune() == 0
+        os.remove(info.backup_path)
+        assert store.prune() == 1
+
+
+# ============================================================================
+# Directory Hardlink Backup
+# ============================================================================
+
+def test_suspicious_directory_hardlink_backup():
+    """Test directories are mirrored with per-file hardlinks"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profile = _make_profile(os.path.join(tmpdir, 'source'), 'p', 'data')
+        manager = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+
+        info = manager.create_backup(CleanupItem(1, profile, 0, 'directory',
+                                                 RiskLevel.SUSPICIOUS, RiskLevel.SUSPICIOUS))
+
+        assert info is not None
+        assert info.backup_type == BackupType.HARDLINK
+        source_file = os.path.join(profile, 'Cache', 'sub', 'unique.bin')
+        backup_file = os.path.join(info.backup_path, 'Cache', 'sub', 'unique.bin')
+        assert os.path.samefile(source_file, backup_file)
+        # 没有回退到完整备份
+        assert os.listdir(os.path.join(manager.backup_root, 'full')) == []
+
+
+def test_directory_hardlink_cross_volume_fallback(monkeypatch):
+    """Test cross-volume files fall back to a copy without failing the backup"""
+    import errno
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profile = _make_profile(os.path.join(tmpdir, 'source'), 'p', 'data')
+        manager = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+
+        real_link = os.link
+
+        def cross_volume_link(src, dst, *args, **kwargs):
+            if src.startswith(profile) and src.endswith('unique.bin'):
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            return real_link(src, dst, *args, **kwargs)
+
+        monkeypatch.setattr(os, 'link', cross_volume_link)
+        info = manager.create_backup(CleanupItem(1, profile, 0, 'directory',
+                                                 RiskLevel.SUSPICIOUS, RiskLevel.SUSPICIOUS))
+
+        assert info.backup_type == BackupType.HARDLINK
+        backup_file = os.path.join(info.backup_path, 'Cache', 'sub', 'unique.bin')
+        assert not os.path.samefile(os.path.join(profile, 'Cache', 'sub', 'unique.bin'), backup_file)
+        with open(backup_file) as f:
+            assert f.read() == 'p' * 10
+
+
+def test_cleanup_old_directory_hardlink_backup():
+    """Test old directory hardlink backups are removed by cleanup"""
+    import time
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profile = _make_profile(os.path.join(tmpdir, 'source'), 'p', 'data')
+        manager = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        info = manager.create_backup(CleanupItem(1, profile, 0, 'directory',
+                                                 RiskLevel.SUSPICIOUS, RiskLevel.SUSPICIOUS))
+
+        old_time = time.time() - 8 * 24 * 3600
+        os.utime(info.backup_path, (old_time, old_time))
+
+        assert manager.cleanup_old_backups(days=7) == 1
+        assert not os.path.exists(info.backup_path)
+        assert os.path.exists(os.path.join(profile, 'Cache', 'sub', 'unique.bin'))
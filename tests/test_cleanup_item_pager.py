@@ -0,0 +1,145 @@
+"""
+Cleanup Item Pager Unit Tests
+
+Test coverage:
+- Database keyset pagination (get_cleanup_items_after)
+- Batched detail loading (get_cleanup_item_details)
+- CleanupItemCursor
+- ItemDetailLoader LRU behaviour
+"""
+import pytest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.database import Database
+from core.cleanup_item_pager import CleanupItemCursor, ItemDetailLoader
+from core.models_smart import CleanupItem, ItemDetail
+from core.rule_engine import RiskLevel
+
+
+@pytest.fixture
+def temp_db():
+    """Create an isolated database with one populated plan"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Database._tables_created = False
+        db = Database(os.path.join(tmpdir, 'test.db'))
+        # 连接按线程缓存，丢弃可能指向其他数据库文件的连接
+        db.close()
+
+        db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+        for i in range(25):
+            status = 'success' if i % 5 == 0 else 'pending'
+            item_id = db.add_cleanup_item(
+                'plan_1', f'/tmp/file_{i}.tmp', i * 10, 'file',
+                'safe', 'safe', f'reason {i % 3}'
+            )
+            if status != 'pending':
+                conn = db._get_connection()
+                conn.execute('UPDATE cleanup_items SET status = ? WHERE id = ?', (status, item_id))
+                conn.commit()
+
+        yield db
+        db.close()
+        Database._tables_created = False
+
+
+# ============================================================================
+# Database Keyset Pagination Tests
+# ============================================================================
+
+def test_get_cleanup_items_after_pages(temp_db):
+    """Test keyset pages are contiguous and ordered"""
+    first = temp_db.get_cleanup_items_after('plan_1', after_id=0, limit=10)
+    second = temp_db.get_cleanup_items_after('plan_1', after_id=first[-1]['id'], limit=10)
+
+    assert len(first) == 10
+    assert len(second) == 10
+    assert [r['id'] for r in first] == sorted(r['id'] for r in first)
+    assert second[0]['id'] > first[-1]['id']
+    assert 'reason' not in first[0]
+
+
+def test_get_cleanup_items_after_status_filter(temp_db):
+    """Test keyset pagination with status filter"""
+    rows = temp_db.get_cleanup_items_after('plan_1', limit=100, status='success')
+    assert len(rows) == 5
+    assert all(r['status'] == 'success' for r in rows)
+
+
+def test_get_cleanup_item_details(temp_db):
+    """Test batched detail query"""
+    rows = temp_db.get_cleanup_items_after('plan_1', limit=3)
+    details = temp_db.get_cleanup_item_details([r['id'] for r in rows])
+
+    assert len(details) == 3
+    assert details[rows[0]['id']]['reason'] == 'reason 0'
+
+
+# ============================================================================
+# CleanupItemCursor Tests
+# ============================================================================
+
+def test_cursor_iterates_all_items(temp_db):
+    """Test cursor walks every item exactly once"""
+    cursor = CleanupItemCursor('plan_1', page_size=7, db=temp_db)
+    pages = list(cursor)
+
+    assert [len(p) for p in pages] == [7, 7, 7, 4]
+    items = [item for page in pages for item in page]
+    assert len({item.item_id for item in items}) == 25
+    assert isinstance(items[0], CleanupItem)
+    assert items[0].ai_risk == RiskLevel.SAFE
+    assert not cursor.has_more
+
+
+def test_cursor_seek_and_reset(temp_db):
+    """Test cursor repositioning"""
+    cursor = CleanupItemCursor('plan_1', page_size=5, db=temp_db)
+    first = cursor.fetch_next()
+
+    cursor.seek(first[2].item_id)
+    assert cursor.fetch_next()[0].item_id == first[3].item_id
+
+    cursor.reset()
+    assert cursor.fetch_next()[0].item_id == first[0].item_id
+
+
+# ============================================================================
+# ItemDetailLoader Tests
+# ============================================================================
+
+def test_detail_loader_lazy_and_cached(temp_db):
+    """Test details are loaded on demand and cached"""
+    item_id = temp_db.get_cleanup_items_after('plan_1', limit=1)[0]['id']
+    loader = ItemDetailLoader(capacity=4, db=temp_db)
+
+    detail = loader.get(item_id)
+    assert isinstance(detail, ItemDetail)
+    assert detail.ai_reason == 'reason 0'
+    assert loader.misses == 1
+
+    assert loader.get(item_id) is detail
+    assert loader.hits == 1
+
+
+def test_detail_loader_lru_eviction(temp_db):
+    """Test least recently used details are evicted"""
+    ids = [r['id'] for r in temp_db.get_cleanup_items_after('plan_1', limit=6)]
+    loader = ItemDetailLoader(capacity=4, db=temp_db)
+
+    loader.prefetch(ids[:4])
+    loader.get(ids[0])
+    loader.prefetch(ids[4:6])
+
+    assert len(loader) == 4
+    assert ids[0] in loader._cache
+    assert ids[1] not in loader._cache
+
+
+def test_detail_loader_missing_item(temp_db):
+    """Test unknown item returns None"""
+    loader = ItemDetailLoader(db=temp_db)
+    assert loader.get(999999) is None
@@ -0,0 +1,389 @@
+"""
+Custom Recycle Bin Unit Tests
+
+Test coverage:
+- Archive backends (stored members for incompressible files, unsupported entries)
+- Recycle and restore round trip
+- Parallel batch recycling
+- SQLite catalog and legacy JSON index import
+"""
+import pytest
+import sys
+import os
+import tempfile
+import json
+import zipfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.safety.archive_backend import (
+    ZipArchiveBackend, HAS_ZSTD, UnsupportedEntryError, get_archive_backend, backend_for_archive,
+    is_incompressible
+)
+from core.safety.custom_recycle_bin import CustomRecycleBin
+from core.safety.recycle_catalog import LEGACY_INDEX_NAME
+
+
+@pytest.fixture
+def env():
+    """Create a recycle bin (zip backend) and a source tree"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, 'source')
+        os.makedirs(os.path.join(source, 'cache', 'nested'))
+        files = {
+            os.path.join('cache', 'log.txt'): b'text ' * 1000,
+            os.path.join('cache', 'nested', 'photo.jpg'): os.urandom(2048),
+            'single.tmp': b'single',
+        }
+        for rel, data in files.items():
+            with open(os.path.join(source, rel), 'wb') as f:
+                f.write(data)
+
+        bin_ = CustomRecycleBin(os.path.join(tmpdir, 'bin'), backend=ZipArchiveBackend())
+        yield tmpdir, source, bin_
+        bin_.catalog.close()
+
+
+# ============================================================================
+# Archive Backend Tests
+# ============================================================================
+
+def test_incompressible_extensions():
+    """Test already-compressed formats are detected by extension"""
+    assert is_incompressible('a/b/Photo.JPG')
+    assert is_incompressible('video.mp4')
+    assert not is_incompressible('log.txt')
+
+
+def test_zip_backend_stores_incompressible_members(env):
+    """Test incompressible files are stored and text is deflated"""
+    tmpdir, source, _ = env
+    archive = os.path.join(tmpdir, 'out.zip')
+    ZipArchiveBackend().write(os.path.join(source, 'cache'), archive)
+
+    with zipfile.ZipFile(archive) as zf:
+        types = {info.filename: info.compress_type for info in zf.infolist()}
+    assert types['cache/nested/photo.jpg'] == zipfile.ZIP_STORED
+    assert types['cache/log.txt'] == zipfile.ZIP_DEFLATED
+
+
+def test_backend_selection():
+    """Test backend lookup by name and archive extension"""
+    assert get_archive_backend('zip').name == 'zip'
+    assert get_archive_backend('auto').name == 'zip'
+    assert backend_for_archive('abc.zip').name == 'zip'
+    assert backend_for_archive('abc.txt') is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason="symlinks not supported")
+def test_symlinks_are_refused_and_left_in_place(env, tmp_path):
+    """Test items containing links are not archived or removed"""
+    tmpdir, source, bin_ = env
+    link = os.path.join(source, 'cache', 'link')
+    os.symlink(os.path.join(source, 'single.tmp'), link)
+
+    with pytest.raises(UnsupportedEntryError):
+        ZipArchiveBackend().write(os.path.join(source, 'cache'), str(tmp_path / 'out.zip'))
+    assert not (tmp_path / 'out.zip').exists()
+
+    # 回收失败，调用方回退到系统回收站
+    assert bin_.recycle_item(os.path.join(source, 'cache'), 1) is False
+    assert bin_.recycle_item(link, 1) is False
+    assert os.path.islink(link)
+    assert os.path.exists(os.path.join(source, 'cache', 'log.txt'))
+    assert bin_.list_items() == []
+
+
+# ============================================================================
+# Recycle / Restore Tests
+# ============================================================================
+
+def test_recycle_and_restore_directory(env):
+    """Test a directory is archived, removed and restored intact"""
+    _, source, bin_ = env
+    path = os.path.join(source, 'cache')
+
+    assert bin_.recycle_item(path, 100, 'cache', 'safe') is True
+    assert not os.path.exists(path)
+
+    items = bin_.list_items()
+    assert len(items) == 1
+    assert items[0]['archive_format'] == 'zip'
+
+    assert bin_.restore_item(items[0]['id']) is True
+    with open(os.path.join(path, 'log.txt'), 'rb') as f:
+        assert f.read() == b'text ' * 1000
+    assert os.path.exists(os.path.join(path, 'nested', 'photo.jpg'))
+    assert bin_.list_items() == []
+
+
+def test_recycle_items_parallel(env):
+    """Test batch recycling archives every item and records one index entry each"""
+    _, source, bin_ = env
+    paths = [os.path.join(source, 'cache'), os.path.join(source, 'single.tmp')]
+    progress = []
+
+    results = bin_.recycle_items(
+        [{'item_path': p, 'original_size': 1} for p in paths],
+        progress=lambda done, total: progress.append((done, total))
+    )
+
+    assert results == {p: True for p in paths}
+    assert not any(os.path.exists(p) for p in paths)
+    assert sorted(i['original_path'] for i in bin_.list_items()) == sorted(paths)
+    assert progress[-1] == (2, 2)
+
+
+def test_recycle_items_failure_keeps_original(env, monkeypatch):
+    """Test an item whose archive fails is reported and left in place"""
+    _, source, bin_ = env
+    good = os.path.join(source, 'single.tmp')
+    bad = os.path.join(source, 'cache')
+    real_write = bin_.backend.write
+
+    def failing_write(item_path, archive_path):
+        if item_path == bad:
+            raise OSError('disk full')
+        return real_write(item_path, archive_path)
+
+    monkeypatch.setattr(bin_.backend, 'write', failing_write)
+    results = bin_.recycle_items([{'item_path': good}, {'item_path': bad}])
+
+    assert results == {good: True, bad: False}
+    assert os.path.exists(bad)
+    assert [i['original_path'] for i in bin_.list_items()] == [good]
+    # 失败项目不留下残缺归档
+    assert len([n for n in os.listdir(bin_.recycle_path) if n.endswith('.zip')]) == 1
+
+
+@pytest.mark.skipif(not HAS_ZSTD, reason="zstandard not installed")
+def test_zstd_round_trip(env):
+    """Test the zstd backend archives and restores a directory"""
+    _, source, _ = env
+    bin_ = CustomRecycleBin(os.path.join(env[0], 'zbin'), backend=get_archive_backend('zstd'))
+    path = os.path.join(source, 'cache')
+
+    assert bin_.recycle_item(path, 1) is True
+    item = bin_.list_items()[0]
+    assert item['zip_file'].endswith('.tar.zst')
+    assert bin_.restore_item(item['id']) is True
+    assert os.path.exists(os.path.join(path, 'nested', 'photo.jpg'))
+
+
+@pytest.mark.skipif(not HAS_ZSTD, reason="zstandard not installed")
+def test_zstd_writes_incompressible_members_in_own_frames(env):
+    """Test already-compressed members get separate store-level frames and remain readable"""
+    import zstandard
+
+    tmpdir, source, _ = env
+    backend = get_archive_backend('zstd')
+    with open(os.path.join(source, 'cache', 'nested', 'photo.jpg'), 'rb') as f:
+        photo = f.read()
+    archive = os.path.join(tmpdir, 'out.tar.zst')
+    backend.write(os.path.join(source, 'cache'), archive)
+
+    # 逐帧解压：图片所在的帧不含可压缩成员
+    frames = []
+    with open(archive, 'rb') as f:
+        data = f.read()
+    while data:
+        dobj = zstandard.ZstdDecompressor().decompressobj()
+        frames.append(dobj.decompress(data))
+        data = dobj.unused_data
+    photo_frames = [frame for frame in frames if photo in frame]
+    assert len(frames) >= 3
+    assert len(photo_frames) == 1 and b'text text' not in photo_frames[0]
+
+    contents = {name: f.read() for name, f in
+                backend.open_members(archive, ['cache/log.txt', 'cache/nested/photo.jpg'])}
+    assert contents == {'cache/log.txt': b'text ' * 1000, 'cache/nested/photo.jpg': photo}
+
+
+# ============================================================================
+# Catalog Tests
+# ============================================================================
+
+def test_catalog_queries_and_stats(env):
+    """Test lookups by original path, stats and permanent deletion"""
+    _, source, bin_ = env
+    bin_.recycle_item(os.path.join(source, 'single.tmp'), 6, 'tmp', 'safe')
+    bin_.recycle_item(os.path.join(source, 'cache'), 100, 'cache', 'suspicious')
+
+    found = bin_.catalog.find_by_original_path(os.path.join(source, 'cache'))
+    assert [i['risk_level'] for i in found] == ['suspicious']
+    assert [i['original_size'] for i in bin_.list_items('safe')] == [6]
+
+    stats = bin_.get_stats()
+    assert stats['total_items'] == 2
+    assert stats['total_size'] == 106
+    assert stats['by_risk'] == {'safe': 1, 'suspicious': 1}
+
+    assert bin_.delete_item(found[0]['id']) is True
+    assert bin_.delete_item(found[0]['id']) is False
+    assert not os.path.exists(os.path.join(bin_.recycle_path, found[0]['zip_file']))
+
+
+def test_cleanup_old_items(env):
+    """Test items deleted before the cutoff are removed with their archives"""
+    _, source, bin_ = env
+    bin_.recycle_item(os.path.join(source, 'single.tmp'), 6)
+    item = bin_.list_items()[0]
+    item['deleted_at'] = '2000-01-01T00:00:00'
+    bin_.catalog.add(item)
+
+    assert bin_.cleanup_old_items(days=30) == 1
+    assert bin_.list_items() == []
+    assert not os.path.exists(os.path.join(bin_.recycle_path, item['zip_file']))
+
+
+def test_legacy_json_index_imported(env):
+    """Test an existing recycle_index.json is imported once and renamed"""
+    tmpdir, source, _ = env
+    legacy_dir = os.path.join(tmpdir, 'legacy')
+    os.makedirs(legacy_dir)
+    archive = os.path.join(legacy_dir, 'abc123.zip')
+    ZipArchiveBackend().write(os.path.join(source, 'single.tmp'), archive)
+    with open(os.path.join(legacy_dir, LEGACY_INDEX_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'items': [{
+            'id': 'abc123', 'original_path': os.path.join(source, 'restored.tmp'),
+            'original_name': 'single.tmp', 'description': 'old', 'risk_level': 'safe',
+            'original_size': 6, 'zip_size': 10, 'deleted_at': '2024-01-01T00:00:00',
+            'zip_file': 'abc123.zip'
+        }]}, f)
+
+    bin_ = CustomRecycleBin(legacy_dir, backend=ZipArchiveBackend())
+    try:
+        assert not os.path.exists(os.path.join(legacy_dir, LEGACY_INDEX_NAME))
+        assert [i['id'] for i in bin_.list_items()] == ['abc123']
+        assert [i['type'] for i in bin_.scan_all_items()] == ['managed']
+
+        assert bin_.restore_item('abc123') is True
+        assert os.path.exists(os.path.join(source, 'restored.tmp'))
+    finally:
+        bin_.catalog.close()
+
+
+@pytest.mark.parametrize('index', [
+    {'items': [
+        {'id': 'good01', 'original_path': '/tmp/good', 'deleted_at': '2024-01-01T00:00:00',
+         'zip_file': 'good01.zip'},
+        {'id': 'bad01', 'deleted_at': '2024-01-01T00:00:00', 'zip_file': 'bad01.zip'},
+        'not-an-item',
+    ]},
+    [{'id': 'good01', 'original_path': '/tmp/good', 'deleted_at': '2024-01-01T00:00:00',
+      'zip_file': 'good01.zip'}, None],
+])
+def test_malformed_legacy_index_items_skipped(env, index):
+    """Test malformed legacy items are skipped instead of failing construction"""
+    legacy_dir = os.path.join(env[0], 'legacy')
+    os.makedirs(legacy_dir)
+    with open(os.path.join(legacy_dir, LEGACY_INDEX_NAME), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+    bin_ = CustomRecycleBin(legacy_dir, backend=ZipArchiveBackend())
+    try:
+        assert [i['id'] for i in bin_.list_items()] == ['good01']
+        assert not os.path.exists(os.path.join(legacy_dir, LEGACY_INDEX_NAME))
+    finally:
+        bin_.catalog.close()
+
+
+def test_restore_item_claims_record_once(env):
+    """Test only one of two restores of the same item proceeds"""
+    _, source, bin_ = env
+    path = os.path.join(source, 'single.tmp')
+    bin_.recycle_item(path, 6)
+    item = bin_.list_items()[0]
+
+    # 另一方已取出记录：本次恢复不解压、不删除归档
+    claimed = bin_.catalog.claim(item['id'])
+    assert claimed['id'] == item['id']
+    assert bin_.catalog.claim(item['id']) is None
+    assert bin_.restore_item(item['id']) is False
+    assert not os.path.exists(path)
+    assert os.path.exists(os.path.join(bin_.recycle_path, item['zip_file']))
+
+    # 放回后可以正常恢复
+    bin_.catalog.add(claimed)
+    assert bin_.restore_item(item['id']) is True
+    assert os.path.exists(path)
+    assert bin_.list_items() == []
+
+
+def test_failed_restore_keeps_record(env, monkeypatch):
+    """Test a restore that fails after claiming puts the record back"""
+    _, source, bin_ = env
+    bin_.recycle_item(os.path.join(source, 'single.tmp'), 6)
+    item_id = bin_.list_items()[0]['id']
+
+    def failing_extract(archive_path, dest_dir):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(ZipArchiveBackend, 'extract', staticmethod(failing_extract))
+    assert bin_.restore_item(item_id) is False
+    assert [i['id'] for i in bin_.list_items()] == [item_id]
+    assert bin_.catalog.get_manifest(item_id)
+
+
+# ============================================================================
+# Selective Restore Tests
+# ============================================================================
+
+def test_archive_contents_from_cached_manifest(env, monkeypatch):
+    """Test archive contents come from the catalog without opening the archive"""
+    _, source, bin_ = env
+    bin_.recycle_item(os.path.join(source, 'cache'), 100)
+    item_id = bin_.list_items()[0]['id']
+
+    def no_read(*args):
+        raise AssertionError('archive should not be read')
+
+    monkeypatch.setattr(ZipArchiveBackend, 'members', no_read)
+    contents = {c['name']: c['size'] for c in bin_.list_archive_contents(item_id)}
+
+    assert contents == {'cache/log.txt': 5000, 'cache/nested/photo.jpg': 2048}
+
+
+def test_restore_single_file(env):
+    """Test one member is restored and the item stays in the recycle bin"""
+    tmpdir, source, bin_ = env
+    bin_.recycle_item(os.path.join(source, 'cache'), 100)
+    item_id = bin_.list_items()[0]['id']
+
+    restored = bin_.restore_files(item_id, ['cache/log.txt'])
+
+    target = os.path.join(source, 'cache', 'log.txt')
+    assert restored == [target]
+    with open(target, 'rb') as f:
+        assert f.read() == b'text ' * 1000
+    assert not os.path.exists(os.path.join(source, 'cache', 'nested'))
+    assert [i['id'] for i in bin_.list_items()] == [item_id]
+
+    # 指定目标目录，重复恢复不覆盖
+    out = os.path.join(tmpdir, 'out')
+    first = bin_.restore_files(item_id, ['cache/nested/photo.jpg'], out)
+    second = bin_.restore_files(item_id, ['cache/nested/photo.jpg'], out)
+    assert first == [os.path.join(out, 'cache', 'nested', 'photo.jpg')]
+    assert second and second != first
+
+
+def test_legacy_archive_manifest_and_traversal(env):
+    """Test manifests are built lazily for old archives and unsafe names are skipped"""
+    tmpdir, source, bin_ = env
+    archive = os.path.join(bin_.recycle_path, 'legacy01.zip')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('old/keep.txt', 'keep')
+        zf.writestr('../evil.txt', 'evil')
+    bin_.catalog.add({
+        'id': 'legacy01', 'original_path': os.path.join(source, 'old'),
+        'deleted_at': '2024-01-01T00:00:00', 'zip_file': 'legacy01.zip'
+    })
+
+    assert bin_.catalog.get_manifest('legacy01') is None
+    names = [c['name'] for c in bin_.list_archive_contents('legacy01')]
+    assert sorted(names) == ['../evil.txt', 'old/keep.txt']
+    assert bin_.catalog.get_manifest('legacy01') is not None
+
+    restored = bin_.restore_files('legacy01', names)
+    assert restored == [os.path.join(source, 'old', 'keep.txt')]
+    assert not os.path.exists(os.path.join(tmpdir, 'evil.txt'))
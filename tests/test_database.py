@@ -0,0 +1,219 @@
+"""
+Database Unit Tests
+
+Test coverage:
+- Reason interning (cleanup_reasons deduplication)
+- Bulk reference_count flush
+- Versioned migrations and resumable backfills
+"""
+import pytest
+import sys
+import os
+import tempfile
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.database import Database
+from core.database_migration import (
+    DatabaseMigration, MigrationRunner, MigrationStep, BackfillTask, SCHEMA_VERSION
+)
+
+
+@pytest.fixture
+def temp_db():
+    """Create an isolated database"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Database._tables_created = False
+        db = Database(os.path.join(tmpdir, 'test.db'))
+        # 连接按线程缓存，丢弃可能指向其他数据库文件的连接
+        db.close()
+        yield db
+        db.close()
+        Database._tables_created = False
+
+
+def _reference_count(db, reason_id):
+    row = db._get_connection().execute(
+        'SELECT reference_count FROM cleanup_reasons WHERE id = ?', (reason_id,)
+    ).fetchone()
+    return row['reference_count']
+
+
+# ============================================================================
+# Reason Interning Tests
+# ============================================================================
+
+def test_reason_interned_after_first_use(temp_db):
+    """Test repeated reasons reuse the same id without extra rows"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    for i in range(10):
+        temp_db.add_cleanup_item('plan_1', f'/tmp/{i}', 1, 'file', 'safe', 'safe', 'temp file')
+
+    rows = temp_db._get_connection().execute('SELECT COUNT(*) AS c FROM cleanup_reasons').fetchone()
+    assert rows['c'] == 1
+    assert 'temp file' in temp_db._reason_ids
+
+
+def test_reason_refs_flushed_in_bulk(temp_db):
+    """Test reference_count deltas are deferred and flushed together"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    for i in range(5):
+        temp_db.add_cleanup_item('plan_1', f'/tmp/{i}', 1, 'file', 'safe', 'safe', 'cache')
+    reason_id = temp_db._reason_ids['cache']
+
+    assert _reference_count(temp_db, reason_id) == 1
+    assert temp_db.flush_reason_refs() == 1
+    assert _reference_count(temp_db, reason_id) == 5
+    assert temp_db.flush_reason_refs() == 0
+
+
+def test_update_cleanup_plan_flushes_reason_refs(temp_db):
+    """Test plan update writes pending reason references"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    reason_id = temp_db.add_or_get_reason('log file')
+    temp_db.add_or_get_reason('log file')
+
+    temp_db.update_cleanup_plan('plan_1', status='ready')
+    assert _reference_count(temp_db, reason_id) == 2
+
+
+def test_preload_reasons_for_plan(temp_db):
+    """Test preloading a plan's reasons into the intern table"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    temp_db.add_cleanup_item('plan_1', '/tmp/a', 1, 'file', 'safe', 'safe', 'reason a')
+    temp_db.add_cleanup_item('plan_1', '/tmp/b', 1, 'file', 'safe', 'safe', 'reason b')
+
+    temp_db.clear_reason_cache()
+    assert temp_db._reason_ids == {}
+
+    assert temp_db.preload_reasons('plan_1') == 2
+    assert set(temp_db._reason_ids) == {'reason a', 'reason b'}
+
+
+def test_reason_survives_cache_clear(temp_db):
+    """Test an existing reason is found again after the cache is cleared"""
+    first = temp_db.add_or_get_reason('shared')
+    temp_db.clear_reason_cache()
+    assert temp_db.add_or_get_reason('shared') == first
+
+
+def test_failed_insert_keeps_flushed_reason_refs(temp_db):
+    """Test a rolled-back item insert does not discard earlier reference increments"""
+    temp_db.REASON_FLUSH_THRESHOLD = 2
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    reason_id = temp_db.add_or_get_reason('shared')
+    temp_db.add_or_get_reason('shared')
+    temp_db.add_or_get_reason('shared')
+
+    # 无法绑定的参数使插入失败并回滚
+    assert temp_db.add_cleanup_item('plan_1', '/tmp/a', object(), 'file', 'safe', 'safe', 'shared') is None
+    assert _reference_count(temp_db, reason_id) == 3
+
+
+def test_new_reason_interned_only_after_commit(temp_db):
+    """Test a reason inserted by an uncommitted or rolled-back item is not shared"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    conn = temp_db._get_connection()
+    reason_id, created = temp_db._get_or_create_reason_id(conn, 'fresh')
+    assert created is True
+    assert 'fresh' not in temp_db._reason_ids
+    conn.rollback()
+
+    # 插入失败：新原因随事务回滚，驻留表中没有失效的 ID
+    assert temp_db.add_cleanup_item('plan_1', '/tmp/a', object(), 'file', 'safe', 'safe', 'fresh') is None
+    assert 'fresh' not in temp_db._reason_ids
+
+    item_id = temp_db.add_cleanup_item('plan_1', '/tmp/b', 1, 'file', 'safe', 'safe', 'fresh')
+    assert item_id is not None
+    reason_id = temp_db._reason_ids['fresh']
+    assert _reference_count(temp_db, reason_id) == 1
+
+
+def test_reason_cache_is_bounded(temp_db):
+    """Test the intern table evicts least recently used reasons"""
+    temp_db.REASON_CACHE_SIZE = 2
+    temp_db.add_or_get_reason('a')
+    temp_db.add_or_get_reason('b')
+    temp_db.add_or_get_reason('a')
+    temp_db.add_or_get_reason('c')
+
+    assert list(temp_db._reason_ids) == ['a', 'c']
+
+
+# ============================================================================
+# Migration Runner Tests
+# ============================================================================
+
+def test_new_database_records_schema_version(temp_db):
+    """Test a freshly created database is at the latest version"""
+    runner = MigrationRunner(temp_db._get_connection(), DatabaseMigration(temp_db.db_path).get_steps())
+    assert runner.current_version() == SCHEMA_VERSION
+    assert runner.pending_steps() == []
+
+
+def test_schema_applied_on_up_to_date_database(temp_db):
+    """Test tables missing from an up-to-date database are recreated on open"""
+    conn = temp_db._get_connection()
+    conn.execute('DROP TABLE cleanup_reports')
+    conn.commit()
+    temp_db.close()
+
+    Database._tables_created = False
+    db = Database(temp_db.db_path)
+    tables = {row['name'] for row in db._get_connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    )}
+    assert 'cleanup_reports' in tables
+
+
+def test_migration_applies_only_pending_steps():
+    """Test steps at or below the recorded version are skipped"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn = sqlite3.connect(os.path.join(tmpdir, 'm.db'))
+        calls = []
+        steps = [
+            MigrationStep(2, 'two', lambda cur: calls.append(2)),
+            MigrationStep(3, 'three', lambda cur: calls.append(3)),
+        ]
+
+        assert MigrationRunner(conn, steps[:1]).apply_pending() == [2]
+        assert MigrationRunner(conn, steps).apply_pending() == [3]
+        assert MigrationRunner(conn, steps).apply_pending() == []
+        assert calls == [2, 3]
+        conn.close()
+
+
+def test_backfill_is_resumable():
+    """Test backfills run in batches and resume from the checkpoint"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn = sqlite3.connect(os.path.join(tmpdir, 'b.db'))
+        conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER DEFAULT 0)')
+        conn.executemany('INSERT INTO t (v) VALUES (0)', [()] * 25)
+        conn.commit()
+
+        def mark(cursor, low, high):
+            cursor.execute('UPDATE t SET v = 1 WHERE id > ? AND id <= ?', (low, high))
+
+        steps = [MigrationStep(2, 'mark', lambda cur: None,
+                               backfills=[BackfillTask('mark_t', 't', mark, batch_size=10)])]
+        runner = MigrationRunner(conn, steps)
+        runner.apply_pending()
+
+        progress = []
+        assert runner.run_backfills(lambda name, done, total: progress.append(done), max_batches=2) is False
+        assert progress == [10, 20]
+        assert conn.execute('SELECT COUNT(*) FROM t WHERE v = 1').fetchone()[0] == 20
+
+        assert MigrationRunner(conn, steps).run_backfills() is True
+        assert conn.execute('SELECT COUNT(*) FROM t WHERE v = 1').fetchone()[0] == 25
+        assert MigrationRunner(conn, steps).pending_backfills() == []
+        conn.close()
+
+
+def test_database_migration_on_fresh_file():
+    """Test DatabaseMigration works without a pre-existing settings table"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        migration = DatabaseMigration(os.path.join(tmpdir, 'fresh.db'))
+        assert migration.run_migrations() is True
+        assert migration.run_backfills() is True
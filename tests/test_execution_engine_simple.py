@@ -15,12 +15,14 @@ import pytest
 import sys
 import os
 import tempfile
+import threading
 import time
 from unittest.mock import patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
 # Qt - import after path setup
+from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QApplication
 
 # Ensure QApplication exists (qApp is a function call)
@@ -495,6 +497,181 @@ def test_execution_thread_state_tracking():
         assert thread.freed_size == 4
 
 
+# ============================================================================
+# Parallel Execution Tests
+# ============================================================================
+
+def _make_plan(plan_id, source, items):
+    return CleanupPlan(
+        plan_id=plan_id,
+        scan_type="test",
+        scan_target=source,
+        items=items,
+        total_size=sum(item.size for item in items),
+        estimated_freed=sum(item.size for item in items)
+    )
+
+
+def test_execution_thread_parallel_accounting():
+    """Test parallel mode deletes everything and keeps ExecutionResult accounting"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, 'source')
+        os.makedirs(source)
+
+        items = []
+        for i in range(40):
+            file_path = os.path.join(source, f'file_{i}.tmp')
+            with open(file_path, 'w') as f:
+                f.write('xy')
+            items.append(CleanupItem(
+                item_id=i, path=file_path, size=2, item_type='file',
+                original_risk=RiskLevel.SAFE, ai_risk=RiskLevel.SAFE
+            ))
+        # 不存在的项目应计为跳过
+        items.append(CleanupItem(
+            item_id=99, path=os.path.join(source, 'missing.tmp'), size=5, item_type='file',
+            original_risk=RiskLevel.SAFE, ai_risk=RiskLevel.SAFE
+        ))
+
+        backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        config = ExecutionConfig(enable_backup=False, parallel_workers=4, per_volume_limit=2)
+        thread = ExecutionThread(_make_plan("test_parallel", source, items), backup_mgr, config)
+
+        results = []
+        batches = []
+        started = []
+        completed = []
+        thread.execution_completed.connect(results.append, type=Qt.DirectConnection)
+        thread.items_completed.connect(batches.append, type=Qt.DirectConnection)
+        thread.item_started.connect(started.append, type=Qt.DirectConnection)
+        thread.item_completed.connect(
+            lambda path, status: completed.append((path, status)), type=Qt.DirectConnection
+        )
+        thread.start()
+        thread.wait(10000)
+
+        assert all(not os.path.exists(item.path) for item in items)
+        result = results[0]
+        assert result.success_items == 40
+        assert result.skipped_items == 1
+        assert result.freed_size == 80
+        assert thread.success_count == 40
+        # 完成通知按批聚合，覆盖所有项目
+        assert sum(len(batch) for batch in batches) == 41
+        assert len(batches) < 41
+        # 现有页面依赖的逐项信号仍然发送
+        assert sorted(started) == sorted(item.path for item in items)
+        assert sorted(completed) == sorted(pair for batch in batches for pair in batch)
+
+
+def test_execution_thread_parallel_with_backup(temp_test_files):
+    """Test backup and delete overlap across items in parallel mode"""
+    tmpdir, source, test_files = temp_test_files
+    backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+
+    items = [
+        CleanupItem(
+            item_id=i, path=path, size=size, item_type='file',
+            original_risk=RiskLevel.DANGEROUS, ai_risk=RiskLevel.DANGEROUS
+        )
+        for i, (path, size) in enumerate(test_files[:3])
+    ]
+    config = ExecutionConfig(enable_backup=True, parallel_workers=3)
+    thread = ExecutionThread(_make_plan("test_parallel_backup", source, items), backup_mgr, config)
+
+    # 记录打开过数据库连接的工作线程
+    workers = set()
+    get_connection = backup_mgr.db._get_connection
+
+    def tracking_get_connection():
+        if threading.current_thread().name.startswith('purifyai-exec'):
+            workers.add(threading.current_thread())
+        return get_connection()
+
+    backup_mgr.db._get_connection = tracking_get_connection
+    try:
+        thread.start()
+        thread.wait(10000)
+    finally:
+        del backup_mgr.db._get_connection
+
+    assert all(not os.path.exists(item.path) for item in items)
+    assert backup_mgr.get_stats().full_backups == 3
+    # 工作线程的线程本地连接在线程池关闭前释放
+    assert workers
+    assert all(worker._db_connection is None for worker in workers)
+
+
+def test_execution_thread_parallel_backs_up_child_before_parent_delete():
+    """Test a parent directory is not deleted while a nested item is still backing up"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        parent = os.path.join(tmpdir, 'source', 'cache')
+        os.makedirs(parent)
+        child = os.path.join(parent, 'important.db')
+        with open(child, 'wb') as f:
+            f.write(b'keep me')
+
+        items = [
+            # 父目录排在前面，且不需要备份
+            CleanupItem(item_id=1, path=parent, size=7, item_type='directory',
+                        original_risk=RiskLevel.SAFE, ai_risk=RiskLevel.SAFE),
+            CleanupItem(item_id=2, path=child, size=7, item_type='file',
+                        original_risk=RiskLevel.DANGEROUS, ai_risk=RiskLevel.DANGEROUS),
+        ]
+        backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        create_backup = backup_mgr.create_backup
+
+        def slow_backup(item):
+            if item.path == child:
+                time.sleep(0.3)
+            return create_backup(item)
+
+        backup_mgr.create_backup = slow_backup
+        config = ExecutionConfig(enable_backup=True, parallel_workers=4, plan_order=False)
+        thread = ExecutionThread(_make_plan("test_parallel_nested", tmpdir, items), backup_mgr, config)
+
+        backups = []
+        thread.backup_created.connect(backups.append, type=Qt.DirectConnection)
+        thread.start()
+        thread.wait(10000)
+
+        assert not os.path.exists(parent)
+        assert len(backups) == 1
+        with open(backups[0].backup_path, 'rb') as f:
+            assert f.read() == b'keep me'
+
+
+def test_nested_path_gate_orders_descendants_and_duplicates():
+    """Test ancestors wait for nested paths and duplicates run in order"""
+    from collections import deque
+    from core.volumes import NestedPathGate
+
+    paths = ['/a', '/a/b/c', '/a/b', '/x', '/a/b/c']
+    gate = NestedPathGate(paths)
+    assert [gate.ready(i) for i in range(5)] == [False, True, False, True, False]
+
+    queue = deque(range(5))
+    assert gate.pop_ready(queue) == 1
+    gate.done(1)
+    assert [gate.ready(i) for i in (0, 2, 4)] == [False, False, True]
+    gate.done(4)
+    assert gate.ready(2) and not gate.ready(0)
+    gate.done(2)
+    assert gate.ready(0)
+
+
+def test_volume_key_groups_same_directory():
+    """Test items in one directory map to the same volume"""
+    from core.volumes import volume_key
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = {}
+        first = volume_key(os.path.join(tmpdir, 'a'), cache)
+        second = volume_key(os.path.join(tmpdir, 'b'), cache)
+        assert first == second
+        assert len(cache) <= 1
+
+
 # ============================================================================
 # Integration Tests
 # ============================================================================
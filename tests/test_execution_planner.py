@@ -0,0 +1,178 @@
+"""
+Execution Planner Unit Tests
+
+Test coverage:
+- Per-item cost estimation (file count, backup type, staged mode)
+- Execution ordering (cheap deletes first, directory locality)
+- Cost-weighted progress and ETA
+- ETA reporting from ExecutionThread
+"""
+import pytest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, qApp
+if qApp is None:
+    QApplication(sys.argv)
+
+from core.execution_planner import ExecutionPlanner, CostModel, ProgressTracker
+from core.execution_engine import ExecutionThread, ExecutionConfig
+from core.backup_manager import BackupManager
+from core.models_smart import CleanupItem, CleanupPlan, BackupType
+from core.rule_engine import RiskLevel
+
+
+def _item(item_id, path, risk=RiskLevel.SAFE, size=10, item_type='file'):
+    return CleanupItem(item_id=item_id, path=path, size=size, item_type=item_type,
+                       original_risk=risk, ai_risk=risk)
+
+
+@pytest.fixture
+def tree():
+    """Create a directory with a known number of files"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = os.path.join(tmpdir, 'cache')
+        os.makedirs(os.path.join(cache, 'sub'))
+        for i in range(5):
+            with open(os.path.join(cache, f'f{i}.tmp'), 'w') as f:
+                f.write('x')
+        with open(os.path.join(cache, 'sub', 'g.tmp'), 'w') as f:
+            f.write('x')
+        yield tmpdir, cache
+
+
+# ============================================================================
+# Estimation Tests
+# ============================================================================
+
+def test_estimate_counts_directory_entries(tree):
+    """Test directories are counted and cost scales with entries"""
+    _, cache = tree
+    planner = ExecutionPlanner()
+
+    dir_cost = planner.estimate(_item(1, cache, item_type='directory'))
+    file_cost = planner.estimate(_item(2, os.path.join(cache, 'f0.tmp')))
+
+    assert dir_cost.file_count == 7  # 6 个文件 + 1 个子目录
+    assert file_cost.file_count == 1
+    assert dir_cost.seconds > file_cost.seconds
+
+
+def test_estimate_backup_costs():
+    """Test full backups cost I/O and outweigh hardlinks and plain deletes"""
+    model = CostModel()
+    planner = ExecutionPlanner(cost_model=model)
+    size = 50 * 1024 * 1024
+
+    safe = planner.estimate(_item(1, '/x/a', RiskLevel.SAFE, size))
+    link = planner.estimate(_item(2, '/x/b', RiskLevel.SUSPICIOUS, size))
+    full = planner.estimate(_item(3, '/x/c', RiskLevel.DANGEROUS, size))
+
+    assert (safe.backup_type, link.backup_type, full.backup_type) == \
+        (BackupType.NONE, BackupType.HARDLINK, BackupType.FULL)
+    assert safe.seconds < link.seconds < full.seconds
+    assert full.io_bytes == size * 2 and link.io_bytes == 0
+    # 禁用备份时全部按免备份估算
+    assert ExecutionPlanner(enable_backup=False).estimate(_item(3, '/x/c', RiskLevel.DANGEROUS)).io_bytes == 0
+
+
+def test_staged_cost_is_constant(tree):
+    """Test staged mode costs one rename regardless of tree size"""
+    _, cache = tree
+    cost = ExecutionPlanner(staged=True, enable_backup=False).estimate(_item(1, cache, item_type='directory'))
+    assert cost.seconds == CostModel().stage_per_item
+
+
+def test_staged_cost_excludes_backup(tree):
+    """Test staged mode does not charge for backups the executor skips"""
+    _, cache = tree
+    cost = ExecutionPlanner(staged=True).estimate(_item(1, cache, RiskLevel.DANGEROUS, item_type='directory'))
+    assert cost.backup_type == BackupType.NONE
+    assert cost.seconds == CostModel().stage_per_item
+    assert cost.io_bytes == 0
+
+
+# ============================================================================
+# Ordering Tests
+# ============================================================================
+
+def test_plan_orders_cheap_first_and_groups_directories():
+    """Test SAFE items run first and same-directory items are adjacent"""
+    base = os.path.abspath(os.sep + 'data')
+    items = [
+        _item(1, os.path.join(base, 'b', 'x.tmp'), RiskLevel.DANGEROUS),
+        _item(2, os.path.join(base, 'a', 'y.tmp')),
+        _item(3, os.path.join(base, 'b', 'z.tmp')),
+        _item(4, os.path.join(base, 'a', 'w.tmp'), RiskLevel.SUSPICIOUS),
+        _item(5, os.path.join(base, 'a', 'v.tmp')),
+    ]
+
+    ordered = [item.item_id for item in ExecutionPlanner().plan(items).items]
+    assert ordered == [5, 2, 3, 4, 1]
+
+    unordered = [item.item_id for item in ExecutionPlanner().plan(items, reorder=False).items]
+    assert unordered == [1, 2, 3, 4, 5]
+
+
+def test_plan_runs_descendants_before_ancestors():
+    """Test a SAFE parent never runs before a backed-up item inside it"""
+    base = os.path.abspath(os.sep + 'data')
+    items = [
+        _item(1, os.path.join(base, 'cache'), item_type='directory'),
+        _item(2, os.path.join(base, 'cache', 'keep', 'db.sqlite'), RiskLevel.DANGEROUS),
+        _item(3, os.path.join(base, 'cache', 'a.tmp')),
+        _item(4, os.path.join(base, 'other.tmp')),
+    ]
+
+    ordered = [item.item_id for item in ExecutionPlanner().plan(items).items]
+    assert ordered == [3, 4, 2, 1]
+
+
+# ============================================================================
+# Progress Tests
+# ============================================================================
+
+def test_progress_tracker_weights_by_cost():
+    """Test completion fraction follows estimated cost, not item count"""
+    planner = ExecutionPlanner()
+    cheap = _item(1, '/x/a', RiskLevel.SAFE)
+    costly = _item(2, '/x/b', RiskLevel.DANGEROUS, size=500 * 1024 * 1024)
+    plan = planner.plan([cheap, costly])
+    tracker = ProgressTracker(plan)
+
+    assert tracker.remaining_seconds() == pytest.approx(plan.total_seconds)
+    tracker.complete(cheap)
+    assert tracker.fraction < 0.01
+    tracker.complete(costly)
+    assert tracker.fraction == 1.0
+    assert tracker.remaining_seconds() == 0.0
+
+
+def test_execution_thread_reports_eta(tree):
+    """Test ExecutionThread runs the planned order and emits ETA updates"""
+    tmpdir, cache = tree
+    paths = [os.path.join(cache, f'f{i}.tmp') for i in range(5)]
+    items = [_item(i, path, RiskLevel.SUSPICIOUS if i == 0 else RiskLevel.SAFE, 1)
+             for i, path in enumerate(paths)]
+    plan = CleanupPlan(plan_id='eta', scan_type='test', scan_target=cache, items=items,
+                       total_size=5, estimated_freed=5)
+
+    thread = ExecutionThread(plan, BackupManager(backup_root=os.path.join(tmpdir, 'backups')),
+                             ExecutionConfig(progress_interval=0))
+    started = []
+    etas = []
+    thread.item_started.connect(started.append, type=Qt.DirectConnection)
+    thread.eta_updated.connect(lambda remaining, fraction: etas.append((remaining, fraction)),
+                               type=Qt.DirectConnection)
+    thread.start()
+    thread.wait(10000)
+
+    assert thread.success_count == 5
+    # 需要备份的项目排在最后
+    assert started[-1] == paths[0]
+    assert etas[0][1] == 0.0
+    assert etas[-1] == (0.0, 1.0)
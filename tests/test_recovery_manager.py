@@ -448,6 +448,136 @@ def test_batch_restore():
                         assert f.read() == test_files_original_contents[test_file]
 
 
+def _backed_up_files(tmpdir, backup_mgr, count):
+    """Create files, back them up and delete the originals"""
+    source = os.path.join(tmpdir, 'source')
+    os.makedirs(source, exist_ok=True)
+    paths, backup_ids = [], []
+    for i in range(count):
+        path = os.path.join(source, f'item_{i}.txt')
+        with open(path, 'w') as f:
+            f.write(f'content {i}')
+        item = CleanupItem(item_id=i, path=path, size=9, item_type='file',
+                           original_risk=RiskLevel.SUSPICIOUS, ai_risk=RiskLevel.SUSPICIOUS)
+        backup_ids.append(backup_mgr.create_backup(item).backup_id)
+        paths.append(path)
+    for path in paths:
+        os.remove(path)
+    return paths, backup_ids
+
+
+def test_batch_restore_parallel_pipeline():
+    """Test the worker pool restores every item and reports final progress"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        paths, backup_ids = _backed_up_files(tmpdir, backup_mgr, 20)
+        recovery_mgr = RecoveryManager(backup_mgr=backup_mgr)
+        progress_calls = []
+
+        result = recovery_mgr.batch_restore(
+            backup_ids + ['nonexistent_backup_id'],
+            lambda current, total: progress_calls.append((current, total)),
+            max_workers=4, per_volume_limit=2
+        )
+
+        assert result == (20, 1, 0)
+        assert progress_calls[-1] == (21, 21)
+        for i, path in enumerate(paths):
+            with open(path) as f:
+                assert f.read() == f'content {i}'
+
+        # 已恢复的备份再次恢复时跳过
+        assert recovery_mgr.batch_restore(backup_ids[:3]) == (0, 0, 3)
+
+
+def test_batch_restore_cancelled():
+    """Test cancellation stops submitting and counts remaining items as skipped"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        paths, backup_ids = _backed_up_files(tmpdir, backup_mgr, 5)
+        recovery_mgr = RecoveryManager(backup_mgr=backup_mgr)
+
+        assert recovery_mgr.batch_restore(backup_ids, should_stop=lambda: True) == (0, 0, 5)
+        assert not any(os.path.exists(p) for p in paths)
+
+
+def test_batch_restore_orders_nested_and_dedupes_targets():
+    """Test nested targets restore ancestors first and duplicates keep the newest backup"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'))
+        target_dir = os.path.join(tmpdir, 'target')
+        child = os.path.join(target_dir, 'child.txt')
+        now = datetime.now()
+
+        def add_backup(backup_id, original_path, content, created_at, is_dir=False):
+            backup_path = os.path.join(tmpdir, 'stored', backup_id)
+            if is_dir:
+                os.makedirs(backup_path)
+                content_path = os.path.join(backup_path, 'child.txt')
+            else:
+                os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+                content_path = backup_path
+            with open(content_path, 'w') as f:
+                f.write(content)
+            backup_mgr._backup_cache[backup_id] = BackupInfo(
+                backup_id=backup_id, original_path=original_path, backup_path=backup_path,
+                backup_type=BackupType.FULL, created_at=created_at
+            )
+            return backup_id
+
+        ids = [
+            add_backup('child-new', child, 'child new', now),
+            add_backup('child-old', child, 'child old', now - timedelta(hours=1)),
+            add_backup('parent', target_dir, 'from parent', now - timedelta(hours=2), is_dir=True),
+        ]
+
+        # 子项恢复较慢时，并行执行会让父目录的 rmtree + copytree 覆盖它
+        restore = backup_mgr.restore_from_info
+
+        def slow_child_restore(backup_info, *args):
+            if backup_info.original_path == child:
+                time.sleep(0.2)
+            return restore(backup_info, *args)
+
+        backup_mgr.restore_from_info = slow_child_restore
+        recovery_mgr = RecoveryManager(backup_mgr=backup_mgr)
+
+        assert recovery_mgr.batch_restore(ids, max_workers=4, per_volume_limit=4) == (2, 0, 1)
+        with open(child) as f:
+            assert f.read() == 'child new'
+        assert not backup_mgr._backup_cache['child-old'].restored
+
+
+def test_batch_restore_loads_metadata_from_db():
+    """Test uncached backups are loaded in one query and marked restored in bulk"""
+    from core.database import Database
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Database._tables_created = False
+        db = Database(os.path.join(tmpdir, 'test.db'))
+        db.close()
+        try:
+            backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'), db=db)
+            original = os.path.join(tmpdir, 'restored.txt')
+            backup_path = os.path.join(tmpdir, 'backup.txt')
+            with open(backup_path, 'w') as f:
+                f.write('from db')
+            log_id = db.add_recovery_log('plan', 1, original, backup_path, BackupType.FULL.value)
+
+            recovery_mgr = RecoveryManager(backup_mgr=backup_mgr, db=db)
+            assert recovery_mgr.batch_restore([str(log_id)]) == (1, 0, 0)
+
+            with open(original) as f:
+                assert f.read() == 'from db'
+            row = db._get_connection().execute(
+                'SELECT restored FROM recovery_log WHERE id = ?', (log_id,)
+            ).fetchone()
+            assert row['restored'] == 1
+        finally:
+            db.close()
+            Database._tables_created = False
+
+
 def test_restore_failed_items():
     """Test restoring failed items"""
     recovery_mgr = get_recovery_manager()
@@ -0,0 +1,235 @@
+"""
+Retention Engine Unit Tests
+
+Test coverage:
+- Batched pruning by age
+- Compressed archiving
+- Reason reference release for cleanup_items
+- VACUUM/ANALYZE maintenance
+"""
+import pytest
+import sys
+import os
+import gzip
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.database import Database
+from core.retention import RetentionEngine, RetentionPolicy, default_policies
+
+
+@pytest.fixture
+def temp_db():
+    """Create an isolated database with old and new history rows"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Database._tables_created = False
+        db = Database(os.path.join(tmpdir, 'test.db'))
+        # 连接按线程缓存，丢弃可能指向其他数据库文件的连接
+        db.close()
+
+        conn = db._get_connection()
+        old = (datetime.now() - timedelta(days=400)).isoformat()
+        new = datetime.now().isoformat()
+        for i in range(12):
+            conn.execute('''
+                INSERT INTO clean_history
+                (clean_type, items_count, total_size, duration_ms, timestamp_cleaned_at)
+                VALUES ('system', 1, 1, 1, ?)
+            ''', (old if i < 10 else new,))
+        conn.commit()
+
+        yield db
+        db.close()
+        Database._tables_created = False
+
+
+def _count(db, table):
+    return db._get_connection().execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_default_policies_cover_history_tables():
+    """Test default policies include every growing history table"""
+    tables = {p.table for p in default_policies()}
+    assert {'cleanup_items', 'recovery_log', 'cleanup_executions',
+            'clean_history', 'annotations'} <= tables
+
+
+def test_prune_in_batches(temp_db):
+    """Test expired rows are removed across several batches"""
+    engine = RetentionEngine(db=temp_db, policies=[], batch_size=3, archive=False)
+    conn = engine._connect('main')
+    deleted = engine.prune(RetentionPolicy('clean_history', 'timestamp_cleaned_at', 365), conn)
+    conn.close()
+
+    assert deleted == 10
+    assert _count(temp_db, 'clean_history') == 2
+
+
+def test_prune_with_archive(temp_db):
+    """Test pruned rows are written to a gzip archive"""
+    with tempfile.TemporaryDirectory() as archive_dir:
+        engine = RetentionEngine(db=temp_db, policies=[], archive_dir=archive_dir,
+                                 batch_size=4, archive=True)
+        conn = engine._connect('main')
+        engine.prune(RetentionPolicy('clean_history', 'timestamp_cleaned_at', 365), conn)
+        conn.close()
+
+        path = engine._archive_path('clean_history')
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 10
+        assert records[0]['clean_type'] == 'system'
+        assert '_rowid' not in records[0]
+
+
+def test_prune_disabled_policy(temp_db):
+    """Test days=0 keeps rows forever"""
+    engine = RetentionEngine(db=temp_db, policies=[], archive=False)
+    conn = engine._connect('main')
+    assert engine.prune(RetentionPolicy('clean_history', 'timestamp_cleaned_at', 0), conn) == 0
+    conn.close()
+
+
+def test_prune_cleanup_items_releases_reasons(temp_db):
+    """Test pruning cleanup_items drops reasons that are no longer referenced"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    temp_db.add_cleanup_item('plan_1', '/tmp/a', 1, 'file', 'safe', 'safe', 'only reason')
+    temp_db.flush_reason_refs()
+
+    engine = RetentionEngine(db=temp_db, archive=False, policies=[
+        p for p in default_policies() if p.table == 'cleanup_items'
+    ])
+    conn = engine._connect('main')
+    engine.prune(engine.policies[0], conn, now=datetime.now() + timedelta(days=365))
+    conn.close()
+
+    assert _count(temp_db, 'cleanup_items') == 0
+    assert _count(temp_db, 'cleanup_reasons') == 0
+
+
+def test_prune_evicts_released_reasons_from_cache(temp_db):
+    """Test items added after pruning never reference a deleted reason"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    temp_db.add_cleanup_item('plan_1', '/tmp/a', 1, 'file', 'safe', 'safe', 'only reason')
+    temp_db.flush_reason_refs()
+    assert 'only reason' in temp_db._reason_ids
+
+    engine = RetentionEngine(db=temp_db, archive=False, policies=[
+        p for p in default_policies() if p.table == 'cleanup_items'
+    ])
+    conn = engine._connect('main')
+    engine.prune(engine.policies[0], conn, now=datetime.now() + timedelta(days=365))
+    conn.close()
+    assert 'only reason' not in temp_db._reason_ids
+
+    # 驻留表中的失效 ID 已随删除移除，新项目重新创建原因
+    item_id = temp_db.add_cleanup_item('plan_1', '/tmp/b', 1, 'file', 'safe', 'safe', 'only reason')
+    row = temp_db._get_connection().execute('''
+        SELECT cr.reason, cr.reference_count FROM cleanup_items ci
+        LEFT JOIN cleanup_reasons cr ON cr.id = ci.reason_id
+        WHERE ci.id = ?
+    ''', (item_id,)).fetchone()
+    assert row['reason'] == 'only reason'
+    assert row['reference_count'] == 1
+
+
+def test_prune_cleanup_items_keeps_reasons_with_pending_refs(temp_db):
+    """Test reasons referenced by not-yet-flushed items survive pruning"""
+    temp_db.create_cleanup_plan('plan_1', 'Test', 'system', '/tmp')
+    old_id = temp_db.add_cleanup_item('plan_1', '/tmp/a', 1, 'file', 'safe', 'safe', 'shared reason')
+    temp_db.flush_reason_refs()
+    conn = temp_db._get_connection()
+    conn.execute('UPDATE cleanup_items SET created_at = ? WHERE id = ?',
+                 ((datetime.now() - timedelta(days=400)).isoformat(), old_id))
+    conn.commit()
+    # 命中驻留表，引用计数增量仅在内存中
+    temp_db.add_cleanup_item('plan_1', '/tmp/b', 1, 'file', 'safe', 'safe', 'shared reason')
+
+    engine = RetentionEngine(db=temp_db, archive=False, policies=[
+        p for p in default_policies() if p.table == 'cleanup_items'
+    ])
+    conn = engine._connect('main')
+    assert engine.prune(engine.policies[0], conn) == 1
+    conn.close()
+
+    row = temp_db._get_connection().execute('SELECT reference_count FROM cleanup_reasons').fetchone()
+    assert row['reference_count'] == 1
+
+
+def test_reviewed_annotations_are_kept():
+    """Test the annotation policy only expires unreviewed annotations"""
+    policy = next(p for p in default_policies() if p.table == 'annotations')
+    assert policy.extra_condition == 'user_reviewed = 0'
+
+
+def test_prune_recovery_log_keeps_unreaped_staged(temp_db):
+    """Test staged recovery records survive retention until they are reaped"""
+    staged_id = temp_db.add_recovery_log('plan_1', 1, '/tmp/a', '/staging/a', 'staged')
+    reaped_id = temp_db.add_recovery_log('plan_1', 2, '/tmp/b', '/staging/b', 'staged')
+    temp_db.clear_recovery_backup_paths([reaped_id])
+    temp_db.add_recovery_log('plan_1', 3, '/tmp/c', '/backups/c', 'full')
+
+    engine = RetentionEngine(db=temp_db, archive=False, policies=[
+        p for p in default_policies() if p.table == 'recovery_log'
+    ])
+    conn = engine._connect('main')
+    deleted = engine.prune(engine.policies[0], conn, now=datetime.now() + timedelta(days=365))
+    conn.close()
+
+    assert deleted == 2
+    assert [row['id'] for row in temp_db.get_recovery_logs([staged_id])] == [staged_id]
+
+
+def test_run_maintenance(temp_db):
+    """Test full maintenance prunes, vacuums and analyzes"""
+    engine = RetentionEngine(
+        db=temp_db, archive=False,
+        policies=[RetentionPolicy('clean_history', 'timestamp_cleaned_at', 365)],
+        annotations_db_path=os.path.join(os.path.dirname(temp_db.db_path), 'missing.db')
+    )
+    result = engine.run_maintenance()
+
+    assert result.deleted == {'clean_history': 10}
+    assert result.analyzed is True
+    assert result.errors == {}
+    conn = engine._connect('main')
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    conn.close()
+
+
+def test_clear_old_cache(temp_db):
+    """Test clear_old_cache removes stale AI classifications"""
+    conn = temp_db._get_connection()
+    conn.execute('''
+        INSERT INTO ai_classifications (folder_name, risk_level, cached_at)
+        VALUES ('old', 'safe', ?)
+    ''', ((datetime.now() - timedelta(days=60)).isoformat(),))
+    conn.commit()
+
+    temp_db.clear_old_cache(days=30)
+    assert _count(temp_db, 'ai_classifications') == 0
+
+
+def test_maintenance_thread_forwards_backfill_progress(caplog):
+    """Test backfill progress is emitted as a signal and logged in 10% steps"""
+    import logging
+    from core.retention import MaintenanceThread
+
+    thread = MaintenanceThread()
+    received = []
+    thread.backfill_progress.connect(lambda *args: received.append(args))
+
+    with caplog.at_level(logging.INFO):
+        for processed in (100, 150, 500, 1000):
+            thread._on_backfill_progress('cleanup_items_reason', processed, 1000)
+
+    assert received == [('cleanup_items_reason', p, 1000) for p in (100, 150, 500, 1000)]
+    logged = [r.getMessage() for r in caplog.records if '回填' in r.getMessage()]
+    assert logged == [
+        '[RETENTION] 回填 cleanup_items_reason: 100/1000 (10%)',
+        '[RETENTION] 回填 cleanup_items_reason: 500/1000 (50%)',
+        '[RETENTION] 回填 cleanup_items_reason: 1000/1000 (100%)',
+    ]
@@ -0,0 +1,161 @@
+"""
+Staging (Delete-by-Rename) Unit Tests
+
+Test coverage:
+- StagingArea same-volume rename
+- Staged execution mode in ExecutionThread
+- Restoring staged items through BackupManager
+- StagingReaper background deletion
+"""
+import pytest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from PyQt5.QtWidgets import QApplication, qApp
+if qApp is None:
+    QApplication(sys.argv)
+
+from core.database import Database
+from core.backup_manager import BackupManager
+from core.execution_engine import ExecutionThread, ExecutionConfig
+from core.models_smart import CleanupPlan, CleanupItem, BackupType
+from core.rule_engine import RiskLevel
+from core.staging import StagingArea, StagingReaper, STAGING_DIR_NAME
+
+
+@pytest.fixture
+def env():
+    """Create an isolated database, backup manager and source tree"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Database._tables_created = False
+        db = Database(os.path.join(tmpdir, 'test.db'))
+        # 连接按线程缓存，丢弃可能指向其他数据库文件的连接
+        db.close()
+
+        source = os.path.join(tmpdir, 'source')
+        os.makedirs(os.path.join(source, 'cache_dir', 'nested'))
+        for rel in ('a.tmp', os.path.join('cache_dir', 'b.tmp'),
+                    os.path.join('cache_dir', 'nested', 'c.tmp')):
+            with open(os.path.join(source, rel), 'w') as f:
+                f.write('data')
+
+        backup_mgr = BackupManager(backup_root=os.path.join(tmpdir, 'backups'), db=db)
+        yield tmpdir, source, db, backup_mgr
+        db.close()
+        Database._tables_created = False
+
+
+def _run_staged(tmpdir, source, backup_mgr, paths, risk=RiskLevel.SAFE, enable_backup=False,
+                staging=None):
+    items = [
+        CleanupItem(item_id=i, path=path, size=4, item_type='file',
+                    original_risk=risk, ai_risk=risk)
+        for i, path in enumerate(paths)
+    ]
+    plan = CleanupPlan(plan_id='staged', scan_type='test', scan_target=source, items=items,
+                       total_size=4 * len(items), estimated_freed=4 * len(items))
+    config = ExecutionConfig(enable_backup=enable_backup, staged_delete=True)
+    thread = ExecutionThread(plan, backup_mgr, config)
+    thread.staging = staging or StagingArea(base_dir=tmpdir)
+    thread.start()
+    thread.wait(10000)
+    return thread
+
+
+# ============================================================================
+# StagingArea Tests
+# ============================================================================
+
+def test_stage_renames_into_staging_dir(env):
+    """Test staging moves the item into the same-volume staging directory"""
+    tmpdir, source, _, _ = env
+    path = os.path.join(source, 'a.tmp')
+
+    staged = StagingArea(base_dir=tmpdir).stage(path)
+
+    assert not os.path.exists(path)
+    assert os.path.dirname(staged) == os.path.join(tmpdir, STAGING_DIR_NAME)
+    assert staged.endswith('_a.tmp')
+
+
+def test_stage_missing_path_returns_none(env):
+    """Test staging a missing path falls back to the caller"""
+    tmpdir, source, _, _ = env
+    assert StagingArea(base_dir=tmpdir).stage(os.path.join(source, 'missing')) is None
+
+
+# ============================================================================
+# Staged Execution Tests
+# ============================================================================
+
+def test_staged_execution_and_restore(env):
+    """Test staged items disappear immediately and can be restored before reaping"""
+    tmpdir, source, db, backup_mgr = env
+    dir_path = os.path.join(source, 'cache_dir')
+    thread = _run_staged(tmpdir, source, backup_mgr, [os.path.join(source, 'a.tmp'), dir_path])
+
+    assert thread.success_count == 2
+    assert not os.path.exists(dir_path)
+
+    staged = [b for b in backup_mgr._backup_cache.values() if b.backup_type == BackupType.STAGED]
+    assert len(staged) == 2
+
+    info = next(b for b in staged if b.original_path == dir_path)
+    # 清空缓存，确保走数据库记录恢复
+    backup_mgr._backup_cache.clear()
+    assert backup_mgr.restore_backup(info.backup_id) is True
+    assert os.path.exists(os.path.join(dir_path, 'nested', 'c.tmp'))
+
+    row = db._get_connection().execute(
+        'SELECT restored FROM recovery_log WHERE id = ?', (int(info.backup_id),)
+    ).fetchone()
+    assert row['restored'] == 1
+
+
+def test_staged_items_are_not_backed_up(env):
+    """Test staging replaces the backup; a backup is only made when staging fails"""
+    tmpdir, source, db, backup_mgr = env
+    _run_staged(tmpdir, source, backup_mgr, [os.path.join(source, 'a.tmp')],
+                risk=RiskLevel.DANGEROUS, enable_backup=True)
+    types = [b.backup_type for b in backup_mgr._backup_cache.values()]
+    assert types == [BackupType.STAGED]
+
+    class FailingStaging(StagingArea):
+        def stage(self, path):
+            return None
+
+    path = os.path.join(source, 'cache_dir', 'b.tmp')
+    _run_staged(tmpdir, source, backup_mgr, [path], risk=RiskLevel.DANGEROUS,
+                enable_backup=True, staging=FailingStaging(base_dir=tmpdir))
+    assert not os.path.exists(path)
+    assert sorted(b.backup_type.value for b in backup_mgr._backup_cache.values()) == \
+        sorted([BackupType.STAGED.value, BackupType.FULL.value])
+
+
+def test_reaper_deletes_staged_items(env):
+    """Test the reaper removes staged items and they can no longer be restored"""
+    tmpdir, source, db, backup_mgr = env
+    _run_staged(tmpdir, source, backup_mgr,
+                [os.path.join(source, 'a.tmp'), os.path.join(source, 'cache_dir')])
+    staged = [b for b in backup_mgr._backup_cache.values() if b.backup_type == BackupType.STAGED]
+
+    reaped, failed = StagingReaper(db=db, grace_seconds=0, throttle_delay=0).reap()
+
+    assert (reaped, failed) == (2, 0)
+    assert os.listdir(os.path.join(tmpdir, STAGING_DIR_NAME)) == []
+    assert db.get_staged_recovery_logs('9999') == []
+
+    backup_mgr._backup_cache.clear()
+    assert backup_mgr.restore_backup(staged[0].backup_id) is False
+
+
+def test_reaper_respects_grace_period(env):
+    """Test items inside the grace period are kept"""
+    tmpdir, source, db, backup_mgr = env
+    _run_staged(tmpdir, source, backup_mgr, [os.path.join(source, 'a.tmp')])
+
+    assert StagingReaper(db=db, grace_seconds=3600, throttle_delay=0).reap() == (0, 0)
+    assert len(os.listdir(os.path.join(tmpdir, STAGING_DIR_NAME))) == 1
@@ -0,0 +1,115 @@
+"""
+Tree Deleter Unit Tests
+
+Test coverage:
+- Single-pass bottom-up deletion
+- Symlinks are removed, never followed
+- Read-only entries handled inline
+- Per-path failure recording
+"""
+import pytest
+import sys
+import os
+import stat
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.tree_deleter import delete_tree
+
+
+@pytest.fixture
+def tree():
+    """Create a nested directory tree"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = os.path.join(tmpdir, 'cache')
+        for sub in ('a', os.path.join('a', 'b'), 'c'):
+            os.makedirs(os.path.join(root, sub))
+        for rel in ('x.tmp', os.path.join('a', 'y.tmp'), os.path.join('a', 'b', 'z.tmp'),
+                    os.path.join('c', 'w.tmp')):
+            with open(os.path.join(root, rel), 'w') as f:
+                f.write('data')
+        yield tmpdir, root
+
+
+def test_delete_tree_removes_everything(tree):
+    """Test the whole tree including the root is removed"""
+    _, root = tree
+    result = delete_tree(root)
+
+    assert result.success
+    assert not os.path.exists(root)
+    assert result.deleted_files == 4
+    assert result.deleted_dirs == 4
+
+
+def test_delete_tree_path_mode(tree, monkeypatch):
+    """Test the path-based walk used on Windows"""
+    import core.tree_deleter as tree_deleter
+    monkeypatch.setattr(tree_deleter, '_USE_DIR_FD', False)
+    _, root = tree
+
+    result = delete_tree(root)
+    assert result.success
+    assert not os.path.exists(root)
+    assert result.deleted_files == 4
+
+
+def test_delete_tree_missing_root():
+    """Test a missing root is not an error"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        result = delete_tree(os.path.join(tmpdir, 'missing'))
+        assert result.success
+        assert result.deleted_dirs == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink') or os.name == 'nt', reason="symlinks required")
+def test_delete_tree_does_not_follow_symlinks(tree):
+    """Test a symlink inside the tree is unlinked without touching its target"""
+    tmpdir, root = tree
+    outside = os.path.join(tmpdir, 'outside')
+    os.makedirs(outside)
+    keep = os.path.join(outside, 'keep.txt')
+    with open(keep, 'w') as f:
+        f.write('keep')
+    os.symlink(outside, os.path.join(root, 'link'))
+
+    result = delete_tree(root)
+
+    assert result.success
+    assert not os.path.exists(root)
+    assert os.path.exists(keep)
+
+
+def test_delete_tree_read_only_entries(tree):
+    """Test read-only files and directories are handled in the same pass"""
+    _, root = tree
+    os.chmod(os.path.join(root, 'a', 'b', 'z.tmp'), stat.S_IREAD)
+    os.chmod(os.path.join(root, 'a', 'b'), stat.S_IREAD | stat.S_IEXEC)
+
+    result = delete_tree(root)
+
+    assert result.success
+    assert not os.path.exists(root)
+
+
+def test_delete_tree_records_failures(tree, monkeypatch):
+    """Test undeletable entries are recorded and siblings still removed"""
+    _, root = tree
+    real_unlink = os.unlink
+
+    def locked_unlink(path, *args, **kwargs):
+        if os.path.basename(path) == 'y.tmp':
+            raise PermissionError(13, 'locked')
+        return real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'unlink', locked_unlink)
+    result = delete_tree(root)
+
+    assert not result.success
+    assert [os.path.basename(p) for p, _ in result.failures] == ['y.tmp']
+    # 只保留失败条目及其祖先目录
+    assert os.path.exists(os.path.join(root, 'a', 'y.tmp'))
+    assert not os.path.exists(os.path.join(root, 'a', 'b'))
+    assert not os.path.exists(os.path.join(root, 'c'))
+    assert not os.path.exists(os.path.join(root, 'x.tmp'))